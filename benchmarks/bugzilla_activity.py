@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2019 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, 51 Franklin Street, Fifth Floor, Boston, MA 02110-1335, USA.
+#
+# Authors:
+#     Santiago Dueñas <sduenas@bitergia.com>
+#
+
+"""Compare the performance of the Bugzilla activity parsers.
+
+The activity pages are parsed with BeautifulSoup (`bs4`) and
+with the tokenizer based parser (`stream`). Both outputs must
+be the same.
+
+Usage:
+
+    $ curl -o activity.html 'https://bugzilla.example.com/show_activity.cgi?id=1'
+    $ python3 benchmarks/bugzilla_activity.py activity.html
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from perceval.backends.core.bugzilla import (ACTIVITY_PARSER_BS4,  # noqa: E402
+                                             ACTIVITY_PARSER_STREAM,
+                                             Bugzilla)
+
+
+DEFAULT_PAGES = [
+    os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                 '..', 'tests', 'data', 'bugzilla', filename)
+    for filename in ['bugzilla_bug_activity.html',
+                     'bugzilla_bug_activity_empty.html',
+                     'bugzilla_bug_activity_empty_alt.html']
+]
+
+
+def run(parser, pages, rounds):
+    best = None
+    events = None
+
+    for _ in range(rounds):
+        start = time.perf_counter()
+        events = [list(Bugzilla.parse_bug_activity(page, parser=parser))
+                  for page in pages]
+        elapsed = time.perf_counter() - start
+
+        best = elapsed if best is None else min(best, elapsed)
+
+    return events, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Bugzilla activity parsers")
+    parser.add_argument('pages', nargs='*', default=DEFAULT_PAGES,
+                        help="HTML activity pages to parse")
+    parser.add_argument('--repeat', type=int, default=10,
+                        help="number of times each page is parsed")
+    parser.add_argument('--rounds', type=int, default=5,
+                        help="number of runs of each parser")
+    args = parser.parse_args()
+
+    pages = []
+    for filepath in args.pages:
+        with open(filepath, 'r') as fd:
+            pages.append(fd.read())
+    pages *= args.repeat
+
+    expected, bs4_time = run(ACTIVITY_PARSER_BS4, pages, args.rounds)
+    events, stream_time = run(ACTIVITY_PARSER_STREAM, pages, args.rounds)
+
+    if events != expected:
+        print("Error: parsers output differ", file=sys.stderr)
+        sys.exit(1)
+
+    print("pages: %d" % len(pages))
+    print("events: %d" % sum(len(page_events) for page_events in events))
+    print("bs4 parser: %.4fs" % bs4_time)
+    print("stream parser: %.4fs" % stream_time)
+    if stream_time:
+        print("speedup: %.2fx" % (bs4_time / stream_time))
+
+
+if __name__ == '__main__':
+    main()
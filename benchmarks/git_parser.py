@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2019 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, 51 Franklin Street, Fifth Floor, Boston, MA 02110-1335, USA.
+#
+# Authors:
+#     Santiago Dueñas <sduenas@bitergia.com>
+#
+
+"""Compare the performance of the Git log parsers.
+
+The log is parsed by `GitParser` and by the `GitParser` of a
+previous revision of the repository (by default, the last one
+based on regular expressions), which is loaded from git without
+modifications. The current parser is run over lines of text and
+over a block of bytes. All the outputs must be the same.
+
+Usage:
+
+    $ git log --raw --numstat --pretty=fuller --decorate=full \\
+        --parents --reverse --topo-order -M -C -c --all > git.log
+    $ python3 benchmarks/git_parser.py git.log
+    $ python3 benchmarks/git_parser.py git.log --baseline v0.12.0
+"""
+
+import argparse
+import io
+import os
+import subprocess
+import sys
+import time
+import types
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+sys.path.insert(0, REPO_DIR)
+
+from perceval.backends.core.git import GitParser  # noqa: E402
+
+
+DEFAULT_LOG = os.path.join(REPO_DIR, 'tests', 'data', 'git', 'git_log.txt')
+
+# Last revision of GitParser based on regular expressions
+DEFAULT_BASELINE = '0145e2f^'
+
+
+def load_parser(revision):
+    """Load the class `GitParser` of a revision of the repository"""
+
+    source = subprocess.check_output(['git', '-C', REPO_DIR, 'show',
+                                      revision + ':perceval/backends/core/git.py'])
+
+    module = types.ModuleType('perceval.backends.core._git_baseline')
+    module.__package__ = 'perceval.backends.core'
+    exec(compile(source, 'git.py@' + revision, 'exec'), module.__dict__)
+
+    return module.GitParser
+
+
+def run(parser_class, data, rounds):
+    best = None
+    commits = None
+
+    for _ in range(rounds):
+        # Blocks of bytes are parsed in one block, like the chunks
+        # of the log files
+        if isinstance(data, bytes):
+            stream = [data]
+        else:
+            stream = io.StringIO(data, newline='\n')
+
+        start = time.perf_counter()
+        commits = list(parser_class(stream).parse())
+        elapsed = time.perf_counter() - start
+
+        best = elapsed if best is None else min(best, elapsed)
+
+    return commits, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Git log parsers")
+    parser.add_argument('logfile', nargs='?', default=DEFAULT_LOG,
+                        help="Git log file to parse")
+    parser.add_argument('--repeat', type=int, default=1,
+                        help="number of times the log is concatenated")
+    parser.add_argument('--rounds', type=int, default=5,
+                        help="number of runs of each parser")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+                        help="git revision of the parser to compare with")
+    args = parser.parse_args()
+
+    with open(args.logfile, 'r', errors='surrogateescape', newline='\n') as fd:
+        data = fd.read()
+
+    if data and not data.endswith('\n'):
+        data += '\n'
+    data *= args.repeat
+
+    baseline_parser = load_parser(args.baseline)
+
+    expected, baseline_time = run(baseline_parser, data, args.rounds)
+    commits, fast_time = run(GitParser, data, args.rounds)
+    block_commits, block_time = run(GitParser, data.encode('utf-8', errors='surrogateescape'),
+                                    args.rounds)
+
+    if commits != expected or block_commits != expected:
+        print("Error: parsers output differ", file=sys.stderr)
+        sys.exit(1)
+
+    print("commits: %d" % len(commits))
+    print("baseline parser (%s): %.4fs" % (args.baseline, baseline_time))
+    print("current parser: %.4fs" % fast_time)
+    if fast_time:
+        print("speedup: %.2fx" % (baseline_time / fast_time))
+    print("current parser (bytes): %.4fs" % block_time)
+    if block_time:
+        print("speedup: %.2fx" % (baseline_time / block_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2019 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, 51 Franklin Street, Fifth Floor, Boston, MA 02110-1335, USA.
+#
+# Authors:
+#     Santiago Dueñas <sduenas@bitergia.com>
+#
+
+"""Measure the performance of the conversion of messages to dicts.
+
+The messages of the given mboxes are converted by `message_to_dict`
+with the fast path for headers and, as a reference, with the path
+that decodes every header, which is used when the policy of the
+messages is not `compat32`. Both outputs must be the same. The time
+needed when bodies are not decoded (`max_body_size=0`) is also
+shown.
+
+Usage:
+
+    $ python3 benchmarks/message_to_dict.py mbox1 mbox2 --repeat 100
+"""
+
+import argparse
+import copy
+import email.policy
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from perceval.backends.core.mbox import MBoxArchive, _read_mbox  # noqa: E402
+from perceval.utils import message_to_dict  # noqa: E402
+
+
+DEFAULT_MBOXES = sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                               '..', 'tests', 'data', 'mbox', '*.mbox')))
+
+
+def run(messages, rounds, max_body_size=None):
+    best = None
+    result = None
+
+    for _ in range(rounds):
+        start = time.perf_counter()
+        result = [message_to_dict(msg, max_body_size=max_body_size)
+                  for msg in messages]
+        elapsed = time.perf_counter() - start
+
+        best = elapsed if best is None else min(best, elapsed)
+
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark message_to_dict")
+    parser.add_argument('mboxes', nargs='*', default=DEFAULT_MBOXES,
+                        help="mbox files with the messages to convert")
+    parser.add_argument('--repeat', type=int, default=100,
+                        help="number of times the messages are converted")
+    parser.add_argument('--rounds', type=int, default=5,
+                        help="number of runs of each conversion")
+    args = parser.parse_args()
+
+    messages = []
+    for filepath in args.mboxes:
+        with MBoxArchive(filepath).container as fd:
+            messages.extend(_read_mbox(fd))
+    messages *= args.repeat
+
+    # A copy of the policy is not `compat32`, so headers are decoded
+    references = []
+    for msg in messages:
+        ref = copy.copy(msg)
+        ref.policy = email.policy.compat32.clone()
+        references.append(ref)
+
+    expected, decode_time = run(references, args.rounds)
+    result, fast_time = run(messages, args.rounds)
+    _, no_body_time = run(messages, args.rounds, max_body_size=0)
+
+    if [dict(m) for m in result] != [dict(m) for m in expected]:
+        print("Error: conversions output differ", file=sys.stderr)
+        sys.exit(1)
+
+    print("messages: %d" % len(messages))
+    print("decoded headers: %.4fs" % decode_time)
+    print("fast headers: %.4fs" % fast_time)
+    print("fast headers, no bodies: %.4fs" % no_body_time)
+    if fast_time:
+        print("speedup: %.2fx" % (decode_time / fast_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -21,13 +21,21 @@
 #     Santiago Dueñas <sduenas@bitergia.com>
 #
 
+import collections
 import hashlib
 import json
 import logging
 import os
 import pickle
 import sqlite3
+import threading
+import time
 import uuid
+import zlib
+
+import requests
+import requests.structures
+import requests.utils
 
 from grimoirelab_toolkit.datetime import (datetime_utcnow,
                                           datetime_to_utc,
@@ -35,10 +43,201 @@ from grimoirelab_toolkit.datetime import (datetime_utcnow,
 
 from .errors import ArchiveError, ArchiveManagerError
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
 
 logger = logging.getLogger(__name__)
 
 
+class ArchiveCodec:
+    """Abstract class for archive codecs.
+
+    Codecs serialize the raw items stored in an archive and
+    deserialize them back when they are retrieved. Each codec
+    is identified by its `name`, which is stored in the metadata
+    of the archive (see `version` column) to know how its
+    entries have to be decoded.
+
+    Derived classes have to implement `encode` and `decode` methods.
+    """
+    name = None
+
+    def encode(self, obj):
+        raise NotImplementedError
+
+    def decode(self, data):
+        raise NotImplementedError
+
+
+class LegacyPickleCodec(ArchiveCodec):
+    """Codec for archives created by older versions of Perceval.
+
+    Objects are serialized using pickle protocol 0. This codec
+    is used to read archives that do not define any version.
+    """
+    name = 'pickle-0'
+
+    def encode(self, obj):
+        return pickle.dumps(obj, 0)
+
+    def decode(self, data):
+        return pickle.loads(data)
+
+
+class CompactCodec(ArchiveCodec):
+    """Compact binary codec for archived items.
+
+    Instead of serializing the whole `requests.Response` objects,
+    this codec only stores their status, reason, headers, url and
+    body. A new `requests.Response` is built with these values when
+    the data is decoded. The same applies to `requests.HTTPError`
+    exceptions and their responses. Any other object is pickled.
+
+    The serialized data is compressed using one of the available
+    methods: 'zstd' (requires `zstandard` package), 'lz4' (requires
+    `lz4` package), 'zlib' or `None`, for no compression.
+
+    :param compression: compression method
+
+    :raises ValueError: when the compression method is not supported
+        or its package is not installed
+    """
+    # Highest protocol available on all the supported Python versions
+    PICKLE_PROTOCOL = 4
+
+    COMPRESSIONS = ['zstd', 'lz4', 'zlib', None]
+
+    OBJECT = 0
+    RESPONSE = 1
+    HTTP_ERROR = 2
+
+    def __init__(self, compression='zlib'):
+        if compression not in self.COMPRESSIONS:
+            raise ValueError("%s compression not supported" % compression)
+        if compression == 'zstd' and not zstandard:
+            raise ValueError("zstd compression requires 'zstandard' package")
+        if compression == 'lz4' and not lz4:
+            raise ValueError("lz4 compression requires 'lz4' package")
+
+        self.compression = compression
+        self.name = 'compact-' + compression if compression else 'compact'
+
+    def encode(self, obj):
+        if isinstance(obj, requests.Response):
+            value = (self.RESPONSE, self._response_to_tuple(obj))
+        elif isinstance(obj, requests.exceptions.HTTPError) and obj.response is not None:
+            value = (self.HTTP_ERROR, (str(obj), self._response_to_tuple(obj.response)))
+        else:
+            value = (self.OBJECT, obj)
+
+        data = pickle.dumps(value, self.PICKLE_PROTOCOL)
+
+        return self._compress(data)
+
+    def decode(self, data):
+        data = self._decompress(data)
+        kind, value = pickle.loads(data)
+
+        if kind == self.RESPONSE:
+            obj = self._tuple_to_response(value)
+        elif kind == self.HTTP_ERROR:
+            msg, response = value
+            obj = requests.exceptions.HTTPError(msg, response=self._tuple_to_response(response))
+        else:
+            obj = value
+
+        return obj
+
+    def _compress(self, data):
+        if self.compression == 'zstd':
+            return zstandard.ZstdCompressor().compress(data)
+        elif self.compression == 'lz4':
+            return lz4.frame.compress(data)
+        elif self.compression == 'zlib':
+            return zlib.compress(data)
+        else:
+            return data
+
+    def _decompress(self, data):
+        if self.compression == 'zstd':
+            return zstandard.ZstdDecompressor().decompress(data)
+        elif self.compression == 'lz4':
+            return lz4.frame.decompress(data)
+        elif self.compression == 'zlib':
+            return zlib.decompress(data)
+        else:
+            return data
+
+    @staticmethod
+    def _response_to_tuple(response):
+        return (response.status_code, response.reason, dict(response.headers),
+                response.url, response.content)
+
+    @staticmethod
+    def _tuple_to_response(value):
+        status_code, reason, headers, url, content = value
+
+        response = requests.Response()
+        response.status_code = status_code
+        response.reason = reason
+        response.headers = requests.structures.CaseInsensitiveDict(headers)
+        response.url = url
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response._content = content
+        response._content_consumed = True
+
+        return response
+
+
+def default_codec():
+    """Return the default codec for new archives.
+
+    The codec compresses the data using the best method available:
+    'zstd', 'lz4' or 'zlib', in that order.
+    """
+    if zstandard:
+        compression = 'zstd'
+    elif lz4:
+        compression = 'lz4'
+    else:
+        compression = 'zlib'
+
+    return CompactCodec(compression=compression)
+
+
+def find_codec(name):
+    """Find a codec by its name.
+
+    :param name: name of the codec; `None` for legacy archives
+
+    :returns: an `ArchiveCodec` object
+
+    :raises ArchiveError: when the codec is unknown or cannot be used
+    """
+    if name is None or name == LegacyPickleCodec.name:
+        return LegacyPickleCodec()
+
+    if name == 'compact':
+        compression = None
+    elif name.startswith('compact-'):
+        compression = name[len('compact-'):]
+    else:
+        raise ArchiveError(cause="unknown archive codec %s" % name)
+
+    try:
+        return CompactCodec(compression=compression)
+    except ValueError as e:
+        raise ArchiveError(cause="archive codec %s not available; %s" % (name, str(e)))
+
+
 class Archive:
     """Basic class for archiving raw items fetched by Perceval.
 
@@ -56,7 +255,40 @@ class Archive:
     initialized calling to `init_metadata` method after creating
     a new archive.
 
+    By default, each stored item is written to disk in its own
+    transaction. To reduce the number of commits, items can be
+    written in batches setting `batch_size` and/or `flush_interval`.
+    In that case, the stored items are committed when the batch is
+    full, when `flush_interval` seconds have passed since the last
+    commit (checked each time a new item is stored), or when the
+    archive is flushed or closed. Buffered archives use WAL journaling.
+
+    Raw items are serialized with an `ArchiveCodec`. The name of
+    the codec is stored in the `version` column of the metadata,
+    so the archive can be decoded later. Archives without version
+    were created with `LegacyPickleCodec`. The codec given as
+    a parameter is only used by new archives.
+
+    Archives are usually replayed in the same order they were stored.
+    When `lookahead` is set, the entries are read sequentially, in
+    insertion order, and up to `lookahead` of them are kept in memory
+    waiting to be retrieved. Only when an entry is not found within
+    that window, it is searched by its hashcode.
+
+    The same archive object can be shared by several threads; access
+    to the database is serialized.
+
     :param archive_path: path where this archive is stored
+    :param batch_size: maximum number of items stored in
+        the same transaction
+    :param flush_interval: maximum number of seconds to keep
+        the stored items without committing them
+    :param codec: codec used to serialize the items; by default
+        the one returned by `default_codec`
+    :param catalog: `ArchiveCatalog` updated when the metadata
+        is initialized
+    :param lookahead: maximum number of entries read in advance
+        while retrieving data; `0` disables it
 
     :raises ArchiveError: when the archive does not exist or is invalid
     """
@@ -79,21 +311,44 @@ class Archive:
                            "backend_version TEXT, " \
                            "category TEXT, " \
                            "backend_params BLOB, " \
-                           "created_on TEXT)"
+                           "created_on TEXT, " \
+                           "version TEXT)"
 
-    def __init__(self, archive_path):
+    DEFAULT_BATCH_SIZE = 1
+    DEFAULT_LOOKAHEAD = 100
+
+    def __init__(self, archive_path, batch_size=DEFAULT_BATCH_SIZE, flush_interval=None,
+                 codec=None, catalog=None, lookahead=0):
         if not os.path.exists(archive_path):
             raise ArchiveError(cause="archive %s does not exist" % (archive_path))
+        if batch_size < 1:
+            raise ArchiveError(cause="batch size must be greater than 0; %s given" % batch_size)
 
         self.archive_path = archive_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
         self.origin = None
         self.backend_name = None
         self.backend_version = None
         self.category = None
         self.backend_params = None
         self.created_on = None
-
-        self._db = sqlite3.connect(self.archive_path)
+        self.codec = codec if codec else default_codec()
+        self.version = None
+        self.catalog = catalog
+        self.lookahead = lookahead
+
+        self._db = sqlite3.connect(self.archive_path, check_same_thread=False)
+        self._lock = threading.RLock()
+        self._nbuffered = 0
+        self._last_flush = time.time()
+        self._lookahead_cursor = None
+        self._lookahead_entries = collections.OrderedDict()
+        self._lookahead_done = False
+
+        if self.buffered:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
 
         self._verify_archive()
         self._load_metadata()
@@ -101,8 +356,19 @@ class Archive:
     def __del__(self):
         conn = getattr(self, '_db', None)
         if conn:
+            try:
+                self.flush()
+            except ArchiveError as e:
+                logger.error("Pending entries of archive %s were lost; cause: %s",
+                             self.archive_path, str(e))
             conn.close()
 
+    @property
+    def buffered(self):
+        """Whether the stored items are written to disk in batches"""
+
+        return self.batch_size > 1 or self.flush_interval is not None
+
     def init_metadata(self, origin, backend_name, backend_version,
                       category, backend_params):
         """Init metadata information.
@@ -124,14 +390,14 @@ class Archive:
         backend_params_dumped = pickle.dumps(backend_params, 0)
 
         metadata = (origin, backend_name, backend_version, category,
-                    backend_params_dumped, created_on_dumped,)
+                    backend_params_dumped, created_on_dumped, self.codec.name,)
 
         try:
             cursor = self._db.cursor()
             insert_stmt = "INSERT INTO " + self.METADATA_TABLE + " "\
                           "(origin, backend_name, backend_version, " \
-                          "category, backend_params, created_on) " \
-                          "VALUES (?, ?, ?, ?, ?, ?)"
+                          "category, backend_params, created_on, version) " \
+                          "VALUES (?, ?, ?, ?, ?, ?, ?)"
             cursor.execute(insert_stmt, metadata)
 
             self._db.commit()
@@ -146,6 +412,10 @@ class Archive:
         self.category = category
         self.backend_params = backend_params
         self.created_on = created_on
+        self.version = self.codec.name
+
+        if self.catalog:
+            self.catalog.update(self)
 
         logger.debug("Metadata of archive %s initialized to %s",
                      self.archive_path, metadata)
@@ -165,28 +435,33 @@ class Archive:
         :raises ArchiveError: when an error occurs storing the given data
         """
         hashcode = self.make_hashcode(uri, payload, headers)
-        payload_dump = pickle.dumps(payload, 0)
-        headers_dump = pickle.dumps(headers, 0)
-        data_dump = pickle.dumps(data, 0)
+        payload_dump = self.codec.encode(payload)
+        headers_dump = self.codec.encode(headers)
+        data_dump = self.codec.encode(data)
 
         logger.debug("Archiving %s with %s %s %s in %s",
                      hashcode, uri, payload, headers, self.archive_path)
 
-        try:
-            cursor = self._db.cursor()
-            insert_stmt = "INSERT INTO " + self.ARCHIVE_TABLE + " (" \
-                          "id, hashcode, uri, payload, headers, data) " \
-                          "VALUES(?,?,?,?,?,?)"
-            cursor.execute(insert_stmt, (None, hashcode, uri,
-                                         payload_dump, headers_dump, data_dump))
-            self._db.commit()
-            cursor.close()
-        except sqlite3.IntegrityError as e:
-            msg = "data storage error; cause: duplicated entry %s" % hashcode
-            raise ArchiveError(cause=msg)
-        except sqlite3.DatabaseError as e:
-            msg = "data storage error; cause: %s" % str(e)
-            raise ArchiveError(cause=msg)
+        with self._lock:
+            try:
+                cursor = self._db.cursor()
+                insert_stmt = "INSERT INTO " + self.ARCHIVE_TABLE + " (" \
+                              "id, hashcode, uri, payload, headers, data) " \
+                              "VALUES(?,?,?,?,?,?)"
+                cursor.execute(insert_stmt, (None, hashcode, uri,
+                                             payload_dump, headers_dump, data_dump))
+                cursor.close()
+            except sqlite3.IntegrityError as e:
+                msg = "data storage error; cause: duplicated entry %s" % hashcode
+                raise ArchiveError(cause=msg)
+            except sqlite3.DatabaseError as e:
+                msg = "data storage error; cause: %s" % str(e)
+                raise ArchiveError(cause=msg)
+
+            self._nbuffered += 1
+
+            if self._nbuffered >= self.batch_size or self._flush_interval_expired():
+                self.flush()
 
         logger.debug("%s data archived in %s", hashcode, self.archive_path)
 
@@ -209,36 +484,72 @@ class Archive:
         logger.debug("Retrieving entry %s with %s %s %s in %s",
                      hashcode, uri, payload, headers, self.archive_path)
 
-        self._db.row_factory = sqlite3.Row
+        with self._lock:
+            data = self._retrieve_lookahead(hashcode) if self.lookahead else None
 
-        try:
-            cursor = self._db.cursor()
-            select_stmt = "SELECT data " \
-                          "FROM " + self.ARCHIVE_TABLE + " " \
-                          "WHERE hashcode = ?"
-            cursor.execute(select_stmt, (hashcode,))
-            row = cursor.fetchone()
-            cursor.close()
-        except sqlite3.DatabaseError as e:
-            msg = "data retrieval error; cause: %s" % str(e)
-            raise ArchiveError(cause=msg)
+            if data is None:
+                data = self._retrieve_entry(hashcode)
 
-        if row:
-            found = pickle.loads(row['data'])
+        if data is not None:
+            found = self.codec.decode(data)
         else:
             msg = "entry %s not found in archive %s" % (hashcode, self.archive_path)
             raise ArchiveError(cause=msg)
 
         return found
 
+    def flush(self):
+        """Write to disk the items pending to be committed.
+
+        :raises ArchiveError: when an error occurs writing the data
+        """
+        with self._lock:
+            if not self._nbuffered:
+                return
+
+            try:
+                self._db.commit()
+            except sqlite3.DatabaseError as e:
+                msg = "data storage error; cause: %s" % str(e)
+                raise ArchiveError(cause=msg)
+
+            logger.debug("%s entries flushed to archive %s",
+                         self._nbuffered, self.archive_path)
+
+            self._nbuffered = 0
+            self._last_flush = time.time()
+
+    def close(self):
+        """Flush the pending items and close the archive.
+
+        :raises ArchiveError: when an error occurs writing the data
+        """
+        with self._lock:
+            if not self._db:
+                return
+
+            try:
+                self._close_lookahead()
+                self.flush()
+            finally:
+                self._db.close()
+                self._db = None
+
     @classmethod
-    def create(cls, archive_path):
+    def create(cls, archive_path, batch_size=DEFAULT_BATCH_SIZE, flush_interval=None,
+               codec=None, catalog=None):
         """Create a brand new archive.
 
          Call this method to create a new and empty archive. It will initialize
          the storage file in the path defined by `archive_path`.
 
         :param archive_path: absolute path where the archive file will be created
+        :param batch_size: maximum number of items stored in
+            the same transaction
+        :param flush_interval: maximum number of seconds to keep
+            the stored items without committing them
+        :param codec: codec used to serialize the items
+        :param catalog: catalog updated when the metadata is initialized
 
         :raises ArchiveError: when the archive file already exists
         """
@@ -257,7 +568,9 @@ class Archive:
         conn.close()
 
         logger.debug("Creating archive %s", archive_path)
-        archive = cls(archive_path)
+        archive = cls(archive_path, batch_size=batch_size,
+                      flush_interval=flush_interval, codec=codec,
+                      catalog=catalog)
         logger.debug("Achive %s was created", archive_path)
 
         return archive
@@ -282,6 +595,73 @@ class Archive:
         hashcode = hashlib.sha1(content.encode('utf-8'))
         return hashcode.hexdigest()
 
+    def _retrieve_entry(self, hashcode):
+        """Fetch the data of an entry using its hashcode"""
+
+        try:
+            cursor = self._db.cursor()
+            select_stmt = "SELECT data " \
+                          "FROM " + self.ARCHIVE_TABLE + " " \
+                          "WHERE hashcode = ?"
+            cursor.execute(select_stmt, (hashcode,))
+            row = cursor.fetchone()
+            cursor.close()
+        except sqlite3.DatabaseError as e:
+            msg = "data retrieval error; cause: %s" % str(e)
+            raise ArchiveError(cause=msg)
+
+        return row[0] if row else None
+
+    def _retrieve_lookahead(self, hashcode):
+        """Look for an entry reading the archive sequentially.
+
+        Entries read while looking for `hashcode` are kept in memory
+        for the next calls. When the buffer is full, the oldest entries
+        are discarded. No more than `lookahead` entries are read
+        on each call.
+        """
+        data = self._lookahead_entries.pop(hashcode, None)
+
+        if data is not None or self._lookahead_done:
+            return data
+
+        try:
+            if not self._lookahead_cursor:
+                self._lookahead_cursor = self._db.cursor()
+                self._lookahead_cursor.execute("SELECT hashcode, data "
+                                               "FROM " + self.ARCHIVE_TABLE + " "
+                                               "ORDER BY id")
+
+            for _ in range(self.lookahead):
+                row = self._lookahead_cursor.fetchone()
+
+                if not row:
+                    self._close_lookahead()
+                    break
+                elif row[0] == hashcode:
+                    return row[1]
+
+                self._lookahead_entries[row[0]] = row[1]
+
+                if len(self._lookahead_entries) > self.lookahead:
+                    self._lookahead_entries.popitem(last=False)
+        except sqlite3.DatabaseError as e:
+            msg = "data retrieval error; cause: %s" % str(e)
+            raise ArchiveError(cause=msg)
+
+        return None
+
+    def _close_lookahead(self):
+        if self._lookahead_cursor:
+            self._lookahead_cursor.close()
+            self._lookahead_cursor = None
+        self._lookahead_done = True
+
+    def _flush_interval_expired(self):
+        if self.flush_interval is None:
+            return False
+        return (time.time() - self._last_flush) >= self.flush_interval
+
     def _verify_archive(self):
         """Check whether the archive is valid or not.
 
@@ -307,8 +687,14 @@ class Archive:
         logger.debug("Loading metadata infomation of archive %s", self.archive_path)
 
         cursor = self._db.cursor()
+
+        # Archives created by older versions do not have 'version' column
+        cursor.execute("PRAGMA table_info(" + self.METADATA_TABLE + ")")
+        columns = [column[1] for column in cursor.fetchall()]
+        version_column = 'version' if 'version' in columns else 'NULL'
+
         select_stmt = "SELECT origin, backend_name, backend_version, " \
-                      "category, backend_params, created_on " \
+                      "category, backend_params, created_on, " + version_column + " " \
                       "FROM " + self.METADATA_TABLE + " " \
                       "LIMIT 1"
         cursor.execute(select_stmt)
@@ -322,6 +708,8 @@ class Archive:
             self.category = row[3]
             self.backend_params = pickle.loads(row[4])
             self.created_on = str_to_datetime(row[5])
+            self.version = row[6]
+            self.codec = find_codec(self.version)
         else:
             logger.debug("Metadata of archive %s was empty", self.archive_path)
 
@@ -345,6 +733,180 @@ class Archive:
         return row[0]
 
 
+class ArchiveCatalog:
+    """Index of the archives stored under a directory.
+
+    The catalog is a SQLite database which stores the metadata of
+    the archives (origin, backend name and version, category and
+    creation date) indexed by the path of each archive, relative
+    to `dirpath`. It allows to search archives without opening
+    each one of them.
+
+    The catalog must be kept updated by the objects that create,
+    initialize or remove archives. When it gets out of sync, it
+    can be regenerated from the archive files calling `rebuild`.
+
+    :param dirpath: path where the archives are stored
+    :param storage_ext: extension of the archive files
+    """
+    CATALOG_NAME = 'catalog.db'
+    CATALOG_TABLE = 'catalog'
+
+    CATALOG_CREATE_STMT = "CREATE TABLE IF NOT EXISTS " + CATALOG_TABLE + " ( " \
+                          "archive_path TEXT PRIMARY KEY, " \
+                          "origin TEXT, " \
+                          "backend_name TEXT, " \
+                          "backend_version TEXT, " \
+                          "category TEXT, " \
+                          "created_on REAL)"
+
+    CATALOG_INDEX_STMT = "CREATE INDEX IF NOT EXISTS " + CATALOG_TABLE + "_search " \
+                         "ON " + CATALOG_TABLE + " (origin, backend_name, category, created_on)"
+
+    # Seconds to wait for other processes using the catalog
+    LOCK_TIMEOUT = 60
+
+    def __init__(self, dirpath, storage_ext='.sqlite3'):
+        self.dirpath = dirpath
+        self.storage_ext = storage_ext
+        self.catalog_path = os.path.join(dirpath, self.CATALOG_NAME)
+
+    @property
+    def exists(self):
+        return os.path.exists(self.catalog_path)
+
+    def add(self, archive_path):
+        """Add an archive without metadata to the catalog.
+
+        :param archive_path: path to the archive
+        """
+        stmt = "INSERT OR REPLACE INTO " + self.CATALOG_TABLE + " " \
+               "(archive_path) VALUES (?)"
+        self._execute(stmt, (self._relpath(archive_path),))
+
+    def update(self, archive):
+        """Add or update the metadata of an archive in the catalog.
+
+        :param archive: `Archive` object
+        """
+        stmt = "INSERT OR REPLACE INTO " + self.CATALOG_TABLE + " " \
+               "(archive_path, origin, backend_name, backend_version, category, created_on) " \
+               "VALUES (?, ?, ?, ?, ?, ?)"
+        self._execute(stmt, self._archive_to_row(archive))
+
+    def remove(self, archive_path):
+        """Remove an archive from the catalog.
+
+        :param archive_path: path to the archive
+        """
+        stmt = "DELETE FROM " + self.CATALOG_TABLE + " WHERE archive_path = ?"
+        self._execute(stmt, (self._relpath(archive_path),))
+
+    def search(self, origin, backend_name, category, archived_after):
+        """Search archives in the catalog.
+
+        :param origin: data origin
+        :param backend_name: backed used to fetch data
+        :param category: type of the items fetched by the backend
+        :param archived_after: get archives created on or after this date
+
+        :returns: a list of tuples with the path and the creation
+            timestamp of the archives, sorted by creation date
+        """
+        stmt = "SELECT archive_path, created_on " \
+               "FROM " + self.CATALOG_TABLE + " " \
+               "WHERE origin = ? AND backend_name = ? AND category = ? " \
+               "AND created_on >= ? " \
+               "ORDER BY created_on, rowid"
+        params = (origin, backend_name, category,
+                  datetime_to_utc(archived_after).timestamp())
+
+        rows = self._execute(stmt, params)
+
+        return [(os.path.join(self.dirpath, row[0]), row[1]) for row in rows]
+
+    def rebuild(self):
+        """Regenerate the catalog from the archive files.
+
+        Archive files which are not valid are not included
+        in the catalog.
+
+        :returns: number of archives added to the catalog
+        """
+        rows = []
+
+        for root, _, files in os.walk(self.dirpath):
+            for filename in files:
+                if not filename.endswith(self.storage_ext):
+                    continue
+
+                archive_path = os.path.join(root, filename)
+
+                try:
+                    archive = Archive(archive_path)
+                except ArchiveError as e:
+                    logger.warning("Ignoring %s archive due to: %s", archive_path, str(e))
+                    continue
+
+                rows.append(self._archive_to_row(archive))
+                archive.close()
+
+        conn = self._connect()
+
+        try:
+            with conn:
+                conn.execute("DELETE FROM " + self.CATALOG_TABLE)
+                conn.executemany("INSERT OR REPLACE INTO " + self.CATALOG_TABLE + " "
+                                 "(archive_path, origin, backend_name, backend_version, "
+                                 "category, created_on) "
+                                 "VALUES (?, ?, ?, ?, ?, ?)", rows)
+        except sqlite3.DatabaseError as e:
+            msg = "catalog %s rebuild error; cause: %s" % (self.catalog_path, str(e))
+            raise ArchiveManagerError(cause=msg)
+        finally:
+            conn.close()
+
+        logger.debug("Catalog %s rebuilt; %s archives found",
+                     self.catalog_path, len(rows))
+
+        return len(rows)
+
+    def _archive_to_row(self, archive):
+        created_on = archive.created_on.timestamp() if archive.created_on else None
+
+        return (self._relpath(archive.archive_path), archive.origin,
+                archive.backend_name, archive.backend_version,
+                archive.category, created_on)
+
+    def _relpath(self, archive_path):
+        return os.path.relpath(archive_path, self.dirpath)
+
+    def _connect(self):
+        try:
+            conn = sqlite3.connect(self.catalog_path, timeout=self.LOCK_TIMEOUT)
+            conn.execute(self.CATALOG_CREATE_STMT)
+            conn.execute(self.CATALOG_INDEX_STMT)
+        except sqlite3.DatabaseError as e:
+            msg = "invalid catalog %s; cause: %s" % (self.catalog_path, str(e))
+            raise ArchiveManagerError(cause=msg)
+
+        return conn
+
+    def _execute(self, stmt, params):
+        conn = self._connect()
+
+        try:
+            with conn:
+                rows = conn.execute(stmt, params).fetchall()
+        except sqlite3.DatabaseError as e:
+            msg = "catalog %s error; cause: %s" % (self.catalog_path, str(e))
+            raise ArchiveManagerError(cause=msg)
+        finally:
+            conn.close()
+
+        return rows
+
+
 class ArchiveManager:
     """Manager for handling archives in Perceval.
 
@@ -354,17 +916,40 @@ class ArchiveManager:
     be the name of the subdirectory; the remaining bytes, the archive
     name.
 
+    New archives will write their items in batches when `batch_size`
+    or `flush_interval` are set. See `Archive` for more information.
+
+    The metadata of the archives is indexed in an `ArchiveCatalog`,
+    stored in the same directory, which is used to search archives.
+    The catalog is built from the archive files when it does not
+    exist.
+
     :param: dirpath: path where the archives are stored
+    :param batch_size: maximum number of items stored in
+        the same transaction by new archives
+    :param flush_interval: maximum number of seconds new archives
+        keep the stored items without committing them
+    :param codec: codec used to serialize the items of new archives
     """
 
     STORAGE_EXT = '.sqlite3'
+    WAL_EXTS = ['-wal', '-shm']
 
-    def __init__(self, dirpath):
+    def __init__(self, dirpath, batch_size=Archive.DEFAULT_BATCH_SIZE, flush_interval=None,
+                 codec=None):
         self.dirpath = dirpath
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.codec = codec
 
         if not os.path.exists(self.dirpath):
             os.makedirs(self.dirpath)
 
+        self.catalog = ArchiveCatalog(self.dirpath, storage_ext=self.STORAGE_EXT)
+
+        if not self.catalog.exists:
+            self.catalog.rebuild()
+
     def create_archive(self):
         """Create a new archive.
 
@@ -387,10 +972,16 @@ class ArchiveManager:
             os.makedirs(archive_dir)
 
         try:
-            archive = Archive.create(archive_path)
+            archive = Archive.create(archive_path,
+                                     batch_size=self.batch_size,
+                                     flush_interval=self.flush_interval,
+                                     codec=self.codec,
+                                     catalog=self.catalog)
         except ArchiveError as e:
             raise ArchiveManagerError(cause=str(e))
 
+        self.catalog.add(archive_path)
+
         return archive
 
     def remove_archive(self, archive_path):
@@ -405,11 +996,17 @@ class ArchiveManager:
             archive
         """
         try:
-            Archive(archive_path)
+            Archive(archive_path).close()
         except ArchiveError as e:
             raise ArchiveManagerError(cause=str(e))
 
         os.remove(archive_path)
+        self.catalog.remove(archive_path)
+
+        # Journal files left by buffered archives
+        for ext in self.WAL_EXTS:
+            if os.path.exists(archive_path + ext):
+                os.remove(archive_path + ext)
 
     def search(self, origin, backend_name, category, archived_after):
         """Search archives.
@@ -430,36 +1027,15 @@ class ArchiveManager:
 
         :returns: a list with archive names which match the search criteria
         """
-        archives = self._search_archives(origin, backend_name,
-                                         category, archived_after)
-        archives = [(fp, date) for fp, date in archives]
-        archives = [fp for fp, _ in sorted(archives, key=lambda x: x[1])]
+        archives = self.catalog.search(origin, backend_name,
+                                       category, archived_after)
+        archives = [fp for fp, _ in archives if os.path.exists(fp)]
 
         return archives
 
-    def _search_archives(self, origin, backend_name, category, archived_after):
-        """Search archives using filters."""
-
-        for archive_path in self._search_files():
-            try:
-                archive = Archive(archive_path)
-            except ArchiveError:
-                continue
-
-            match = archive.origin == origin and \
-                archive.backend_name == backend_name and \
-                archive.category == category and \
-                archive.created_on >= archived_after
+    def rebuild(self):
+        """Regenerate the catalog from the archive files.
 
-            if not match:
-                continue
-
-            yield archive_path, archive.created_on
-
-    def _search_files(self):
-        """Retrieve the file paths stored under the base path."""
-
-        for root, _, files in os.walk(self.dirpath):
-            for filename in files:
-                location = os.path.join(root, filename)
-                yield location
+        :returns: number of archives found
+        """
+        return self.catalog.rebuild()
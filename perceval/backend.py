@@ -127,6 +127,9 @@ class Backend:
         for item in self.fetch_items(category, **kwargs):
             yield self.metadata(item)
 
+        if self.archive:
+            self.archive.flush()
+
     def fetch_from_archive(self):
         """Fetch the questions from an archive.
 
@@ -207,13 +210,14 @@ class BackendCommandArgumentParser:
     :param token_auth: set token/key authentication arguments
     :param archive: set archiving arguments
     :param aliases: define aliases for parsed arguments
+    :param http_cache: set conditional HTTP requests arguments
 
     :raises AttributeArror: when both `from_date` and `offset` are set
         to `True`
     """
     def __init__(self, from_date=False, to_date=False, offset=False,
                  basic_auth=False, token_auth=False, archive=False,
-                 aliases=None):
+                 aliases=None, http_cache=False):
         self._from_date = from_date
         self._to_date = to_date
         self._archive = archive
@@ -249,6 +253,9 @@ class BackendCommandArgumentParser:
         if archive:
             self._set_archive_arguments()
 
+        if http_cache:
+            self._set_http_cache_arguments()
+
         self._set_output_arguments()
 
     def parse(self, *args):
@@ -314,6 +321,20 @@ class BackendCommandArgumentParser:
                            help="fetch data from the archives")
         group.add_argument('--archived-since', dest='archived_since', default='1970-01-01',
                            help="retrieve items archived since the given date")
+        group.add_argument('--archive-batch-size', dest='archive_batch_size', type=int,
+                           default=Archive.DEFAULT_BATCH_SIZE,
+                           help="number of raw items written to the archive in the same transaction")
+        group.add_argument('--archive-flush-interval', dest='archive_flush_interval', type=float,
+                           default=None,
+                           help="maximum number of seconds raw items wait to be written to the archive")
+
+    def _set_http_cache_arguments(self):
+        """Activate conditional HTTP requests arguments parsing"""
+
+        group = self.parser.add_argument_group('HTTP cache arguments')
+        group.add_argument('--http-cache-path', dest='http_cache_path', default=None,
+                           help="file where validators and contents of the responses are cached "
+                                "to make conditional requests")
 
     def _set_output_arguments(self):
         """Activate output arguments parsing"""
@@ -415,7 +436,9 @@ class BackendCommand:
             else:
                 archive_path = self.parsed_args.archive_path
 
-            manager = ArchiveManager(archive_path)
+            manager = ArchiveManager(archive_path,
+                                     batch_size=self.parsed_args.archive_batch_size,
+                                     flush_interval=self.parsed_args.archive_flush_interval)
 
         self.archive_manager = manager
 
@@ -494,12 +517,18 @@ def fetch(backend_class, backend_args, category, manager=None):
     except Exception as e:
         if manager:
             archive_path = archive.archive_path
-            manager.remove_archive(archive_path)
+            try:
+                archive.close()
+            except Exception as close_error:
+                logger.warning("Error closing archive %s: %s", archive_path, str(close_error))
+            finally:
+                manager.remove_archive(archive_path)
         raise e
 
 
 def fetch_from_archive(backend_class, backend_args, manager,
-                       category, archived_after):
+                       category, archived_after,
+                       lookahead=Archive.DEFAULT_LOOKAHEAD):
     """Fetch items from an archive manager.
 
     Generator to get the items of a category (previously fetched
@@ -509,11 +538,17 @@ def fetch_from_archive(backend_class, backend_args, manager,
     The parameters needed to initialize `backend` and get the
     items are given using `backend_args` dict parameter.
 
+    Archives are read sequentially keeping in memory up to `lookahead`
+    entries (see `Archive`), which is faster than searching each entry
+    when they are replayed in the same order they were stored.
+
     :param backend_class: backend class to retrive items
     :param backend_args: dict of arguments needed to retrieve the items
     :param manager: archive manager where the items will be retrieved
     :param category: category of the items to retrieve
     :param archived_after: return items archived after this date
+    :param lookahead: number of entries read in advance from
+        the archives; `0` to disable it
 
     :returns: a generator of archived items
     """
@@ -527,10 +562,10 @@ def fetch_from_archive(backend_class, backend_args, manager,
                                archived_after)
 
     for filepath in filepaths:
-        backend.archive = Archive(filepath)
-        items = backend.fetch_from_archive()
-
         try:
+            backend.archive = Archive(filepath, lookahead=lookahead)
+            items = backend.fetch_from_archive()
+
             for item in items:
                 yield item
         except ArchiveError as e:
@@ -21,8 +21,11 @@
 #     Alvaro del Castillo San Felix <acs@bitergia.com>
 #
 
+import collections
+import concurrent.futures
 import csv
 import datetime
+import html.parser
 import logging
 import re
 
@@ -36,11 +39,19 @@ from ...backend import (Backend,
                         BackendCommandArgumentParser)
 from ...client import HttpClient
 from ...errors import BackendError, ParseError
-from ...utils import DEFAULT_DATETIME, xml_to_dict
+from ...utils import DEFAULT_DATETIME, xml_to_dict_iter
 
 CATEGORY_BUG = "bug"
 MAX_BUGS = 200  # Maximum number of bugs per query
 MAX_BUGS_CSV = 10000  # Maximum number of bugs per CSV query
+MAX_WORKERS = 1
+
+# Parsers of the activity of the bugs
+ACTIVITY_PARSER_BS4 = 'bs4'
+ACTIVITY_PARSER_STREAM = 'stream'
+ACTIVITY_PARSERS = [ACTIVITY_PARSER_BS4, ACTIVITY_PARSER_STREAM]
+
+EMPTY_ACTIVITY_REGEX = re.compile("No changes have been made to this (?:bug|issue) yet.")
 
 logger = logging.getLogger(__name__)
 
@@ -59,14 +70,28 @@ class Bugzilla(Backend):
     :param max_bugs: maximum number of bugs requested on the same query
     :param tag: label used to mark the data
     :param archive: archive to store/retrieve items
+    :param max_workers: number of requests of bugs details and
+        activity made at the same time; bugs are returned in the
+        same order regardless of this value
+    :param activity_parser: parser of the activity of the bugs;
+        `bs4` builds the HTML tree with BeautifulSoup while `stream`
+        reads the HTML with a tokenizer; both give the same events
+
+    :raises BackendError: when the activity parser is not valid
     """
-    version = '0.10.3'
+    version = '0.12.0'
 
     CATEGORIES = [CATEGORY_BUG]
 
     def __init__(self, url, user=None, password=None,
                  max_bugs=MAX_BUGS, max_bugs_csv=MAX_BUGS_CSV,
-                 tag=None, archive=None):
+                 tag=None, archive=None, max_workers=MAX_WORKERS,
+                 activity_parser=ACTIVITY_PARSER_BS4):
+        if activity_parser not in ACTIVITY_PARSERS:
+            cause = "unknown activity parser %s; valid parsers are %s" \
+                % (activity_parser, ', '.join(ACTIVITY_PARSERS))
+            raise BackendError(cause=cause)
+
         origin = url
 
         super().__init__(origin, tag=tag, archive=archive)
@@ -76,6 +101,10 @@ class Bugzilla(Backend):
         self.max_bugs_csv = max_bugs_csv
         self.client = None
         self.max_bugs = max(1, max_bugs)
+        self.max_workers = max_workers
+        self.activity_parser = activity_parser
+
+        self._executor = None
 
     def fetch(self, category=CATEGORY_BUG, from_date=DEFAULT_DATETIME):
         """Fetch the bugs from the repository.
@@ -99,6 +128,11 @@ class Bugzilla(Backend):
     def fetch_items(self, category, **kwargs):
         """Fetch the bugs
 
+        The list of bugs is read page by page while the details of
+        the bugs are fetched, in chunks of `max_bugs`. When there are
+        several workers, the details of the next chunks and the activity
+        of the bugs of a chunk are fetched concurrently.
+
         :param category: the category of items to fetch
         :param kwargs: backend arguments
 
@@ -110,26 +144,21 @@ class Bugzilla(Backend):
         logger.info("Looking for bugs: '%s' updated from '%s'",
                     self.url, str(from_date))
 
-        buglist = [bug for bug in self.__fetch_buglist(from_date)]
+        if self.max_workers > 1:
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers)
 
         nbugs = 0
-        tbugs = len(buglist)
 
-        for i in range(0, tbugs, self.max_bugs):
-            chunk = buglist[i:i + self.max_bugs]
-            bugs_ids = [b['bug_id'] for b in chunk]
-
-            logger.info("Fetching bugs: %s/%s", i, tbugs)
-            bugs = self.__fetch_and_parse_bugs_details(bugs_ids)
-
-            for bug in bugs:
-                bug_id = bug['bug_id'][0]['__text__']
-                bug['activity'] = self.__fetch_and_parse_bug_activity(bug_id)
+        try:
+            for bug in self.__fetch_bugs(from_date):
                 nbugs += 1
                 yield bug
+        finally:
+            if self._executor:
+                self._executor.shutdown(wait=True)
+                self._executor = None
 
-        logger.info("Fetch process completed: %s/%s bugs fetched",
-                    nbugs, tbugs)
+        logger.info("Fetch process completed: %s bugs fetched", nbugs)
 
     @classmethod
     def has_archiving(cls):
@@ -206,7 +235,9 @@ class Bugzilla(Backend):
         the information related to a parsed bug.
 
         If the given XML is invalid or does not contains any bug, the
-        method will raise a ParseError exception.
+        method will raise a ParseError exception. Bugs are returned as
+        soon as they are parsed, so the bugs found before an error in
+        the XML are returned before the exception is raised.
 
         :param raw_xml: XML string to parse
 
@@ -215,27 +246,34 @@ class Bugzilla(Backend):
         :raises ParseError: raised when an error occurs parsing
             the given XML stream
         """
-        bugs = xml_to_dict(raw_xml)
+        nbugs = 0
+
+        for bug in xml_to_dict_iter(raw_xml, 'bug'):
+            nbugs += 1
+            yield bug
 
-        if 'bug' not in bugs:
+        if nbugs == 0:
             cause = "No bugs found. XML stream seems to be invalid."
             raise ParseError(cause=cause)
 
-        for bug in bugs['bug']:
-            yield bug
-
     @staticmethod
-    def parse_bug_activity(raw_html):
+    def parse_bug_activity(raw_html, parser=ACTIVITY_PARSER_BS4):
         """Parse a Bugzilla bug activity HTML stream.
 
         This method extracts the information about activity from the
         given HTML stream. The bug activity is stored into a HTML
         table. Each parsed activity event is returned into a dictionary.
 
+        The HTML can be parsed building its tree with BeautifulSoup
+        (`bs4`) or reading it with a tokenizer (`stream`), which is
+        faster and does not keep the tree in memory. Both parsers
+        return the same events.
+
         If the given HTML is invalid, the method will raise a ParseError
         exception.
 
         :param raw_html: HTML string to parse
+        :param parser: name of the parser to use
 
         :returns: a generator of parsed activity events
 
@@ -243,8 +281,7 @@ class Bugzilla(Backend):
             the given HTML stream
         """
         def is_activity_empty(bs):
-            EMPTY_ACTIVITY = "No changes have been made to this (?:bug|issue) yet."
-            tag = bs.find(text=re.compile(EMPTY_ACTIVITY))
+            tag = bs.find(text=EMPTY_ACTIVITY_REGEX)
             return tag is not None
 
         def find_activity_table(bs):
@@ -268,61 +305,144 @@ class Bugzilla(Backend):
             s = ' '.join(strings)
             return s
 
-        # Parsing starts here
-        bs = bs4.BeautifulSoup(raw_html, 'html.parser')
+        def parse_cells_bs4():
+            bs = bs4.BeautifulSoup(raw_html, 'html.parser')
+
+            if is_activity_empty(bs):
+                return []
 
-        if is_activity_empty(bs):
-            fields = []
-        else:
             activity_tb = find_activity_table(bs)
             remove_tags(activity_tb)
-            fields = activity_tb.find_all('td')
-
-        while fields:
-            # First two fields: 'Who' and 'When'.
-            who = fields.pop(0)
-            when = fields.pop(0)
-
-            # The attribute 'rowspan' of 'who' field tells how many
-            # changes were made on the same date.
-            n = int(who.get('rowspan'))
-
-            # Next fields are split into chunks of three elements:
-            # 'What', 'Removed' and 'Added'. These chunks share
-            # 'Who' and 'When' values.
-            for _ in range(n):
-                what = fields.pop(0)
-                removed = fields.pop(0)
-                added = fields.pop(0)
-                event = {'Who': format_text(who),
-                         'When': format_text(when),
-                         'What': format_text(what),
-                         'Removed': format_text(removed),
-                         'Added': format_text(added)}
-                yield event
+
+            return [(format_text(td), td.get('rowspan'))
+                    for td in activity_tb.find_all('td')]
+
+        # Parsing starts here
+        if parser == ACTIVITY_PARSER_STREAM:
+            cells = _ActivityHTMLParser.parse_cells(raw_html)
+        else:
+            cells = parse_cells_bs4()
+
+        cells = iter(cells)
+
+        try:
+            for who, rowspan in cells:
+                # Second field is 'When'
+                when, _ = next(cells)
+
+                # The attribute 'rowspan' of 'who' field tells how many
+                # changes were made on the same date.
+                n = int(rowspan)
+
+                # Next fields are split into chunks of three elements:
+                # 'What', 'Removed' and 'Added'. These chunks share
+                # 'Who' and 'When' values.
+                for _ in range(n):
+                    what, _ = next(cells)
+                    removed, _ = next(cells)
+                    added, _ = next(cells)
+                    event = {'Who': who,
+                             'When': when,
+                             'What': what,
+                             'Removed': removed,
+                             'Added': added}
+                    yield event
+        except StopIteration:
+            raise ParseError(cause="Table of bug activity is incomplete.")
 
     def _init_client(self, from_archive=False):
         """Init client"""
 
         return BugzillaClient(self.url, user=self.user, password=self.password,
                               max_bugs_csv=self.max_bugs_csv,
-                              archive=self.archive, from_archive=from_archive)
+                              archive=self.archive, from_archive=from_archive,
+                              pool_size=self.max_workers)
+
+    def __fetch_bugs(self, from_date):
+        """Fetch the bugs, with their activity, keeping their order"""
+
+        chunks = self.__fetch_buglist_chunks(from_date)
+
+        if not self._executor:
+            for bugs_ids in chunks:
+                bugs = self.__fetch_and_parse_bugs_details(bugs_ids)
+                yield from self.__fetch_bugs_activity(bugs)
+            return
+
+        # Limit the number of chunks whose details are
+        # fetched before they are needed
+        pending = collections.deque()
+
+        try:
+            for bugs_ids in chunks:
+                if len(pending) == self.max_workers:
+                    yield from self.__fetch_bugs_activity(pending.popleft().result())
+
+                future = self._executor.submit(self.__fetch_and_parse_bugs_details_list,
+                                               bugs_ids)
+                pending.append(future)
+
+            while pending:
+                yield from self.__fetch_bugs_activity(pending.popleft().result())
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def __fetch_bugs_activity(self, bugs):
+        """Fetch the activity of the bugs and return them in order"""
+
+        if not self._executor:
+            for bug in bugs:
+                bug_id = bug['bug_id'][0]['__text__']
+                bug['activity'] = self.__fetch_and_parse_bug_activity(bug_id)
+                yield bug
+            return
+
+        futures = [(bug, self._executor.submit(self.__fetch_and_parse_bug_activity,
+                                               bug['bug_id'][0]['__text__']))
+                   for bug in bugs]
+
+        try:
+            for bug, future in futures:
+                bug['activity'] = future.result()
+                yield bug
+        finally:
+            for _, future in futures:
+                future.cancel()
+
+    def __fetch_buglist_chunks(self, from_date):
+        """Read the list of bugs in chunks of `max_bugs` identifiers"""
+
+        nbugs = 0
+        chunk = []
+
+        for bug in self.__fetch_buglist(from_date):
+            chunk.append(bug['bug_id'])
+
+            if len(chunk) == self.max_bugs:
+                logger.info("Fetching bugs: %s", nbugs)
+                yield chunk
+                nbugs += len(chunk)
+                chunk = []
+
+        if chunk:
+            logger.info("Fetching bugs: %s", nbugs)
+            yield chunk
 
     def __fetch_buglist(self, from_date):
         buglist = self.__fetch_and_parse_buglist_page(from_date)
 
         while buglist:
-            bug = buglist.pop(0)
-            last_date = bug['changeddate']
-            yield bug
+            for bug in buglist:
+                yield bug
 
             # Bugzilla does not support pagination. Due to this,
             # the next list of bugs is requested adding one second
             # to the last date obtained.
-            if not buglist:
-                from_date = str_to_datetime(last_date)
-                from_date += datetime.timedelta(seconds=1)
-                buglist = self.__fetch_and_parse_buglist_page(from_date)
+            last_date = buglist[-1]['changeddate']
+            from_date = str_to_datetime(last_date)
+            from_date += datetime.timedelta(seconds=1)
+            buglist = self.__fetch_and_parse_buglist_page(from_date)
 
     def __fetch_and_parse_buglist_page(self, from_date):
         logger.debug("Fetching and parsing buglist page from %s", str(from_date))
@@ -333,12 +453,28 @@ class Bugzilla(Backend):
     def __fetch_and_parse_bugs_details(self, *bug_ids):
         logger.debug("Fetching and parsing bugs details")
         raw_bugs = self.client.bugs(*bug_ids)
-        return self.parse_bugs_details(raw_bugs)
+
+        # Bugs are returned while the XML is parsed, so some of
+        # them might have been returned when an error is found
+        nbugs = 0
+
+        try:
+            for bug in self.parse_bugs_details(raw_bugs):
+                nbugs += 1
+                yield bug
+        except ParseError as e:
+            logger.error("Error parsing bugs details; %s bugs were returned before the error: %s",
+                         nbugs, str(e))
+            raise e
+
+    def __fetch_and_parse_bugs_details_list(self, *bug_ids):
+        bugs = self.__fetch_and_parse_bugs_details(*bug_ids)
+        return [bug for bug in bugs]
 
     def __fetch_and_parse_bug_activity(self, bug_id):
         logger.debug("Fetching and parsing bug #%s activity", bug_id)
         raw_activity = self.client.bug_activity(bug_id)
-        activity = self.parse_bug_activity(raw_activity)
+        activity = self.parse_bug_activity(raw_activity, parser=self.activity_parser)
         return [event for event in activity]
 
 
@@ -363,6 +499,12 @@ class BugzillaCommand(BackendCommand):
         group.add_argument('--max-bugs-csv', dest='max_bugs_csv',
                            type=int, default=MAX_BUGS_CSV,
                            help="Maximum number of bugs requested on CSV queries")
+        group.add_argument('--max-workers', dest='max_workers',
+                           type=int, default=MAX_WORKERS,
+                           help="Number of requests of bugs made at the same time")
+        group.add_argument('--activity-parser', dest='activity_parser',
+                           choices=ACTIVITY_PARSERS, default=ACTIVITY_PARSER_BS4,
+                           help="Parser of the HTML activity of the bugs")
 
         # Required arguments
         parser.parser.add_argument('url',
@@ -371,6 +513,172 @@ class BugzillaCommand(BackendCommand):
         return parser
 
 
+class _ActivityHTMLParser(html.parser.HTMLParser):
+    """Tokenizer based parser of the activity of a bug.
+
+    It reads the cells of the activity table as `Bugzilla.parse_bug_activity`
+    does using BeautifulSoup, but without building the tree of the page.
+    Tags are opened and closed following the same rules than the `bs4`
+    parser does. The activity table is the first table whose first row
+    has five headers. The text of a cell is made of its strings, once
+    stripped, where the contents of links, italics and spans form a
+    single string.
+    """
+    VOID_ELEMENTS = {'area', 'base', 'basefont', 'bgsound', 'br', 'col',
+                     'command', 'embed', 'frame', 'hr', 'image', 'img',
+                     'input', 'isindex', 'keygen', 'link', 'menuitem',
+                     'meta', 'nextid', 'param', 'source', 'spacer',
+                     'track', 'wbr'}
+
+    TAGS_TO_MERGE = {'a', 'i', 'span'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+
+        self.empty = False
+        self.tables = []  # tables in document order
+
+        self._open = []  # stack of open elements
+        self._data = []  # data read since the last tag
+        self._merged = None  # strings of the outermost 'a', 'i' or 'span'
+
+    @classmethod
+    def parse_cells(cls, raw_html):
+        """Get the cells of the activity table.
+
+        :returns: a list of `(text, rowspan)` tuples, one for each
+            cell of the table; an empty list when the bug has no
+            activity
+
+        :raises ParseError: when the activity table is not found
+        """
+        parser = cls()
+        parser.feed(raw_html)
+        parser.close()
+        parser.flush_data()
+
+        if parser.empty:
+            return []
+
+        for table in parser.tables:
+            if table['nheaders'] == 5:
+                return [(' '.join(cell['strings']), cell['rowspan'])
+                        for cell in table['cells'] if not cell['detached']]
+
+        raise ParseError(cause="Table of bug activity not found.")
+
+    def handle_starttag(self, tag, attrs):
+        self.flush_data()
+
+        if tag in self.VOID_ELEMENTS:
+            return
+
+        element = {'tag': tag}
+
+        if tag == 'table':
+            element['nheaders'] = 0
+            element['tr'] = None
+            element['cells'] = []
+            self.tables.append(element)
+        elif tag == 'tr':
+            for table in self.__open_elements('table'):
+                if table['tr'] is None:
+                    table['tr'] = element
+        elif tag == 'th':
+            parent = self._open[-1] if self._open else None
+            if parent and parent['tag'] == 'tr':
+                for table in self.__open_elements('table'):
+                    if table['tr'] is parent:
+                        table['nheaders'] += 1
+        elif tag == 'td':
+            element['strings'] = []
+            element['rowspan'] = dict(attrs).get('rowspan')
+            # Cells within links, italics or spans are replaced by text
+            element['detached'] = self._merged is not None
+            for table in self.__open_elements('table'):
+                table['cells'].append(element)
+        elif tag in self.TAGS_TO_MERGE and self._merged is None \
+                and self.__open_elements('table'):
+            element['merged'] = True
+            self._merged = []
+
+        self._open.append(element)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        self.flush_data()
+
+        if tag in self.VOID_ELEMENTS:
+            return
+
+        # Close the element and the ones opened after it;
+        # nothing is closed when the element is not open
+        for i in range(len(self._open) - 1, -1, -1):
+            if self._open[i]['tag'] == tag:
+                break
+        else:
+            return
+
+        for j in range(i, len(self._open)):
+            if self._open[j].get('merged'):
+                text = ''.join(self._merged)
+                self._merged = None
+                self.__add_string(text, self._open[:j])
+                break
+
+        del self._open[i:]
+
+    def handle_data(self, data):
+        self._data.append(data)
+
+    def handle_comment(self, data):
+        self.flush_data()
+        self.__check_empty(data)
+
+    def handle_decl(self, decl):
+        self.flush_data()
+
+    def handle_pi(self, data):
+        self.flush_data()
+
+    def flush_data(self):
+        """Process the data read since the last tag as a single string"""
+
+        if not self._data:
+            return
+
+        data = ''.join(self._data)
+        self._data = []
+
+        self.__check_empty(data)
+
+        if self._merged is not None:
+            self._merged.append(data)
+        else:
+            self.__add_string(data)
+
+    def __check_empty(self, data):
+        if not self.empty and EMPTY_ACTIVITY_REGEX.search(data):
+            self.empty = True
+
+    def __add_string(self, data, ancestors=None):
+        data = data.strip()
+
+        if not data:
+            return
+
+        for cell in self.__open_elements('td', ancestors):
+            cell['strings'].append(data)
+
+    def __open_elements(self, tag, ancestors=None):
+        if ancestors is None:
+            ancestors = self._open
+        return [element for element in ancestors if element['tag'] == tag]
+
+
 class BugzillaClient(HttpClient):
     """Bugzilla API client.
 
@@ -387,6 +695,8 @@ class BugzillaClient(HttpClient):
     :param max_bugs_cvs: max bugs requested per CSV query
     :param archive: an archive to store/read fetched data
     :param from_archive: it tells whether to write/read the archive
+    :param pool_size: number of threads that will use this client
+        at the same time
 
     :raises BackendError: when an error occurs initilizing the
         client
@@ -423,9 +733,11 @@ class BugzillaClient(HttpClient):
     CTYPE_XML = 'xml'
 
     def __init__(self, base_url, user=None, password=None,
-                 max_bugs_csv=MAX_BUGS_CSV, archive=None, from_archive=False):
+                 max_bugs_csv=MAX_BUGS_CSV, archive=None, from_archive=False,
+                 pool_size=1):
         self.version = None
-        super().__init__(base_url, archive=archive, from_archive=from_archive)
+        super().__init__(base_url, archive=archive, from_archive=from_archive,
+                         pool_size=pool_size)
 
         if user is not None and password is not None:
             self.login(user, password)
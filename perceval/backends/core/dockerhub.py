@@ -29,6 +29,7 @@ from grimoirelab_toolkit.uris import urijoin
 from ...backend import (Backend,
                         BackendCommand,
                         BackendCommandArgumentParser)
+from ...cache import SQLiteCache
 from ...client import HttpClient
 
 CATEGORY_DOCKERHUB_DATA = "dockerhub-data"
@@ -57,12 +58,16 @@ class DockerHub(Backend):
     :param repository: DockerHub repository owned by `owner`
     :param tag: label used to mark the data
     :param archive: archive to store/retrieve items
+    :param http_cache_path: path to the file where the validators
+        and contents of the responses are cached to make conditional
+        requests; `None` disables them
     """
-    version = '0.4.2'
+    version = '0.5.0'
 
     CATEGORIES = [CATEGORY_DOCKERHUB_DATA]
 
-    def __init__(self, owner, repository, tag=None, archive=None):
+    def __init__(self, owner, repository, tag=None, archive=None,
+                 http_cache_path=None):
         if owner == DOCKER_SHORTCUT_OWNER:
             owner = DOCKER_OWNER
 
@@ -71,6 +76,7 @@ class DockerHub(Backend):
         super().__init__(origin, tag=tag, archive=archive)
         self.owner = owner
         self.repository = repository
+        self.http_cache_path = http_cache_path
         self.client = None
 
     def fetch(self, category=CATEGORY_DOCKERHUB_DATA):
@@ -171,7 +177,10 @@ class DockerHub(Backend):
     def _init_client(self, from_archive=False):
         """Init client"""
 
-        return DockerHubClient(archive=self.archive, from_archive=from_archive)
+        http_cache = SQLiteCache(self.http_cache_path) if self.http_cache_path else None
+
+        return DockerHubClient(archive=self.archive, from_archive=from_archive,
+                               http_cache=http_cache)
 
 
 class DockerHubClient(HttpClient):
@@ -182,11 +191,13 @@ class DockerHubClient(HttpClient):
 
     :param archive: an archive to store/read fetched data
     :param from_archive: it tells whether to write/read the archive
+    :param http_cache: cache of the conditional requests
     """
     RREPOSITORY = 'repositories'
 
-    def __init__(self, archive=None, from_archive=False):
-        super().__init__(DOCKERHUB_API_URL, archive=archive, from_archive=from_archive)
+    def __init__(self, archive=None, from_archive=False, http_cache=None):
+        super().__init__(DOCKERHUB_API_URL, archive=archive, from_archive=from_archive,
+                         http_cache=http_cache)
 
     def repository(self, owner, repository):
         """Fetch information about a repository."""
@@ -209,7 +220,8 @@ class DockerHubCommand(BackendCommand):
     def setup_cmd_parser():
         """Returns the DockerHub argument parser."""
 
-        parser = BackendCommandArgumentParser(archive=True)
+        parser = BackendCommandArgumentParser(archive=True,
+                                              http_cache=True)
 
         # Required arguments
         parser.parser.add_argument('owner',
@@ -21,14 +21,19 @@
 #
 
 import collections
-import io
+import itertools
 import logging
+import mmap
 import os
 import re
 import subprocess
+import tempfile
 import threading
+import time
 
 import dulwich.client
+import dulwich.objects
+import dulwich.pack
 import dulwich.repo
 
 from grimoirelab_toolkit.datetime import datetime_to_utc, str_to_datetime
@@ -36,11 +41,18 @@ from grimoirelab_toolkit.datetime import datetime_to_utc, str_to_datetime
 from ...backend import (Backend,
                         BackendCommand,
                         BackendCommandArgumentParser)
+from ...cache import SQLiteCache
 from ...errors import RepositoryError, ParseError
-from ...utils import DEFAULT_DATETIME, DEFAULT_LAST_DATETIME
+from ...utils import (DEFAULT_DATETIME,
+                      DEFAULT_LAST_DATETIME,
+                      run_in_pool)
 
 CATEGORY_COMMIT = 'commit'
 
+MAX_WORKERS = 1
+SHARD_SIZE = 1000
+LOG_CHUNK_SIZE = 1024 * 1024
+
 logger = logging.getLogger(__name__)
 
 
@@ -60,23 +72,37 @@ class Git(Backend):
     :param gitpath: path to the repository or to the log file
     :param tag: label used to mark the data
     :param archive: archive to store/retrieve items
+    :param max_workers: number of processes used to read and parse
+        the log of the repository; when it is greater than 1, the
+        history is split in shards of commits which are processed
+        in parallel
+    :param maintenance: run maintenance tasks on the repository
+        after updating it (see `GitRepository.maintain`)
+    :param commits_cache_path: path to a file where parsed commits
+        are cached between runs; cached commits are not read nor
+        parsed again from the log
 
     :raises RepositoryError: raised when there was an error cloning or
         updating the repository.
     """
-    version = '0.11.0'
+    version = '0.15.0'
 
     CATEGORIES = [CATEGORY_COMMIT]
 
-    def __init__(self, uri, gitpath, tag=None, archive=None):
+    def __init__(self, uri, gitpath, tag=None, archive=None,
+                 max_workers=MAX_WORKERS, maintenance=False,
+                 commits_cache_path=None):
         origin = uri
 
         super().__init__(origin, tag=tag, archive=archive)
         self.uri = uri
         self.gitpath = gitpath
+        self.max_workers = max_workers
+        self.maintenance = maintenance
+        self.commits_cache_path = commits_cache_path
 
     def fetch(self, category=CATEGORY_COMMIT, from_date=DEFAULT_DATETIME, to_date=DEFAULT_LAST_DATETIME,
-              branches=None, latest_items=False, no_update=False):
+              branches=None, latest_items=False, no_update=False, incremental=False):
         """Fetch commits.
 
         The method retrieves from a Git repository or a log file
@@ -97,9 +123,16 @@ class Git(Backend):
         The parameter `no_update` returns all commits without performing
         an update of the repository before.
 
+        The parameter `incremental` returns only those commits which
+        were not reachable from the tips of the references the last
+        time this method was called with this flag. These tips, the
+        watermark, are stored in the repository (see
+        `GitRepository.read_watermark`).
+
         Take into account that `from_date` and `branches` are ignored
         when the commits are fetched from a Git log file or when
-        `latest_items` flag is set.
+        `latest_items` flag is set. `from_date` and `to_date` are
+        also ignored when `incremental` flag is set.
 
         The class raises a `RepositoryError` exception when an error
         occurs accessing the repository.
@@ -112,6 +145,8 @@ class Git(Backend):
         :param latest_items: sync with the repository to fetch only the
             newest commits
         :param no_update: if enabled, don't update the repo with the latest changes
+        :param incremental: fetch only the commits added since the
+            last watermark
 
         :returns: a generator of commits
         """
@@ -125,7 +160,8 @@ class Git(Backend):
             'to_date': to_date,
             'branches': branches,
             'latest_items': latest_items,
-            'no_update': no_update
+            'no_update': no_update,
+            'incremental': incremental
         }
         items = super().fetch(category, **kwargs)
 
@@ -144,6 +180,7 @@ class Git(Backend):
         branches = kwargs['branches']
         latest_items = kwargs['latest_items']
         no_update = kwargs['no_update']
+        incremental = kwargs.get('incremental', False)
 
         ncommits = 0
 
@@ -152,7 +189,8 @@ class Git(Backend):
                 commits = self.__fetch_from_log()
             else:
                 commits = self.__fetch_from_repo(from_date, to_date, branches,
-                                                 latest_items, no_update)
+                                                 latest_items, no_update,
+                                                 incremental)
 
             for commit in commits:
                 yield commit
@@ -212,13 +250,19 @@ class Git(Backend):
         return CATEGORY_COMMIT
 
     @staticmethod
-    def parse_git_log_from_file(filepath):
+    def parse_git_log_from_file(filepath, max_workers=1):
         """Parse a Git log file.
 
         The method parses the Git log file and returns an iterator of
         dictionaries. Each one of this, contains a commit.
 
+        The file is memory-mapped and split in chunks of whole commits.
+        Each chunk is parsed as bytes, independently of the others. When `max_workers` is greater than 1, chunks are parsed
+        by a pool of processes. Commits are returned in the same order
+        they are in the file.
+
         :param filepath: path to the log file
+        :param max_workers: number of processes used to parse the file
 
         :returns: a generator of parsed commits
 
@@ -227,22 +271,26 @@ class Git(Backend):
         :raises OSError: raised when an error occurs reading the
             given file
         """
-        with open(filepath, 'r', errors='surrogateescape',
-                  newline=os.linesep) as f:
-            parser = GitParser(f)
+        tasks = [(filepath, start, end, nline)
+                 for start, end, nline in _find_log_chunks(filepath, LOG_CHUNK_SIZE)]
 
-            for commit in parser.parse():
-                yield commit
+        if max_workers > 1 and len(tasks) > 1:
+            for _, commits in run_in_pool(_parse_git_log_chunk, tasks, max_workers):
+                yield from commits
+        else:
+            for task in tasks:
+                yield from _iter_git_log_chunk(*task)
 
     @staticmethod
     def parse_git_log_from_iter(iterator):
         """Parse a Git log obtained from an iterator.
 
         The method parses the Git log fetched from an iterator, where
-        each item is a line of the log. It returns and iterator of
-        dictionaries. Each dictionary contains a commit.
+        each item is a line of the log or a block of whole lines of
+        bytes. It returns and iterator of dictionaries. Each dictionary
+        contains a commit.
 
-        :param iterator: iterator of Git log lines
+        :param iterator: iterator of Git log lines or blocks of bytes
 
         :raises ParseError: raised when the format of the Git log
             is invalid
@@ -258,16 +306,20 @@ class Git(Backend):
     def __fetch_from_log(self):
         logger.info("Fetching commits: '%s' git repository from log file %s",
                     self.uri, self.gitpath)
-        return self.parse_git_log_from_file(self.gitpath)
+        return self.parse_git_log_from_file(self.gitpath,
+                                            max_workers=self.max_workers)
 
-    def __fetch_from_repo(self, from_date, to_date, branches, latest_items=False, no_update=False):
+    def __fetch_from_repo(self, from_date, to_date, branches, latest_items=False, no_update=False,
+                          incremental=False):
         # When no latest items are set or the repository has not
         # been cloned use the default mode
         default_mode = not latest_items or not os.path.exists(self.gitpath)
 
         repo = self.__create_git_repository()
 
-        if default_mode:
+        if incremental:
+            commits = self.__fetch_commits_from_watermark(repo, branches, no_update)
+        elif default_mode:
             commits = self.__fetch_commits_from_repo(repo, from_date, to_date, branches, no_update)
         else:
             commits = self.__fetch_newest_commits_from_repo(repo)
@@ -299,21 +351,158 @@ class Git(Backend):
 
         if not no_update:
             repo.update()
+            self.__maintain_repository(repo)
+
+        if self.commits_cache_path:
+            return self.__fetch_commits_from_cache(repo, from_date, to_date, branches)
+
+        if self.max_workers > 1:
+            return self.__fetch_commits_in_shards(repo, from_date, to_date, branches)
 
-        gitlog = repo.log(from_date, to_date, branches)
+        gitlog = repo.log(from_date, to_date, branches, encoding=None)
         return self.parse_git_log_from_iter(gitlog)
 
+    def __fetch_commits_in_shards(self, repo, from_date, to_date, branches):
+        """Fetch commits splitting the history in shards.
+
+        The list of commits, in the same order `GitRepository.log`
+        returns them, is split in consecutive shards. The log of
+        each shard is read and parsed by a pool of processes and
+        the results are returned following the order of the shards.
+        """
+        hashes = [commit for commit in repo.rev_list(branches,
+                                                     from_date=from_date,
+                                                     to_date=to_date,
+                                                     reverse=True)]
+        if not hashes:
+            return
+
+        shard_size = min(SHARD_SIZE, -(-len(hashes) // self.max_workers))
+        shards = [hashes[i:i + shard_size] for i in range(0, len(hashes), shard_size)]
+
+        logger.debug("Fetching %s commits from %s in %s shards using %s workers",
+                     len(hashes), self.uri, len(shards), self.max_workers)
+
+        tasks = [(repo.uri, repo.dirpath, shard) for shard in shards]
+
+        for _, commits in run_in_pool(_fetch_commits_shard, tasks, self.max_workers):
+            yield from commits
+
+    def __fetch_commits_from_cache(self, repo, from_date, to_date, branches):
+        """Fetch commits reading and parsing only those not cached.
+
+        Commits are immutable, so the parsed data of a commit can be
+        reused in any run, unless the backend changes. Only the refs
+        pointing to a commit may change; these are not cached and
+        they are read from the log every time.
+        """
+        cache = SQLiteCache(self.commits_cache_path)
+
+        shard = []
+
+        for commit, refs in repo.log_refs(from_date, to_date, branches):
+            shard.append((commit, refs))
+
+            if len(shard) == SHARD_SIZE:
+                yield from self.__fetch_commits_shard_from_cache(repo, cache, shard)
+                shard = []
+
+        if shard:
+            yield from self.__fetch_commits_shard_from_cache(repo, cache, shard)
+
+        logger.debug("Commits cache: %s hits, %s misses",
+                     cache.hits, cache.misses)
+
+    def __fetch_commits_shard_from_cache(self, repo, cache, shard):
+        cached = {}
+        missing = []
+
+        for commit, _ in shard:
+            data = cache.get(self.__commit_cache_key(commit))
+
+            if data is None:
+                missing.append(commit)
+            else:
+                cached[commit] = data
+
+        if missing:
+            parsed = _fetch_commits_shard(repo.uri, repo.dirpath, missing)
+
+            entries = []
+            for data in parsed:
+                data['refs'] = None
+                cached[data['commit']] = data
+                entries.append((self.__commit_cache_key(data['commit']), data))
+            cache.set_many(entries)
+
+        for commit, refs in shard:
+            data = cached[commit]
+            data['refs'] = refs
+            yield data
+
+    def __commit_cache_key(self, commit):
+        return self.version + ':' + commit
+
     def __fetch_newest_commits_from_repo(self, repo):
         logger.info("Fetching latest commits: '%s' git repository",
                     self.uri)
 
         hashes = repo.sync()
+        self.__maintain_repository(repo)
+
         if not hashes:
             return []
 
-        gitshow = repo.show(hashes)
+        gitshow = repo.show(hashes, encoding=None)
         return self.parse_git_log_from_iter(gitshow)
 
+    def __fetch_commits_from_watermark(self, repo, branches, no_update):
+        logger.info("Fetching commits since the last watermark: '%s' git repository",
+                    self.uri)
+
+        if not no_update:
+            repo.update()
+            self.__maintain_repository(repo)
+
+        tips = repo.tips(branches)
+
+        if not tips:
+            return
+
+        watermark = repo.read_watermark()
+
+        if watermark:
+            # Commits of the watermark no longer reachable from the
+            # tips mean the history was rewritten (i.e force-push)
+            # or some references were removed
+            nlost = repo.count_commits(watermark, excluded=tips)
+
+            if nlost:
+                logger.warning("Git %s history was rewritten; %s commits fetched "
+                               "before are no longer reachable", self.uri, nlost)
+
+        gitlog = repo.log_revisions(tips, excluded=watermark, encoding=None)
+
+        for commit in self.parse_git_log_from_iter(gitlog):
+            yield commit
+
+        repo.write_watermark(tips)
+
+    def __maintain_repository(self, repo):
+        if not self.maintenance:
+            return
+
+        try:
+            timing = repo.maintain()
+        except RepositoryError as e:
+            logger.warning("Git %s repository maintenance failed; %s",
+                           self.uri, str(e))
+            return
+
+        if timing:
+            logger.info("Git %s repository maintenance completed in %.2fs",
+                        self.uri, sum(timing.values()))
+
     def __create_git_repository(self):
         if not os.path.exists(self.gitpath):
             repo = GitRepository.clone(self.uri, self.gitpath)
@@ -352,6 +541,9 @@ class GitCommand(BackendCommand):
         group.add_argument('--branches', dest='branches',
                            nargs='+', type=str, default=None,
                            help="Fetch commits only from these branches")
+        group.add_argument('--max-workers', dest='max_workers',
+                           default=MAX_WORKERS, type=int,
+                           help="Number of processes used to parse the log")
 
         # Mutual exclusive parameters
         exgroup = group.add_mutually_exclusive_group()
@@ -367,6 +559,14 @@ class GitCommand(BackendCommand):
         exgroup_fetch.add_argument('--no-update', dest='no_update',
                                    action='store_true',
                                    help="Fetch all commits without updating the repository")
+        exgroup_fetch.add_argument('--incremental', dest='incremental',
+                                   action='store_true',
+                                   help="Fetch commits added since the last watermark")
+        group.add_argument('--maintenance', dest='maintenance',
+                           action='store_true',
+                           help="Write the commit-graph and repack the repository after updating it")
+        group.add_argument('--commits-cache-path', dest='commits_cache_path',
+                           help="file where parsed commits are cached between runs")
 
         # Required arguments
         parser.parser.add_argument('uri',
@@ -463,7 +663,9 @@ class GitParser:
         git log --raw --numstat --pretty=fuller --decorate=full \
                 --parents -M -C -c --remotes=origin --all
 
-    :param stream: a file object which stores the log
+    :param stream: a file object which stores the log; it can also
+        be an iterator of blocks of whole lines of bytes
+    :param encoding: encoding used to decode the blocks of bytes
     """
     COMMIT_PATTERN = r"""^commit[ \t](?P<commit>[a-f0-9]{40})
                      (?:[ \t](?P<parents>[a-f0-9][a-f0-9 \t]+))?
@@ -503,71 +705,271 @@ class GitParser:
     # Git trailers
     TRAILERS = ['Signed-off-by']
 
-    def __init__(self, stream):
+    # Characters of the indexes of the action lines
+    HEX_CHARS = '0123456789abcdef'
+
+    def __init__(self, stream, encoding='utf-8'):
         self.stream = stream
+        self.encoding = encoding
         self.nline = 0
         self.state = self.INIT
 
         # Aux vars to store the commit that is being parsed
         self.commit = None
         self.commit_files = {}
-
-        self.handlers = {
-            self.INIT: self._handle_init,
-            self.COMMIT: self._handle_commit,
-            self.HEADER: self._handle_header,
-            self.MESSAGE: self._handle_message,
-            self.FILE: self._handle_file
-        }
+        self.commit_message = []
 
     def parse(self):
-        """Parse the Git log stream."""
-
-        for line in self.stream:
-            line = line.rstrip('\n')
-            parsed = False
-            self.nline += 1
+        """Parse the Git log stream.
+
+        The log is parsed in a single pass by a state machine which
+        dispatches each line by the state of the parser and by the
+        first characters of the line. Message, action and stats
+        lines, which are the most common ones, are split using
+        string methods; regular expressions are only used to parse
+        commit and header lines.
+
+        The items of the stream can be lines of text or blocks of
+        whole lines of bytes. Blocks are split in lines of bytes;
+        message, action and stats lines are parsed as bytes and only
+        their values are decoded using `encoding`. Other lines are
+        decoded before parsing them.
+        """
+        stream = iter(self.stream)
+        first = next(stream, None)
 
-            while not parsed:
-                parsed = self.handlers[self.state](line)
+        if first is not None:
+            stream = itertools.chain([first], stream)
 
-                if self.state == self.COMMIT and self.commit:
-                    commit = self._build_commit()
-                    logger.debug("Commit %s parsed", commit['commit'])
-                    yield commit
+            if isinstance(first, str):
+                yield from self.__parse_lines(stream)
+            else:
+                yield from self.__parse_blocks(stream)
 
         # Return the last commit, if any
         if self.commit:
-            commit = self._build_commit()
-            logger.debug("Commit %s parsed", commit['commit'])
-            yield commit
+            yield self._build_commit()
 
-    def _build_commit(self):
-        def remove_none_values(d):
-            return {k: v for k, v in d.items() if v is not None}
+    def __parse_lines(self, lines):
+        FILE = self.FILE
+        MESSAGE = self.MESSAGE
+        HEADER = self.HEADER
+        COMMIT = self.COMMIT
+
+        parse_line = self._parse_line
+        parse_commit_line = self._parse_commit_line
+        parse_action_line = self._parse_action_line
+        parse_stats_line = self._parse_stats_line
+        parse_trailer = self._parse_trailer
+        match_header = self.GIT_HEADER_TRAILER_REGEXP.match
+        message = self.commit_message
+
+        nline = self.nline
+
+        for line in lines:
+            line = line.rstrip('\n')
+            nline += 1
+            state = self.state
+
+            if state == FILE:
+                if not line:
+                    self.state = COMMIT
+                    yield self._build_commit()
+                    continue
+                elif line[0] == ':':
+                    if parse_action_line(line):
+                        continue
+                elif parse_stats_line(line):
+                    continue
+            elif state == MESSAGE:
+                if line.startswith('    '):
+                    msg_line = line[4:]
+                    if not message:
+                        self.commit['message'] = ''
+                    message.append(msg_line)
+                    if ':' in msg_line:
+                        parse_trailer(msg_line)
+                    continue
+                elif not line:
+                    self.state = FILE
+                    continue
+            elif state == HEADER:
+                if not line:
+                    self.state = MESSAGE
+                    continue
+
+                m = match_header(line)
+                if m:
+                    name, value = m.groups()
+                    self.commit[name] = value
+                    continue
+            elif state == COMMIT:
+                self.nline = nline
+                parse_commit_line(line)
+                continue
 
+            # Unusual lines and errors
+            self.nline = nline
+            yield from parse_line(line)
+
+        self.nline = nline
+
+    def __parse_blocks(self, blocks):
+        FILE = self.FILE
+        MESSAGE = self.MESSAGE
+        HEADER = self.HEADER
+        COMMIT = self.COMMIT
+
+        parse_line = self._parse_line
+        parse_commit_line = self._parse_commit_line
+        parse_action_bytes = self._parse_action_bytes
+        parse_stats_bytes = self._parse_stats_bytes
+        parse_trailer = self._parse_trailer
+        match_header = self.GIT_HEADER_TRAILER_REGEXP.match
+        message = self.commit_message
+        encoding = self.encoding
+
+        nline = self.nline
+
+        for block in blocks:
+            lines = block.split(b'\n')
+
+            # Blocks end with a line break; remove the empty
+            # item the split left after it
+            if not lines[-1]:
+                lines.pop()
+
+            for data in lines:
+                nline += 1
+                state = self.state
+
+                if state == FILE:
+                    if not data:
+                        self.state = COMMIT
+                        yield self._build_commit()
+                        continue
+                    elif data[0] == 0x3a:
+                        if parse_action_bytes(data):
+                            continue
+                    elif parse_stats_bytes(data):
+                        continue
+                elif state == MESSAGE:
+                    if data.startswith(b'    '):
+                        msg_line = data[4:].decode(encoding, errors='surrogateescape')
+                        if not message:
+                            self.commit['message'] = ''
+                        message.append(msg_line)
+                        if ':' in msg_line:
+                            parse_trailer(msg_line)
+                        continue
+                    elif not data:
+                        self.state = FILE
+                        continue
+                elif state == HEADER:
+                    if not data:
+                        self.state = MESSAGE
+                        continue
+
+                line = data.decode(encoding, errors='surrogateescape')
+                self.nline = nline
+
+                if state == HEADER:
+                    m = match_header(line)
+                    if m:
+                        name, value = m.groups()
+                        self.commit[name] = value
+                        continue
+                elif state == COMMIT:
+                    parse_commit_line(line)
+                    continue
+
+                # Unusual lines and errors
+                yield from parse_line(line)
+
+        self.nline = nline
+
+    def _parse_line(self, line):
+        """Parse a line of the log according to the state of the parser.
+
+        A line which does not belong to the files of a commit ends
+        that commit; the commit is returned and the line is parsed
+        again in the next state.
+
+        :returns: a generator of the commits the line completes
+        """
+        while True:
+            state = self.state
+
+            if state == self.FILE:
+                if not line:
+                    self.state = self.COMMIT
+                    yield self._build_commit()
+                    return
+
+                if line[0] == ':':
+                    if self._parse_action_line(line):
+                        return
+                elif self._parse_stats_line(line):
+                    return
+
+                logger.debug("Invalid action format on line %s. Skipping.",
+                             str(self.nline))
+                self.state = self.COMMIT
+                yield self._build_commit()
+            elif state == self.MESSAGE:
+                if not line:
+                    self.state = self.FILE
+                    return
+
+                # Message lines start with four blank characters
+                if len(line) >= 4 and line[:4].isspace():
+                    self._parse_message_line(line[4:])
+                    return
+
+                logger.debug("Invalid message format on line %s. Skipping.",
+                             str(self.nline))
+                self.state = self.FILE
+            elif state == self.HEADER:
+                if not line:
+                    self.state = self.MESSAGE
+                else:
+                    self._parse_header_line(line)
+                return
+            elif state == self.COMMIT:
+                self._parse_commit_line(line)
+                return
+            else:
+                # An empty line may be found before the first commit
+                self.state = self.COMMIT
+                if not line:
+                    return
+
+    def _build_commit(self):
         commit = self.commit
-        commit = remove_none_values(commit)
-        commit['files'] = [remove_none_values(item)
-                           for _, item in sorted(self.commit_files.items())]
+        commit_files = self.commit_files
 
-        self.commit = None
-        self.commit_files = {}
+        if self.commit_message:
+            commit['message'] = '\n'.join(self.commit_message)
+            self.commit_message.clear()
 
-        return commit
+        files = []
 
-    def _handle_init(self, line):
-        m = self.GIT_NEXT_STATE_REGEXP.match(line)
+        for filename in sorted(commit_files):
+            entry = commit_files[filename]
+            if 'newfile' in entry and entry['newfile'] is None:
+                del entry['newfile']
+            files.append(entry)
 
-        # In both cases, the parser advances to the next state.
-        # It only has to check whether the line has to be parsed
-        # again or not
-        self.state = self.COMMIT
-        parsed = m is not None
+        commit['files'] = files
 
-        return parsed
+        self.commit = None
+        self.commit_files = {}
 
-    def _handle_commit(self, line):
+        logger.debug("Commit %s parsed", commit['commit'])
+
+        return commit
+
+    def _parse_commit_line(self, line):
         m = self.GIT_COMMIT_REGEXP.match(line)
         if not m:
             msg = "commit expected on line %s" % (str(self.nline))
@@ -577,21 +979,15 @@ class GitParser:
         refs = self.__parse_data_list(m.group('refs'), sep=',')
 
         # Initialize a new commit
-        self.commit = {}
-        self.commit['commit'] = m.group('commit')
-        self.commit['parents'] = parents
-        self.commit['refs'] = refs
+        self.commit = {
+            'commit': m.group('commit'),
+            'parents': parents,
+            'refs': refs
+        }
 
         self.state = self.HEADER
 
-        return True
-
-    def _handle_header(self, line):
-        m = self.GIT_NEXT_STATE_REGEXP.match(line)
-        if m:
-            self.state = self.MESSAGE
-            return True
-
+    def _parse_header_line(self, line):
         m = self.GIT_HEADER_TRAILER_REGEXP.match(line)
         if not m:
             msg = "invalid header format on line %s" % (str(self.nline))
@@ -601,96 +997,424 @@ class GitParser:
         value = m.group('value')
         self.commit[header] = value
 
+    def _parse_message_line(self, line):
+        # Concatenate message lines
+        if not self.commit_message:
+            self.commit['message'] = ''
+        self.commit_message.append(line)
+
+        if ':' in line:
+            self._parse_trailer(line)
+
+    def _parse_trailer(self, line):
+        """Parse a trailer of the commit message.
+
+        Trailers have a name, followed by a colon, one or more blank
+        characters and a value. Only the core trailers are stored.
+        """
+        name, _, value = line.partition(':')
+
+        if name not in self.TRAILERS:
+            return
+        if not value or value[0] not in ' \t':
+            return
+
+        # Values of blank characters keep the last one
+        trailer = value.lstrip(' \t')
+
+        if not trailer:
+            if len(value) < 2:
+                return
+            trailer = value[-1]
+
+        self.commit.setdefault(name, []).append(trailer)
+
+    def _parse_action_line(self, line):
+        """Parse an action line.
+
+        Lines with the usual format (one mode and one index per
+        colon plus one, separated by spaces, followed by the action
+        and one or two tab separated file paths) are split directly.
+        Other lines are matched by `_match_action_line`.
+
+        :returns: whether the line was parsed or not
+        """
+        parts = line.split('\t')
+        nparts = len(parts)
+
+        if nparts != 2 and nparts != 3:
+            return self.__parse_unusual_action_line(line)
+
+        tokens = parts[0].split(' ')
+        head = tokens[0]
+        ncolons = len(head) - len(head.lstrip(':'))
+        nentries = ncolons + 1
+
+        if len(tokens) != 2 * nentries + 1:
+            return self.__parse_unusual_action_line(line)
+
+        tokens[0] = head[ncolons:]
+        modes = tokens[:nentries]
+        indexes = tokens[nentries:-1]
+        action = tokens[-1]
+
+        hex_chars = self.HEX_CHARS
+
+        if not action or action[0] in hex_chars:
+            return self.__parse_unusual_action_line(line)
+
+        for mode in modes:
+            if len(mode) != 6 or not mode.isdecimal():
+                return self.__parse_unusual_action_line(line)
+
+        for index in indexes:
+            value = index.rstrip('.')
+            if not value or len(index) - len(value) > 3 or value.strip(hex_chars):
+                return self.__parse_unusual_action_line(line)
+            if len(index) == 6 and index.isdecimal():
+                return self.__parse_unusual_action_line(line)
+
+        filename = parts[1]
+        newfile = parts[2] if nparts == 3 else None
+
+        if not filename or newfile == '':
+            return self.__parse_unusual_action_line(line)
+
+        self._add_action_data(modes, indexes, action, filename, newfile)
+
         return True
 
-    def _handle_message(self, line):
-        m = self.GIT_NEXT_STATE_REGEXP.match(line)
-        if m:
-            self.state = self.FILE
-            return True
+    def _parse_stats_line(self, line):
+        """Parse a stats line.
 
-        m = self.GIT_MESSAGE_REGEXP.match(line)
-        if not m:
-            logger.debug("Invalid message format on line %s. Skipping.",
-                         str(self.nline))
-            self.state = self.FILE
+        Tab separated lines with a file path that does not start
+        with a blank character are split directly. Other lines are
+        matched by `_match_stats_line`.
+
+        :returns: whether the line was parsed or not
+        """
+        parts = line.split('\t', 2)
+
+        if len(parts) != 3:
+            return self.__parse_unusual_stats_line(line)
+
+        added, removed, filepath = parts
+
+        if not (added.isdecimal() or added == '-'):
+            return self.__parse_unusual_stats_line(line)
+        if not (removed.isdecimal() or removed == '-'):
+            return self.__parse_unusual_stats_line(line)
+        if not filepath or filepath[0] in ' \t':
+            return self.__parse_unusual_stats_line(line)
+
+        self._add_stats_data(added, removed, filepath)
+
+        return True
+
+    def _parse_action_bytes(self, data):
+        """Parse an action line with the usual format from bytes.
+
+        Only the file paths and the action of the line are decoded.
+        Lines with other formats are not parsed; they have to be
+        decoded and parsed by `_parse_action_line`.
+
+        :returns: whether the line was parsed or not
+        """
+        parts = data.split(b'\t')
+        nparts = len(parts)
+
+        if nparts != 2 and nparts != 3:
+            return False
+
+        try:
+            head = parts[0].decode('ascii')
+        except UnicodeDecodeError:
             return False
 
-        msg_line = m.group('msg')
+        tokens = head.split(' ')
+        head = tokens[0]
+        ncolons = len(head) - len(head.lstrip(':'))
+        nentries = ncolons + 1
 
-        # Concatenate message lines
-        if 'message' not in self.commit:
-            self.commit['message'] = ''
-        else:
-            self.commit['message'] += '\n'
-        self.commit['message'] += msg_line
+        if len(tokens) != 2 * nentries + 1:
+            return False
+
+        tokens[0] = head[ncolons:]
+        modes = tokens[:nentries]
+        indexes = tokens[nentries:-1]
+        action = tokens[-1]
+
+        hex_chars = self.HEX_CHARS
 
-        # Check trailers
-        self._handle_trailer(msg_line)
+        if not action or action[0] in hex_chars:
+            return False
+
+        for mode in modes:
+            if len(mode) != 6 or not mode.isdecimal():
+                return False
+
+        for index in indexes:
+            value = index.rstrip('.')
+            if not value or len(index) - len(value) > 3 or value.strip(hex_chars):
+                return False
+            if len(index) == 6 and index.isdecimal():
+                return False
+
+        filename = parts[1]
+        newfile = parts[2] if nparts == 3 else None
+
+        if not filename or newfile == b'':
+            return False
+
+        encoding = self.encoding
+
+        filename = filename.decode(encoding, errors='surrogateescape')
+        if newfile is not None:
+            newfile = newfile.decode(encoding, errors='surrogateescape')
+
+        self._add_action_data(modes, indexes, action, filename, newfile)
 
         return True
 
-    def _handle_file(self, line):
-        m = self.GIT_NEXT_STATE_REGEXP.match(line)
-        if m:
-            self.state = self.COMMIT
-            return True
+    def _parse_stats_bytes(self, data):
+        """Parse a stats line with the usual format from bytes.
 
-        m = self.GIT_ACTION_REGEXP.match(line)
-        if m:
-            data = m.groupdict()
-            self._handle_action_data(data)
-            return True
+        Only the file path of the line is decoded. Lines with
+        other formats are not parsed; they have to be decoded
+        and parsed by `_parse_stats_line`.
 
-        m = self.GIT_STATS_REGEXP.match(line)
-        if m:
-            data = m.groupdict()
-            self._handle_stats_data(data)
-            return True
+        :returns: whether the line was parsed or not
+        """
+        parts = data.split(b'\t', 2)
 
-        # No match case
-        logger.debug("Invalid action format on line %s. Skipping.",
-                     str(self.nline))
-        self.state = self.COMMIT
-        return False
+        if len(parts) != 3:
+            return False
 
-    def _handle_trailer(self, line):
-        m = self.GIT_HEADER_TRAILER_REGEXP.match(line)
-        if not m:
-            return
+        added, removed, filepath = parts
 
-        trailer = m.group('name')
-        value = m.group('value')
+        if not (added.isdigit() or added == b'-'):
+            return False
+        if not (removed.isdigit() or removed == b'-'):
+            return False
+        if not filepath or filepath[0] in b' \t':
+            return False
 
-        if trailer not in self.TRAILERS:
-            logger.debug("Trailer %s found on line %s but is not a core trailer. Skipping.",
-                         trailer, str(self.nline))
-            return
+        filepath = filepath.decode(self.encoding, errors='surrogateescape')
 
-        self.commit.setdefault(trailer, []).append(value)
+        self._add_stats_data(added.decode('ascii'), removed.decode('ascii'), filepath)
+
+        return True
+
+    def _match_action_line(self, line):
+        """Match an action line with any format.
+
+        The line is matched in the same way `GIT_ACTION_REGEXP` does:
+        the longest list of modes and indexes followed by a valid
+        action and file paths is selected.
+
+        :returns: a dict with the groups of `GIT_ACTION_REGEXP` or
+            `None` when the line does not match
+        """
+        size = len(line)
+        start = size - len(line.lstrip(':'))
+
+        if not start:
+            return None
+
+        # Modes are six digits followed by a blank character
+        modes_ends = []
+        pos = start
+
+        while pos + 7 <= size and line[pos:pos + 6].isdecimal() and line[pos + 6] in ' \t':
+            pos += 7
+            modes_ends.append(pos)
+
+        for modes_end in reversed(modes_ends):
+            # Indexes are hex numbers followed by up to three
+            # dots and a blank character
+            indexes_ends = []
+            pos = modes_end
+
+            while True:
+                end = pos
+                while end < size and line[end] in self.HEX_CHARS:
+                    end += 1
+                if end == pos:
+                    break
+
+                ndots = 0
+                while end < size and ndots < 3 and line[end] == '.':
+                    end += 1
+                    ndots += 1
+
+                if end == size or line[end] not in ' \t':
+                    break
+
+                pos = end + 1
+                indexes_ends.append(pos)
+
+            for indexes_end in reversed(indexes_ends):
+                data = self.__match_action_tail(line, indexes_end)
+
+                if data:
+                    data['sc'] = line[:start]
+                    data['modes'] = line[start:modes_end]
+                    data['indexes'] = line[modes_end:indexes_end]
+                    return data
+
+        return None
+
+    def _match_stats_line(self, line):
+        """Match a stats line with any format.
+
+        The line is matched in the same way `GIT_STATS_REGEXP` does.
+
+        :returns: a dict with the groups of `GIT_STATS_REGEXP` or
+            `None` when the line does not match
+        """
+        size = len(line)
+
+        added_end = self.__match_stats_number(line, 0)
+        if added_end < 0:
+            return None
+
+        removed_start = self.__skip_blanks(line, added_end)
+        if removed_start == added_end:
+            return None
+
+        removed_end = self.__match_stats_number(line, removed_start)
+        if removed_end < 0:
+            return None
+
+        file_start = self.__skip_blanks(line, removed_end)
+        if file_start == removed_end:
+            return None
+
+        # The file takes the last blank when there is nothing else
+        if file_start == size:
+            if file_start - removed_end < 2:
+                return None
+            file_start = size - 1
+
+        return {
+            'added': line[:added_end],
+            'removed': line[removed_start:removed_end],
+            'file': line[file_start:]
+        }
+
+    def _add_action_data(self, modes, indexes, action, filename, newfile):
+        entry = self.commit_files.get(filename, None)
+
+        if entry is None:
+            entry = {}
+            self.commit_files[filename] = entry
+
+        entry['modes'] = modes
+        entry['indexes'] = indexes
+        entry['action'] = action
+        entry['file'] = filename
+        entry['newfile'] = newfile
+
+    def _add_stats_data(self, added, removed, filepath):
+        if '{' in filepath or ' => ' in filepath:
+            filename = self.__get_old_filepath(filepath)
+        else:
+            filename = filepath
+
+        entry = self.commit_files.get(filename, None)
+
+        if entry is None:
+            self.commit_files[filename] = {'file': filename, 'added': added, 'removed': removed}
+        else:
+            entry['added'] = added
+            entry['removed'] = removed
+
+    def __parse_unusual_action_line(self, line):
+        data = self._match_action_line(line)
+
+        if not data:
+            return False
 
-    def _handle_action_data(self, data):
         modes = self.__parse_data_list(data['modes'])
         indexes = self.__parse_data_list(data['indexes'])
-        filename = data['file']
+        self._add_action_data(modes, indexes, data['action'],
+                              data['file'], data['newfile'])
+
+        return True
+
+    def __parse_unusual_stats_line(self, line):
+        data = self._match_stats_line(line)
+
+        if not data:
+            return False
+
+        self._add_stats_data(data['added'], data['removed'], data['file'])
 
-        if filename not in self.commit_files:
-            self.commit_files[filename] = {}
+        return True
+
+    @staticmethod
+    def __match_action_tail(line, pos):
+        """Match the action and the file paths of an action line"""
+
+        size = len(line)
 
-        self.commit_files[filename]['modes'] = modes
-        self.commit_files[filename]['indexes'] = indexes
-        self.commit_files[filename]['action'] = data['action']
-        self.commit_files[filename]['file'] = filename
-        self.commit_files[filename]['newfile'] = data['newfile']
+        if pos == size or line[pos] == '\t':
+            return None
 
-    def _handle_stats_data(self, data):
-        filename = self.__get_old_filepath(data['file'])
+        action_end = line.find('\t', pos)
+        if action_end < 0:
+            return None
 
-        if filename not in self.commit_files:
-            self.commit_files[filename] = {'file': filename}
+        file_start = action_end
+        while file_start < size and line[file_start] == '\t':
+            file_start += 1
+        if file_start == size:
+            return None
 
-        self.commit_files[filename]['added'] = data['added']
-        self.commit_files[filename]['removed'] = data['removed']
+        newfile = None
+        file_end = line.find('\t', file_start)
+
+        if file_end < 0:
+            file_end = size
+        else:
+            newfile_start = file_end
+            while newfile_start < size and line[newfile_start] == '\t':
+                newfile_start += 1
+
+            # The new file takes the last tab when there is nothing else
+            if newfile_start == size:
+                if newfile_start - file_end < 2:
+                    return None
+                newfile_start = size - 1
+
+            newfile = line[newfile_start:]
+
+        return {
+            'action': line[pos:action_end],
+            'file': line[file_start:file_end],
+            'newfile': newfile
+        }
+
+    @staticmethod
+    def __match_stats_number(line, pos):
+        """Find the end of a number of lines (or '-') of a stats line"""
+
+        end = pos
+        while end < len(line) and line[end].isdecimal():
+            end += 1
+
+        if end > pos:
+            return end
+        elif line[pos:pos + 1] == '-':
+            return pos + 1
+        else:
+            return -1
+
+    @staticmethod
+    def __skip_blanks(line, pos):
+        while pos < len(line) and line[pos] in ' \t':
+            pos += 1
+        return pos
 
     def __parse_data_list(self, data, sep=' '):
         if data:
@@ -777,6 +1501,43 @@ class GitRepository:
         '-c',  # show merge info
     ]
 
+    # Namespace of the references which store the watermark
+    WATERMARK_REFS = 'refs/perceval/watermark/'
+
+    # Maintenance tasks and the commands to run them; they need
+    # 'git maintenance', which is available since git 2.29
+    GIT_MAINTENANCE_VERSION = (2, 29)
+    GIT_MAINTENANCE_TASKS = [
+        ('loose-objects', ['git', 'maintenance', 'run',
+                           '--task=loose-objects', '--quiet']),
+        ('incremental-repack', ['git', 'maintenance', 'run',
+                                '--task=incremental-repack', '--quiet'])
+    ]
+
+    # Task run on older versions of git instead of the previous ones
+    GIT_GC_TASK = ('gc', ['git', 'gc', '--auto', '--quiet'])
+
+    # Commands to write the commit-graph and the minimum version
+    # of git they need; the first one supported is run
+    GIT_COMMIT_GRAPH_CMDS = [
+        ((2, 27), ['git', 'commit-graph', 'write', '--reachable',
+                   '--split', '--changed-paths', '--no-progress']),
+        ((2, 24), ['git', 'commit-graph', 'write', '--reachable',
+                   '--split', '--no-progress']),
+        ((2, 19), ['git', 'commit-graph', 'write', '--reachable'])
+    ]
+
+    GIT_VERSION_REGEXP = re.compile(r'git version (\d+)\.(\d+)')
+
+    # Version of git, read the first time it is needed
+    _git_version = None
+
+    # Size of the blocks read from the output of the commands
+    READ_BUFFER_SIZE = 1024 * 1024
+
+    # Line boundaries, other than '\n', used by `str.splitlines`
+    LINE_BREAKS_REGEXP = re.compile('[\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]')
+
     def __init__(self, uri, dirpath):
         gitdir = os.path.join(dirpath, 'HEAD')
 
@@ -907,6 +1668,201 @@ class GitRepository:
         logger.debug("Git %s repository updated into %s",
                      self.uri, self.dirpath)
 
+    def tips(self, branches=None):
+        """Get the commits at the tips of the references.
+
+        The list of branches is a list of strings, with the names of the
+        branches to use. If the list of branches is empty, no commit
+        is returned. If the list of branches is None, the tips of all
+        the branches, tags and remote branches of `origin` are returned.
+
+        Annotated tags are peeled to the commits they point to.
+
+        :param branches: names of branches (default: None)
+
+        :returns: a list of commits
+
+        :raises EmptyRepositoryError: when the repository is empty and
+            the action cannot be performed
+        :raises RepositoryError: when an error occurs executing the command
+        """
+        if self.is_empty():
+            logger.warning("Git %s repository is empty; unable to get the tips",
+                           self.uri)
+            raise EmptyRepositoryError(repository=self.uri)
+
+        if branches is not None and len(branches) == 0:
+            return []
+
+        cmd_tips = ['git', 'rev-list', '--no-walk=unsorted']
+
+        if branches is None:
+            cmd_tips.extend(['--branches', '--tags', '--remotes=origin'])
+        else:
+            cmd_tips.extend(['refs/heads/' + branch for branch in branches])
+
+        outs = self._exec(cmd_tips, cwd=self.dirpath, env=self.gitenv)
+        outs = outs.decode('utf-8', errors='surrogateescape')
+
+        return [commit for commit in outs.split()]
+
+    def count_commits(self, revisions, excluded=None):
+        """Count the commits reachable from a set of revisions.
+
+        :param revisions: list of revisions
+        :param excluded: list of revisions whose commits are not counted
+
+        :returns: number of commits reachable from `revisions` but
+            not from `excluded`
+
+        :raises RepositoryError: when an error occurs executing the command
+        """
+        if not revisions:
+            return 0
+
+        cmd_count = ['git', 'rev-list', '--count']
+        cmd_count.extend(revisions)
+
+        if excluded:
+            cmd_count.append('--not')
+            cmd_count.extend(excluded)
+
+        outs = self._exec(cmd_count, cwd=self.dirpath, env=self.gitenv)
+
+        return int(outs.decode('utf-8', errors='surrogateescape'))
+
+    def read_watermark(self):
+        """Read the watermark of the repository.
+
+        The watermark is the list of commits at the tips of the
+        references the last time the repository was read. It is
+        stored using references under `WATERMARK_REFS` namespace,
+        so these commits are kept by Git while they are needed.
+
+        :returns: list of commits of the watermark; empty when
+            there is no watermark
+
+        :raises RepositoryError: when an error occurs executing the command
+        """
+        cmd_refs = ['git', 'for-each-ref', '--format=%(objectname)',
+                    self.WATERMARK_REFS]
+
+        outs = self._exec(cmd_refs, cwd=self.dirpath, env=self.gitenv)
+        outs = outs.decode('utf-8', errors='surrogateescape')
+
+        return [commit for commit in outs.split()]
+
+    def write_watermark(self, commits):
+        """Replace the watermark of the repository.
+
+        :param commits: list of commits of the new watermark
+
+        :raises RepositoryError: when an error occurs executing the command
+        """
+        old_commits = set(self.read_watermark())
+        commits = set(commits)
+
+        # All the references are updated by a single command
+        updates = ['delete %s\n' % (self.WATERMARK_REFS + commit)
+                   for commit in old_commits if commit not in commits]
+        updates += ['update %s %s\n' % (self.WATERMARK_REFS + commit, commit)
+                    for commit in commits if commit not in old_commits]
+
+        if updates:
+            cmd = ['git', 'update-ref', '--stdin']
+            self._exec(cmd, cwd=self.dirpath, env=self.gitenv,
+                       input_data=''.join(updates).encode('utf-8'))
+
+        logger.debug("Git %s repository watermark updated to %s commits",
+                     self.uri, len(commits))
+
+    def maintain(self):
+        """Run maintenance tasks to speed up the access to the repository.
+
+        The tasks are run in this order:
+
+            - `loose-objects`: pack the loose objects
+            - `incremental-repack`: repack small packs into bigger
+              ones, indexing them with a multi-pack-index
+            - `commit-graph`: write the commit-graph, incrementally,
+              with changed-path Bloom filters
+
+        The commit-graph speeds up commands which walk the history,
+        like `log` with `--topo-order` or limited to some paths.
+
+        These tasks need git 2.29 or later. With older versions, a
+        `gc` task (`git gc --auto`) is run instead of the first two,
+        and the commit-graph is written with the options available
+        (changed-path filters need git 2.27 and incremental writes
+        git 2.24); it is not written before git 2.19.
+
+        Empty repositories are not maintained.
+
+        :returns: a dict with the seconds each task took
+
+        :raises RepositoryError: when an error occurs running any
+            of the tasks
+        """
+        if self.is_empty():
+            logger.debug("Git %s repository is empty; maintenance skipped",
+                         self.uri)
+            return {}
+
+        timing = {}
+
+        for task, cmd in self._maintenance_tasks():
+            before = time.time()
+            self._exec(cmd, cwd=self.dirpath, env=self.gitenv)
+            timing[task] = time.time() - before
+
+            logger.debug("Git %s repository maintenance task %s run in %.2fs",
+                         self.uri, task, timing[task])
+
+        return timing
+
+    @classmethod
+    def git_version(cls):
+        """Get the version of git.
+
+        The version is read running `git --version` the first time
+        this method is called.
+
+        :returns: a tuple with the major and minor numbers of the
+            version; `(0, 0)` when it cannot be read
+
+        :raises RepositoryError: when an error occurs running git
+        """
+        if cls._git_version is None:
+            output = cls._exec(['git', '--version'])
+            m = cls.GIT_VERSION_REGEXP.search(output.decode('utf-8', errors='surrogateescape'))
+
+            if m:
+                version = (int(m.group(1)), int(m.group(2)))
+            else:
+                logger.warning("Unknown git version: %s", output)
+                version = (0, 0)
+
+            cls._git_version = version
+
+        return cls._git_version
+
+    def _maintenance_tasks(self):
+        """Get the maintenance tasks supported by the version of git"""
+
+        version = self.git_version()
+
+        if version >= self.GIT_MAINTENANCE_VERSION:
+            tasks = list(self.GIT_MAINTENANCE_TASKS)
+        else:
+            tasks = [self.GIT_GC_TASK]
+
+        for min_version, cmd in self.GIT_COMMIT_GRAPH_CMDS:
+            if version >= min_version:
+                tasks.append(('commit-graph', cmd))
+                break
+
+        return tasks
+
     def sync(self):
         """Keep the repository in sync.
 
@@ -939,7 +1895,7 @@ class GitRepository:
 
         return commits
 
-    def rev_list(self, branches=None):
+    def rev_list(self, branches=None, from_date=None, to_date=None, reverse=False):
         """Read the list commits from the repository
 
         The list of branches is a list of strings, with the names of the
@@ -952,7 +1908,15 @@ class GitRepository:
 
             git rev-list --topo-order
 
+        When `from_date` or `to_date` are given, only the commits
+        between these dates will be returned. Setting `reverse`,
+        the commits are returned in the same order `log` does.
+
         :param branches: names of branches to fetch from (default: None)
+        :param from_date: fetch commits newer than a specific
+            date (inclusive)
+        :param to_date: fetch commits older than a specific date
+        :param reverse: return the commits in reverse order
 
         :raises EmptyRepositoryError: when the repository is empty and
             the action cannot be performed
@@ -965,10 +1929,22 @@ class GitRepository:
 
         cmd_rev_list = ['git', 'rev-list', '--topo-order']
 
+        if reverse:
+            cmd_rev_list.append('--reverse')
+
+        if from_date:
+            dt = from_date.strftime("%Y-%m-%d %H:%M:%S %z")
+            cmd_rev_list.append('--since=' + dt)
+
+        if to_date:
+            dt = to_date.strftime("%Y-%m-%d %H:%M:%S %z")
+            cmd_rev_list.append('--until=' + dt)
+
         if branches is None:
             cmd_rev_list.extend(['--branches', '--tags', '--remotes=origin'])
         elif len(branches) == 0:
-            cmd_rev_list.append('--max-count=0')
+            # rev-list needs, at least, one revision to run
+            return
         else:
             branches = ['refs/heads/' + branch for branch in branches]
             cmd_rev_list.extend(branches)
@@ -979,6 +1955,61 @@ class GitRepository:
         logger.debug("Git rev-list fetched from %s repository (%s)",
                      self.uri, self.dirpath)
 
+    def log_refs(self, from_date=None, to_date=None, branches=None):
+        """Read the list of commits and their refs from the repository.
+
+        The method returns the commits `log` would return, in the
+        same order, together with the refs that point to each one of
+        them. Refs have the format `GitParser` gives to them. Only
+        the commit hashes and their refs are read from the log, using
+        the following options:
+
+            git log --reverse --topo-order --decorate=full
+                --format=%H%x00%D
+
+        :param from_date: fetch commits newer than a specific
+            date (inclusive)
+        :param to_date: fetch commits older than a specific date
+        :param branches: names of branches to fetch from (default: None)
+
+        :returns: a generator of `(commit, refs)` tuples
+
+        :raises EmptyRepositoryError: when the repository is empty and
+            the action cannot be performed
+        :raises RepositoryError: when an error occurs executing the command
+        """
+        if self.is_empty():
+            logger.warning("Git %s repository is empty; unable to get the refs log",
+                           self.uri)
+            raise EmptyRepositoryError(repository=self.uri)
+
+        cmd_log = ['git', 'log', '--reverse', '--topo-order',
+                   '--decorate=full', '--format=%H%x00%D']
+
+        if from_date:
+            dt = from_date.strftime("%Y-%m-%d %H:%M:%S %z")
+            cmd_log.append('--since=' + dt)
+
+        if to_date:
+            dt = to_date.strftime("%Y-%m-%d %H:%M:%S %z")
+            cmd_log.append('--until=' + dt)
+
+        if branches is None:
+            cmd_log.extend(['--branches', '--tags', '--remotes=origin'])
+        elif len(branches) == 0:
+            return
+        else:
+            branches = ['refs/heads/' + branch for branch in branches]
+            cmd_log.extend(branches)
+
+        for line in self._exec_nb(cmd_log, cwd=self.dirpath, env=self.gitenv):
+            commit, refs = line.rstrip('\n').split('\x00', 1)
+            refs = [ref.strip() for ref in refs.split(',')] if refs else []
+            yield commit, refs
+
+        logger.debug("Git refs log fetched from %s repository (%s)",
+                     self.uri, self.dirpath)
+
     def log(self, from_date=None, to_date=None, branches=None, encoding='utf-8'):
         """Read the commit log from the repository.
 
@@ -1000,7 +2031,9 @@ class GitRepository:
         :param from_date: fetch commits newer than a specific
             date (inclusive)
         :param branches: names of branches to fetch from (default: None)
-        :param encoding: encode the log using this format
+        :param encoding: encode the log using this format; when it
+            is `None`, the log is returned in blocks of whole lines
+            of bytes
 
         :returns: a generator where each item is a line from the log
 
@@ -1032,12 +2065,86 @@ class GitRepository:
             branches = ['refs/heads/' + branch for branch in branches]
             cmd_log.extend(branches)
 
-        for line in self._exec_nb(cmd_log, cwd=self.dirpath, env=self.gitenv):
+        for line in self._exec_nb(cmd_log, cwd=self.dirpath, env=self.gitenv,
+                                  encoding=encoding):
             yield line
 
         logger.debug("Git log fetched from %s repository (%s)",
                      self.uri, self.dirpath)
 
+    def log_revisions(self, revisions, excluded=None, encoding='utf-8'):
+        """Read the log of a set of revisions.
+
+        The method returns the Git log of the commits reachable from
+        `revisions` but not from `excluded` revisions, in the same
+        order and format `log` does, using the following options:
+
+            git log --raw --numstat --pretty=fuller --decorate=full
+                --reverse --topo-order --parents -M -C -c
+                <revision>... --not <excluded>...
+
+        :param revisions: list of revisions to read
+        :param excluded: list of revisions whose commits are excluded
+        :param encoding: encode the log using this format; when it
+            is `None`, the log is returned in blocks of whole lines
+            of bytes
+
+        :returns: a generator where each item is a line from the log
+
+        :raises RepositoryError: when an error occurs fetching the log
+        """
+        if not revisions:
+            return
+
+        cmd_log = ['git', 'log', '--reverse', '--topo-order']
+        cmd_log.extend(self.GIT_PRETTY_OUTPUT_OPTS)
+        cmd_log.extend(revisions)
+
+        if excluded:
+            cmd_log.append('--not')
+            cmd_log.extend(excluded)
+
+        for line in self._exec_nb(cmd_log, cwd=self.dirpath, env=self.gitenv,
+                                  encoding=encoding):
+            yield line
+
+        logger.debug("Git log of revisions fetched from %s repository (%s)",
+                     self.uri, self.dirpath)
+
+    def log_commits(self, commits, encoding='utf-8'):
+        """Read the log of a list of commits.
+
+        The method returns the Git log of the given commits, in the
+        same order they are given, using the following options:
+
+            git log --no-walk=unsorted --raw --numstat --pretty=fuller
+                --decorate=full --parents -M -C -c <commit>...<commit>
+
+        The format of the log is the same `log` method returns.
+
+        :param commits: list of commits to read
+        :param encoding: encode the log using this format; when it
+            is `None`, the log is returned in blocks of whole lines
+            of bytes
+
+        :returns: a generator where each item is a line from the log
+
+        :raises RepositoryError: when an error occurs fetching the log
+        """
+        if not commits:
+            return
+
+        cmd_log = ['git', 'log', '--no-walk=unsorted']
+        cmd_log.extend(self.GIT_PRETTY_OUTPUT_OPTS)
+        cmd_log.extend(commits)
+
+        for line in self._exec_nb(cmd_log, cwd=self.dirpath, env=self.gitenv,
+                                  encoding=encoding):
+            yield line
+
+        logger.debug("Git log of %s commits fetched from %s repository (%s)",
+                     len(commits), self.uri, self.dirpath)
+
     def show(self, commits=None, encoding='utf-8'):
         """Show the data of a set of commits.
 
@@ -1052,7 +2159,9 @@ class GitRepository:
         `git show`.
 
         :param commits: list of commits to show data
-        :param encoding: encode the output using this format
+        :param encoding: encode the output using this format; when it
+            is `None`, the output is returned in blocks of whole lines
+            of bytes
 
         :returns: a generator where each item is a line from the show output
 
@@ -1072,7 +2181,8 @@ class GitRepository:
         cmd_show.extend(self.GIT_PRETTY_OUTPUT_OPTS)
         cmd_show.extend(commits)
 
-        for line in self._exec_nb(cmd_show, cwd=self.dirpath, env=self.gitenv):
+        for line in self._exec_nb(cmd_show, cwd=self.dirpath, env=self.gitenv,
+                                  encoding=encoding):
             yield line
 
         logger.debug("Git show fetched from %s repository (%s)",
@@ -1093,42 +2203,69 @@ class GitRepository:
 
         client, repo_path = dulwich.client.get_transport_and_path(self.uri)
         repo = dulwich.repo.Repo(self.dirpath)
-        fd = io.BytesIO()
 
         local_refs = self._discover_refs()
         graph_walker = _GraphWalker(local_refs)
 
-        result = client.fetch_pack(repo_path,
-                                   determine_wants,
-                                   graph_walker,
-                                   fd.write)
-        refs = [GitRef(ref_hash.decode('utf-8'), ref_name.decode('utf-8'))
-                for ref_name, ref_hash in result.refs.items()]
-
-        if len(fd.getvalue()) > 0:
-            fd.seek(0)
-            pack = repo.object_store.add_thin_pack(fd.read, None)
-            pack_name = pack.name().decode('utf-8')
-        else:
-            pack_name = None
+        # The pack is streamed to disk so the memory needed
+        # does not depend on its size
+        with tempfile.TemporaryFile(dir=self.dirpath, prefix='tmp_fetch_') as fd:
+            result = client.fetch_pack(repo_path,
+                                       determine_wants,
+                                       graph_walker,
+                                       fd.write)
+            refs = [GitRef(ref_hash.decode('utf-8'), ref_name.decode('utf-8'))
+                    for ref_name, ref_hash in result.refs.items()]
+
+            if fd.tell() > 0:
+                fd.seek(0)
+                pack = repo.object_store.add_thin_pack(fd.read, None)
+                pack_name = pack.name().decode('utf-8')
+            else:
+                pack_name = None
 
         return (pack_name, refs)
 
     def _read_commits_from_pack(self, packet_name):
         """Read the commits of a pack."""
 
-        filepath = 'objects/pack/pack-' + packet_name
+        filepath = os.path.join(self.dirpath, 'objects', 'pack',
+                                'pack-' + packet_name)
 
-        cmd_verify_pack = ['git', 'verify-pack', '-v', filepath]
+        index = dulwich.pack.load_pack_index(filepath + '.idx')
+        offsets = {sha: offset for sha, offset, _ in index.iterentries()}
 
-        outs = self._exec(cmd_verify_pack, cwd=self.dirpath, env=self.gitenv)
-        outs = outs.decode('utf-8', errors='surrogateescape').rstrip()
+        # Deltified objects have the type of the object at
+        # the end of their chain of bases
+        types = {}
+        bases = {}
 
-        lines = [line.split(' ') for line in outs.split('\n')]
+        data = dulwich.pack.PackData(filepath + '.pack')
+
+        try:
+            for offset, type_num, obj, _ in data.iterobjects(compute_crc32=False):
+                if type_num == dulwich.pack.OFS_DELTA:
+                    bases[offset] = offset - obj[0]
+                elif type_num == dulwich.pack.REF_DELTA:
+                    bases[offset] = offsets[obj[0]]
+                else:
+                    types[offset] = type_num
+        finally:
+            data.close()
+
+        for offset in bases:
+            base = bases[offset]
+            while base not in types:
+                base = bases[base]
+            types[offset] = types[base]
+
+        commits = [(offset, dulwich.objects.sha_to_hex(sha).decode('utf-8'))
+                   for sha, offset in offsets.items()
+                   if types[offset] == dulwich.objects.Commit.type_num]
+        commits.sort()
 
         # Commits usually come in the pack ordered from newest to oldest
-        commits = [parts[0] for parts in lines if parts[1] == 'commit']
-        commits.reverse()
+        commits = [commit for _, commit in reversed(commits)]
 
         return commits
 
@@ -1226,10 +2363,11 @@ class GitRepository:
         Execute `cmd` command with a non blocking call. The command will
         be run in the directory set by `cwd`. Enviroment variables can be
         set using the `env` dictionary. The output data is returned
-        as encoded bytes in an iterator. Each item will be a line of the
-        output.
+        in an iterator. Each item will be a line of the output, decoded
+        using `encoding`. When `encoding` is `None`, the output is not
+        decoded and each item will be a block of whole lines of bytes.
 
-        :returns: an iterator with the output of the command as encoded bytes
+        :returns: an iterator with the output of the command
 
         :raises RepositoryError: when an error occurs running the command
         """
@@ -1244,12 +2382,13 @@ class GitRepository:
                                          stderr=subprocess.PIPE,
                                          cwd=cwd,
                                          env=env)
+            # Error messages are always decoded
             err_thread = threading.Thread(target=self._read_stderr,
-                                          kwargs={'encoding': encoding},
+                                          kwargs={'encoding': encoding or 'utf-8'},
                                           daemon=True)
             err_thread.start()
-            for line in self.proc.stdout:
-                yield line.decode(encoding, errors='surrogateescape')
+            for line in self._read_stdout(encoding=encoding):
+                yield line
             err_thread.join()
 
             self.proc.communicate()
@@ -1264,6 +2403,77 @@ class GitRepository:
                 (self.failed_message, self.proc.returncode)
             raise RepositoryError(cause=cause)
 
+    def _read_stdout(self, encoding='utf-8'):
+        """Reads self.proc.stdout.
+
+        The output is read in blocks of whole lines. When `encoding`
+        is `None`, the blocks are returned as they are. Otherwise,
+        each block is decoded at once and split in lines.
+
+        :returns: an iterator with the blocks or the lines of the output
+        """
+        for block in self.__read_blocks():
+            if encoding is None:
+                yield block
+            else:
+                text = block.decode(encoding, errors='surrogateescape')
+                yield from self.__split_lines(text)
+
+    def __read_blocks(self):
+        """Read self.proc.stdout in large blocks of whole lines.
+
+        Each read block is cut after its last line break; the bytes
+        after it are joined to the next block. The last block may not
+        end with a line break.
+
+        :returns: an iterator with the blocks of bytes
+        """
+        fd = self.proc.stdout.fileno()
+        pending = []
+
+        while True:
+            data = os.read(fd, self.READ_BUFFER_SIZE)
+
+            if not data:
+                break
+
+            end = data.rfind(b'\n') + 1
+
+            if not end:
+                pending.append(data)
+                continue
+
+            if pending:
+                pending.append(data[:end])
+                yield b''.join(pending)
+            else:
+                yield data[:end]
+
+            pending = [data[end:]] if end < len(data) else []
+
+        if pending:
+            yield b''.join(pending)
+
+    def __split_lines(self, text):
+        """Split a text into lines keeping the line endings.
+
+        Lines are only split by '\n', like when a stream is read
+        line by line. `str.splitlines` is faster but it also splits
+        by other characters, so it is only used when the text does
+        not contain any of them.
+        """
+        if not self.LINE_BREAKS_REGEXP.search(text):
+            return text.splitlines(True)
+
+        lines = text.split('\n')
+        last = lines.pop()
+        lines = [line + '\n' for line in lines]
+
+        if last:
+            lines.append(last)
+
+        return lines
+
     def _read_stderr(self, encoding='utf-8'):
         """Reads self.proc.stderr.
 
@@ -1292,12 +2502,13 @@ class GitRepository:
 
     @staticmethod
     def _exec(cmd, cwd=None, env=None, ignored_error_codes=None,
-              encoding='utf-8'):
+              encoding='utf-8', input_data=None):
         """Run a command.
 
         Execute `cmd` command in the directory set by `cwd`. Environment
-        variables can be set using the `env` dictionary. The output
-        data is returned as encoded bytes.
+        variables can be set using the `env` dictionary. The bytes given
+        in `input_data` are written to the standard input of the command.
+        The output data is returned as encoded bytes.
 
         Commands which their returning status codes are non-zero will
         be treated as failed. Error codes considered as valid can be
@@ -1314,10 +2525,12 @@ class GitRepository:
                      ' '.join(cmd), cwd, str(env))
 
         try:
-            proc = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+            stdin = subprocess.PIPE if input_data is not None else None
+            proc = subprocess.Popen(cmd, stdin=stdin,
+                                    stdout=subprocess.PIPE,
                                     stderr=subprocess.PIPE,
                                     cwd=cwd, env=env)
-            (outs, errs) = proc.communicate()
+            (outs, errs) = proc.communicate(input=input_data)
         except OSError as e:
             raise RepositoryError(cause=str(e))
 
@@ -1329,3 +2542,78 @@ class GitRepository:
             logger.debug(errs.decode(encoding, errors='surrogateescape'))
 
         return outs
+
+
+def _find_log_chunks(filepath, chunk_size):
+    """Split a Git log file in chunks of whole commits.
+
+    Chunks end where a commit starts (the 'commit' word at the
+    beginning of a line), after, at least, `chunk_size` bytes.
+
+    :returns: a list of `(start, end, nline)` tuples with the offsets
+        of each chunk and the number of lines before it
+    """
+    chunks = []
+
+    with open(filepath, 'rb') as f:
+        # Empty files cannot be mapped
+        if os.fstat(f.fileno()).st_size == 0:
+            return [(0, 0, 0)]
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            size = len(mm)
+            start = 0
+            nline = 0
+
+            while start < size:
+                pos = mm.find(b'\ncommit ', start + chunk_size)
+                end = pos + 1 if pos >= 0 else size
+
+                chunks.append((start, end, nline))
+                nline += mm[start:end].count(b'\n')
+                start = end
+
+    return chunks
+
+
+def _parse_git_log_chunk(filepath, start, end, nline=0):
+    """Parse a chunk of a Git log file.
+
+    This function is run by the workers of the pool of processes
+    used by `Git.parse_git_log_from_file`.
+
+    :returns: a list of parsed commits
+    """
+    return [commit for commit in _iter_git_log_chunk(filepath, start, end, nline)]
+
+
+def _iter_git_log_chunk(filepath, start, end, nline=0):
+    """Parse a chunk of a Git log file returning its commits one by one."""
+
+    if start == end:
+        data = b''
+    else:
+        with open(filepath, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                data = mm[start:end]
+
+    # The chunk is parsed as a block of bytes; only the values
+    # of the lines are decoded
+    parser = GitParser([data])
+    parser.nline = nline
+
+    yield from parser.parse()
+
+
+def _fetch_commits_shard(uri, dirpath, commits):
+    """Read and parse the log of a shard of commits.
+
+    This function is run by the workers of the pool of processes
+    used by `Git` backend.
+
+    :returns: a list of parsed commits
+    """
+    repo = GitRepository(uri, dirpath)
+    gitlog = repo.log_commits(commits, encoding=None)
+
+    return [commit for commit in Git.parse_git_log_from_iter(gitlog)]
@@ -22,8 +22,12 @@
 #     Alberto Martín <alberto.martin@bitergia.com>
 #
 
+import collections
+import concurrent.futures
+import itertools
 import json
 import logging
+import threading
 
 import requests
 from grimoirelab_toolkit.datetime import (datetime_to_utc,
@@ -34,6 +38,7 @@ from grimoirelab_toolkit.uris import urijoin
 from ...backend import (Backend,
                         BackendCommand,
                         BackendCommandArgumentParser)
+from ...cache import MemoryCache, SQLiteCache
 from ...client import HttpClient, RateLimitHandler
 from ...utils import DEFAULT_DATETIME, DEFAULT_LAST_DATETIME
 
@@ -54,6 +59,13 @@ PER_PAGE = 100
 DEFAULT_SLEEP_TIME = 1
 MAX_RETRIES = 5
 
+# Number of issues/pull requests enriched at the same time
+MAX_WORKERS = 1
+
+# Caches of users shared by the backends
+_USERS_CACHES = {}
+_USERS_CACHES_LOCK = threading.Lock()
+
 TARGET_ISSUE_FIELDS = ['user', 'assignee', 'assignees', 'comments', 'reactions']
 TARGET_PULL_FIELDS = ['user', 'review_comments', 'requested_reviewers', "merged_by", "commits"]
 
@@ -68,7 +80,9 @@ class GitHub(Backend):
 
     :param owner: GitHub owner
     :param repository: GitHub repository from the owner
-    :param api_token: GitHub auth token to access the API
+    :param api_token: GitHub auth token to access the API; a list
+        of tokens can be given to rotate them when their rate limit
+        is exhausted
     :param base_url: GitHub URL in enterprise edition case;
         when no value is set the backend will be fetch the data
         from the GitHub public site.
@@ -81,8 +95,19 @@ class GitHub(Backend):
         before raising a RetryError exception
     :param sleep_time: time to sleep in case
         of connection problems
+    :param max_workers: number of issues or pull requests whose
+        comments, reactions and users are fetched at the same time;
+        items are returned in the same order regardless of this value
+    :param users_cache_path: path to a file where users data will be
+        cached between runs; by default, users are cached in memory
+    :param users_cache_size: maximum number of entries of the users cache
+    :param users_cache_ttl: number of seconds an entry of the users
+        cache is valid
+    :param http_cache_path: path to the file where the validators
+        and contents of the responses are cached to make conditional
+        requests; `None` disables them
     """
-    version = '0.19.0'
+    version = '0.23.0'
 
     CATEGORIES = [CATEGORY_ISSUE, CATEGORY_PULL_REQUEST, CATEGORY_REPO]
 
@@ -90,7 +115,9 @@ class GitHub(Backend):
                  api_token=None, base_url=None,
                  tag=None, archive=None,
                  sleep_for_rate=False, min_rate_to_sleep=MIN_RATE_LIMIT,
-                 max_retries=MAX_RETRIES, sleep_time=DEFAULT_SLEEP_TIME):
+                 max_retries=MAX_RETRIES, sleep_time=DEFAULT_SLEEP_TIME,
+                 max_workers=MAX_WORKERS, users_cache_path=None,
+                 users_cache_size=None, users_cache_ttl=None, http_cache_path=None):
         origin = base_url if base_url else GITHUB_URL
         origin = urijoin(origin, owner, repository)
 
@@ -105,9 +132,15 @@ class GitHub(Backend):
         self.min_rate_to_sleep = min_rate_to_sleep
         self.max_retries = max_retries
         self.sleep_time = sleep_time
+        self.max_workers = max_workers
+        self.users_cache_path = users_cache_path
+        self.users_cache_size = users_cache_size
+        self.users_cache_ttl = users_cache_ttl
+        self.http_cache_path = http_cache_path
 
         self.client = None
         self._users = {}  # internal users cache
+        self._executor = None
 
     def fetch(self, category=CATEGORY_ISSUE, from_date=DEFAULT_DATETIME, to_date=DEFAULT_LAST_DATETIME):
         """Fetch the issues/pull requests from the repository.
@@ -155,7 +188,19 @@ class GitHub(Backend):
         else:
             items = self.__fetch_repo_info()
 
-        return items
+        if self.max_workers > 1:
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers)
+
+        try:
+            for item in items:
+                yield item
+        finally:
+            if self._executor:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+            logger.debug("Users cache: %s hits, %s misses",
+                         self.client.users_cache.hits, self.client.users_cache.misses)
 
     @classmethod
     def has_archiving(cls):
@@ -222,10 +267,17 @@ class GitHub(Backend):
     def _init_client(self, from_archive=False):
         """Init client"""
 
+        http_cache = SQLiteCache(self.http_cache_path) if self.http_cache_path else None
+
         return GitHubClient(self.owner, self.repository, self.api_token, self.base_url,
                             self.sleep_for_rate, self.min_rate_to_sleep,
                             self.sleep_time, self.max_retries,
-                            self.archive, from_archive)
+                            self.archive, from_archive,
+                            pool_size=self.max_workers,
+                            users_cache=get_users_cache(self.users_cache_path,
+                                                        self.users_cache_size,
+                                                        self.users_cache_ttl),
+                            http_cache=http_cache)
 
     def __fetch_issues(self, from_date, to_date):
         """Fetch the issues"""
@@ -234,59 +286,107 @@ class GitHub(Backend):
 
         for raw_issues in issues_groups:
             issues = json.loads(raw_issues)
-            for issue in issues:
+            selected = [issue for issue in itertools.takewhile(
+                lambda issue: str_to_datetime(issue['updated_at']) <= to_date, issues)]
 
-                if str_to_datetime(issue['updated_at']) > to_date:
-                    return
+            for issue in self.__map(self.__enrich_issue, selected):
+                yield issue
 
-                self.__init_extra_issue_fields(issue)
-                for field in TARGET_ISSUE_FIELDS:
+            if len(selected) < len(issues):
+                return
 
-                    if not issue[field]:
-                        continue
+    def __enrich_issue(self, issue):
+        """Add users, comments and reactions data to an issue"""
 
-                    if field == 'user':
-                        issue[field + '_data'] = self.__get_user(issue[field]['login'])
-                    elif field == 'assignee':
-                        issue[field + '_data'] = self.__get_issue_assignee(issue[field])
-                    elif field == 'assignees':
-                        issue[field + '_data'] = self.__get_issue_assignees(issue[field])
-                    elif field == 'comments':
-                        issue[field + '_data'] = self.__get_issue_comments(issue['number'])
-                    elif field == 'reactions':
-                        issue[field + '_data'] = \
-                            self.__get_issue_reactions(issue['number'], issue['reactions']['total_count'])
+        self.__init_extra_issue_fields(issue)
+        for field in TARGET_ISSUE_FIELDS:
 
-                yield issue
+            if not issue[field]:
+                continue
+
+            if field == 'user':
+                issue[field + '_data'] = self.__get_user(issue[field]['login'])
+            elif field == 'assignee':
+                issue[field + '_data'] = self.__get_issue_assignee(issue[field])
+            elif field == 'assignees':
+                issue[field + '_data'] = self.__get_issue_assignees(issue[field])
+            elif field == 'comments':
+                issue[field + '_data'] = self.__get_issue_comments(issue['number'])
+            elif field == 'reactions':
+                issue[field + '_data'] = \
+                    self.__get_issue_reactions(issue['number'], issue['reactions']['total_count'])
+
+        return issue
 
     def __fetch_pull_requests(self, from_date, to_date):
         """Fetch the pull requests"""
 
-        raw_pulls = self.client.pulls(from_date=from_date)
-        for raw_pull in raw_pulls:
-            pull = json.loads(raw_pull)
+        issues_groups = self.client.issues(from_date=from_date)
 
-            if str_to_datetime(pull['updated_at']) > to_date:
-                return
+        for raw_issues in issues_groups:
+            issues = json.loads(raw_issues)
+            numbers = [issue['number'] for issue in issues if 'pull_request' in issue]
 
-            self.__init_extra_pull_fields(pull)
-            for field in TARGET_PULL_FIELDS:
+            for pull in self.__map(lambda number: self.__fetch_pull_request(number, to_date), numbers):
+                if not pull:
+                    return
+                yield pull
 
-                if not pull[field]:
-                    continue
+    def __fetch_pull_request(self, pr_number, to_date):
+        """Fetch and enrich a pull request; `None` when it was updated after `to_date`"""
+
+        pull = json.loads(self.client.pull(pr_number))
+
+        if str_to_datetime(pull['updated_at']) > to_date:
+            return None
 
-                if field == 'user':
-                    pull[field + '_data'] = self.__get_user(pull[field]['login'])
-                elif field == 'merged_by':
-                    pull[field + '_data'] = self.__get_user(pull[field]['login'])
-                elif field == 'review_comments':
-                    pull[field + '_data'] = self.__get_pull_review_comments(pull['number'])
-                elif field == 'requested_reviewers':
-                    pull[field + '_data'] = self.__get_pull_requested_reviewers(pull['number'])
-                elif field == 'commits':
-                    pull[field + '_data'] = self.__get_pull_commits(pull['number'])
+        self.__init_extra_pull_fields(pull)
+        for field in TARGET_PULL_FIELDS:
 
-            yield pull
+            if not pull[field]:
+                continue
+
+            if field == 'user':
+                pull[field + '_data'] = self.__get_user(pull[field]['login'])
+            elif field == 'merged_by':
+                pull[field + '_data'] = self.__get_user(pull[field]['login'])
+            elif field == 'review_comments':
+                pull[field + '_data'] = self.__get_pull_review_comments(pull['number'])
+            elif field == 'requested_reviewers':
+                pull[field + '_data'] = self.__get_pull_requested_reviewers(pull['number'])
+            elif field == 'commits':
+                pull[field + '_data'] = self.__get_pull_commits(pull['number'])
+
+        return pull
+
+    def __map(self, func, items):
+        """Apply `func` to the items, keeping their order.
+
+        When there are several workers, `func` is run concurrently
+        on the executor; otherwise, items are processed one by one
+        when they are requested. No more than `max_workers` items
+        are submitted before their results are requested, so few
+        items are processed in vain when the caller stops.
+        """
+        if not self._executor:
+            for item in items:
+                yield func(item)
+            return
+
+        pending = collections.deque()
+
+        try:
+            for item in items:
+                if len(pending) == self.max_workers:
+                    yield pending.popleft().result()
+
+                pending.append(self._executor.submit(func, item))
+
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
 
     def __fetch_repo_info(self):
         """Get repo info about stars, watchers and forks"""
@@ -472,7 +572,9 @@ class GitHubClient(HttpClient, RateLimitHandler):
 
     :param owner: GitHub owner
     :param repository: GitHub repository from the owner
-    :param token: GitHub auth token to access the API
+    :param token: GitHub auth token to access the API or a list
+        of tokens; the token with the highest remaining rate limit
+        is used on each request
     :param base_url: GitHub URL in enterprise edition case;
         when no value is set the backend will be fetch the data
         from the GitHub public site.
@@ -485,19 +587,43 @@ class GitHubClient(HttpClient, RateLimitHandler):
         before raising a RetryError exception
     :param archive: collect issues already retrieved from an archive
     :param from_archive: it tells whether to write/read the archive
+    :param pool_size: number of threads that will use this client
+        at the same time
+    :param users_cache: `Cache` object to store users and their
+        organizations; by default, a memory cache shared by all
+        the clients is used; users found in the cache are also
+        stored in the archive, when it is set; when the data is
+        read from the archive, a memory cache private to the
+        client is used instead
+    :param http_cache: cache of the conditional requests
     """
     EXTRA_STATUS_FORCELIST = [403, 500, 502, 503]
 
-    _users = {}       # users cache
-    _users_orgs = {}  # users orgs cache
+    USERS_LOCKS = 64
+    USERS_CACHE_SIZE = 10000
+
+    _users_cache = MemoryCache(max_size=USERS_CACHE_SIZE)  # users and users orgs cache
+    _users_locks = [threading.Lock() for _ in range(USERS_LOCKS)]  # users being fetched
 
     def __init__(self, owner, repository, token,
                  base_url=None, sleep_for_rate=False, min_rate_to_sleep=MIN_RATE_LIMIT,
                  sleep_time=DEFAULT_SLEEP_TIME, max_retries=MAX_RETRIES,
-                 archive=None, from_archive=False):
+                 archive=None, from_archive=False, pool_size=1,
+                 users_cache=None, http_cache=None):
         self.owner = owner
         self.repository = repository
-        self.token = token
+
+        if from_archive:
+            self.users_cache = MemoryCache(max_size=self.USERS_CACHE_SIZE)
+        elif users_cache is not None:
+            self.users_cache = users_cache
+        else:
+            self.users_cache = self._users_cache
+
+        self._archived_users = set()
+
+        tokens = [token] if isinstance(token, str) else list(token or [])
+        self.token = tokens[0] if tokens else None
 
         if base_url:
             base_url = urijoin(base_url, 'api', 'v3')
@@ -507,8 +633,10 @@ class GitHubClient(HttpClient, RateLimitHandler):
         super().__init__(base_url, sleep_time=sleep_time, max_retries=max_retries,
                          extra_headers=self._set_extra_headers(),
                          extra_status_forcelist=self.EXTRA_STATUS_FORCELIST,
-                         archive=archive, from_archive=from_archive)
-        super().setup_rate_limit_handler(sleep_for_rate=sleep_for_rate, min_rate_to_sleep=min_rate_to_sleep)
+                         archive=archive, from_archive=from_archive,
+                         http_cache=http_cache, pool_size=pool_size)
+        super().setup_rate_limit_handler(sleep_for_rate=sleep_for_rate, min_rate_to_sleep=min_rate_to_sleep,
+                                         tokens=tokens)
 
         self._init_rate_limit()
 
@@ -585,13 +713,17 @@ class GitHubClient(HttpClient, RateLimitHandler):
                 if "pull_request" not in issue:
                     continue
 
-                pull_number = issue["number"]
-                path = urijoin(self.base_url, 'repos', self.owner, self.repository, "pulls", pull_number)
+                yield self.pull(issue["number"])
 
-                r = self.fetch(path)
-                pull = r.text
+    def pull(self, pr_number):
+        """Get a pull request"""
 
-                yield pull
+        path = urijoin(self.base_url, 'repos', self.owner, self.repository, "pulls", pr_number)
+
+        r = self.fetch(path)
+        pull = r.text
+
+        return pull
 
     def repo(self):
         """Get repository data"""
@@ -645,39 +777,50 @@ class GitHubClient(HttpClient, RateLimitHandler):
 
     def user(self, login):
         """Get the user information and update the user cache"""
-        user = None
-
-        if login in self._users:
-            return self._users[login]
 
         url_user = urijoin(self.base_url, 'users', login)
 
-        logging.info("Getting info for %s" % (url_user))
+        with self._user_lock(url_user):
+            user = self.users_cache.get(url_user)
+
+            if user is not None:
+                self._archive_user(url_user, user)
+                return user
 
-        r = self.fetch(url_user)
-        user = r.text
-        self._users[login] = user
+            logging.info("Getting info for %s" % (url_user))
+
+            r = self.fetch(url_user)
+            user = r.text
+            self.users_cache.set(url_user, user)
+            self._archived_users.add(url_user)
 
         return user
 
     def user_orgs(self, login):
         """Get the user public organizations"""
-        if login in self._users_orgs:
-            return self._users_orgs[login]
 
         url = urijoin(self.base_url, 'users', login, 'orgs')
-        try:
-            r = self.fetch(url)
-            orgs = r.text
-        except requests.exceptions.HTTPError as error:
-            # 404 not found is wrongly received sometimes
-            if error.response.status_code == 404:
-                logger.error("Can't get github login orgs: %s", error)
-                orgs = '[]'
-            else:
-                raise error
 
-        self._users_orgs[login] = orgs
+        with self._user_lock(url):
+            orgs = self.users_cache.get(url)
+
+            if orgs is not None:
+                self._archive_user(url, orgs)
+                return orgs
+
+            try:
+                r = self.fetch(url)
+                orgs = r.text
+            except requests.exceptions.HTTPError as error:
+                # 404 not found is wrongly received sometimes
+                if error.response.status_code == 404:
+                    logger.error("Can't get github login orgs: %s", error)
+                    orgs = '[]'
+                else:
+                    raise error
+
+            self.users_cache.set(url, orgs)
+            self._archived_users.add(url)
 
         return orgs
 
@@ -692,13 +835,23 @@ class GitHubClient(HttpClient, RateLimitHandler):
 
         :returns a response object
         """
+        token = None
+
         if not self.from_archive:
-            self.sleep_for_rate_limit()
+            # Workers share the client; the token is selected and
+            # sent with the request without changing the session
+            with self._rate_limit_lock:
+                self.sleep_for_rate_limit()
+                token = self.current_token
+
+            if token:
+                headers = dict(headers) if headers else {}
+                headers['Authorization'] = 'token ' + token
 
         response = super().fetch(url, payload, headers, method, stream, verify)
 
         if not self.from_archive:
-            self.update_rate_limit(response)
+            self.update_rate_limit(response, token=token)
 
         return response
 
@@ -735,6 +888,62 @@ class GitHubClient(HttpClient, RateLimitHandler):
                 items = response.text
                 logger.debug("Page: %i/%i" % (page, last_page))
 
+    def _user_lock(self, url):
+        """Get the lock that avoids fetching the same user twice at the same time.
+
+        The number of locks is fixed, so URLs share them.
+        """
+        return self._users_locks[hash(url) % len(self._users_locks)]
+
+    def _archive_user(self, url, data):
+        """Store in the archive the data of a user found in the users cache.
+
+        The users cache is shared with other clients and runs, so the
+        data of the user may not have been requested to the API. The
+        response is stored anyway to read it later from the archive.
+        """
+        if not self.archive or self.from_archive or url in self._archived_users:
+            return
+
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = 'OK'
+        response.url = url
+        response.headers['Content-Type'] = 'application/json; charset=utf-8'
+        response.encoding = 'utf-8'
+        response._content = data.encode('utf-8')
+        response._content_consumed = True
+
+        url, headers, payload = self.sanitize_for_archive(url, None, None)
+        self.archive.store(url, payload, headers, response)
+        self._archived_users.add(url)
+
+    def set_token(self, token):
+        """Set the token used by the next requests"""
+
+        self.token = token
+
+    @staticmethod
+    def sanitize_for_archive(url, headers, payload):
+        """Sanitize the headers of a HTTP request by removing the token
+        before storing/retrieving archived items
+
+        :param: url: HTTP url request
+        :param: headers: HTTP headers request
+        :param: payload: HTTP payload request
+
+        :returns url, the sanitized headers and payload
+        """
+        if headers and 'Authorization' in headers:
+            headers = dict(headers)
+            headers.pop('Authorization')
+
+            # Requests without other headers were archived with no headers
+            if not headers:
+                headers = None
+
+        return url, headers, payload
+
     def _set_extra_headers(self):
         """Set extra headers for session"""
 
@@ -747,7 +956,12 @@ class GitHubClient(HttpClient, RateLimitHandler):
         return headers
 
     def _init_rate_limit(self):
-        """Initialize rate limit information"""
+        """Initialize rate limit information.
+
+        Only the rate of the first token is fetched. The rate of the
+        rest of tokens is unknown until they are used for the first time.
+        """
+        self.current_token = self.token
 
         url = urijoin(self.base_url, "rate_limit")
         try:
@@ -765,6 +979,14 @@ class GitHubCommand(BackendCommand):
 
     BACKEND = GitHub
 
+    def _pre_init(self):
+        """Join the API tokens in a pool"""
+
+        if self.parsed_args.extra_api_tokens:
+            tokens = [self.parsed_args.api_token] if self.parsed_args.api_token else []
+            tokens.extend(self.parsed_args.extra_api_tokens)
+            setattr(self.parsed_args, 'api_token', tokens)
+
     @staticmethod
     def setup_cmd_parser():
         """Returns the GitHub argument parser."""
@@ -772,10 +994,14 @@ class GitHubCommand(BackendCommand):
         parser = BackendCommandArgumentParser(from_date=True,
                                               to_date=True,
                                               token_auth=True,
-                                              archive=True)
+                                              archive=True,
+                                              http_cache=True)
 
         # GitHub options
         group = parser.parser.add_argument_group('GitHub arguments')
+        group.add_argument('--extra-api-token', dest='extra_api_tokens',
+                           action='append', default=[],
+                           help="additional API token; repeat it to rotate a pool of tokens")
         group.add_argument('--enterprise-url', dest='base_url',
                            help="Base URL for GitHub Enterprise instance")
         group.add_argument('--sleep-for-rate', dest='sleep_for_rate',
@@ -784,6 +1010,17 @@ class GitHubCommand(BackendCommand):
         group.add_argument('--min-rate-to-sleep', dest='min_rate_to_sleep',
                            default=MIN_RATE_LIMIT, type=int,
                            help="sleep until reset when the rate limit reaches this value")
+        group.add_argument('--max-workers', dest='max_workers',
+                           default=MAX_WORKERS, type=int,
+                           help="number of issues/pull requests whose data is fetched at the same time")
+        group.add_argument('--users-cache-path', dest='users_cache_path',
+                           help="file where users data is cached between runs")
+        group.add_argument('--users-cache-size', dest='users_cache_size',
+                           type=int,
+                           help="maximum number of entries of the users cache")
+        group.add_argument('--users-cache-ttl', dest='users_cache_ttl',
+                           type=int,
+                           help="number of seconds the users cache entries are valid")
 
         # Generic client options
         group.add_argument('--max-retries', dest='max_retries',
@@ -800,3 +1037,35 @@ class GitHubCommand(BackendCommand):
                                    help="GitHub repository")
 
         return parser
+
+
+def get_users_cache(cache_path=None, max_size=None, ttl=None):
+    """Get a users cache shared by the backends of this process.
+
+    When none of the parameters is set, the default cache of
+    `GitHubClient` is returned. Otherwise, a `SQLiteCache` (when
+    `cache_path` is given) or a `MemoryCache` is created the first
+    time it is requested with those parameters.
+
+    :param cache_path: path to the file of the cache
+    :param max_size: maximum number of entries of the cache
+    :param ttl: number of seconds an entry of the cache is valid
+
+    :returns: a `Cache` object
+    """
+    if cache_path is None and max_size is None and ttl is None:
+        return GitHubClient._users_cache
+
+    key = (cache_path, max_size, ttl)
+
+    with _USERS_CACHES_LOCK:
+        cache = _USERS_CACHES.get(key, None)
+
+        if cache is None:
+            if cache_path:
+                cache = SQLiteCache(cache_path, max_size=max_size, ttl=ttl)
+            else:
+                cache = MemoryCache(max_size=max_size, ttl=ttl)
+            _USERS_CACHES[key] = cache
+
+    return cache
@@ -35,6 +35,7 @@ from grimoirelab_toolkit.uris import urijoin
 from ...backend import (Backend,
                         BackendCommand,
                         BackendCommandArgumentParser)
+from ...cache import SQLiteCache
 from ...client import HttpClient, RateLimitHandler
 from ...utils import DEFAULT_DATETIME
 
@@ -80,8 +81,11 @@ class GitLab(Backend):
         before raising a RetryError exception
     :param sleep_time: time to sleep in case
     :param blacklist_ids: ids of items that must not be retrieved
+    :param http_cache_path: path to the file where the validators
+        and contents of the responses are cached to make conditional
+        requests; `None` disables them
     """
-    version = '0.6.2'
+    version = '0.7.0'
 
     CATEGORIES = [CATEGORY_ISSUE, CATEGORY_MERGE_REQUEST]
 
@@ -89,7 +93,7 @@ class GitLab(Backend):
                  api_token=None, base_url=None, tag=None, archive=None,
                  sleep_for_rate=False, min_rate_to_sleep=MIN_RATE_LIMIT,
                  max_retries=MAX_RETRIES, sleep_time=DEFAULT_SLEEP_TIME,
-                 blacklist_ids=None):
+                 blacklist_ids=None, http_cache_path=None):
         origin = base_url if base_url else GITLAB_URL
         origin = urijoin(origin, owner, repository)
 
@@ -103,6 +107,7 @@ class GitLab(Backend):
         self.max_retries = max_retries
         self.sleep_time = sleep_time
         self.blacklist_ids = blacklist_ids
+        self.http_cache_path = http_cache_path
         self.client = None
         self._users = {}  # internal users cache
 
@@ -200,10 +205,13 @@ class GitLab(Backend):
     def _init_client(self, from_archive=False):
         """Init client"""
 
+        http_cache = SQLiteCache(self.http_cache_path) if self.http_cache_path else None
+
         return GitLabClient(self.owner, self.repository, self.api_token, self.base_url,
                             self.sleep_for_rate, self.min_rate_to_sleep,
                             self.sleep_time, self.max_retries,
-                            self.archive, from_archive)
+                            self.archive, from_archive,
+                            http_cache=http_cache)
 
     def __fetch_issues(self, from_date):
         """Fetch the issues"""
@@ -372,6 +380,7 @@ class GitLabClient(HttpClient, RateLimitHandler):
          before raising a RetryError exception
     :param archive: an archive to store/read fetched data
     :param from_archive: it tells whether to write/read the archive
+    :param http_cache: cache of the conditional requests
     """
 
     RATE_LIMIT_HEADER = "RateLimit-Remaining"
@@ -389,7 +398,7 @@ class GitLabClient(HttpClient, RateLimitHandler):
     def __init__(self, owner, repository, token, base_url=None,
                  sleep_for_rate=False, min_rate_to_sleep=MIN_RATE_LIMIT,
                  sleep_time=DEFAULT_SLEEP_TIME, max_retries=MAX_RETRIES,
-                 archive=None, from_archive=False):
+                 archive=None, from_archive=False, http_cache=None):
         self.owner = owner
         self.repository = repository
         self.token = token
@@ -404,7 +413,7 @@ class GitLabClient(HttpClient, RateLimitHandler):
 
         super().__init__(base_url, sleep_time=sleep_time, max_retries=max_retries,
                          extra_headers=self._set_extra_headers(), extra_retry_after_status=[502, 503],
-                         archive=archive, from_archive=from_archive)
+                         archive=archive, from_archive=from_archive, http_cache=http_cache)
         super().setup_rate_limit_handler(rate_limit_header=self.RATE_LIMIT_HEADER,
                                          rate_limit_reset_header=self.RATE_LIMIT_RESET_HEADER,
                                          sleep_for_rate=sleep_for_rate,
@@ -633,7 +642,8 @@ class GitLabCommand(BackendCommand):
 
         parser = BackendCommandArgumentParser(from_date=True,
                                               token_auth=True,
-                                              archive=True)
+                                              archive=True,
+                                              http_cache=True)
 
         # GitLab options
         group = parser.parser.add_argument_group('GitLab arguments')
@@ -27,7 +27,10 @@ from requests.auth import HTTPBasicAuth
 
 from grimoirelab_toolkit.uris import urijoin
 
-from .mbox import MBox, MailingList, CATEGORY_MESSAGE
+from .mbox import (MBox,
+                   MailingList,
+                   ArchiveDownloader,
+                   CATEGORY_MESSAGE)
 from ...backend import (BackendCommand,
                         BackendCommandArgumentParser)
 from ...errors import BackendError
@@ -60,7 +63,7 @@ class Groupsio(MBox):
     :param tag: label used to mark the data
     :param archive: archive to store/retrieve items
     """
-    version = '0.1.2'
+    version = '0.2.0'
 
     CATEGORIES = [CATEGORY_MESSAGE]
 
@@ -150,6 +153,7 @@ class GroupsioClient(MailingList):
         self.api_token = api_token
         self.auth = HTTPBasicAuth(self.api_token, '')
         self.verify = verify
+        self.client = ArchiveDownloader(GROUPSIO_API_URL, verify=verify, auth=self.auth)
 
     def fetch(self):
         """Fetch the mbox files from the remote archiver.
@@ -159,7 +163,8 @@ class GroupsioClient(MailingList):
         be ignored.
 
         Groups.io archives are returned as a .zip file, which contains
-        one file in mbox format.
+        one file in mbox format. The archive is only downloaded again
+        when it was modified (see `ArchiveDownloader`).
 
         :returns: a list of tuples, storing the links and paths of the
             fetched archives
@@ -207,18 +212,15 @@ class GroupsioClient(MailingList):
             keep_fetching = response_raw['has_more']
 
     def _download_archive(self, url, payload, filepath):
-        r = requests.get(url, params=payload, auth=self.auth, stream=True, verify=self.verify)
         try:
-            r.raise_for_status()
-            self._write_archive(r, filepath)
-        except requests.exceptions.HTTPError as e:
+            self.client.fetch_archive(url, filepath, self._write_archive,
+                                      payload=payload)
+        except requests.exceptions.RequestException as e:
             raise e
         except OSError as e:
             logger.warning("Ignoring %s archive due to: %s", self.uri, str(e))
             return False
 
-        logger.debug("%s archive downloaded and stored in %s", self.uri, filepath)
-
         return True
 
     @staticmethod
@@ -242,11 +244,7 @@ class GroupsioClient(MailingList):
     def __fetch(self, url, payload):
         """Fetch requests from groupsio API"""
 
-        r = requests.get(url, params=payload, auth=self.auth, verify=self.verify)
-        try:
-            r.raise_for_status()
-        except requests.exceptions.HTTPError as e:
-            raise e
+        r = self.client.fetch(url, payload=payload, verify=self.verify)
 
         return r
 
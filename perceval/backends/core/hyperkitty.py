@@ -27,14 +27,18 @@ import os
 import dateutil.parser
 import dateutil.relativedelta
 import dateutil.tz
+import requests
 
 from grimoirelab_toolkit.datetime import datetime_to_utc, datetime_utcnow
 from grimoirelab_toolkit.uris import urijoin
 
-from .mbox import MBox, MailingList, CATEGORY_MESSAGE
+from .mbox import (MBox,
+                   MailingList,
+                   ArchiveDownloader,
+                   CATEGORY_MESSAGE,
+                   MAX_DOWNLOADS)
 from ...backend import (BackendCommand,
                         BackendCommandArgumentParser)
-from ...client import HttpClient
 from ...utils import (DEFAULT_DATETIME,
                       months_range)
 
@@ -53,14 +57,22 @@ class HyperKitty(MBox):
     :param dirpath: directory path where the mboxes are stored
     :param tag: label used to mark the data
     :param archive: archive to store/retrieve items
+    :param index_path: path to a file where the state of the mboxes
+        is stored between runs; mboxes which did not change since
+        they were read are skipped (see `MBox`)
+    :param max_downloads: maximum number of archives downloaded
+        at the same time
     """
-    version = '0.4.2'
+    version = '0.6.0'
 
     CATEGORIES = [CATEGORY_MESSAGE]
 
-    def __init__(self, url, dirpath, tag=None, archive=None):
-        super().__init__(url, dirpath, tag=tag, archive=archive)
+    def __init__(self, url, dirpath, tag=None, archive=None,
+                 index_path=None, max_downloads=MAX_DOWNLOADS):
+        super().__init__(url, dirpath, tag=tag, archive=archive,
+                         index_path=index_path)
         self.url = url
+        self.max_downloads = max_downloads
 
     def fetch(self, category=CATEGORY_MESSAGE, from_date=DEFAULT_DATETIME):
         """Fetch the messages from the HyperKitty mailing list archiver.
@@ -96,7 +108,8 @@ class HyperKitty(MBox):
         logger.info("Looking for messages from '%s' since %s",
                     self.url, str(from_date))
 
-        mailing_list = HyperKittyList(self.url, self.dirpath)
+        mailing_list = HyperKittyList(self.url, self.dirpath,
+                                      max_downloads=self.max_downloads)
         mailing_list.fetch(from_date=from_date)
 
         messages = self._fetch_and_parse_messages(mailing_list, from_date)
@@ -136,10 +149,12 @@ class HyperKittyList(MailingList):
 
     :param url: URL to the HyperKitty archiver for this list
     :param dirpath: path to the local mboxes archives
+    :param max_downloads: maximum number of archives downloaded
+        at the same time
     """
-    def __init__(self, url, dirpath):
+    def __init__(self, url, dirpath, max_downloads=MAX_DOWNLOADS):
         super().__init__(url, dirpath)
-        self.client = HttpClient(url)
+        self.client = ArchiveDownloader(url, max_downloads=max_downloads)
 
     def fetch(self, from_date=DEFAULT_DATETIME):
         """Fetch the mbox files from the remote archiver.
@@ -149,7 +164,8 @@ class HyperKittyList(MailingList):
 
         HyperKitty archives are accessed month by month and stored following
         the schema year-month. Archives are fetched from the given month
-        till the current month.
+        till the current month. Archives already stored are only downloaded
+        again when they were modified (see `ArchiveDownloader`).
 
         :param from_date: fetch archives that store messages
             equal or after the given date; only year and month values
@@ -170,15 +186,12 @@ class HyperKittyList(MailingList):
 
         months = months_range(from_date, to_end)
 
-        fetched = []
-
         if not os.path.exists(self.dirpath):
             os.makedirs(self.dirpath)
 
-        tmbox = 0
+        archives = []
 
         for dts in months:
-            tmbox += 1
             start, end = dts[0], dts[1]
             filename = start.strftime("%Y-%m.mbox.gz")
             filepath = os.path.join(self.dirpath, filename)
@@ -190,12 +203,13 @@ class HyperKittyList(MailingList):
                 'end': end.strftime("%Y-%m-%d")
             }
 
-            success = self._download_archive(url, params, filepath)
+            archives.append((url, params, filepath))
 
-            if success:
-                fetched.append((url, filepath))
+        results = self.client.run(self._download_archive, archives)
+        fetched = [(url, filepath) for (url, _, filepath), success in zip(archives, results)
+                   if success]
 
-        logger.info("%s/%s MBoxes downloaded", len(fetched), tmbox)
+        logger.info("%s/%s MBoxes downloaded", len(fetched), len(archives))
 
         return fetched
 
@@ -234,19 +248,22 @@ class HyperKittyList(MailingList):
         return dt
 
     def _download_archive(self, url, params, filepath):
-        r = self.client.fetch(url, payload=params, stream=True)
-
         try:
-            with open(filepath, 'wb') as fd:
-                fd.write(r.raw.read())
+            self.client.fetch_archive(url, filepath, self._write_archive,
+                                      payload=params)
+        except requests.exceptions.RequestException as e:
+            raise e
         except OSError as e:
             logger.warning("Ignoring %s archive due to: %s", url, str(e))
             return False
 
-        logger.debug("%s archive downloaded and stored in %s", url, filepath)
-
         return True
 
+    @staticmethod
+    def _write_archive(r, filepath):
+        with open(filepath, 'wb') as fd:
+            fd.write(r.raw.read())
+
 
 class HyperKittyCommand(BackendCommand):
     """Class to run HyperKitty backend from the command line."""
@@ -274,6 +291,11 @@ class HyperKittyCommand(BackendCommand):
         group = parser.parser.add_argument_group('HyperKitty arguments')
         group.add_argument('--mboxes-path', dest='mboxes_path',
                            help="Path where mbox files will be stored")
+        group.add_argument('--index-path', dest='index_path',
+                           help="Path to the file where the state of the read mboxes is stored")
+        group.add_argument('--max-downloads', dest='max_downloads',
+                           default=MAX_DOWNLOADS, type=int,
+                           help="Maximum number of archives downloaded at the same time")
 
         # Required arguments
         parser.parser.add_argument('url',
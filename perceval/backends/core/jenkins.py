@@ -30,6 +30,7 @@ from grimoirelab_toolkit.uris import urijoin
 from ...backend import (Backend,
                         BackendCommand,
                         BackendCommandArgumentParser)
+from ...cache import SQLiteCache
 from ...client import HttpClient
 
 CATEGORY_BUILD = "build"
@@ -53,13 +54,17 @@ class Jenkins(Backend):
     :param detail_depth: control the detail level of the data returned by the API
     :param sleep_time: minimun waiting time due to a timeout connection exception
     :param archive: collect builds already retrieved from an archive
+    :param http_cache_path: path to the file where the validators
+        and contents of the responses are cached to make conditional
+        requests; `None` disables them
     """
-    version = '0.11.2'
+    version = '0.12.0'
 
     CATEGORIES = [CATEGORY_BUILD]
 
     def __init__(self, url, tag=None, archive=None,
-                 blacklist_jobs=None, detail_depth=DETAIL_DEPTH, sleep_time=SLEEP_TIME):
+                 blacklist_jobs=None, detail_depth=DETAIL_DEPTH, sleep_time=SLEEP_TIME,
+                 http_cache_path=None):
         origin = url
 
         super().__init__(origin, tag=tag, archive=archive)
@@ -67,6 +72,7 @@ class Jenkins(Backend):
         self.sleep_time = sleep_time
         self.blacklist_jobs = blacklist_jobs
         self.detail_depth = detail_depth
+        self.http_cache_path = http_cache_path
 
         self.client = None
 
@@ -184,9 +190,12 @@ class Jenkins(Backend):
     def _init_client(self, from_archive=False):
         """Init client"""
 
+        http_cache = SQLiteCache(self.http_cache_path) if self.http_cache_path else None
+
         return JenkinsClient(self.url, self.blacklist_jobs, self.detail_depth,
                              self.sleep_time,
-                             archive=self.archive, from_archive=from_archive)
+                             archive=self.archive, from_archive=from_archive,
+                             http_cache=http_cache)
 
 
 class JenkinsClient(HttpClient):
@@ -204,6 +213,7 @@ class JenkinsClient(HttpClient):
     :param sleep_time: minimun waiting time due to a timeout connection exception
     :param archive: an archive to store/read fetched data
     :param from_archive: it tells whether to write/read the archive
+    :param http_cache: cache of the conditional requests
 
     :raises HTTPError: when an error occurs doing the request
     """
@@ -211,9 +221,9 @@ class JenkinsClient(HttpClient):
     MAX_RETRIES = 5
 
     def __init__(self, url, blacklist_jobs=None, detail_depth=DETAIL_DEPTH, sleep_time=SLEEP_TIME,
-                 archive=None, from_archive=False):
+                 archive=None, from_archive=False, http_cache=None):
         super().__init__(url, sleep_time=sleep_time, extra_status_forcelist=self.EXTRA_STATUS_FORCELIST,
-                         archive=archive, from_archive=from_archive)
+                         archive=archive, from_archive=from_archive, http_cache=http_cache)
         self.blacklist_jobs = blacklist_jobs
         self.detail_depth = detail_depth
 
@@ -248,7 +258,8 @@ class JenkinsCommand(BackendCommand):
     def setup_cmd_parser():
         """Returns the Jenkins argument parser."""
 
-        parser = BackendCommandArgumentParser(archive=True)
+        parser = BackendCommandArgumentParser(archive=True,
+                                              http_cache=True)
 
         # Jenkins options
         group = parser.parser.add_argument_group('Jenkins arguments')
@@ -23,10 +23,12 @@
 # Note: some ot this code was taken from the MailingListStats project
 #
 
+import concurrent.futures
+import email.utils
 import logging
 import mailbox
+import mmap
 import os
-import tempfile
 
 import gzip
 import bz2
@@ -39,12 +41,22 @@ from grimoirelab_toolkit.datetime import (InvalidDateError,
 from ...backend import (Backend,
                         BackendCommand,
                         BackendCommandArgumentParser)
+from ...cache import SQLiteCache
+from ...client import HttpClient
 from ...utils import (DEFAULT_DATETIME,
                       check_compressed_file_type,
-                      message_to_dict)
+                      message_to_dict,
+                      run_in_pool)
 
 CATEGORY_MESSAGE = "message"
 
+MAX_WORKERS = 1
+MBOX_CHUNK_SIZE = 4 * 1024 * 1024
+MBOX_INDEX_TAIL_SIZE = 256
+
+MAX_DOWNLOADS = 1
+DOWNLOAD_SUFFIX = '.part'
+
 logger = logging.getLogger(__name__)
 
 
@@ -61,20 +73,35 @@ class MBox(Backend):
     :param dirpath: directory path where the mboxes are stored
     :param tag: label used to mark the data
     :param archive: archive to store/retrieve items
+    :param max_workers: number of processes used to parse the mboxes;
+        when it is greater than 1, mboxes and chunks of large mboxes
+        are parsed in parallel; messages are returned in the same
+        order regardless of this value
+    :param index_path: path to a file where the state of the mboxes
+        is stored between runs; when it is set, mboxes which did not
+        change since they were read are skipped and plain mboxes which
+        grew are read from where the previous run stopped
+    :param max_body_size: maximum number of characters stored for
+        each type of body of the messages; when it is 0, bodies are
+        not decoded; `None` for no limit
     """
-    version = '0.11.0'
+    version = '0.14.0'
 
     CATEGORIES = [CATEGORY_MESSAGE]
 
     DATE_FIELD = 'Date'
     MESSAGE_ID_FIELD = 'Message-ID'
 
-    def __init__(self, uri, dirpath, tag=None, archive=None):
+    def __init__(self, uri, dirpath, tag=None, archive=None,
+                 max_workers=MAX_WORKERS, index_path=None, max_body_size=None):
         origin = uri
 
         super().__init__(origin, tag=tag, archive=archive)
         self.uri = uri
         self.dirpath = dirpath
+        self.max_workers = max_workers
+        self.index_path = index_path
+        self.max_body_size = max_body_size
 
     def fetch(self, category=CATEGORY_MESSAGE, from_date=DEFAULT_DATETIME):
         """Fetch the messages from a set of mbox files.
@@ -170,17 +197,17 @@ class MBox(Backend):
         """Parse a mbox file.
 
         This method parses a mbox file and returns an iterator of dictionaries.
-        Each one of this contains an email message.
+        Each one of this contains an email message. The file, which can
+        be compressed, is read in a single pass.
 
         :param filepath: path of the mbox to parse
 
         :returns : generator of messages; each message is stored in a
             dictionary of type `requests.structures.CaseInsensitiveDict`
         """
-        mbox = _MBox(filepath, create=False)
+        mbox = MBoxArchive(filepath)
 
-        for msg in mbox:
-            message = message_to_dict(msg)
+        for message in _parse_mbox_archive(mbox):
             yield message
 
     def _init_client(self, from_archive=False):
@@ -193,58 +220,189 @@ class MBox(Backend):
 
         nmsgs, imsgs, tmsgs = (0, 0, 0)
 
-        for mbox in mailing_list.mboxes:
-            tmp_path = None
+        index = SQLiteCache(self.index_path) if self.index_path else None
 
-            try:
-                tmp_path = self._copy_mbox(mbox)
+        if self.max_workers > 1:
+            messages = self._parse_mboxes_in_pool(mailing_list.mboxes, index, from_date)
+        else:
+            messages = self._parse_mboxes(mailing_list.mboxes, index, from_date)
 
-                for message in self.parse_mbox(tmp_path):
-                    tmsgs += 1
+        for message in messages:
+            tmsgs += 1
 
-                    if not self._validate_message(message):
-                        imsgs += 1
-                        continue
+            if not self._validate_message(message):
+                imsgs += 1
+                continue
 
-                    # Ignore those messages sent before the given date
-                    dt = str_to_datetime(message[MBox.DATE_FIELD])
+            # Ignore those messages sent before the given date
+            dt = str_to_datetime(message[MBox.DATE_FIELD])
 
-                    if dt < from_date:
-                        logger.debug("Message %s sent before %s; skipped",
-                                     message['unixfrom'], str(from_date))
-                        tmsgs -= 1
-                        continue
+            if dt < from_date:
+                logger.debug("Message %s sent before %s; skipped",
+                             message['unixfrom'], str(from_date))
+                tmsgs -= 1
+                continue
+
+            # Convert 'CaseInsensitiveDict' to dict
+            message = self._casedict_to_dict(message)
+
+            nmsgs += 1
+            logger.debug("Message %s parsed", message['unixfrom'])
 
-                    # Convert 'CaseInsensitiveDict' to dict
-                    message = self._casedict_to_dict(message)
+            yield message
 
-                    nmsgs += 1
-                    logger.debug("Message %s parsed", message['unixfrom'])
+        logger.info("Done. %s/%s messages fetched; %s ignored",
+                    nmsgs, tmsgs, imsgs)
 
+    def _parse_mboxes(self, mboxes, index=None, from_date=DEFAULT_DATETIME):
+        """Parse the messages of a list of mboxes, one after the other"""
+
+        for mbox in mboxes:
+            try:
+                to_read = self._find_mbox_range(mbox, index, from_date)
+
+                if not to_read:
+                    continue
+
+                start, end, state = to_read
+
+                for message in _parse_mbox_archive(mbox, start, end,
+                                                   max_body_size=self.max_body_size):
                     yield message
             except (OSError, EOFError) as e:
                 logger.warning("Ignoring %s mbox due to: %s", mbox.filepath, str(e))
-            except Exception as e:
-                if tmp_path and os.path.exists(tmp_path):
-                    os.remove(tmp_path)
-                raise e
-            finally:
-                if tmp_path and os.path.exists(tmp_path):
-                    os.remove(tmp_path)
+                continue
 
-        logger.info("Done. %s/%s messages fetched; %s ignored",
-                    nmsgs, tmsgs, imsgs)
+            self._update_mbox_index(index, mbox, state)
+
+    def _parse_mboxes_in_pool(self, mboxes, index=None, from_date=DEFAULT_DATETIME):
+        """Parse the messages of a list of mboxes in a pool of processes.
+
+        Plain mboxes are split in chunks of whole messages which are
+        parsed independently; compressed mboxes are parsed as a whole.
+        Messages are returned following the order of the mboxes.
+        """
+        states = {}
+
+        def find_tasks():
+            for mbox in mboxes:
+                try:
+                    to_read = self._find_mbox_range(mbox, index, from_date)
+
+                    if not to_read:
+                        continue
+
+                    start, end, states[mbox] = to_read
+
+                    if mbox.is_compressed():
+                        chunks = [(None, None)]
+                    else:
+                        chunks = _find_mbox_chunks(mbox.filepath, MBOX_CHUNK_SIZE,
+                                                   start=start or 0, end=end)
+                except OSError as e:
+                    logger.warning("Ignoring %s mbox due to: %s", mbox.filepath, str(e))
+                    continue
+
+                for chunk_start, chunk_end in chunks:
+                    yield mbox, chunk_start, chunk_end, self.max_body_size
+
+        ignored = None
+        current = None
+
+        for task, result in run_in_pool(_parse_mbox_chunk, find_tasks(), self.max_workers):
+            mbox = task[0]
+
+            # The previous mbox was completely read
+            if mbox is not current:
+                if current is not None and current is not ignored:
+                    self._update_mbox_index(index, current, states[current])
+                current = mbox
+
+            # Chunks read after an error are discarded
+            if mbox is ignored:
+                continue
+
+            messages, error = result
+
+            for message in messages:
+                yield message
+
+            if error:
+                logger.warning("Ignoring %s mbox due to: %s", mbox.filepath, error)
+                ignored = mbox
 
-    def _copy_mbox(self, mbox):
-        """Copy the contents of a mbox to a temporary file"""
+        if current is not None and current is not ignored:
+            self._update_mbox_index(index, current, states[current])
 
-        tmp_path = tempfile.mktemp(prefix='perceval_')
+    def _find_mbox_range(self, mbox, index, from_date=DEFAULT_DATETIME):
+        """Find the range of bytes of a mbox that has to be read.
 
-        with mbox.container as f_in:
-            with open(tmp_path, mode='wb') as f_out:
-                for l in f_in:
-                    f_out.write(l)
-        return tmp_path
+        Without an index, mboxes are read from the beginning to the end.
+        Otherwise, the state of the mbox stored in the index is compared
+        with the current one. Mboxes with the same size and modification
+        time are not read. When a plain mbox grew and the bytes before
+        the offset where the previous read stopped did not change, it
+        is read from that offset.
+
+        Messages sent before `from_date` are not returned, so the state
+        is only valid for dates equal or later than the one used to
+        read the mbox. When `from_date` is earlier, the mbox is read
+        again from the beginning.
+
+        :returns: a `(start, end, state)` tuple, where `state` is the
+            value to store in the index once the range is read, or
+            `None` when the mbox does not need to be read
+        """
+        if index is None:
+            return None, None, None
+
+        stat = os.stat(mbox.filepath)
+        entry = index.get(self._mbox_index_key(mbox))
+
+        if entry and (entry.get('from_date') is None or from_date < entry['from_date']):
+            logger.debug("Mbox %s was read since a later date; reading it again",
+                         mbox.filepath)
+            entry = None
+
+        if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+            logger.debug("Mbox %s did not change; skipped", mbox.filepath)
+            return None
+
+        state = {
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'offset': None,
+            'tail': None,
+            'from_date': from_date
+        }
+
+        # Compressed mboxes cannot be resumed
+        if mbox.is_compressed():
+            return None, None, state
+
+        state['offset'] = stat.st_size
+        state['tail'] = _read_mbox_tail(mbox.filepath, stat.st_size)
+
+        start = 0
+
+        if entry and entry['offset'] and entry['offset'] < stat.st_size:
+            if _read_mbox_tail(mbox.filepath, entry['offset']) == entry['tail']:
+                logger.debug("Mbox %s grew; reading from offset %s",
+                             mbox.filepath, entry['offset'])
+                start = entry['offset']
+
+        return start, stat.st_size, state
+
+    def _update_mbox_index(self, index, mbox, state):
+        """Store the state of a mbox that was read in the index"""
+
+        if index is None:
+            return
+
+        index.set(self._mbox_index_key(mbox), state)
+
+    def _mbox_index_key(self, mbox):
+        return self.origin + ':' + os.path.abspath(mbox.filepath)
 
     def _validate_message(self, message):
         """Check if the given message has the mandatory fields"""
@@ -297,32 +455,6 @@ class MBox(Backend):
         return msg
 
 
-class _MBox(mailbox.mbox):
-    """Wrapper of `mailbox.mbox` to catch unhandled errors"""
-
-    def get_message(self, key):
-        """Return a Message representation or raise a KeyError."""
-
-        start, stop = self._lookup(key)
-        self._file.seek(start)
-        from_line = self._file.readline().replace(mailbox.linesep, b'')
-        string = self._file.read(stop - self._file.tell())
-        msg = self._message_factory(string.replace(mailbox.linesep, b'\n'))
-
-        try:
-            msg.set_from(from_line[5:].decode('ascii'))
-            return msg
-        except UnicodeDecodeError:
-            pass
-
-        try:
-            msg.set_from(from_line[5:].decode('utf-8'))
-        except UnicodeDecodeError:
-            msg.set_from(from_line[5:].decode('iso-8859-1'))
-
-        return msg
-
-
 class MBoxCommand(BackendCommand):
     """Class to run MBox backend from the command line."""
 
@@ -340,6 +472,17 @@ class MBoxCommand(BackendCommand):
         parser.parser.add_argument('dirpath',
                                    help="Path to the mbox directory")
 
+        # Optional arguments
+        group = parser.parser.add_argument_group('MBox arguments')
+        group.add_argument('--max-workers', dest='max_workers',
+                           default=MAX_WORKERS, type=int,
+                           help="Number of processes used to parse the mboxes")
+        group.add_argument('--index-path', dest='index_path',
+                           help="Path to the file where the state of the read mboxes is stored")
+        group.add_argument('--max-body-size', dest='max_body_size',
+                           default=None, type=int,
+                           help="Maximum number of characters of the bodies; 0 to skip them")
+
         return parser
 
 
@@ -413,9 +556,262 @@ class MailingList(object):
         else:
             for root, _, files in os.walk(self.dirpath):
                 for filename in sorted(files):
+                    # Archives that are being downloaded
+                    if filename.endswith(DOWNLOAD_SUFFIX):
+                        continue
+
                     try:
                         location = os.path.join(root, filename)
                         archives.append(MBoxArchive(location))
                     except OSError as e:
                         logger.warning("Ignoring %s mbox due to: %s", filename, str(e))
         return archives
+
+
+class ArchiveDownloader(HttpClient):
+    """Download the archives of mailing lists.
+
+    Archives are downloaded using the pooled connections of a session,
+    up to `max_downloads` at the same time. Stored archives are only
+    transferred again when they changed: requests include the header
+    `If-Modified-Since` with the modification time of the stored file,
+    which is set to the `Last-Modified` date of the server, and the
+    archive is not modified when the response is `304 Not Modified`.
+    Bodies are written to temporary files which replace the stored
+    archives once they are complete.
+
+    :param base_url: URL of the archiver
+    :param max_downloads: maximum number of archives downloaded
+        at the same time
+    :param verify: allows to disable SSL verification
+    :param auth: authentication used on the requests
+    """
+    def __init__(self, base_url, max_downloads=MAX_DOWNLOADS, verify=True, auth=None):
+        self.max_downloads = max_downloads
+        self.verify = verify
+
+        super().__init__(base_url, pool_size=max_downloads)
+        self.session.auth = auth
+
+    def fetch_archive(self, url, filepath, write, payload=None):
+        """Download an archive unless the stored one is up to date.
+
+        :param url: URL of the archive
+        :param filepath: path where the archive is stored
+        :param write: function that writes the body of a response
+            to a file, called as `write(response, path)`
+        :param payload: parameters of the request
+
+        :returns: `True` when the archive was downloaded; `False`
+            when the stored one was not modified
+        """
+        headers = None
+
+        if os.path.isfile(filepath):
+            mtime = os.stat(filepath).st_mtime
+            headers = {
+                'If-Modified-Since': email.utils.formatdate(mtime, usegmt=True)
+            }
+
+        r = self.fetch(url, payload=payload, headers=headers,
+                       stream=True, verify=self.verify)
+
+        with r:
+            if r.status_code == self.NOT_MODIFIED:
+                logger.debug("%s archive not modified; %s is up to date", url, filepath)
+                return False
+
+            self._store_archive(r, filepath, write)
+
+        logger.debug("%s archive downloaded and stored in %s", url, filepath)
+
+        return True
+
+    def run(self, func, tasks):
+        """Run a function for each task in a pool of threads.
+
+        Each task is a tuple with the arguments of `func`. The first
+        exception raised by a call is raised again once the running
+        calls end; calls not started yet are cancelled.
+
+        :returns: a list with the results, following the order of the tasks
+        """
+        if self.max_downloads <= 1:
+            return [func(*task) for task in tasks]
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_downloads) as executor:
+            futures = [executor.submit(func, *task) for task in tasks]
+
+            try:
+                return [future.result() for future in futures]
+            except Exception:
+                for future in futures:
+                    future.cancel()
+                raise
+
+    @staticmethod
+    def _store_archive(r, filepath, write):
+        """Write an archive to a temporary file and move it to its path"""
+
+        dirpath, filename = os.path.split(filepath)
+        tmp_path = os.path.join(dirpath, '.' + filename + DOWNLOAD_SUFFIX)
+
+        try:
+            write(r, tmp_path)
+
+            # Keep the date of the server for the next requests
+            last_modified = r.headers.get('Last-Modified', None)
+            if last_modified:
+                try:
+                    ts = email.utils.parsedate_to_datetime(last_modified).timestamp()
+                    os.utime(tmp_path, (ts, ts))
+                except (TypeError, ValueError):
+                    pass
+
+            os.replace(tmp_path, filepath)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+def _find_mbox_chunks(filepath, chunk_size, start=0, end=None):
+    """Split a mbox file in chunks of whole messages.
+
+    Chunks end where a message starts (a line beginning with
+    'From '), after, at least, `chunk_size` bytes. Only the bytes
+    between `start` and `end` (the end of the file, by default)
+    are split.
+
+    :returns: a list of `(start, end)` tuples with the offsets
+        of each chunk
+    """
+    chunks = []
+
+    with open(filepath, 'rb') as f:
+        # Empty files cannot be mapped
+        if os.fstat(f.fileno()).st_size == 0:
+            return chunks
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            size = len(mm) if end is None else min(end, len(mm))
+
+            while start < size:
+                pos = mm.find(b'\nFrom ', start + chunk_size - 1, size)
+                stop = size if pos < 0 else pos + 1
+                chunks.append((start, stop))
+                start = stop
+
+    return chunks
+
+
+def _parse_mbox_chunk(mbox, start, end, max_body_size=None):
+    """Parse the messages of a chunk of a mbox.
+
+    When `start` and `end` are `None`, the whole mbox is parsed.
+    Errors reading the mbox do not raise an exception; they are
+    returned together with the messages parsed before them.
+
+    :returns: a tuple with the list of parsed messages and the
+        description of the error found reading them or `None`
+    """
+    messages = []
+
+    try:
+        for message in _parse_mbox_archive(mbox, start, end,
+                                           max_body_size=max_body_size):
+            messages.append(message)
+    except (OSError, EOFError) as e:
+        return messages, str(e)
+
+    return messages, None
+
+
+def _read_mbox_tail(filepath, offset):
+    """Read the bytes of a mbox file found before an offset"""
+
+    with open(filepath, 'rb') as f:
+        start = max(0, offset - MBOX_INDEX_TAIL_SIZE)
+        f.seek(start)
+        return f.read(offset - start)
+
+
+def _parse_mbox_archive(mbox, start=None, end=None, max_body_size=None):
+    """Parse the messages of a mbox archive.
+
+    The messages are read from the container of the archive, which
+    is decompressed on the fly when needed. When `start` and `end`
+    are given, only the messages stored between these offsets of a
+    plain mbox are parsed. Bodies are limited to `max_body_size`
+    characters (see `message_to_dict`).
+
+    :returns: a generator of messages converted to dictionaries
+    """
+    with mbox.container as fd:
+        size = None
+
+        if start is not None:
+            fd.seek(start)
+            size = end - start
+
+        for msg in _read_mbox(fd, size=size):
+            yield message_to_dict(msg, max_body_size=max_body_size)
+
+
+def _read_mbox(fd, size=None):
+    """Read the messages of a mbox stream in a single pass.
+
+    Messages are split following the same rules than `mailbox.mbox`
+    does: a message starts on each line beginning with 'From ' and
+    ends before the next one, dropping the blank line that separates
+    them. Data found before the first message is ignored.
+
+    :param fd: binary stream of the mbox
+    :param size: number of bytes to read from the current position
+        of the stream; when it is `None` the stream is read until
+        its end
+
+    :returns: a generator of `mailbox.mboxMessage` objects
+    """
+    lines = None
+    nbytes = 0
+
+    for line in fd:
+        if size is not None:
+            if nbytes >= size:
+                break
+            nbytes += len(line)
+
+        if line.startswith(b'From '):
+            if lines is not None:
+                yield _build_mbox_message(lines)
+            lines = [line]
+        elif lines is not None:
+            lines.append(line)
+
+    if lines is not None:
+        yield _build_mbox_message(lines)
+
+
+def _build_mbox_message(lines):
+    """Build a mbox message from its lines, the 'From ' one included"""
+
+    if len(lines) > 1 and lines[-1] == mailbox.linesep:
+        lines.pop()
+
+    from_line = lines[0].replace(mailbox.linesep, b'')
+    string = b''.join(lines[1:])
+    msg = mailbox.mboxMessage(string.replace(mailbox.linesep, b'\n'))
+
+    # Unix from lines are not always encoded in ASCII
+    try:
+        msg.set_from(from_line[5:].decode('ascii'))
+        return msg
+    except UnicodeDecodeError:
+        pass
+
+    try:
+        msg.set_from(from_line[5:].decode('utf-8'))
+    except UnicodeDecodeError:
+        msg.set_from(from_line[5:].decode('iso-8859-1'))
+
+    return msg
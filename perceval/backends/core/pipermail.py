@@ -34,7 +34,11 @@ import requests
 from grimoirelab_toolkit.datetime import datetime_to_utc
 from grimoirelab_toolkit.uris import urijoin
 
-from .mbox import MBox, MailingList, CATEGORY_MESSAGE
+from .mbox import (MBox,
+                   MailingList,
+                   ArchiveDownloader,
+                   CATEGORY_MESSAGE,
+                   MAX_DOWNLOADS)
 from ...backend import (BackendCommand,
                         BackendCommandArgumentParser)
 from ...utils import DEFAULT_DATETIME
@@ -63,15 +67,23 @@ class Pipermail(MBox):
     :param verify: allows to disable SSL verification
     :param tag: label used to mark the data
     :param archive: archive to store/retrieve items
+    :param index_path: path to a file where the state of the mboxes
+        is stored between runs; mboxes which did not change since
+        they were read are skipped (see `MBox`)
+    :param max_downloads: maximum number of archives downloaded
+        at the same time
     """
-    version = '0.9.0'
+    version = '0.11.0'
 
     CATEGORIES = [CATEGORY_MESSAGE]
 
-    def __init__(self, url, dirpath, verify=True, tag=None, archive=None):
-        super().__init__(url, dirpath, tag=tag, archive=archive)
+    def __init__(self, url, dirpath, verify=True, tag=None, archive=None,
+                 index_path=None, max_downloads=MAX_DOWNLOADS):
+        super().__init__(url, dirpath, tag=tag, archive=archive,
+                         index_path=index_path)
         self.url = url
         self.verify = verify
+        self.max_downloads = max_downloads
 
     def fetch(self, category=CATEGORY_MESSAGE, from_date=DEFAULT_DATETIME):
         """Fetch the messages from the Pipermail archiver.
@@ -101,7 +113,8 @@ class Pipermail(MBox):
         logger.info("Looking for messages from '%s' since %s",
                     self.url, str(from_date))
 
-        mailing_list = PipermailList(self.url, self.dirpath, self.verify)
+        mailing_list = PipermailList(self.url, self.dirpath, self.verify,
+                                     max_downloads=self.max_downloads)
         mailing_list.fetch(from_date=from_date)
 
         messages = self._fetch_and_parse_messages(mailing_list, from_date)
@@ -154,6 +167,11 @@ class PipermailCommand(BackendCommand):
         group = parser.parser.add_argument_group('Pipermail arguments')
         group.add_argument('--mboxes-path', dest='mboxes_path',
                            help="Path where mbox files will be stored")
+        group.add_argument('--index-path', dest='index_path',
+                           help="Path to the file where the state of the read mboxes is stored")
+        group.add_argument('--max-downloads', dest='max_downloads',
+                           default=MAX_DOWNLOADS, type=int,
+                           help="Maximum number of archives downloaded at the same time")
         group.add_argument('--no-verify', dest='verify',
                            action='store_false',
                            help="Value 'True' enable SSL verification")
@@ -175,18 +193,22 @@ class PipermailList(MailingList):
     :param url: URL to the Pipermail archiver for this list
     :param dirpath: path to the local mboxes archives
     :param verify: allows to disable SSL verification
+    :param max_downloads: maximum number of archives downloaded
+        at the same time
     """
-    def __init__(self, url, dirpath, verify=True):
+    def __init__(self, url, dirpath, verify=True, max_downloads=MAX_DOWNLOADS):
         super().__init__(url, dirpath)
         self.url = url
         self.verify = verify
+        self.client = ArchiveDownloader(url, max_downloads=max_downloads, verify=verify)
 
     def fetch(self, from_date=DEFAULT_DATETIME):
         """Fetch the mbox files from the remote archiver.
 
         Stores the archives in the path given during the initialization
         of this object. Those archives which a not valid extension will
-        be ignored.
+        be ignored. Archives already stored are only downloaded again
+        when they were modified (see `ArchiveDownloader`).
 
         Pipermail archives usually have on their file names the date of
         the archives stored following the schema year-month. When `from_date`
@@ -206,16 +228,15 @@ class PipermailList(MailingList):
 
         from_date = datetime_to_utc(from_date)
 
-        r = requests.get(self.url, verify=self.verify)
-        r.raise_for_status()
+        r = self.client.fetch(self.url, verify=self.verify)
 
         links = self._parse_archive_links(r.text)
 
-        fetched = []
-
         if not os.path.exists(self.dirpath):
             os.makedirs(self.dirpath)
 
+        archives = []
+
         for l in links:
             filename = os.path.basename(l)
 
@@ -226,10 +247,10 @@ class PipermailList(MailingList):
                 from_date < mbox_dt):
 
                 filepath = os.path.join(self.dirpath, filename)
-                success = self._download_archive(l, filepath)
+                archives.append((l, filepath))
 
-                if success:
-                    fetched.append((l, filepath))
+        results = self.client.run(self._download_archive, archives)
+        fetched = [archive for archive, success in zip(archives, results) if success]
 
         logger.info("%s/%s MBoxes downloaded", len(fetched), len(links))
 
@@ -298,9 +319,7 @@ class PipermailList(MailingList):
 
     def _download_archive(self, url, filepath):
         try:
-            r = requests.get(url, stream=True, verify=self.verify)
-            r.raise_for_status()
-            self._write_archive(r, filepath)
+            self.client.fetch_archive(url, filepath, self._write_archive)
         except requests.exceptions.HTTPError as e:
             if e.response.status_code == 403:
                 logger.warning("Ignoring %s archive due to: %s", url, str(e))
@@ -311,8 +330,6 @@ class PipermailList(MailingList):
             logger.warning("Ignoring %s archive due to: %s", url, str(e))
             return False
 
-        logger.debug("%s archive downloaded and stored in %s", url, filepath)
-
         return True
 
     @staticmethod
@@ -29,6 +29,7 @@ from grimoirelab_toolkit.datetime import str_to_datetime
 from ...backend import (Backend,
                         BackendCommand,
                         BackendCommandArgumentParser)
+from ...cache import SQLiteCache
 from ...client import HttpClient
 
 CATEGORY_ENTRY = "entry"
@@ -46,16 +47,20 @@ class RSS(Backend):
     :param url: RSS url
     :param tag: label used to mark the data
     :param archive: archive to store/retrieve items
+    :param http_cache_path: path to the file where the validators
+        and contents of the responses are cached to make conditional
+        requests; `None` disables them
     """
-    version = '0.5.2'
+    version = '0.6.0'
 
     CATEGORIES = [CATEGORY_ENTRY]
 
-    def __init__(self, url, tag=None, archive=None):
+    def __init__(self, url, tag=None, archive=None, http_cache_path=None):
         origin = url
 
         super().__init__(origin, tag=tag, archive=archive)
         self.url = url
+        self.http_cache_path = http_cache_path
         self.client = None
 
     def fetch(self, category=CATEGORY_ENTRY):
@@ -145,7 +150,10 @@ class RSS(Backend):
     def _init_client(self, from_archive=False):
         """Init client"""
 
-        return RSSClient(self.url, self.archive, from_archive)
+        http_cache = SQLiteCache(self.http_cache_path) if self.http_cache_path else None
+
+        return RSSClient(self.url, self.archive, from_archive,
+                         http_cache=http_cache)
 
 
 class RSSClient(HttpClient):
@@ -157,12 +165,14 @@ class RSSClient(HttpClient):
     :param url: URL of rss node: https://item.opnfv.org/ci
     :param archive: an archive to store/read fetched data
     :param from_archive: it tells whether to write/read the archive
+    :param http_cache: cache of the conditional requests
 
     :raises HTTPError: when an error occurs doing the request
     """
 
-    def __init__(self, url, archive=None, from_archive=False):
-        super().__init__(url, archive=archive, from_archive=from_archive)
+    def __init__(self, url, archive=None, from_archive=False, http_cache=None):
+        super().__init__(url, archive=archive, from_archive=from_archive,
+                         http_cache=http_cache)
 
     def get_entries(self):
         """ Retrieve all entries from a RSS feed"""
@@ -180,7 +190,8 @@ class RSSCommand(BackendCommand):
     def setup_cmd_parser():
         """Returns the RSS argument parser."""
 
-        parser = BackendCommandArgumentParser(archive=True)
+        parser = BackendCommandArgumentParser(archive=True,
+                                              http_cache=True)
 
         # Required arguments
         parser.parser.add_argument('url',
@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2019 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, 51 Franklin Street, Fifth Floor, Boston, MA 02110-1335, USA.
+#
+# Authors:
+#     Santiago Dueñas <sduenas@bitergia.com>
+#
+
+import collections
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from .errors import CacheError
+
+
+logger = logging.getLogger(__name__)
+
+
+class Cache:
+    """Basic class for key-value caches.
+
+    Caches store values indexed by string keys. The number of entries
+    can be bounded by `max_size`; when the cache is full, the least
+    recently used entry is evicted. Entries older than `ttl` seconds
+    are expired and they will not be returned anymore.
+
+    The number of lookups that found (`hits`) or did not find
+    (`misses`) a valid entry is counted by each cache object.
+
+    Caches can be shared by several threads.
+
+    :param max_size: maximum number of entries; `None` for no limit
+    :param ttl: number of seconds an entry is valid; `None` for no limit
+
+    :raises CacheError: when any of the parameters is not valid
+    """
+    def __init__(self, max_size=None, ttl=None):
+        if max_size is not None and max_size < 1:
+            raise CacheError(cause="max size must be greater than 0; %s given" % max_size)
+        if ttl is not None and ttl <= 0:
+            raise CacheError(cause="ttl must be greater than 0; %s given" % ttl)
+
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()
+
+    def get(self, key, default=None):
+        """Get the value of a key.
+
+        :param key: key of the entry
+        :param default: value returned when the entry is not found
+            or it has expired
+
+        :returns: the value of the entry or `default`
+        """
+        with self._lock:
+            found, value = self._get(key)
+
+            if found:
+                self.hits += 1
+                return value
+            else:
+                self.misses += 1
+                return default
+
+    def set(self, key, value):
+        """Set the value of a key.
+
+        :param key: key of the entry
+        :param value: value to store
+        """
+        with self._lock:
+            self._set(key, value)
+
+    def set_many(self, entries):
+        """Set the values of several keys at once.
+
+        :param entries: iterable of `(key, value)` tuples
+        """
+        with self._lock:
+            self._set_many(entries)
+
+    def clear(self):
+        """Remove all the entries and reset the counters"""
+
+        with self._lock:
+            self._clear()
+            self.hits = 0
+            self.misses = 0
+
+    def _expired(self, stored_on):
+        return self.ttl is not None and (time.time() - stored_on) >= self.ttl
+
+    def _get(self, key):
+        raise NotImplementedError
+
+    def _set(self, key, value):
+        raise NotImplementedError
+
+    def _set_many(self, entries):
+        for key, value in entries:
+            self._set(key, value)
+
+    def _clear(self):
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+
+class MemoryCache(Cache):
+    """In-memory cache.
+
+    Entries are lost when the process ends.
+
+    :param max_size: maximum number of entries; `None` for no limit
+    :param ttl: number of seconds an entry is valid; `None` for no limit
+    """
+    def __init__(self, max_size=None, ttl=None):
+        super().__init__(max_size=max_size, ttl=ttl)
+        self._entries = collections.OrderedDict()
+
+    def _get(self, key):
+        entry = self._entries.get(key, None)
+
+        if entry is None:
+            return False, None
+
+        value, stored_on = entry
+
+        if self._expired(stored_on):
+            del self._entries[key]
+            return False, None
+
+        self._entries.move_to_end(key)
+
+        return True, value
+
+    def _set(self, key, value):
+        self._entries[key] = (value, time.time())
+        self._entries.move_to_end(key)
+
+        if self.max_size is not None:
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCache(Cache):
+    """Persistent cache stored in a SQLite database.
+
+    Entries are kept between runs and they can be shared by several
+    processes using the same database file. Values are serialized
+    using `pickle`.
+
+    :param cache_path: path to the database file; it will be
+        created when it does not exist
+    :param max_size: maximum number of entries; `None` for no limit
+    :param ttl: number of seconds an entry is valid; `None` for no limit
+
+    :raises CacheError: when the database cannot be initialized
+    """
+    CACHE_TABLE = "cache"
+
+    CACHE_CREATE_STMT = "CREATE TABLE IF NOT EXISTS " + CACHE_TABLE + " ( " \
+                        "key TEXT PRIMARY KEY, " \
+                        "value BLOB, " \
+                        "stored_on REAL, " \
+                        "accessed_on REAL)"
+
+    CACHE_INDEX_STMT = "CREATE INDEX IF NOT EXISTS " + CACHE_TABLE + "_accessed_on " \
+                       "ON " + CACHE_TABLE + " (accessed_on)"
+
+    LOCK_TIMEOUT = 30
+
+    def __init__(self, cache_path, max_size=None, ttl=None):
+        super().__init__(max_size=max_size, ttl=ttl)
+
+        self.cache_path = cache_path
+
+        dirpath = os.path.dirname(cache_path)
+        if dirpath and not os.path.exists(dirpath):
+            os.makedirs(dirpath)
+
+        try:
+            self._db = sqlite3.connect(cache_path, timeout=self.LOCK_TIMEOUT,
+                                       check_same_thread=False)
+            self._db.execute(self.CACHE_CREATE_STMT)
+            self._db.execute(self.CACHE_INDEX_STMT)
+            self._db.commit()
+        except sqlite3.DatabaseError as e:
+            msg = "cache %s initialization error; cause: %s" % (cache_path, str(e))
+            raise CacheError(cause=msg)
+
+    def __del__(self):
+        conn = getattr(self, '_db', None)
+        if conn:
+            conn.close()
+
+    def _get(self, key):
+        try:
+            cursor = self._db.execute("SELECT value, stored_on "
+                                      "FROM " + self.CACHE_TABLE + " "
+                                      "WHERE key = ?", (key,))
+            row = cursor.fetchone()
+            cursor.close()
+
+            if not row:
+                return False, None
+
+            if self._expired(row[1]):
+                self._db.execute("DELETE FROM " + self.CACHE_TABLE + " "
+                                 "WHERE key = ?", (key,))
+                self._db.commit()
+                return False, None
+
+            if self.max_size is not None:
+                self._db.execute("UPDATE " + self.CACHE_TABLE + " "
+                                 "SET accessed_on = ? "
+                                 "WHERE key = ?", (time.time(), key))
+                self._db.commit()
+        except sqlite3.DatabaseError as e:
+            msg = "cache %s retrieval error; cause: %s" % (self.cache_path, str(e))
+            raise CacheError(cause=msg)
+
+        return True, pickle.loads(row[0])
+
+    def _set(self, key, value):
+        self._set_many([(key, value)])
+
+    def _set_many(self, entries):
+        now = time.time()
+
+        # All the entries are written in a single transaction
+        rows = [(key, pickle.dumps(value, 4), now, now) for key, value in entries]
+
+        try:
+            self._db.executemany("INSERT OR REPLACE INTO " + self.CACHE_TABLE + " "
+                                 "(key, value, stored_on, accessed_on) "
+                                 "VALUES (?, ?, ?, ?)", rows)
+
+            if self.max_size is not None:
+                self._db.execute("DELETE FROM " + self.CACHE_TABLE + " "
+                                 "WHERE key IN (SELECT key FROM " + self.CACHE_TABLE + " "
+                                 "ORDER BY accessed_on DESC LIMIT -1 OFFSET ?)",
+                                 (self.max_size,))
+            self._db.commit()
+        except sqlite3.DatabaseError as e:
+            msg = "cache %s storage error; cause: %s" % (self.cache_path, str(e))
+            raise CacheError(cause=msg)
+
+    def _clear(self):
+        try:
+            self._db.execute("DELETE FROM " + self.CACHE_TABLE)
+            self._db.commit()
+        except sqlite3.DatabaseError as e:
+            msg = "cache %s error; cause: %s" % (self.cache_path, str(e))
+            raise CacheError(cause=msg)
+
+    def __len__(self):
+        with self._lock:
+            cursor = self._db.execute("SELECT COUNT(*) FROM " + self.CACHE_TABLE)
+            nentries = cursor.fetchone()[0]
+            cursor.close()
+
+        return nentries
@@ -20,10 +20,15 @@
 #     Valerio Cosentino <valcos@bitergia.com>
 #
 
+import hashlib
+import json
 import logging
+import threading
 import time
 
 import requests
+import requests.structures
+import requests.utils
 import urllib3.util
 
 from .errors import RateLimitError
@@ -52,8 +57,16 @@ class HttpClient:
         before raising a RetryError exception
     :param sleep_time: time to sleep in case
         of connection problems
+    :param http_cache: `Cache` object to store the validators
+        (`ETag` and `Last-Modified` headers) and the contents of
+        the responses to GET requests; when it is set, requests
+        are made conditional and `304 Not Modified` responses are
+        replaced by the cached ones
+    :param pool_size: number of threads that will use this client
+        at the same time; the session keeps at least a connection
+        for each of them
     """
-    version = '0.1.5'
+    version = '0.2.0'
 
     DEFAULT_SLEEP_TIME = 1
 
@@ -76,11 +89,15 @@ class HttpClient:
     GET = "GET"
     POST = "POST"
 
+    NOT_MODIFIED = 304
+    BODY_HEADERS = ['content-length', 'content-encoding', 'content-type', 'transfer-encoding']
+
     def __init__(self, base_url, max_retries=MAX_RETRIES, sleep_time=DEFAULT_SLEEP_TIME,
                  extra_headers=None, extra_status_forcelist=None, extra_retry_after_status=None,
-                 archive=None, from_archive=False):
+                 archive=None, from_archive=False, http_cache=None, pool_size=1):
 
         self.base_url = base_url
+        self.pool_size = pool_size
 
         self.headers = dict(self.DEFAULT_HEADERS)
         if extra_headers:
@@ -108,6 +125,7 @@ class HttpClient:
 
         self.archive = archive
         self.from_archive = from_archive
+        self.http_cache = http_cache
 
         self._create_http_session()
 
@@ -159,10 +177,21 @@ class HttpClient:
 
     def _fetch_from_remote(self, url, payload, headers, method, stream, verify):
 
+        conditional = self.http_cache is not None and method == self.GET and not stream
+        cached = None
+        request_headers = headers
+
+        if conditional:
+            cache_key = self._http_cache_key(url, payload, headers)
+            cached = self.http_cache.get(cache_key)
+
+            if cached:
+                request_headers = self._conditional_headers(headers, cached)
+
         if method == self.GET:
-            response = self.session.get(url, params=payload, headers=headers, stream=stream, verify=verify)
+            response = self.session.get(url, params=payload, headers=request_headers, stream=stream, verify=verify)
         else:
-            response = self.session.post(url, data=payload, headers=headers, stream=stream, verify=verify)
+            response = self.session.post(url, data=payload, headers=request_headers, stream=stream, verify=verify)
 
         try:
             response.raise_for_status()
@@ -172,11 +201,83 @@ class HttpClient:
                 self.archive.store(url, payload, headers, e)
             raise e
 
+        if cached and response.status_code == self.NOT_MODIFIED:
+            logger.debug("%s not modified; using cached response", response.url)
+            response = self._cached_response(cached, response)
+        elif conditional:
+            self._cache_response(cache_key, response)
+
         if self.archive:
             url, headers, payload = self.sanitize_for_archive(url, headers, payload)
             self.archive.store(url, payload, headers, response)
         return response
 
+    def _http_cache_key(self, url, payload, headers):
+        """Generate the key of a request in the HTTP cache"""
+
+        payload = dict(payload) if payload else payload
+        headers = dict(headers) if headers else headers
+
+        url, headers, payload = self.sanitize_for_archive(url, headers, payload)
+        content = json.dumps([url, payload, headers], sort_keys=True)
+
+        return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _conditional_headers(headers, cached):
+        """Add the validators of a cached response to the headers of a request"""
+
+        etag, last_modified = cached[:2]
+
+        conditional_headers = dict(headers) if headers else {}
+
+        if etag:
+            conditional_headers['If-None-Match'] = etag
+        if last_modified:
+            conditional_headers['If-Modified-Since'] = last_modified
+
+        return conditional_headers
+
+    def _cache_response(self, cache_key, response):
+        """Store a response with validators in the HTTP cache"""
+
+        etag = response.headers.get('ETag', None)
+        last_modified = response.headers.get('Last-Modified', None)
+
+        if not etag and not last_modified:
+            return
+
+        cached = (etag, last_modified, response.status_code, response.reason,
+                  dict(response.headers), response.url, response.content)
+        self.http_cache.set(cache_key, cached)
+
+    @staticmethod
+    def _cached_response(cached, not_modified):
+        """Build the response of a request from the cache.
+
+        Headers sent with the `304 Not Modified` response (i.e. rate
+        limit data) replace the ones of the cached response, except
+        those related to the body.
+        """
+        _, _, status_code, reason, headers, url, content = cached
+
+        response = requests.Response()
+        response.status_code = status_code
+        response.reason = reason
+        response.headers = requests.structures.CaseInsensitiveDict(headers)
+
+        for header, value in not_modified.headers.items():
+            if header.lower() not in HttpClient.BODY_HEADERS:
+                response.headers[header] = value
+
+        response.url = url
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.request = not_modified.request
+        response._content = content
+        response._content_consumed = True
+
+        return response
+
     def _create_http_session(self):
         """Create a http session and initialize the retry object."""
 
@@ -197,8 +298,12 @@ class HttpClient:
                                      raise_on_status=self.raise_on_status,
                                      respect_retry_after_header=self.respect_retry_after_header)
 
-        self.session.mount('http://', requests.adapters.HTTPAdapter(max_retries=retries))
-        self.session.mount('https://', requests.adapters.HTTPAdapter(max_retries=retries))
+        pool_maxsize = max(self.pool_size, requests.adapters.DEFAULT_POOLSIZE)
+
+        self.session.mount('http://', requests.adapters.HTTPAdapter(max_retries=retries,
+                                                                    pool_maxsize=pool_maxsize))
+        self.session.mount('https://', requests.adapters.HTTPAdapter(max_retries=retries,
+                                                                     pool_maxsize=pool_maxsize))
 
     def _close_http_session(self):
         """Close the http session."""
@@ -210,12 +315,23 @@ class HttpClient:
 class RateLimitHandler:
     """Class to handle rate limit for HTTP clients.
 
+    The handler can manage a pool of tokens. In that case, the rate
+    limit of each token is tracked separately and, before each request,
+    the token with the highest remaining rate is selected calling to
+    `set_token`, which must be implemented by the client. The fetching
+    process only sleeps when all the tokens are exhausted.
+
+    The selection of the tokens and the updates of their rate limits
+    are done holding `_rate_limit_lock`, so the handler can be shared
+    by several threads.
+
     :param sleep_for_rate: sleep until rate limit is reset
     :param min_rate_to_sleep: minimun rate needed to sleep until it will be rese
     :param rate_limit_header: header to know the current rate limit
     :param rate_limit_reset_header: header to know the next rate limit reset
+    :param tokens: list of tokens to rotate
     """
-    version = '0.2'
+    version = '0.3'
 
     MIN_RATE_LIMIT = 10
     MAX_RATE_LIMIT = 500
@@ -224,19 +340,26 @@ class RateLimitHandler:
 
     def setup_rate_limit_handler(self, sleep_for_rate=False, min_rate_to_sleep=MIN_RATE_LIMIT,
                                  rate_limit_header=RATE_LIMIT_HEADER,
-                                 rate_limit_reset_header=RATE_LIMIT_RESET_HEADER):
+                                 rate_limit_reset_header=RATE_LIMIT_RESET_HEADER,
+                                 tokens=None):
         """Setup the rate limit handler.
 
         :param sleep_for_rate: sleep until rate limit is reset
         :param min_rate_to_sleep: minimun rate needed to make the fecthing process sleep
         :param rate_limit_header: header from where extract the rate limit data
         :param rate_limit_reset_header: header from where extract the rate limit reset data
+        :param tokens: list of tokens to rotate; when it is empty or `None`,
+            tokens are not managed by the handler
         """
         self.rate_limit = None
         self.rate_limit_reset_ts = None
         self.sleep_for_rate = sleep_for_rate
         self.rate_limit_header = rate_limit_header
         self.rate_limit_reset_header = rate_limit_reset_header
+        self.tokens = list(tokens) if tokens else []
+        self.current_token = None
+        self._tokens_rate_limit = {token: (None, None) for token in self.tokens}
+        self._rate_limit_lock = threading.RLock()
 
         if min_rate_to_sleep > self.MAX_RATE_LIMIT:
             msg = "Minimum rate to sleep value exceeded (%d)."
@@ -250,7 +373,13 @@ class RateLimitHandler:
     def sleep_for_rate_limit(self):
         """The fetching process sleeps until the rate limit is restored or
            raises a RateLimitError exception if sleep_for_rate flag is disabled.
+
+           When there is a pool of tokens, the best token is selected
+           first, so the process only sleeps when all of them are exhausted.
         """
+        if self.tokens:
+            self.select_token()
+
         if self.rate_limit is not None and self.rate_limit <= self.min_rate_to_sleep:
             seconds_to_reset = self.calculate_time_to_reset()
 
@@ -262,6 +391,11 @@ class RateLimitHandler:
             if self.sleep_for_rate:
                 logger.info("%s Waiting %i secs for rate limit reset.", cause, seconds_to_reset)
                 time.sleep(seconds_to_reset)
+
+                # The rate of the token was restored
+                with self._rate_limit_lock:
+                    if self.current_token is not None:
+                        self._tokens_rate_limit[self.current_token] = (None, None)
             else:
                 raise RateLimitError(cause=cause, seconds_to_reset=seconds_to_reset)
 
@@ -270,20 +404,79 @@ class RateLimitHandler:
 
         raise NotImplementedError
 
-    def update_rate_limit(self, response):
+    def select_token(self):
+        """Select the token of the pool with the highest remaining rate.
+
+        Tokens with unknown rate are preferred over the rest. When
+        all the tokens are exhausted, the token which will be reset
+        first is selected. The rate limit data of the handler is set
+        to the values of the selected token.
+
+        :returns: the selected token
+        """
+        def remaining(token):
+            rate_limit, _ = self._tokens_rate_limit[token]
+            return float('inf') if rate_limit is None else rate_limit
+
+        def reset_ts(token):
+            _, rate_limit_reset_ts = self._tokens_rate_limit[token]
+            return 0 if rate_limit_reset_ts is None else rate_limit_reset_ts
+
+        with self._rate_limit_lock:
+            token = max(self.tokens, key=remaining)
+
+            if remaining(token) <= self.min_rate_to_sleep:
+                token = min(self.tokens, key=reset_ts)
+
+            self.rate_limit, self.rate_limit_reset_ts = self._tokens_rate_limit[token]
+
+            if token != self.current_token:
+                logger.debug("Token rotated; remaining rate: %s", self.rate_limit)
+                self.current_token = token
+                self.set_token(token)
+
+        return token
+
+    def set_token(self, token):
+        """Set the token used by the next requests.
+
+        It is called by `select_token` holding `_rate_limit_lock`.
+        """
+
+        raise NotImplementedError
+
+    def update_rate_limit(self, response, token=None):
         """Update the rate limit and the time to reset
         from the response headers.
 
+        The rate limit data of the handler is only updated when the
+        response was obtained with the current token; otherwise, only
+        the data of the given token is updated.
+
         :param: response: the response object
+        :param: token: token used to get the response; by default,
+            the current token
         """
         if self.rate_limit_header in response.headers:
-            self.rate_limit = int(response.headers[self.rate_limit_header])
-            logger.debug("Rate limit: %s", self.rate_limit)
+            rate_limit = int(response.headers[self.rate_limit_header])
         else:
-            self.rate_limit = None
+            rate_limit = None
 
         if self.rate_limit_reset_header in response.headers:
-            self.rate_limit_reset_ts = int(response.headers[self.rate_limit_reset_header])
-            logger.debug("Rate limit reset: %s", self.calculate_time_to_reset())
+            rate_limit_reset_ts = int(response.headers[self.rate_limit_reset_header])
         else:
-            self.rate_limit_reset_ts = None
+            rate_limit_reset_ts = None
+
+        with self._rate_limit_lock:
+            token = token if token is not None else self.current_token
+
+            if token in self._tokens_rate_limit:
+                self._tokens_rate_limit[token] = (rate_limit, rate_limit_reset_ts)
+
+            if token == self.current_token:
+                self.rate_limit = rate_limit
+                self.rate_limit_reset_ts = rate_limit_reset_ts
+
+                logger.debug("Rate limit: %s", self.rate_limit)
+                if self.rate_limit_reset_ts is not None:
+                    logger.debug("Rate limit reset: %s", self.calculate_time_to_reset())
@@ -36,6 +36,12 @@ class BaseError(Exception):
     def __str__(self):
         return self.msg
 
+    def __reduce__(self):
+        # Exceptions are unpickled calling their constructor with
+        # positional arguments, which are not supported by these
+        # errors, so they are restored from their state instead
+        return _restore_error, (self.__class__, self.__dict__)
+
 
 class ArchiveError(BaseError):
     """Generic error for archive objects"""
@@ -55,6 +61,12 @@ class BackendError(BaseError):
     message = "%(cause)s"
 
 
+class CacheError(BaseError):
+    """Generic error for caches"""
+
+    message = "%(cause)s"
+
+
 class HttpClientError(BaseError):
     """Generic error for HTTP Cient"""
 
@@ -85,3 +97,11 @@ class ParseError(BaseError):
     """Exception raised a parsing errors occurs"""
 
     message = "%(cause)s"
+
+
+def _restore_error(cls, state):
+    """Restore a pickled Perceval exception"""
+
+    error = cls.__new__(cls)
+    error.__dict__.update(state)
+    return error
@@ -0,0 +1,354 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2019 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, 51 Franklin Street, Fifth Floor, Boston, MA 02110-1335, USA.
+#
+# Authors:
+#     Santiago Dueñas <sduenas@bitergia.com>
+#
+
+import collections
+import concurrent.futures
+import json
+import logging
+import multiprocessing
+import queue
+import threading
+import urllib.parse
+
+from .backend import fetch
+from .errors import BackendError
+
+
+logger = logging.getLogger(__name__)
+
+# Arguments parsed by a command which are not related to the backend
+COMMAND_ONLY_ARGS = ['archive_path', 'no_archive', 'fetch_archive',
+                     'archived_since', 'archive_batch_size',
+                     'archive_flush_interval', 'outfile', 'json_line']
+
+# Arguments checked, in this order, to find the host of a job
+HOST_ARGS = ['url', 'uri', 'origin', 'base_url', 'gitpath', 'dirpath']
+
+# Messages sent by the workers
+ITEM = 'item'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class FetchJob:
+    """Fetching job run by the orchestrator.
+
+    A job is defined by the backend class used to fetch the items,
+    the arguments needed to initialize and run that backend and the
+    category of the items. The parameters are the same ones given
+    to `perceval.backend.fetch` function.
+
+    Jobs are grouped by `host`, to limit the number of jobs which
+    access to the same server at the same time. When it is not given,
+    the host will be extracted from the URL-like arguments of the
+    backend (i.e `url`, `uri`, `origin`).
+
+    Each job can define its own archive manager. A new archive will
+    be created for each job.
+
+    :param backend_class: backend class to fetch items
+    :param backend_args: dict of arguments needed to fetch the items
+    :param category: category of the items to retrieve
+    :param manager: archive manager needed to store the items
+    :param host: name of the host accessed by the job
+    """
+    def __init__(self, backend_class, backend_args, category=None,
+                 manager=None, host=None):
+        self.backend_class = backend_class
+        self.backend_args = backend_args
+        self.category = category
+        self.manager = manager
+        self.host = host if host else self._find_host(backend_args)
+
+    @classmethod
+    def from_command(cls, command_class, *args):
+        """Create a job using the arguments of a backend command.
+
+        The arguments are parsed and initialized in the same way
+        `BackendCommand` does. Thus, any command can be converted
+        into a job. The archive manager of the command will be set
+        as the archive manager of the job.
+
+        :param command_class: `BackendCommand` class
+        :param args: argument strings of the command
+
+        :returns: a new `FetchJob` object
+        """
+        cmd = command_class(*args)
+
+        backend_args = dict(vars(cmd.parsed_args))
+        category = backend_args.pop('category', None)
+
+        for arg in COMMAND_ONLY_ARGS:
+            backend_args.pop(arg, None)
+
+        return cls(command_class.BACKEND, backend_args, category,
+                   manager=cmd.archive_manager)
+
+    @staticmethod
+    def _find_host(backend_args):
+        for arg in HOST_ARGS:
+            value = backend_args.get(arg, None)
+
+            if not value or not isinstance(value, str):
+                continue
+
+            host = urllib.parse.urlparse(value).netloc
+            return host if host else value
+
+        return None
+
+    def __repr__(self):
+        return "%s(%s, %s)" % (self.__class__.__name__,
+                               self.backend_class.__name__,
+                               self.host)
+
+
+class Orchestrator:
+    """Run several fetching jobs in parallel.
+
+    The orchestrator runs a list of `FetchJob` in a bounded pool of
+    workers. These workers can be threads or processes (see `mode`
+    parameter). Items fetched by the jobs are merged into a single
+    stream. Items of the same job keep their order, but items of
+    different jobs can be interleaved.
+
+    When `max_jobs_per_host` is set, the orchestrator will not run
+    at the same time more than that number of jobs for the same host.
+    Jobs without host are not limited.
+
+    Jobs are run using `perceval.backend.fetch`. When a job fails, its
+    archive is removed, the error is logged and the job is added to
+    `failed_jobs` list; the rest of jobs keep running.
+
+    :param max_workers: maximum number of jobs run at the same time
+    :param mode: type of workers; 'threads' or 'processes'
+    :param max_jobs_per_host: maximum number of jobs run at the
+        same time for the same host
+    :param queue_size: maximum number of fetched items waiting
+        to be consumed
+
+    :raises ValueError: when any of the parameters is not valid
+    """
+    THREADS = 'threads'
+    PROCESSES = 'processes'
+
+    MODES = [THREADS, PROCESSES]
+
+    DEFAULT_MAX_WORKERS = 4
+    DEFAULT_QUEUE_SIZE = 1000
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, mode=THREADS,
+                 max_jobs_per_host=None, queue_size=DEFAULT_QUEUE_SIZE):
+        if mode not in self.MODES:
+            raise ValueError("%s mode not valid; use %s" % (mode, ' or '.join(self.MODES)))
+        if max_workers < 1:
+            raise ValueError("max_workers must be greater than 0; %s given" % max_workers)
+        if max_jobs_per_host is not None and max_jobs_per_host < 1:
+            raise ValueError("max_jobs_per_host must be greater than 0; %s given" % max_jobs_per_host)
+
+        self.max_workers = max_workers
+        self.mode = mode
+        self.max_jobs_per_host = max_jobs_per_host
+        self.queue_size = queue_size
+        self.failed_jobs = []
+
+    def run(self, jobs):
+        """Run the jobs and fetch their items.
+
+        :param jobs: list of `FetchJob` objects
+
+        :returns: a generator of items
+        """
+        self.failed_jobs = []
+
+        if self.mode == self.PROCESSES:
+            sync_manager = multiprocessing.Manager()
+            items_queue = sync_manager.Queue(self.queue_size)
+            stop_event = sync_manager.Event()
+            executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.max_workers)
+        else:
+            sync_manager = None
+            items_queue = queue.Queue(self.queue_size)
+            stop_event = threading.Event()
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers)
+
+        pending = collections.deque(enumerate(jobs))
+        running = {}
+        hosts = collections.Counter()
+
+        try:
+            while pending or running:
+                self._schedule(executor, pending, running, hosts,
+                               items_queue, stop_event)
+
+                job_id, status, value = items_queue.get()
+
+                if status == ITEM:
+                    yield value
+                    continue
+
+                job = running.pop(job_id)
+                hosts[job.host] -= 1
+
+                if status == FAILED:
+                    logger.error("Job %s failed; cause: %s", job, value)
+                    self.failed_jobs.append(job)
+                else:
+                    logger.debug("Job %s completed", job)
+        finally:
+            # Consumer stopped before all the jobs finished;
+            # unblock the running workers and wait for them
+            stop_event.set()
+            while running:
+                job_id, status, _ = items_queue.get()
+                if status != ITEM:
+                    running.pop(job_id, None)
+            executor.shutdown(wait=True)
+
+            if sync_manager:
+                sync_manager.shutdown()
+
+    def _schedule(self, executor, pending, running, hosts, items_queue, stop_event):
+        """Submit the pending jobs which are allowed to run"""
+
+        waiting = collections.deque()
+
+        while pending and len(running) < self.max_workers:
+            job_id, job = pending.popleft()
+
+            if not self._host_available(job, hosts):
+                waiting.append((job_id, job))
+                continue
+
+            running[job_id] = job
+            hosts[job.host] += 1
+
+            future = executor.submit(_run_job, job_id, job, items_queue, stop_event)
+            future.add_done_callback(_job_error_callback(job_id, items_queue))
+
+            logger.debug("Job %s scheduled", job)
+
+        waiting.extend(pending)
+        pending.clear()
+        pending.extend(waiting)
+
+    def _host_available(self, job, hosts):
+        if not self.max_jobs_per_host or job.host is None:
+            return True
+        return hosts[job.host] < self.max_jobs_per_host
+
+
+def fetch_jobs(jobs, max_workers=Orchestrator.DEFAULT_MAX_WORKERS,
+               mode=Orchestrator.THREADS, max_jobs_per_host=None):
+    """Fetch items from several jobs in parallel.
+
+    Generator to get the items of a list of `FetchJob` objects
+    using an `Orchestrator`. See its documentation for more
+    information about the parameters.
+
+    :param jobs: list of `FetchJob` objects
+    :param max_workers: maximum number of jobs run at the same time
+    :param mode: type of workers; 'threads' or 'processes'
+    :param max_jobs_per_host: maximum number of jobs run at the
+        same time for the same host
+
+    :returns: a generator of items
+    """
+    orchestrator = Orchestrator(max_workers=max_workers, mode=mode,
+                                max_jobs_per_host=max_jobs_per_host)
+    return orchestrator.run(jobs)
+
+
+def read_jobs(fd, commands):
+    """Read a list of jobs from a file.
+
+    Each line of the file defines a job using a JSON object with
+    the name of the backend (`backend`) and the list of arguments
+    given to its command (`args`), like in:
+
+        {"backend": "git", "args": ["https://github.com/chaoss/grimoirelab-perceval"]}
+
+    Empty lines are ignored.
+
+    :param fd: file object to read
+    :param commands: dict of `BackendCommand` classes indexed by name
+
+    :returns: a list of `FetchJob` objects
+
+    :raises BackendError: when a line is not valid or the backend
+        is unknown
+    """
+    jobs = []
+
+    for nline, line in enumerate(fd, start=1):
+        line = line.strip()
+
+        if not line:
+            continue
+
+        try:
+            entry = json.loads(line)
+            name = entry['backend']
+            args = entry.get('args', [])
+        except (ValueError, KeyError, TypeError) as e:
+            cause = "invalid job on line %s; %s" % (nline, str(e))
+            raise BackendError(cause=cause)
+
+        if name not in commands:
+            cause = "unknown backend %s on line %s" % (name, nline)
+            raise BackendError(cause=cause)
+
+        job = FetchJob.from_command(commands[name], *args)
+        jobs.append(job)
+
+    return jobs
+
+
+def _run_job(job_id, job, items_queue, stop_event):
+    """Fetch the items of a job and send them to the queue"""
+
+    backend_args = dict(job.backend_args)
+
+    try:
+        items = fetch(job.backend_class, backend_args, job.category,
+                      manager=job.manager)
+
+        for item in items:
+            if stop_event.is_set():
+                items.close()
+                break
+            items_queue.put((job_id, ITEM, item))
+    except Exception as e:
+        items_queue.put((job_id, FAILED, str(e)))
+    else:
+        items_queue.put((job_id, DONE, None))
+
+
+def _job_error_callback(job_id, items_queue):
+    """Notify jobs that could not be run by the executor"""
+
+    def notify(future):
+        if not future.cancelled() and future.exception():
+            items_queue.put((job_id, FAILED, str(future.exception())))
+
+    return notify
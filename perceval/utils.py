@@ -21,8 +21,11 @@
 #     Germán Poo-Caamaño <gpoo@gnome.org>
 #
 
+import collections
+import concurrent.futures
 import datetime
 import email
+import email.policy
 import logging
 import mailbox
 import re
@@ -47,6 +50,14 @@ DEFAULT_DATETIME = datetime.datetime(1970, 1, 1, 0, 0, 0,
 DEFAULT_LAST_DATETIME = datetime.datetime(2100, 1, 1, 0, 0, 0,
                                           tzinfo=dateutil.tz.tzutc())
 
+ILLEGAL_XML_UNICHRS = [(0x00, 0x08), (0x0B, 0x1F),
+                       (0x7F, 0x84), (0x86, 0x9F)]
+ILLEGAL_XML_REGEX = re.compile('[%s]' % ''.join(['%s-%s' % (chr(low), chr(high))
+                                                 for (low, high) in ILLEGAL_XML_UNICHRS
+                                                 if low < sys.maxunicode]))
+
+XML_CHUNK_SIZE = 64 * 1024
+
 
 def check_compressed_file_type(filepath):
     """Check if filename is a compressed file supported by the tool.
@@ -103,7 +114,7 @@ def months_range(from_date, to_date):
         pos = x
 
 
-def message_to_dict(msg):
+def message_to_dict(msg, max_body_size=None):
     """Convert an email message into a dictionary.
 
     This function transforms an `email.message.Message` object
@@ -112,21 +123,47 @@ def message_to_dict(msg):
     Body may have two other keys inside, 'plain', for plain body
     messages and 'html', for HTML encoded messages.
 
+    The size of the bodies can be limited with `max_body_size`.
+    Bodies longer than that number of characters are truncated
+    and, when it is 0, bodies are not decoded at all, so `body`
+    will be empty.
+
     The returned dictionary has the type `requests.structures.CaseInsensitiveDict`
     due to same headers with different case formats can appear in
     the same message.
 
     :param msg: email message of type `email.message.Message`
+    :param max_body_size: maximum number of characters of each type
+        of body; `None` for no limit
 
     :returns : dictionary of type `requests.structures.CaseInsensitiveDict`
 
     :raises ParseError: when an error occurs transforming the message
         to a dictionary
     """
+    def is_ascii(value):
+        # 'str.isascii' is not available before Python 3.7
+        try:
+            value.encode('ascii')
+        except UnicodeEncodeError:
+            return False
+        return True
+
     def parse_headers(msg):
         headers = {}
 
-        for header, value in msg.items():
+        # Values of 'compat32' messages are only modified when
+        # they are not ASCII, so they can be read as they are
+        raw = msg.policy is email.policy.compat32
+
+        for header, value in (msg.raw_items() if raw else msg.items()):
+            if raw:
+                # Fast path for headers without encoded words
+                if isinstance(value, str) and '=?' not in value and is_ascii(value):
+                    headers[header] = value if value else None
+                    continue
+                value = msg.policy.header_fetch_parse(header, value)
+
             hv = []
 
             for text, charset in email.header.decode_header(value):
@@ -146,20 +183,32 @@ def message_to_dict(msg):
 
     def parse_payload(msg):
         body = {}
+        sizes = collections.Counter()
 
         if not msg.is_multipart():
-            payload = decode_payload(msg)
-            subtype = msg.get_content_subtype()
-            body[subtype] = [payload]
+            parts = [msg]
         else:
             # Include all the attached texts if it is multipart
             # Ignores binary parts by default
-            for part in email.iterators.typed_subpart_iterator(msg):
-                payload = decode_payload(part)
-                subtype = part.get_content_subtype()
-                body.setdefault(subtype, []).append(payload)
+            parts = email.iterators.typed_subpart_iterator(msg)
+
+        for part in parts:
+            subtype = part.get_content_subtype()
+
+            # Parts beyond the limit are not decoded
+            if max_body_size is not None and sizes[subtype] >= max_body_size:
+                continue
+
+            payload = decode_payload(part)
+            body.setdefault(subtype, []).append(payload)
+            sizes[subtype] += len(payload) + 1
 
-        return {k: '\n'.join(v) for k, v in body.items()}
+        body = {k: '\n'.join(v) for k, v in body.items()}
+
+        if max_body_size is not None:
+            body = {k: v[:max_body_size] for k, v in body.items()}
+
+        return body
 
     def decode_payload(msg_or_part):
         charset = msg_or_part.get_content_charset('utf-8')
@@ -190,6 +239,44 @@ def message_to_dict(msg):
     return message
 
 
+def run_in_pool(func, tasks, max_workers):
+    """Run a list of tasks in a pool of processes.
+
+    Each task is a tuple with the arguments of `func`. Tasks and their
+    results are returned as pairs, following the order of the tasks.
+    The number of results waiting to be returned is limited, so the
+    memory needed does not depend on the number of tasks.
+
+    :param func: function to run; it must be defined at the top
+        level of a module, so it can be sent to the processes
+    :param tasks: iterable of tuples with the arguments of `func`
+    :param max_workers: number of processes of the pool
+
+    :returns: a generator of `(task, result)` tuples
+    """
+    max_pending = 2 * max_workers
+    pending = collections.deque()
+
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers=max_workers)
+
+    try:
+        for task in tasks:
+            if len(pending) == max_pending:
+                done, future = pending.popleft()
+                yield done, future.result()
+
+            future = executor.submit(func, *task)
+            pending.append((task, future))
+
+        while pending:
+            done, future = pending.popleft()
+            yield done, future.result()
+    finally:
+        for _, future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+
 def remove_invalid_xml_chars(raw_xml):
     """Remove control and invalid characters from an xml stream.
 
@@ -203,23 +290,7 @@ def remove_invalid_xml_chars(raw_xml):
 
     :returns: a purged XML stream
     """
-    illegal_unichrs = [(0x00, 0x08), (0x0B, 0x1F),
-                       (0x7F, 0x84), (0x86, 0x9F)]
-
-    illegal_ranges = ['%s-%s' % (chr(low), chr(high))
-                      for (low, high) in illegal_unichrs
-                      if low < sys.maxunicode]
-
-    illegal_xml_re = re.compile('[%s]' % ''.join(illegal_ranges))
-
-    purged_xml = ''
-
-    for c in raw_xml:
-        if illegal_xml_re.search(c) is not None:
-            c = ' '
-        purged_xml += c
-
-    return purged_xml
+    return ILLEGAL_XML_REGEX.sub(' ', raw_xml)
 
 
 def xml_to_dict(raw_xml):
@@ -241,31 +312,84 @@ def xml_to_dict(raw_xml):
     :raises ParseError: raised when an error occurs parsing the given
         XML stream
     """
-    def node_to_dict(node):
-        d = {}
-        d.update(node.items())
+    purged_xml = remove_invalid_xml_chars(raw_xml)
+
+    try:
+        tree = xml.etree.ElementTree.fromstring(purged_xml)
+    except xml.etree.ElementTree.ParseError as e:
+        cause = "XML stream %s" % (str(e))
+        raise ParseError(cause=cause)
 
-        text = getattr(node, 'text', None)
+    d = _xml_node_to_dict(tree)
 
-        if text is not None:
-            d['__text__'] = text
+    return d
 
-        childs = {}
-        for child in node:
-            childs.setdefault(child.tag, []).append(node_to_dict(child))
 
-        d.update(childs.items())
+def xml_to_dict_iter(raw_xml, tag):
+    """Convert the children of the root of a XML stream into dictionaries.
 
-        return d
+    This function works like `xml_to_dict` but, instead of converting
+    the whole stream, it returns a generator of dictionaries, one for
+    each child of the root element named `tag`. The stream is parsed
+    and purged of invalid characters in chunks. Children are discarded
+    once they are converted, so only one of them is kept in memory.
 
-    purged_xml = remove_invalid_xml_chars(raw_xml)
+    :param raw_xml: XML stream
+    :param tag: name of the children to convert
+
+    :returns: a generator of dicts with the XML data of the children
+
+    :raises ParseError: raised when an error occurs parsing the given
+        XML stream
+    """
+    def read_events():
+        parser = xml.etree.ElementTree.XMLPullParser(events=('start', 'end'))
+
+        for i in range(0, len(raw_xml), XML_CHUNK_SIZE):
+            parser.feed(remove_invalid_xml_chars(raw_xml[i:i + XML_CHUNK_SIZE]))
+            yield from parser.read_events()
+
+        parser.close()
+        yield from parser.read_events()
+
+    root = None
+    depth = 0
 
     try:
-        tree = xml.etree.ElementTree.fromstring(purged_xml)
+        for event, node in read_events():
+            if event == 'start':
+                if root is None:
+                    root = node
+                depth += 1
+                continue
+
+            depth -= 1
+
+            if depth != 1:
+                continue
+            if node.tag == tag:
+                yield _xml_node_to_dict(node)
+            root.remove(node)
     except xml.etree.ElementTree.ParseError as e:
         cause = "XML stream %s" % (str(e))
         raise ParseError(cause=cause)
 
-    d = node_to_dict(tree)
+
+def _xml_node_to_dict(node):
+    """Convert a XML node and its children into a dictionary"""
+
+    d = {}
+    d.update(node.items())
+
+    text = getattr(node, 'text', None)
+
+    if text is not None:
+        d['__text__'] = text
+
+    childs = {}
+    for child in node:
+        childs.setdefault(child.tag, []).append(_xml_node_to_dict(child))
+
+    d.update(childs.items())
 
     return d
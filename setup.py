@@ -110,6 +110,10 @@ setup(name="perceval",
           'urllib3>=1.22',
           'grimoirelab-toolkit>=0.1.4'
       ],
+      extras_require={
+          'zstd': ['zstandard'],
+          'lz4': ['lz4']
+      },
       scripts=[
           'bin/perceval'
       ],
@@ -49,6 +49,14 @@ class TestCaseBackendArchive(unittest.TestCase):
 
         self.assertEqual(len(items), len(items_archived))
 
+        # Replay the archive reading its entries sequentially
+        archive = Archive(self.archive.archive_path, lookahead=Archive.DEFAULT_LOOKAHEAD)
+        self.backend_read_archive.archive = archive
+        items_replayed = [item for item in self.backend_read_archive.fetch_from_archive()]
+        archive.close()
+
+        self.assertEqual(len(items), len(items_replayed))
+
         for i in range(len(items)):
             item = items[i]
             archived_item = items_archived[i]
@@ -57,3 +65,8 @@ class TestCaseBackendArchive(unittest.TestCase):
             del archived_item['timestamp']
 
             self.assertEqual(item, archived_item)
+
+            replayed_item = items_replayed[i]
+            del replayed_item['timestamp']
+
+            self.assertEqual(item, replayed_item)
@@ -35,7 +35,13 @@ import requests
 
 from grimoirelab_toolkit.datetime import datetime_utcnow, datetime_to_utc
 
-from perceval.archive import Archive, ArchiveManager
+from perceval.archive import (Archive,
+                              ArchiveCatalog,
+                              ArchiveManager,
+                              CompactCodec,
+                              LegacyPickleCodec,
+                              default_codec,
+                              find_codec)
 from perceval.errors import ArchiveError, ArchiveManagerError
 
 
@@ -189,26 +195,26 @@ class TestArchive(unittest.TestCase):
         ds = data_stored[0]
         dr = data_requests[0]
         self.assertEqual(ds[0], '0fa4ce047340780f08efca92f22027514263521d')
-        self.assertEqual(pickle.loads(ds[1]).url, responses[0].url)
+        self.assertEqual(archive.codec.decode(ds[1]).url, responses[0].url)
         self.assertEqual(ds[2], dr[0])
-        self.assertEqual(pickle.loads(ds[3]), dr[1])
-        self.assertEqual(pickle.loads(ds[4]), dr[2])
+        self.assertEqual(archive.codec.decode(ds[3]), dr[1])
+        self.assertEqual(archive.codec.decode(ds[4]), dr[2])
 
         ds = data_stored[1]
         dr = data_requests[1]
         self.assertEqual(ds[0], '3879a6f12828b7ac3a88b7167333e86168f2f5d2')
-        self.assertEqual(pickle.loads(ds[1]).url, responses[1].url)
+        self.assertEqual(archive.codec.decode(ds[1]).url, responses[1].url)
         self.assertEqual(ds[2], dr[0])
-        self.assertEqual(pickle.loads(ds[3]), dr[1])
-        self.assertEqual(pickle.loads(ds[4]), dr[2])
+        self.assertEqual(archive.codec.decode(ds[3]), dr[1])
+        self.assertEqual(archive.codec.decode(ds[4]), dr[2])
 
         ds = data_stored[2]
         dr = data_requests[2]
         self.assertEqual(ds[0], 'ef38f574a0745b63a056e7befdb7a06e7cf1549b')
-        self.assertEqual(pickle.loads(ds[1]).url, responses[2].url)
+        self.assertEqual(archive.codec.decode(ds[1]).url, responses[2].url)
         self.assertEqual(ds[2], dr[0])
-        self.assertEqual(pickle.loads(ds[3]), dr[1])
-        self.assertEqual(pickle.loads(ds[4]), dr[2])
+        self.assertEqual(archive.codec.decode(ds[3]), dr[1])
+        self.assertEqual(archive.codec.decode(ds[4]), dr[2])
 
     @httpretty.activate
     def test_store_duplicate(self):
@@ -233,6 +239,88 @@ class TestArchive(unittest.TestCase):
         with self.assertRaisesRegex(ArchiveError, "duplicated entry"):
             archive.store(url, payload, headers, response)
 
+    def test_store_buffered(self):
+        """Test whether data is written to disk in batches"""
+
+        archive_path = os.path.join(self.test_path, 'myarchive')
+        archive = Archive.create(archive_path, batch_size=3)
+
+        self.assertEqual(archive.batch_size, 3)
+        self.assertIsNone(archive.flush_interval)
+        self.assertTrue(archive.buffered)
+
+        archive.store('http://example.com/0', None, None, 'data0')
+        archive.store('http://example.com/1', None, None, 'data1')
+
+        # Pending entries are visible for the archive but not on disk
+        self.assertEqual(count_number_rows(archive_path, Archive.ARCHIVE_TABLE), 0)
+        self.assertEqual(archive.retrieve('http://example.com/1', None, None), 'data1')
+
+        # The batch is full, so entries are written
+        archive.store('http://example.com/2', None, None, 'data2')
+        self.assertEqual(count_number_rows(archive_path, Archive.ARCHIVE_TABLE), 3)
+
+        archive.store('http://example.com/3', None, None, 'data3')
+        self.assertEqual(count_number_rows(archive_path, Archive.ARCHIVE_TABLE), 3)
+
+        archive.flush()
+        self.assertEqual(count_number_rows(archive_path, Archive.ARCHIVE_TABLE), 4)
+
+        # WAL journaling is enabled on buffered archives
+        cursor = archive._db.execute("PRAGMA journal_mode")
+        self.assertEqual(cursor.fetchone()[0], 'wal')
+
+    def test_store_buffered_flush_interval(self):
+        """Test whether data is written to disk when the interval expires"""
+
+        archive_path = os.path.join(self.test_path, 'myarchive')
+        archive = Archive.create(archive_path, batch_size=100, flush_interval=60)
+
+        archive.store('http://example.com/0', None, None, 'data0')
+        self.assertEqual(count_number_rows(archive_path, Archive.ARCHIVE_TABLE), 0)
+
+        archive._last_flush -= 60
+
+        archive.store('http://example.com/1', None, None, 'data1')
+        self.assertEqual(count_number_rows(archive_path, Archive.ARCHIVE_TABLE), 2)
+
+    def test_store_buffered_duplicate(self):
+        """Test whether duplicated entries are detected before flushing them"""
+
+        archive_path = os.path.join(self.test_path, 'myarchive')
+        archive = Archive.create(archive_path, batch_size=10)
+
+        archive.store('http://example.com/0', None, None, 'data0')
+
+        with self.assertRaisesRegex(ArchiveError, "duplicated entry"):
+            archive.store('http://example.com/0', None, None, 'data0')
+
+        archive.flush()
+        self.assertEqual(count_number_rows(archive_path, Archive.ARCHIVE_TABLE), 1)
+
+    def test_close(self):
+        """Test whether pending entries are written when the archive is closed"""
+
+        archive_path = os.path.join(self.test_path, 'myarchive')
+        archive = Archive.create(archive_path, batch_size=10)
+
+        archive.store('http://example.com/0', None, None, 'data0')
+        archive.store('http://example.com/1', None, None, 'data1')
+        archive.close()
+
+        self.assertEqual(count_number_rows(archive_path, Archive.ARCHIVE_TABLE), 2)
+
+        # Closing the archive twice does not fail
+        archive.close()
+
+    def test_invalid_batch_size(self):
+        """Test whether an exception is raised when the batch size is invalid"""
+
+        archive_path = os.path.join(self.test_path, 'myarchive')
+
+        with self.assertRaisesRegex(ArchiveError, "batch size must be greater than 0"):
+            Archive.create(archive_path, batch_size=0)
+
     @httpretty.activate
     def test_retrieve(self):
         """Test whether data is properly retrieved from the archive"""
@@ -255,6 +343,56 @@ class TestArchive(unittest.TestCase):
 
         self.assertEqual(data.url, response.url)
 
+    def test_retrieve_lookahead(self):
+        """Test whether entries are retrieved reading the archive sequentially"""
+
+        archive_path = os.path.join(self.test_path, 'myarchive')
+        archive = Archive.create(archive_path)
+        archive.init_metadata('marvel.com', 'marvel-comics-backend', '0.1.0',
+                              'issue', {'from_date': None})
+
+        for x in range(10):
+            archive.store('http://example.com/%s' % x, None, None, 'data%s' % x)
+
+        archive = Archive(archive_path, lookahead=3)
+        self.assertEqual(archive.lookahead, 3)
+
+        with unittest.mock.patch.object(archive, '_retrieve_entry',
+                                        wraps=archive._retrieve_entry) as mock_retrieve:
+            # Entries retrieved in the same order they were stored
+            for x in range(3):
+                data = archive.retrieve('http://example.com/%s' % x, None, None)
+                self.assertEqual(data, 'data%s' % x)
+
+            self.assertEqual(mock_retrieve.call_count, 0)
+
+            # Entries in the lookahead window
+            self.assertEqual(archive.retrieve('http://example.com/5', None, None), 'data5')
+            self.assertEqual(archive.retrieve('http://example.com/3', None, None), 'data3')
+            self.assertEqual(archive.retrieve('http://example.com/4', None, None), 'data4')
+            self.assertEqual(mock_retrieve.call_count, 0)
+
+            # Entries out of the window or already retrieved are searched
+            self.assertEqual(archive.retrieve('http://example.com/9', None, None), 'data9')
+            self.assertEqual(mock_retrieve.call_count, 1)
+
+            self.assertEqual(archive.retrieve('http://example.com/0', None, None), 'data0')
+            self.assertEqual(mock_retrieve.call_count, 2)
+
+            # Entries read while looking for the previous ones are still available
+            self.assertEqual(archive.retrieve('http://example.com/7', None, None), 'data7')
+            self.assertEqual(archive.retrieve('http://example.com/9', None, None), 'data9')
+            self.assertEqual(mock_retrieve.call_count, 2)
+
+            # The oldest entries were discarded when the window was full
+            self.assertEqual(archive.retrieve('http://example.com/6', None, None), 'data6')
+            self.assertEqual(mock_retrieve.call_count, 3)
+
+            with self.assertRaisesRegex(ArchiveError, "not found in archive"):
+                archive.retrieve('http://example.com/10', None, None)
+
+        archive.close()
+
     def test_retrieve_missing(self):
         """Test whether the retrieval of non archived data throws an error
 
@@ -268,6 +406,156 @@ class TestArchive(unittest.TestCase):
         with self.assertRaisesRegex(ArchiveError, "not found in archive"):
             _ = archive.retrieve("http://wrong", payload={}, headers={})
 
+    @httpretty.activate
+    def test_retrieve_http_error(self):
+        """Test whether HTTP errors are properly retrieved from the archive"""
+
+        url = "https://example.com/tasks"
+
+        httpretty.register_uri(httpretty.GET,
+                               url,
+                               body='{"error": "not found"}',
+                               status=404)
+        response = requests.get(url)
+
+        try:
+            response.raise_for_status()
+        except requests.exceptions.HTTPError as e:
+            error = e
+
+        archive_path = os.path.join(self.test_path, 'myarchive')
+        archive = Archive.create(archive_path)
+        archive.store(url, None, None, error)
+
+        data = archive.retrieve(url, None, None)
+
+        self.assertIsInstance(data, requests.exceptions.HTTPError)
+        self.assertEqual(str(data), str(error))
+        self.assertEqual(data.response.status_code, 404)
+        self.assertEqual(data.response.text, '{"error": "not found"}')
+
+    def test_version(self):
+        """Test whether the codec is stored in the metadata"""
+
+        archive_path = os.path.join(self.test_path, 'myarchive')
+        archive = Archive.create(archive_path, codec=CompactCodec(compression=None))
+        self.assertIsNone(archive.version)
+
+        archive.init_metadata('marvel.com', 'marvel-comics-backend', '0.1.0',
+                              'issue', {'from_date': None})
+        archive.store('http://example.com/', None, None, {'item': 1})
+        self.assertEqual(archive.version, 'compact')
+
+        archive = Archive(archive_path)
+        self.assertEqual(archive.version, 'compact')
+        self.assertEqual(archive.codec.name, 'compact')
+        self.assertDictEqual(archive.retrieve('http://example.com/', None, None),
+                             {'item': 1})
+
+    def test_legacy_archive(self):
+        """Test whether archives created by older versions can be read"""
+
+        archive_path = os.path.join(self.test_path, 'myarchive')
+
+        conn = sqlite3.connect(archive_path)
+        conn.execute("CREATE TABLE metadata ( origin TEXT, backend_name TEXT, "
+                     "backend_version TEXT, category TEXT, backend_params BLOB, "
+                     "created_on TEXT)")
+        conn.execute(Archive.ARCHIVE_CREATE_STMT)
+        conn.execute("INSERT INTO metadata VALUES (?, ?, ?, ?, ?, ?)",
+                     ('marvel.com', 'marvel-comics-backend', '0.1.0', 'issue',
+                      pickle.dumps({'from_date': None}, 0), '2016-01-01T00:00:00+00:00'))
+        conn.execute("INSERT INTO archive VALUES (?, ?, ?, ?, ?, ?)",
+                     (None, Archive.make_hashcode('http://example.com/', None, None),
+                      'http://example.com/', pickle.dumps(None, 0), pickle.dumps(None, 0),
+                      pickle.dumps({'item': 1}, 0)))
+        conn.commit()
+        conn.close()
+
+        archive = Archive(archive_path)
+
+        self.assertIsNone(archive.version)
+        self.assertIsInstance(archive.codec, LegacyPickleCodec)
+        self.assertEqual(archive.origin, 'marvel.com')
+        self.assertDictEqual(archive.retrieve('http://example.com/', None, None),
+                             {'item': 1})
+
+
+class TestArchiveCodecs(unittest.TestCase):
+    """Archive codecs tests"""
+
+    @httpretty.activate
+    def test_compact_codec_response(self):
+        """Test whether responses are encoded and decoded"""
+
+        url = "https://example.com/tasks"
+
+        httpretty.register_uri(httpretty.GET,
+                               url,
+                               body='{"task": "my task"}',
+                               adding_headers={'Link': '<https://example.com/tasks?page=2>; rel="next"'},
+                               content_type='application/json; charset=utf-8',
+                               status=200)
+        response = requests.get(url, params={'page': 1})
+
+        for compression in [None, 'zlib']:
+            codec = CompactCodec(compression=compression)
+            decoded = codec.decode(codec.encode(response))
+
+            self.assertIsInstance(decoded, requests.Response)
+            self.assertEqual(decoded.status_code, 200)
+            self.assertEqual(decoded.url, response.url)
+            self.assertEqual(decoded.content, response.content)
+            self.assertEqual(decoded.text, '{"task": "my task"}')
+            self.assertDictEqual(decoded.json(), {'task': 'my task'})
+            self.assertEqual(decoded.encoding, 'utf-8')
+            self.assertEqual(decoded.headers['content-type'], 'application/json; charset=utf-8')
+            self.assertEqual(decoded.links['next']['url'], 'https://example.com/tasks?page=2')
+
+    def test_compact_codec_objects(self):
+        """Test whether any other object is encoded and decoded"""
+
+        codec = CompactCodec()
+
+        for obj in [None, {'q': 'issues'}, 'text', b'bytes', [1, 2, 3]]:
+            self.assertEqual(codec.decode(codec.encode(obj)), obj)
+
+        # Data is compressed
+        obj = 'a' * 1000
+        self.assertLess(len(codec.encode(obj)), len(LegacyPickleCodec().encode(obj)))
+
+    def test_compact_codec_not_supported(self):
+        """Test whether an exception is raised for unknown compressions"""
+
+        with self.assertRaisesRegex(ValueError, "rar compression not supported"):
+            CompactCodec(compression='rar')
+
+    def test_default_codec(self):
+        """Test whether the default codec compresses data"""
+
+        codec = default_codec()
+        self.assertIsInstance(codec, CompactCodec)
+        self.assertIn(codec.compression, ['zstd', 'lz4', 'zlib'])
+
+    def test_find_codec(self):
+        """Test whether codecs are found by their name"""
+
+        self.assertIsInstance(find_codec(None), LegacyPickleCodec)
+        self.assertIsInstance(find_codec('pickle-0'), LegacyPickleCodec)
+
+        codec = find_codec('compact-zlib')
+        self.assertIsInstance(codec, CompactCodec)
+        self.assertEqual(codec.compression, 'zlib')
+
+        codec = find_codec('compact')
+        self.assertIsNone(codec.compression)
+
+        with self.assertRaisesRegex(ArchiveError, "unknown archive codec mycodec"):
+            find_codec('mycodec')
+
+        with self.assertRaisesRegex(ArchiveError, "archive codec compact-rar not available"):
+            find_codec('compact-rar')
+
 
 ARCHIVE_TEST_DIR = 'archivedir'
 
@@ -353,6 +641,25 @@ class TestArchiveManager(unittest.TestCase):
         manager.remove_archive(archive.archive_path)
         self.assertEqual(os.path.exists(archive.archive_path), False)
 
+    def test_remove_buffered_archive(self):
+        """Test if a buffered archive and its journal files are removed"""
+
+        archive_mng_path = os.path.join(self.test_path, ARCHIVE_TEST_DIR)
+        manager = ArchiveManager(archive_mng_path, batch_size=10, flush_interval=5)
+
+        archive = manager.create_archive()
+        self.assertEqual(archive.batch_size, 10)
+        self.assertEqual(archive.flush_interval, 5)
+
+        archive.init_metadata('http://example.com/', 'MockBackend', '0.1', 'mock_item', {})
+        archive.store('http://example.com/0', None, None, 'data0')
+        archive.close()
+
+        manager.remove_archive(archive.archive_path)
+        self.assertEqual(os.path.exists(archive.archive_path), False)
+        self.assertEqual(os.path.exists(archive.archive_path + '-wal'), False)
+        self.assertEqual(os.path.exists(archive.archive_path + '-shm'), False)
+
     def test_remove_archive_not_found(self):
         """Test if an exception is raised when the archive is not found"""
 
@@ -468,6 +775,92 @@ class TestArchiveManager(unittest.TestCase):
         expected = [metadata[1]['filepath']]
         self.assertListEqual(archives, expected)
 
+    def test_search_removed_file(self):
+        """Check if archives removed from the filesystem are not returned"""
+
+        archive_mng_path = os.path.join(self.test_path, ARCHIVE_TEST_DIR)
+        manager = ArchiveManager(archive_mng_path)
+
+        dt = datetime_utcnow()
+
+        filepaths = []
+        for _ in range(2):
+            archive = manager.create_archive()
+            archive.init_metadata('https://example.com', 'git', '0.8', 'commit', {})
+            filepaths.append(archive.archive_path)
+
+        os.remove(filepaths[0])
+
+        archives = manager.search('https://example.com', 'git', 'commit', dt)
+        self.assertListEqual(archives, [filepaths[1]])
+
+    def test_catalog(self):
+        """Test whether the catalog is updated by the manager"""
+
+        archive_mng_path = os.path.join(self.test_path, ARCHIVE_TEST_DIR)
+        manager = ArchiveManager(archive_mng_path)
+
+        catalog_path = os.path.join(archive_mng_path, ArchiveCatalog.CATALOG_NAME)
+        self.assertIsInstance(manager.catalog, ArchiveCatalog)
+        self.assertEqual(manager.catalog.catalog_path, catalog_path)
+        self.assertEqual(os.path.exists(catalog_path), True)
+
+        archive = manager.create_archive()
+        self.assertEqual(count_number_rows(catalog_path, ArchiveCatalog.CATALOG_TABLE), 1)
+
+        archive.init_metadata('https://example.com', 'git', '0.8', 'commit', {})
+
+        conn = sqlite3.connect(catalog_path)
+        row = conn.execute("SELECT archive_path, origin, backend_name, backend_version, "
+                           "category, created_on FROM catalog").fetchone()
+        conn.close()
+
+        self.assertEqual(os.path.join(archive_mng_path, row[0]), archive.archive_path)
+        self.assertEqual(row[1], 'https://example.com')
+        self.assertEqual(row[2], 'git')
+        self.assertEqual(row[3], '0.8')
+        self.assertEqual(row[4], 'commit')
+        self.assertEqual(row[5], archive.created_on.timestamp())
+
+        manager.remove_archive(archive.archive_path)
+        self.assertEqual(count_number_rows(catalog_path, ArchiveCatalog.CATALOG_TABLE), 0)
+
+    def test_rebuild(self):
+        """Test whether the catalog is regenerated from the archive files"""
+
+        archive_mng_path = os.path.join(self.test_path, ARCHIVE_TEST_DIR)
+        os.makedirs(os.path.join(archive_mng_path, 'aa'))
+
+        # Archives created without the manager
+        dt = datetime_utcnow()
+        archive_path = os.path.join(archive_mng_path, 'aa', 'archive' + ArchiveManager.STORAGE_EXT)
+        archive = Archive.create(archive_path)
+        archive.init_metadata('https://example.com', 'git', '0.8', 'commit', {})
+
+        invalid_path = os.path.join(archive_mng_path, 'aa', 'invalid' + ArchiveManager.STORAGE_EXT)
+        with open(invalid_path, 'w') as fd:
+            fd.write('not an archive')
+
+        # Catalog does not exist, so it is built on init
+        manager = ArchiveManager(archive_mng_path)
+
+        archives = manager.search('https://example.com', 'git', 'commit', dt)
+        self.assertListEqual(archives, [archive_path])
+
+        # The catalog is out of sync until it is rebuilt
+        other_path = os.path.join(archive_mng_path, 'aa', 'other' + ArchiveManager.STORAGE_EXT)
+        archive = Archive.create(other_path)
+        archive.init_metadata('https://example.com', 'git', '0.8', 'commit', {})
+
+        archives = manager.search('https://example.com', 'git', 'commit', dt)
+        self.assertListEqual(archives, [archive_path])
+
+        nfound = manager.rebuild()
+        self.assertEqual(nfound, 2)
+
+        archives = manager.search('https://example.com', 'git', 'commit', dt)
+        self.assertListEqual(archives, [archive_path, other_path])
+
     def test_search_no_match(self):
         """Check if an empty set of archives is returned when none match the criteria"""
 
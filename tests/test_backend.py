@@ -506,6 +506,30 @@ class TestBackendCommandArgumentParser(unittest.TestCase):
         self.assertEqual(parsed_args.fetch_archive, True)
         self.assertEqual(parsed_args.no_archive, False)
         self.assertEqual(parsed_args.archived_since, expected_dt)
+        self.assertEqual(parsed_args.archive_batch_size, 1)
+        self.assertIsNone(parsed_args.archive_flush_interval)
+
+        args = ['--archive-batch-size', '100',
+                '--archive-flush-interval', '2.5']
+
+        parsed_args = parser.parse(*args)
+        self.assertEqual(parsed_args.archive_batch_size, 100)
+        self.assertEqual(parsed_args.archive_flush_interval, 2.5)
+
+    def test_parse_http_cache_args(self):
+        """Test if HTTP cache arguments are parsed"""
+
+        parser = BackendCommandArgumentParser(http_cache=True)
+
+        parsed_args = parser.parse()
+        self.assertIsNone(parsed_args.http_cache_path)
+
+        parsed_args = parser.parse('--http-cache-path', '/tmp/http.db')
+        self.assertEqual(parsed_args.http_cache_path, '/tmp/http.db')
+
+        parser = BackendCommandArgumentParser()
+        parsed_args = parser.parse()
+        self.assertNotIn('http_cache_path', parsed_args)
 
     def test_incompatible_fetch_archive_and_no_archive(self):
         """Test if fetch-archive and no-archive arguments are incompatible"""
@@ -1008,6 +1032,94 @@ class TestFetch(unittest.TestCase):
 
         self.assertEqual(len(filepaths), 0)
 
+    def test_remove_archive_on_close_error(self):
+        """Test whether an archive is removed and the original error raised when closing it fails"""
+
+        manager = ArchiveManager(self.test_path)
+
+        category = 'mock_item'
+        args = {
+            'origin': 'http://example.com/',
+            'tag': 'test',
+            'subtype': 'mocksubtype',
+            'from-date': str_to_datetime('2015-01-01')
+        }
+
+        items = fetch(ErrorCommandBackend, args, category, manager=manager)
+
+        # Only the first call, made while flushing the items, fails
+        close = Archive.close
+        errors = [ArchiveError(cause='flush error')]
+
+        def close_archive(archive):
+            close(archive)
+            if errors:
+                raise errors.pop()
+
+        with unittest.mock.patch('perceval.archive.Archive.close',
+                                 autospec=True, side_effect=close_archive):
+            with self.assertRaises(BackendError):
+                _ = [item for item in items]
+
+        filepaths = manager.search('http://example.com/', 'ErrorCommandBackend',
+                                   'mock_item', str_to_datetime('1970-01-01'))
+
+        self.assertEqual(len(filepaths), 0)
+
+    def test_items_storing_buffered_archive(self):
+        """Test whether items fetched are stored in a buffered archive"""
+
+        manager = ArchiveManager(self.test_path, batch_size=10)
+
+        category = 'mock_item'
+        args = {
+            'origin': 'http://example.com/',
+            'tag': 'test',
+            'subtype': 'mocksubtype',
+            'from-date': str_to_datetime('2015-01-01')
+        }
+
+        items = fetch(CommandBackend, args, category, manager=manager)
+        items = [item for item in items]
+
+        self.assertEqual(len(items), 5)
+
+        filepaths = manager.search('http://example.com/', 'CommandBackend',
+                                   'mock_item', str_to_datetime('1970-01-01'))
+        self.assertEqual(len(filepaths), 1)
+
+        # Pending items were written once the fetching process finished
+        conn = sqlite3.connect(filepaths[0])
+        nrows = conn.execute("SELECT COUNT(*) FROM archive").fetchone()[0]
+        conn.close()
+
+        self.assertEqual(nrows, 5)
+
+    def test_remove_buffered_archive_on_error(self):
+        """Test whether a buffered archive is removed when an unhandled exception occurs"""
+
+        manager = ArchiveManager(self.test_path, batch_size=10)
+
+        args = {
+            'origin': 'http://example.com/',
+            'tag': 'test',
+            'subtype': 'mocksubtype',
+            'from-date': str_to_datetime('2015-01-01')
+        }
+
+        items = fetch(ErrorCommandBackend, args, 'mock_item', manager=manager)
+
+        with self.assertRaises(BackendError):
+            _ = [item for item in items]
+
+        filepaths = manager.search('http://example.com/', 'ErrorCommandBackend',
+                                   'mock_item', str_to_datetime('1970-01-01'))
+
+        self.assertEqual(len(filepaths), 0)
+        archive_files = [f for _, _, files in os.walk(self.test_path)
+                         for f in files if ArchiveManager.STORAGE_EXT in f]
+        self.assertListEqual(archive_files, [])
+
 
 class TestFetchFromArchive(unittest.TestCase):
     """Unit tests for fetch_from_archive function"""
@@ -26,6 +26,7 @@ import datetime
 import os
 import shutil
 import unittest
+import urllib.parse
 
 import httpretty
 import pkg_resources
@@ -69,6 +70,8 @@ class TestBugzillaBackend(unittest.TestCase):
         self.assertEqual(bg.origin, BUGZILLA_SERVER_URL)
         self.assertEqual(bg.tag, 'test')
         self.assertEqual(bg.max_bugs, 5)
+        self.assertEqual(bg.max_workers, 1)
+        self.assertEqual(bg.activity_parser, 'bs4')
         self.assertIsNone(bg.client)
 
         # When tag is empty or None it will be set to
@@ -83,6 +86,15 @@ class TestBugzillaBackend(unittest.TestCase):
         self.assertEqual(bg.origin, BUGZILLA_SERVER_URL)
         self.assertEqual(bg.tag, BUGZILLA_SERVER_URL)
 
+        bg = Bugzilla(BUGZILLA_SERVER_URL, activity_parser='stream')
+        self.assertEqual(bg.activity_parser, 'stream')
+
+    def test_invalid_activity_parser(self):
+        """Test whether an exception is raised with an unknown activity parser"""
+
+        with self.assertRaisesRegex(BackendError, "unknown activity parser"):
+            Bugzilla(BUGZILLA_SERVER_URL, activity_parser='lxml')
+
     def test_has_archiving(self):
         """Test if it returns True when has_archiving is called"""
 
@@ -171,18 +183,6 @@ class TestBugzillaBackend(unittest.TestCase):
                 'order': ['changeddate'],
                 'chfieldfrom': ['1970-01-01 00:00:00']
             },
-            {
-                'ctype': ['csv'],
-                'limit': ['500'],
-                'order': ['changeddate'],
-                'chfieldfrom': ['2009-07-30 11:35:33']
-            },
-            {
-                'ctype': ['csv'],
-                'limit': ['500'],
-                'order': ['changeddate'],
-                'chfieldfrom': ['2015-08-12 18:32:11']
-            },
             {
                 'ctype': ['xml'],
                 'id': ['15', '18', '17', '20', '19'],
@@ -203,6 +203,18 @@ class TestBugzillaBackend(unittest.TestCase):
             {
                 'id': ['19']
             },
+            {
+                'ctype': ['csv'],
+                'limit': ['500'],
+                'order': ['changeddate'],
+                'chfieldfrom': ['2009-07-30 11:35:33']
+            },
+            {
+                'ctype': ['csv'],
+                'limit': ['500'],
+                'order': ['changeddate'],
+                'chfieldfrom': ['2015-08-12 18:32:11']
+            },
             {
                 'ctype': ['xml'],
                 'id': ['30', '888'],
@@ -221,6 +233,64 @@ class TestBugzillaBackend(unittest.TestCase):
         for i in range(len(expected)):
             self.assertDictEqual(requests[i].querystring, expected[i])
 
+    @httpretty.activate
+    def test_fetch_workers(self):
+        """Test whether bugs are returned in order when they are fetched in parallel"""
+
+        buglists = {
+            '1970-01-01 00:00:00': read_file('data/bugzilla/bugzilla_buglist.csv'),
+            '2009-07-30 11:35:33': read_file('data/bugzilla/bugzilla_buglist_next.csv'),
+            '2015-08-12 18:32:11': ""
+        }
+        details = {
+            '15': read_file('data/bugzilla/bugzilla_bugs_details.xml', mode='rb'),
+            '30': read_file('data/bugzilla/bugzilla_bugs_details_next.xml', mode='rb')
+        }
+        version = read_file('data/bugzilla/bugzilla_version.xml', mode='rb')
+        activity = read_file('data/bugzilla/bugzilla_bug_activity.html', mode='rb')
+        activity_empty = read_file('data/bugzilla/bugzilla_bug_activity_empty.html', mode='rb')
+
+        # The last request could belong to other thread;
+        # read the params of each request from its URI
+        def request_callback(method, uri, headers):
+            params = urllib.parse.parse_qs(urllib.parse.urlparse(uri).query)
+
+            if uri.startswith(BUGZILLA_BUGLIST_URL):
+                body = buglists[params['chfieldfrom'][0]]
+            elif uri.startswith(BUGZILLA_BUG_URL):
+                body = details[params['id'][0]] if 'id' in params else version
+            elif params['id'][0] in ['18', '20', '888']:
+                body = activity
+            else:
+                body = activity_empty
+
+            return (200, headers, body)
+
+        httpretty.register_uri(httpretty.GET,
+                               BUGZILLA_BUGLIST_URL,
+                               body=request_callback)
+        httpretty.register_uri(httpretty.GET,
+                               BUGZILLA_BUG_URL,
+                               body=request_callback)
+        httpretty.register_uri(httpretty.GET,
+                               BUGZILLA_BUG_ACTIVITY_URL,
+                               body=request_callback)
+
+        bg = Bugzilla(BUGZILLA_SERVER_URL,
+                      max_bugs=5, max_bugs_csv=500)
+        expected = [bug['data'] for bug in bg.fetch()]
+
+        bg = Bugzilla(BUGZILLA_SERVER_URL,
+                      max_bugs=5, max_bugs_csv=500, max_workers=4)
+        bugs = [bug['data'] for bug in bg.fetch()]
+
+        self.assertEqual(len(bugs), 7)
+        self.assertListEqual([bug['bug_id'][0]['__text__'] for bug in bugs],
+                             ['15', '18', '17', '20', '19', '30', '888'])
+        self.assertListEqual([len(bug['activity']) for bug in bugs],
+                             [0, 14, 0, 14, 0, 0, 14])
+        self.assertListEqual(bugs, expected)
+
     @httpretty.activate
     def test_fetch_from_date(self):
         """Test whether a list of bugs is returned from a given date"""
@@ -651,6 +721,20 @@ class TestBugzillaBackendParsers(unittest.TestCase):
             bugs = Bugzilla.parse_bugs_details(raw_xml)
             _ = [bug for bug in bugs]
 
+    def test_parse_truncated_bug_details(self):
+        """Test whether the bugs before the error are returned when the XML is truncated"""
+
+        raw_xml = read_file('data/bugzilla/bugzilla_bugs_details.xml')
+        raw_xml = raw_xml[:raw_xml.rindex('<bug>')]
+
+        bugs = Bugzilla.parse_bugs_details(raw_xml)
+
+        bug_ids = [next(bugs)['bug_id'][0]['__text__'] for _ in range(4)]
+        self.assertListEqual(bug_ids, ['15', '18', '17', '20'])
+
+        with self.assertRaises(ParseError):
+            _ = next(bugs)
+
     def test_parse_activity(self):
         """Test activity bug parsing"""
 
@@ -707,6 +791,69 @@ class TestBugzillaBackendParsers(unittest.TestCase):
             activity = Bugzilla.parse_bug_activity(raw_html)
             _ = [event for event in activity]
 
+    def test_parse_activity_stream(self):
+        """Test whether the stream parser returns the same activity than bs4"""
+
+        filenames = ['data/bugzilla/bugzilla_bug_activity.html',
+                     'data/bugzilla/bugzilla_bug_activity_empty.html',
+                     'data/bugzilla/bugzilla_bug_activity_empty_alt.html']
+
+        for filename in filenames:
+            raw_html = read_file(filename)
+
+            expected = [event for event in Bugzilla.parse_bug_activity(raw_html)]
+            activity = Bugzilla.parse_bug_activity(raw_html, parser='stream')
+            result = [event for event in activity]
+
+            self.assertListEqual(result, expected)
+
+        raw_html = read_file('data/bugzilla/bugzilla_bug_activity_not_valid.html')
+
+        with self.assertRaises(ParseError):
+            activity = Bugzilla.parse_bug_activity(raw_html, parser='stream')
+            _ = [event for event in activity]
+
+    def test_parse_activity_stream_unclosed_tags(self):
+        """Test whether the stream parser closes tags like bs4 does"""
+
+        raw_html = """
+            <table><tr><td>Menu</td></tr></table>
+            <a href="index.cgi">Home
+            <table>
+              <tr><th>Who</th><th>When</th><th>What</th><th>Removed</th><th>Added</th></tr>
+              <tr>
+                <td rowspan="2">jsmith&#64;example.com</td><td rowspan="2">2013-06-25</td>
+                <td><a href="attachment.cgi?id=1">Attachment <i>#1</i></td><td>0<br></td><td>1</td>
+              </tr>
+              <tr><td>Status</td><td><span>NEW</td><td>CLOSED &amp; <b>FIXED</b></td></tr>
+            </table>
+        """
+
+        expected = [event for event in Bugzilla.parse_bug_activity(raw_html)]
+        self.assertEqual(len(expected), 2)
+        self.assertEqual(expected[0]['What'], 'Attachment #1')
+        self.assertEqual(expected[1]['Added'], 'CLOSED & FIXED')
+
+        activity = Bugzilla.parse_bug_activity(raw_html, parser='stream')
+        result = [event for event in activity]
+        self.assertListEqual(result, expected)
+
+    def test_parse_activity_stream_incomplete(self):
+        """Test if it raises an exception when the activity table is incomplete"""
+
+        raw_html = """
+            <table>
+              <tr><th>Who</th><th>When</th><th>What</th><th>Removed</th><th>Added</th></tr>
+              <tr><td rowspan="2">jsmith</td><td rowspan="2">2013-06-25</td>
+                  <td>Status</td><td>NEW</td><td>CLOSED</td></tr>
+            </table>
+        """
+
+        for parser in ['bs4', 'stream']:
+            with self.assertRaisesRegex(ParseError, "incomplete"):
+                activity = Bugzilla.parse_bug_activity(raw_html, parser=parser)
+                _ = [event for event in activity]
+
 
 class TestBugzillaCommand(unittest.TestCase):
     """BugzillaCommand unit tests"""
@@ -739,6 +886,16 @@ class TestBugzillaCommand(unittest.TestCase):
         self.assertEqual(parsed_args.no_archive, True)
         self.assertEqual(parsed_args.url, BUGZILLA_SERVER_URL)
         self.assertEqual(parsed_args.from_date, DEFAULT_DATETIME)
+        self.assertEqual(parsed_args.max_workers, 1)
+        self.assertEqual(parsed_args.activity_parser, 'bs4')
+
+        args = ['--max-workers', '4',
+                '--activity-parser', 'stream',
+                BUGZILLA_SERVER_URL]
+
+        parsed_args = parser.parse(*args)
+        self.assertEqual(parsed_args.max_workers, 4)
+        self.assertEqual(parsed_args.activity_parser, 'stream')
 
 
 class TestBugzillaClient(unittest.TestCase):
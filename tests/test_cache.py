@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2019 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, 51 Franklin Street, Fifth Floor, Boston, MA 02110-1335, USA.
+#
+# Authors:
+#     Santiago Dueñas <sduenas@bitergia.com>
+#
+
+import os
+import shutil
+import tempfile
+import unittest
+import unittest.mock
+
+from perceval.cache import Cache, MemoryCache, SQLiteCache
+from perceval.errors import CacheError
+
+
+class TestCache(unittest.TestCase):
+    """Cache tests"""
+
+    def test_invalid_parameters(self):
+        """Test whether an exception is raised with invalid parameters"""
+
+        with self.assertRaisesRegex(CacheError, "max size must be greater than 0"):
+            Cache(max_size=0)
+        with self.assertRaisesRegex(CacheError, "ttl must be greater than 0"):
+            Cache(ttl=-1)
+
+    def test_not_implemented(self):
+        """Test whether the basic methods are not implemented"""
+
+        cache = Cache()
+
+        with self.assertRaises(NotImplementedError):
+            cache.get('key')
+        with self.assertRaises(NotImplementedError):
+            cache.set('key', 'value')
+        with self.assertRaises(NotImplementedError):
+            cache.clear()
+
+
+class CacheTestMixin:
+    """Tests shared by all the types of caches"""
+
+    def new_cache(self, max_size=None, ttl=None):
+        raise NotImplementedError
+
+    def test_get_set(self):
+        """Test whether values are stored and counted"""
+
+        cache = self.new_cache()
+        self.assertIsNone(cache.max_size)
+        self.assertIsNone(cache.ttl)
+
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('a', 'default'), 'default')
+
+        cache.set('a', '{"login": "a"}')
+        cache.set('b', ['b', 1])
+
+        self.assertEqual(cache.get('a'), '{"login": "a"}')
+        self.assertListEqual(cache.get('b'), ['b', 1])
+        self.assertEqual(len(cache), 2)
+
+        cache.set('a', 'x')
+        self.assertEqual(cache.get('a'), 'x')
+        self.assertEqual(len(cache), 2)
+
+        self.assertEqual(cache.hits, 3)
+        self.assertEqual(cache.misses, 2)
+
+    def test_set_many(self):
+        """Test whether several values are stored at once"""
+
+        cache = self.new_cache(max_size=3)
+        cache.set('a', 0)
+
+        cache.set_many([('a', 1), ('b', [2]), ('c', {'c': 3})])
+        self.assertEqual(len(cache), 3)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertListEqual(cache.get('b'), [2])
+        self.assertDictEqual(cache.get('c'), {'c': 3})
+
+        cache.set_many([])
+        self.assertEqual(len(cache), 3)
+
+    def test_max_size(self):
+        """Test whether the least recently used entries are evicted"""
+
+        cache = self.new_cache(max_size=2)
+
+        with unittest.mock.patch('perceval.cache.time.time') as mock_time:
+            mock_time.return_value = 1
+            cache.set('a', 1)
+            mock_time.return_value = 2
+            cache.set('b', 2)
+
+            # 'a' is used again, so 'b' will be evicted
+            mock_time.return_value = 3
+            self.assertEqual(cache.get('a'), 1)
+
+            mock_time.return_value = 4
+            cache.set('c', 3)
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_ttl(self):
+        """Test whether expired entries are not returned"""
+
+        cache = self.new_cache(ttl=10)
+
+        with unittest.mock.patch('perceval.cache.time.time') as mock_time:
+            mock_time.return_value = 100
+            cache.set('a', 1)
+            mock_time.return_value = 105
+            cache.set('b', 2)
+
+            mock_time.return_value = 109
+            self.assertEqual(cache.get('a'), 1)
+            self.assertEqual(cache.get('b'), 2)
+
+            mock_time.return_value = 110
+            self.assertIsNone(cache.get('a'))
+            self.assertEqual(cache.get('b'), 2)
+
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.hits, 3)
+        self.assertEqual(cache.misses, 1)
+
+    def test_clear(self):
+        """Test whether entries and counters are removed"""
+
+        cache = self.new_cache()
+        cache.set('a', 1)
+        cache.get('a')
+        cache.get('b')
+
+        cache.clear()
+
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.hits, 0)
+        self.assertEqual(cache.misses, 0)
+        self.assertIsNone(cache.get('a'))
+
+
+class TestMemoryCache(CacheTestMixin, unittest.TestCase):
+    """MemoryCache tests"""
+
+    def new_cache(self, max_size=None, ttl=None):
+        return MemoryCache(max_size=max_size, ttl=ttl)
+
+
+class TestSQLiteCache(CacheTestMixin, unittest.TestCase):
+    """SQLiteCache tests"""
+
+    def setUp(self):
+        self.test_path = tempfile.mkdtemp(prefix='perceval_')
+        self.cache_path = os.path.join(self.test_path, 'cache', 'users.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.test_path)
+
+    def new_cache(self, max_size=None, ttl=None):
+        return SQLiteCache(self.cache_path, max_size=max_size, ttl=ttl)
+
+    def test_persistence(self):
+        """Test whether entries are kept and shared between cache objects"""
+
+        cache = self.new_cache()
+        cache.set('a', {'login': 'a'})
+        self.assertTrue(os.path.exists(self.cache_path))
+
+        other = self.new_cache()
+        self.assertDictEqual(other.get('a'), {'login': 'a'})
+        self.assertEqual(other.hits, 1)
+        self.assertEqual(cache.hits, 0)
+
+        other.set('b', 2)
+        self.assertEqual(cache.get('b'), 2)
+
+        del cache
+        del other
+
+        cache = self.new_cache()
+        self.assertEqual(len(cache), 2)
+
+    def test_invalid_file(self):
+        """Test whether an exception is raised when the file is not a database"""
+
+        os.makedirs(os.path.dirname(self.cache_path))
+        with open(self.cache_path, 'w') as fd:
+            fd.write("this is not a database" * 100)
+
+        with self.assertRaisesRegex(CacheError, "initialization error"):
+            self.new_cache()
+
+
+if __name__ == "__main__":
+    unittest.main(warnings='ignore')
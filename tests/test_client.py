@@ -21,6 +21,7 @@
 #     Valerio Cosentino <valcos@bitergia.com>
 #
 
+import concurrent.futures
 import os
 import shutil
 import time
@@ -36,7 +37,9 @@ pkg_resources.declare_namespace('perceval.backends')
 from grimoirelab_toolkit.datetime import datetime_utcnow
 
 from perceval.archive import Archive
+from perceval.cache import MemoryCache
 from perceval.client import HttpClient, RateLimitHandler
+from perceval.errors import RateLimitError
 
 
 CLIENT_API_URL = "https://gateway.marvel.com/v1/"
@@ -59,18 +62,25 @@ class MockedClient(HttpClient, RateLimitHandler):
                  rate_limit_header=RateLimitHandler.RATE_LIMIT_HEADER,
                  rate_limit_reset_header=RateLimitHandler.RATE_LIMIT_RESET_HEADER,
                  define_calculate_time_to_reset=True,
-                 archive=None, from_archive=False, sanitize=False):
+                 archive=None, from_archive=False, sanitize=False, tokens=None,
+                 http_cache=None, pool_size=1):
 
         self.define_calculate_time_to_reset = define_calculate_time_to_reset
+        self.used_tokens = []
         MockedClient.sanitize = sanitize
         super().__init__(base_url, sleep_time=sleep_time, max_retries=max_retries,
                          extra_status_forcelist=extra_status_forcelist,
                          extra_retry_after_status=extra_retry_after_status,
-                         extra_headers=extra_headers, archive=archive, from_archive=from_archive)
+                         extra_headers=extra_headers, archive=archive, from_archive=from_archive,
+                         http_cache=http_cache, pool_size=pool_size)
         super().setup_rate_limit_handler(sleep_for_rate=sleep_for_rate,
                                          min_rate_to_sleep=min_rate_to_sleep,
                                          rate_limit_header=rate_limit_header,
-                                         rate_limit_reset_header=rate_limit_reset_header)
+                                         rate_limit_reset_header=rate_limit_reset_header,
+                                         tokens=tokens)
+
+    def set_token(self, token):
+        self.used_tokens.append(token)
 
     def calculate_time_to_reset(self):
         if self.define_calculate_time_to_reset:
@@ -107,6 +117,7 @@ class TestHttpClient(unittest.TestCase):
         self.assertEqual(client.raise_on_status, HttpClient.DEFAULT_RAISE_ON_STATUS)
         self.assertEqual(client.respect_retry_after_header, HttpClient.DEFAULT_RESPECT_RETRY_AFTER_HEADER)
         self.assertEqual(client.sleep_time, HttpClient.DEFAULT_SLEEP_TIME)
+        self.assertEqual(client.pool_size, 1)
 
         self.assertIsNotNone(client.session)
         self.assertEqual(client.session.headers['User-Agent'], HttpClient.DEFAULT_HEADERS.get('User-Agent'))
@@ -133,6 +144,24 @@ class TestHttpClient(unittest.TestCase):
         self.assertTrue(extra_status in client.status_forcelist)
         self.assertTrue(extra_status in client.retry_after_status)
 
+    def test_pool_size(self):
+        """Test whether the session keeps a connection for each thread"""
+
+        client = MockedClient(CLIENT_API_URL)
+
+        for prefix in ['http://', 'https://']:
+            adapter = client.session.get_adapter(prefix)
+            self.assertEqual(adapter._pool_maxsize, requests.adapters.DEFAULT_POOLSIZE)
+            self.assertEqual(adapter.max_retries.total, HttpClient.MAX_RETRIES)
+
+        client = MockedClient(CLIENT_API_URL, pool_size=32)
+        self.assertEqual(client.pool_size, 32)
+
+        for prefix in ['http://', 'https://']:
+            adapter = client.session.get_adapter(prefix)
+            self.assertEqual(adapter._pool_maxsize, 32)
+            self.assertEqual(adapter.max_retries.total, HttpClient.MAX_RETRIES)
+
     @httpretty.activate
     def test_close_session(self):
         """Test wheter the session is properly closed"""
@@ -270,6 +299,109 @@ class TestHttpClient(unittest.TestCase):
             with self.assertRaises(requests.exceptions.RetryError):
                 _ = client.fetch(url)
 
+    @httpretty.activate
+    def test_fetch_conditional(self):
+        """Test whether not modified responses are replaced by the cached ones"""
+
+        httpretty.register_uri(httpretty.GET,
+                               CLIENT_SPIDERMAN_URL,
+                               responses=[
+                                   httpretty.Response(body="spiderman", status=200,
+                                                      forcing_headers={
+                                                          'ETag': '"abcd"',
+                                                          'Last-Modified': 'Wed, 21 Oct 2015 07:28:00 GMT',
+                                                          'X-RateLimit-Remaining': '20'
+                                                      }),
+                                   httpretty.Response(body="", status=304,
+                                                      forcing_headers={
+                                                          'ETag': '"abcd"',
+                                                          'X-RateLimit-Remaining': '19'
+                                                      })
+                               ])
+
+        http_cache = MemoryCache()
+
+        client = MockedClient(CLIENT_API_URL, sleep_time=0.1, max_retries=1,
+                              http_cache=http_cache)
+        response = client.fetch(CLIENT_SPIDERMAN_URL, payload={'a': 'b'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.text, "spiderman")
+        self.assertNotIn('If-None-Match', httpretty.last_request().headers)
+        self.assertEqual(len(http_cache), 1)
+
+        response = client.fetch(CLIENT_SPIDERMAN_URL, payload={'a': 'b'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.text, "spiderman")
+        self.assertEqual(response.headers['X-RateLimit-Remaining'], '19')
+        self.assertEqual(response.headers['ETag'], '"abcd"')
+
+        request = httpretty.last_request()
+        self.assertEqual(request.headers['If-None-Match'], '"abcd"')
+        self.assertEqual(request.headers['If-Modified-Since'], 'Wed, 21 Oct 2015 07:28:00 GMT')
+        self.assertEqual(http_cache.hits, 1)
+
+    @httpretty.activate
+    def test_fetch_conditional_archive(self):
+        """Test whether cached responses are stored in the archive"""
+
+        httpretty.register_uri(httpretty.GET,
+                               CLIENT_SPIDERMAN_URL,
+                               responses=[
+                                   httpretty.Response(body="spiderman", status=200,
+                                                      forcing_headers={'ETag': '"abcd"'}),
+                                   httpretty.Response(body="", status=304,
+                                                      forcing_headers={'ETag': '"abcd"'})
+                               ])
+
+        http_cache = MemoryCache()
+
+        archive_path = os.path.join(self.test_path, 'myarchive')
+        archive = Archive.create(archive_path)
+
+        client = MockedClient(CLIENT_API_URL, sleep_time=0.1, max_retries=1,
+                              http_cache=http_cache)
+        client.fetch(CLIENT_SPIDERMAN_URL)
+
+        client = MockedClient(CLIENT_API_URL, sleep_time=0.1, max_retries=1,
+                              archive=archive, http_cache=http_cache)
+        response = client.fetch(CLIENT_SPIDERMAN_URL)
+        self.assertEqual(httpretty.last_request().headers['If-None-Match'], '"abcd"')
+
+        # Validators are not part of the archived request
+        client = MockedClient(CLIENT_API_URL, sleep_time=0.1, max_retries=1,
+                              archive=archive, from_archive=True, http_cache=http_cache)
+        answer_archive = client.fetch(CLIENT_SPIDERMAN_URL)
+
+        self.assertEqual(answer_archive.status_code, 200)
+        self.assertEqual(answer_archive.text, response.text)
+        self.assertEqual(answer_archive.text, "spiderman")
+
+    @httpretty.activate
+    def test_fetch_conditional_no_validators(self):
+        """Test whether responses without validators are not cached"""
+
+        httpretty.register_uri(httpretty.GET,
+                               CLIENT_SPIDERMAN_URL,
+                               body="spiderman",
+                               status=200)
+        httpretty.register_uri(httpretty.POST,
+                               CLIENT_SUPERMAN_URL,
+                               body="superman",
+                               status=200,
+                               forcing_headers={'ETag': '"abcd"'})
+
+        http_cache = MemoryCache()
+
+        client = MockedClient(CLIENT_API_URL, sleep_time=0.1, max_retries=1,
+                              http_cache=http_cache)
+        client.fetch(CLIENT_SPIDERMAN_URL)
+        client.fetch(CLIENT_SPIDERMAN_URL)
+        client.fetch(CLIENT_SUPERMAN_URL, method=HttpClient.POST)
+        client.fetch(CLIENT_SUPERMAN_URL, method=HttpClient.POST)
+
+        self.assertEqual(len(http_cache), 0)
+        self.assertNotIn('If-None-Match', httpretty.last_request().headers)
+
     @httpretty.activate
     def test_fetch_from_archive(self):
         """Test whether responses are correctly fecthed from an archive"""
@@ -430,6 +562,110 @@ class TestRateLimitHandler(unittest.TestCase):
 
         self.assertEqual(before, after)
 
+    @httpretty.activate
+    def test_select_token(self):
+        """Test whether the token with the highest rate is selected"""
+
+        httpretty.register_uri(httpretty.GET,
+                               CLIENT_SPIDERMAN_URL,
+                               body="",
+                               status=200,
+                               forcing_headers={
+                                   'X-RateLimit-Remaining': '20',
+                                   'X-RateLimit-Reset': '15'
+                               })
+        httpretty.register_uri(httpretty.GET,
+                               CLIENT_SUPERMAN_URL,
+                               body="",
+                               status=200,
+                               forcing_headers={
+                                   'X-RateLimit-Remaining': '5',
+                                   'X-RateLimit-Reset': '10'
+                               })
+
+        client = MockedClient(CLIENT_API_URL, sleep_time=0.1, max_retries=1,
+                              tokens=['aaa', 'bbb', 'ccc'])
+        self.assertListEqual(client.tokens, ['aaa', 'bbb', 'ccc'])
+        self.assertIsNone(client.current_token)
+
+        # Tokens with unknown rate go first
+        self.assertEqual(client.select_token(), 'aaa')
+        client.update_rate_limit(client.fetch(CLIENT_SPIDERMAN_URL))
+        self.assertEqual(client.select_token(), 'bbb')
+        client.update_rate_limit(client.fetch(CLIENT_SUPERMAN_URL))
+        self.assertEqual(client.select_token(), 'ccc')
+        client.update_rate_limit(client.fetch(CLIENT_SUPERMAN_URL))
+
+        # 'aaa' is the one with the highest rate
+        self.assertEqual(client.select_token(), 'aaa')
+        self.assertEqual(client.rate_limit, 20)
+        self.assertEqual(client.rate_limit_reset_ts, 15)
+
+        # The rate of a token can be updated after a rotation
+        client.update_rate_limit(client.fetch(CLIENT_SUPERMAN_URL), token='bbb')
+        self.assertEqual(client.select_token(), 'aaa')
+
+        # All are exhausted; the first to be reset is chosen
+        client.update_rate_limit(client.fetch(CLIENT_SUPERMAN_URL))
+        client._tokens_rate_limit['ccc'] = (5, 8)
+        self.assertEqual(client.select_token(), 'ccc')
+        self.assertEqual(client.rate_limit, 5)
+        self.assertEqual(client.rate_limit_reset_ts, 8)
+
+        self.assertListEqual(client.used_tokens, ['aaa', 'bbb', 'ccc', 'aaa', 'ccc'])
+
+    def test_sleep_for_rate_limit_tokens(self):
+        """Test whether the fetching process only sleeps when all the tokens are exhausted"""
+
+        client = MockedClient(CLIENT_API_URL, sleep_time=0.1, max_retries=1,
+                              min_rate_to_sleep=10, tokens=['aaa', 'bbb'])
+        client._tokens_rate_limit['aaa'] = (5, 10)
+        client._tokens_rate_limit['bbb'] = (50, 10)
+
+        client.sleep_for_rate_limit()
+        self.assertEqual(client.current_token, 'bbb')
+
+        client._tokens_rate_limit['bbb'] = (1, 10)
+
+        with self.assertRaises(RateLimitError):
+            client.sleep_for_rate_limit()
+
+    def test_select_token_workers(self):
+        """Test whether tokens are selected and updated by several threads at the same time"""
+
+        def make_response(remaining):
+            response = requests.Response()
+            response.headers['X-RateLimit-Remaining'] = str(remaining)
+            response.headers['X-RateLimit-Reset'] = '15'
+            return response
+
+        def fetch(remaining):
+            token = client.select_token()
+            client.update_rate_limit(make_response(remaining), token=token)
+            return token
+
+        client = MockedClient(CLIENT_API_URL, sleep_time=0.1, max_retries=1,
+                              min_rate_to_sleep=10, tokens=['aaa', 'bbb'])
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+            tokens = list(executor.map(fetch, range(1000, 0, -1)))
+
+        self.assertSetEqual(set(tokens), {'aaa', 'bbb'})
+
+        # Tokens are only set when they change
+        for previous, token in zip(client.used_tokens, client.used_tokens[1:]):
+            self.assertNotEqual(previous, token)
+
+        # The data of the handler belongs to the current token
+        self.assertIn(client.current_token, ['aaa', 'bbb'])
+        self.assertEqual((client.rate_limit, client.rate_limit_reset_ts),
+                         client._tokens_rate_limit[client.current_token])
+
+        for token in ['aaa', 'bbb']:
+            rate_limit, rate_limit_reset_ts = client._tokens_rate_limit[token]
+            self.assertLess(rate_limit, 1000)
+            self.assertEqual(rate_limit_reset_ts, 15)
+
 
 if __name__ == "__main__":
     unittest.main(warnings='ignore')
@@ -21,6 +21,7 @@
 #     Santiago Dueñas <sduenas@bitergia.com>
 #
 
+import pickle
 import unittest
 
 import perceval.errors as errors
@@ -62,6 +63,23 @@ class TestBaseError(unittest.TestCase):
         kwargs = {'code': 1, 'error': 'Fatal error'}
         self.assertRaises(KeyError, MockErrorArgs, **kwargs)
 
+    def test_pickle(self):
+        """Check if errors can be pickled and unpickled"""
+
+        e = MockErrorArgs(code=1, msg='Fatal error')
+        restored = pickle.loads(pickle.dumps(e))
+
+        self.assertIsInstance(restored, MockErrorArgs)
+        self.assertEqual(str(restored), str(e))
+
+        e = errors.RateLimitError(cause="client rate exhausted",
+                                  seconds_to_reset=10)
+        restored = pickle.loads(pickle.dumps(e))
+
+        self.assertIsInstance(restored, errors.RateLimitError)
+        self.assertEqual(str(restored), str(e))
+        self.assertEqual(restored.seconds_to_reset, 10)
+
 
 class TestArchiveError(unittest.TestCase):
 
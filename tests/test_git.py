@@ -22,6 +22,7 @@
 #
 
 import datetime
+import json
 import os
 import shutil
 import subprocess
@@ -35,7 +36,7 @@ import pkg_resources
 pkg_resources.declare_namespace('perceval.backends')
 
 from perceval.backend import BackendCommandArgumentParser, uuid
-from perceval.errors import RepositoryError
+from perceval.errors import ParseError, RepositoryError
 from perceval.utils import DEFAULT_DATETIME, DEFAULT_LAST_DATETIME
 from perceval.backends.core.git import (EmptyRepositoryError,
                                         Git,
@@ -474,6 +475,100 @@ class TestGitBackend(TestCaseGit):
 
         shutil.rmtree(new_path)
 
+    def test_fetch_max_workers(self):
+        """Test whether commits fetched in shards are the same as the sequential ones"""
+
+        new_path = os.path.join(self.tmp_path, 'newgit')
+
+        from_date = datetime.datetime(2012, 8, 14, 17, 30, 13)
+        to_date = datetime.datetime(2014, 2, 11, 22, 7, 49)
+
+        def fetch_data(git, **kwargs):
+            return [commit['data'] for commit in git.fetch(**kwargs)]
+
+        git = Git(self.git_path, new_path)
+        expected = fetch_data(git)
+        expected_dates = fetch_data(git, from_date=from_date, to_date=to_date)
+        expected_branch = fetch_data(git, branches=['lzp'])
+
+        self.assertEqual(len(expected), 9)
+        self.assertEqual(len(expected_dates), 6)
+        self.assertEqual(len(expected_branch), 7)
+
+        for max_workers in [2, 4]:
+            git = Git(self.git_path, new_path, max_workers=max_workers)
+            self.assertEqual(git.max_workers, max_workers)
+
+            commits = fetch_data(git)
+            self.assertListEqual(commits, expected)
+
+            commits = fetch_data(git, from_date=from_date, to_date=to_date)
+            self.assertListEqual(commits, expected_dates)
+
+            commits = fetch_data(git, branches=['lzp'])
+            self.assertListEqual(commits, expected_branch)
+
+            commits = fetch_data(git, branches=[])
+            self.assertListEqual(commits, [])
+
+        shutil.rmtree(new_path)
+
+    def test_fetch_max_workers_from_empty_repository(self):
+        """Test whether it parses in shards from empty repository"""
+
+        new_path = os.path.join(self.tmp_path, 'newgit')
+
+        git = Git(self.git_empty_path, new_path, max_workers=2)
+        commits = [commit for commit in git.fetch()]
+
+        self.assertListEqual(commits, [])
+
+        shutil.rmtree(new_path)
+
+    def test_fetch_maintenance(self):
+        """Test whether the repository is maintained after updating it"""
+
+        new_path = os.path.join(self.tmp_path, 'newgit')
+        graph_path = os.path.join(new_path, 'objects', 'info', 'commit-graphs')
+
+        git = Git(self.git_path, new_path)
+        self.assertFalse(git.maintenance)
+
+        commits = [commit for commit in git.fetch()]
+        self.assertEqual(len(commits), 9)
+        self.assertFalse(os.path.exists(graph_path))
+
+        git = Git(self.git_path, new_path, maintenance=True)
+        self.assertTrue(git.maintenance)
+
+        # No maintenance is done when the repository is not updated
+        commits = [commit for commit in git.fetch(no_update=True)]
+        self.assertEqual(len(commits), 9)
+        self.assertFalse(os.path.exists(graph_path))
+
+        commits = [commit for commit in git.fetch()]
+        self.assertEqual(len(commits), 9)
+        self.assertTrue(os.path.exists(graph_path))
+
+        shutil.rmtree(new_path)
+
+    def test_fetch_maintenance_error(self):
+        """Test whether commits are fetched when the maintenance fails"""
+
+        new_path = os.path.join(self.tmp_path, 'newgit')
+
+        git = Git(self.git_path, new_path, maintenance=True)
+
+        with unittest.mock.patch.object(GitRepository, 'maintain',
+                                        side_effect=RepositoryError(cause='error')):
+            with self.assertLogs('perceval.backends.core.git', level='WARNING') as cm:
+                commits = [commit for commit in git.fetch()]
+
+        self.assertEqual(len(commits), 9)
+        self.assertRegex(cm.output[0], 'repository maintenance failed; error')
+
+        shutil.rmtree(new_path)
+
     def test_fetch_from_empty_repository(self):
         """Test whether it parses from empty repository"""
 
@@ -659,6 +754,126 @@ class TestGitBackend(TestCaseGit):
         shutil.rmtree(editable_path)
         shutil.rmtree(new_path)
 
+    def test_fetch_incremental(self):
+        """Test whether only new commits are fetched in incremental mode"""
+
+        origin_path = os.path.join(self.tmp_repo_path, 'gittest')
+        editable_path = os.path.join(self.tmp_path, 'editgit')
+        new_path = os.path.join(self.tmp_path, 'newgit')
+        new_file = os.path.join(editable_path, 'newfile')
+
+        shutil.copytree(origin_path, editable_path)
+
+        def git_cmd(*args):
+            cmd = ['git', '-c', 'user.name="mock"',
+                   '-c', 'user.email="mock@example.com"']
+            cmd.extend(args)
+            subprocess.check_output(cmd, stderr=subprocess.STDOUT,
+                                    cwd=editable_path, env={'LANG': 'C'})
+
+        git = Git(editable_path, new_path)
+
+        # The first time, all the commits are fetched
+        commits = [commit for commit in git.fetch(incremental=True)]
+        self.assertEqual(len(commits), 9)
+        self.assertEqual(commits[0]['data']['commit'], 'bc57a9209f096a130dcc5ba7089a8663f758a703')
+        self.assertEqual(commits[-1]['data']['commit'], '456a68ee1407a77f3e804a30dff245bb6c6b872f')
+
+        # Nothing new
+        commits = [commit for commit in git.fetch(incremental=True)]
+        self.assertListEqual(commits, [])
+
+        # Add new commits to master
+        with open(new_file, 'w') as f:
+            f.write("Testing incremental mode")
+
+        git_cmd('add', new_file)
+        git_cmd('commit', '-m', 'Testing incremental')
+
+        commits = [commit for commit in git.fetch(incremental=True)]
+        self.assertEqual(len(commits), 1)
+        self.assertEqual(commits[0]['data']['message'], 'Testing incremental')
+
+        # Rewrite the history of master
+        git_cmd('reset', '--hard', 'HEAD~2')
+        git_cmd('commit', '--allow-empty', '-m', 'Rewritten history')
+
+        with self.assertLogs('perceval.backends.core.git', level='WARNING') as cm:
+            commits = [commit for commit in git.fetch(incremental=True)]
+
+        self.assertEqual(len(commits), 1)
+        self.assertEqual(commits[0]['data']['message'], 'Rewritten history')
+        self.assertRegex(cm.output[0], 'history was rewritten; 2 commits fetched before')
+
+        # Commits are fetched anyway when the repository is not incremental
+        commits = [commit for commit in git.fetch()]
+        self.assertEqual(len(commits), 9)
+
+        # Cleanup
+        shutil.rmtree(editable_path)
+        shutil.rmtree(new_path)
+
+    def test_fetch_commits_cache(self):
+        """Test whether cached commits are not parsed again"""
+
+        origin_path = os.path.join(self.tmp_repo_path, 'gittest')
+        editable_path = os.path.join(self.tmp_path, 'editgit')
+        new_path = os.path.join(self.tmp_path, 'newgit')
+        cache_path = os.path.join(self.tmp_path, 'cache', 'commits.db')
+
+        shutil.copytree(origin_path, editable_path)
+
+        git = Git(editable_path, new_path)
+        expected = [commit['data'] for commit in git.fetch()]
+
+        git = Git(editable_path, new_path, commits_cache_path=cache_path)
+
+        commits = [commit['data'] for commit in git.fetch()]
+        self.assertListEqual(commits, expected)
+
+        # Commits are read from the cache, only refs are updated
+        cmd = ['git', 'branch', 'mybranch', '589bb080f059834829a2a5955bebfd7c2baa110a']
+        subprocess.check_output(cmd, stderr=subprocess.STDOUT,
+                                cwd=editable_path, env={'LANG': 'C'})
+
+        with unittest.mock.patch('perceval.backends.core.git.GitRepository.log_commits') as mock_log:
+            commits = [commit['data'] for commit in git.fetch()]
+            self.assertFalse(mock_log.called)
+
+        self.assertEqual(len(commits), len(expected))
+
+        for commit, expected_commit in zip(commits, expected):
+            if commit['commit'] == '589bb080f059834829a2a5955bebfd7c2baa110a':
+                self.assertListEqual(commit['refs'], ['refs/heads/mybranch'])
+                commit['refs'] = expected_commit['refs']
+            self.assertDictEqual(commit, expected_commit)
+
+        # A filtered fetch is served from the cache too
+        from_date = datetime.datetime(2014, 2, 11, 22, 7, 49)
+
+        with unittest.mock.patch('perceval.backends.core.git.GitRepository.log_commits') as mock_log:
+            commits = [commit['data']['commit'] for commit in git.fetch(from_date=from_date)]
+            self.assertFalse(mock_log.called)
+
+        expected = [commit['data']['commit'] for commit in Git(editable_path, new_path).fetch(from_date=from_date)]
+        self.assertListEqual(commits, expected)
+
+        # Cleanup
+        shutil.rmtree(editable_path)
+        shutil.rmtree(new_path)
+
+    def test_fetch_incremental_from_empty_repository(self):
+        """Test whether it parses from empty repository in incremental mode"""
+
+        new_path = os.path.join(self.tmp_path, 'newgit')
+
+        git = Git(self.git_empty_path, new_path)
+
+        commits = [commit for commit in git.fetch(incremental=True)]
+        self.assertListEqual(commits, [])
+
+        shutil.rmtree(new_path)
+
     def test_fetch_from_file(self):
         """Test whether commits are fetched from a Git log file"""
 
@@ -737,6 +952,97 @@ class TestGitBackend(TestCaseGit):
         result = [commit for commit in commits]
         self.assertEqual(len(result), 1)
 
+    @unittest.mock.patch('perceval.backends.core.git.LOG_CHUNK_SIZE', 1)
+    def test_git_parser_chunks(self):
+        """Test if a git log file is parsed in chunks of commits"""
+
+        log_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data/git/git_log.txt")
+
+        with open(log_path, 'r') as f:
+            expected = [commit for commit in Git.parse_git_log_from_iter(f)]
+
+        self.assertEqual(len(expected), 10)
+
+        commits = [commit for commit in Git.parse_git_log_from_file(log_path)]
+        self.assertListEqual(commits, expected)
+
+        commits = [commit for commit in Git.parse_git_log_from_file(log_path, max_workers=2)]
+        self.assertListEqual(commits, expected)
+
+        log_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data/git/git_log_empty.txt")
+        commits = [commit for commit in Git.parse_git_log_from_file(log_path, max_workers=2)]
+        self.assertListEqual(commits, [])
+
+        # Empty files cannot be memory-mapped
+        empty_path = os.path.join(self.tmp_path, 'git_log_zero.txt')
+        open(empty_path, 'w').close()
+
+        commits = [commit for commit in Git.parse_git_log_from_file(empty_path)]
+        self.assertListEqual(commits, [])
+
+        os.remove(empty_path)
+
+    @unittest.mock.patch('perceval.backends.core.git.LOG_CHUNK_SIZE', 1)
+    def test_git_parser_chunks_bytes(self):
+        """Test if chunks parsed as bytes return the same commits than lines"""
+
+        filepath = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data/git/git_log_parsed.json')
+        with open(filepath, 'r') as f:
+            parsed = json.load(f)
+
+        logs = ['git_log.txt', 'git_log_merge.txt', 'git_log_trailers.txt', 'git_bad_cr.txt']
+
+        for log in logs:
+            log_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data/git/", log)
+
+            commits = [commit for commit in Git.parse_git_log_from_file(log_path)]
+            self.assertListEqual(commits, parsed[log])
+
+            commits = [commit for commit in Git.parse_git_log_from_file(log_path, max_workers=2)]
+            self.assertListEqual(commits, parsed[log])
+
+        # Non UTF-8 file names are escaped like when lines are decoded
+        log_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data/git/git_log.txt")
+        latin_path = os.path.join(self.tmp_path, 'git_log_latin.txt')
+
+        with open(log_path, 'rb') as f:
+            data = f.read().replace(b'aaa/otherthing', 'aaa/cañón'.encode('latin-1'))
+
+        with open(latin_path, 'wb') as f:
+            f.write(data)
+
+        with open(latin_path, 'r', errors='surrogateescape', newline='\n') as f:
+            expected = [commit for commit in Git.parse_git_log_from_iter(f)]
+
+        commits = [commit for commit in Git.parse_git_log_from_file(latin_path)]
+        self.assertListEqual(commits, expected)
+        self.assertIn('aaa/ca\udcf1\udcf3n', [f['file'] for c in commits for f in c['files']])
+
+        os.remove(latin_path)
+
+    @unittest.mock.patch('perceval.backends.core.git.LOG_CHUNK_SIZE', 1)
+    def test_git_parser_chunks_error(self):
+        """Test if lines of errors are counted from the beginning of the file"""
+
+        log_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data/git/git_log.txt")
+        invalid_path = os.path.join(self.tmp_path, 'git_log_invalid.txt')
+
+        with open(log_path, 'r') as f:
+            data = f.read()
+            nlines = data.count('\n')
+
+        with open(invalid_path, 'w') as f:
+            f.write(data)
+            f.write("\ncommit 0123\n")
+
+        with self.assertRaisesRegex(ParseError, "commit expected on line %s" % (nlines + 2)):
+            _ = [commit for commit in Git.parse_git_log_from_file(invalid_path)]
+
+        with self.assertRaisesRegex(ParseError, "commit expected on line %s" % (nlines + 2)):
+            _ = [commit for commit in Git.parse_git_log_from_file(invalid_path, max_workers=2)]
+
+        os.remove(invalid_path)
+
     def test_git_parser_from_iter(self):
         """Test if the static method parses a git log from a repository"""
 
@@ -826,16 +1132,41 @@ class TestGitCommand(TestCaseGit):
         self.assertEqual(parsed_args.to_date, DEFAULT_LAST_DATETIME)
         self.assertEqual(parsed_args.branches, None)
         self.assertTrue(parsed_args.no_update)
+        self.assertEqual(parsed_args.max_workers, 1)
 
         args = ['http://example.com/',
                 '--git-path', '/tmp/gitpath',
-                '--branches', 'master', 'testing']
+                '--branches', 'master', 'testing',
+                '--max-workers', '4']
 
         parsed_args = parser.parse(*args)
         self.assertEqual(parsed_args.git_path, '/tmp/gitpath')
         self.assertEqual(parsed_args.uri, 'http://example.com/')
         self.assertEqual(parsed_args.branches, ['master', 'testing'])
         self.assertFalse(parsed_args.no_update)
+        self.assertEqual(parsed_args.max_workers, 4)
+        self.assertFalse(parsed_args.maintenance)
+        self.assertIsNone(parsed_args.commits_cache_path)
+
+        self.assertFalse(parsed_args.incremental)
+
+        args = ['http://example.com/',
+                '--latest-items',
+                '--maintenance',
+                '--commits-cache-path', '/tmp/commits.db']
+
+        parsed_args = parser.parse(*args)
+        self.assertTrue(parsed_args.latest_items)
+        self.assertTrue(parsed_args.maintenance)
+        self.assertEqual(parsed_args.commits_cache_path, '/tmp/commits.db')
+        self.assertFalse(parsed_args.incremental)
+
+        args = ['http://example.com/',
+                '--incremental']
+
+        parsed_args = parser.parse(*args)
+        self.assertFalse(parsed_args.latest_items)
+        self.assertTrue(parsed_args.incremental)
 
     def test_mutual_exclusive_update(self):
         """Test whether an exception is thrown when no-update and latest-items flags are set"""
@@ -1068,6 +1399,205 @@ class TestGitParser(TestCaseGit):
 
         self.assertListEqual(commits, [])
 
+    def test_parser_baseline(self):
+        """Test if logs are parsed in the same way the regular expressions based parser did"""
+
+        # Commits parsed by GitParser before it was rewritten
+        filepath = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data/git/git_log_parsed.json')
+        with open(filepath, 'r') as f:
+            parsed = json.load(f)
+
+        logs = ['git_log.txt', 'git_log_merge.txt', 'git_log_trailers.txt',
+                'git_log_incompleted.txt', 'git_bad_cr.txt']
+
+        for log in logs:
+            filepath = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data/git/", log)
+
+            with open(filepath, 'r', errors='surrogateescape', newline='\n') as f:
+                commits = [commit for commit in GitParser(f).parse()]
+
+            self.assertListEqual(commits, parsed[log])
+
+    def test_parser_blocks(self):
+        """Test if blocks of bytes are parsed in the same way lines are"""
+
+        filepath = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data/git/git_log_parsed.json')
+        with open(filepath, 'r') as f:
+            parsed = json.load(f)
+
+        logs = ['git_log.txt', 'git_log_merge.txt', 'git_log_trailers.txt',
+                'git_log_incompleted.txt', 'git_bad_cr.txt']
+
+        for log in logs:
+            filepath = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data/git/", log)
+
+            with open(filepath, 'rb') as f:
+                data = f.read()
+
+            commits = [commit for commit in GitParser([data]).parse()]
+            self.assertListEqual(commits, parsed[log])
+
+            # One line per block
+            blocks = [line + b'\n' for line in data.split(b'\n')]
+            blocks[-1] = blocks[-1][:-1]
+            commits = [commit for commit in GitParser(blocks).parse()]
+            self.assertListEqual(commits, parsed[log])
+
+    def test_parser_blocks_unusual_lines(self):
+        """Test if unusual lines in blocks of bytes are parsed like lines"""
+
+        log = "\n".join([
+            "commit bc57a9209f096a130dcc5ba7089a8663f758a703",
+            "Author:     Eduardo Morais <companheiro.vermelho@example.com>",
+            "AuthorDate: Tue Aug 14 14:30:13 2012 -0300",
+            "Commit:     Eduardo Morais <companheiro.vermelho@example.com>",
+            "CommitDate: Tue Aug 14 14:30:13 2012 -0300",
+            "",
+            "    Cañón line",
+            "\t\t\t\tTabbed message line",
+            "",
+            ":100644 100644 e69de29... e69de29... M\tcañón.py",
+            ":100644 100644 e69de29... e69de29...  M\tbbb/bthing.py",
+            ":100644 100644 e69de29... e69de29... R100\taaa\t\tbbb",
+            "0\t0\tcañón.py",
+            "1 \t2\t bbb/bthing.py",
+            "-\t-\taaa\tbbb",
+            ""
+        ])
+
+        expected = [commit for commit in GitParser(log.splitlines(True)).parse()]
+        self.assertEqual(len(expected), 1)
+        self.assertEqual(len(expected[0]['files']), 4)
+
+        commits = [commit for commit in GitParser([log.encode('utf-8')]).parse()]
+        self.assertListEqual(commits, expected)
+
+        data = log.encode('latin-1')
+        expected = [commit for commit in GitParser(data.decode('latin-1').splitlines(True)).parse()]
+        commits = [commit for commit in GitParser([data], encoding='latin-1').parse()]
+        self.assertListEqual(commits, expected)
+
+    def test_match_action_line(self):
+        """Test if action lines are matched like the action pattern does"""
+
+        lines = [
+            ":100644 100644 e69de29... e69de29... M\tbbb/bthing.py",
+            ":100644 100644 e69de29... e69de29...  M\tbbb/bthing.py",
+            ":100644\t100644 e69de29... e69de29... M\tbbb/bthing.py",
+            ":100644 100644 e69de29.... e69de29... M\tbbb/bthing.py",
+            ":100644 100644 e69de29 e69de29\tbbb/bthing.py",
+            ":100644 100644 123456 e69de29... M\tbbb/bthing.py",
+            ":100644 100644 e69de29... e69de29... R100\t\taaa\t\t\tbbb\tccc",
+            ":100644 100644 e69de29... e69de29... R100\taaa\t\t",
+            ":100644 100644 e69de29... e69de29... R100\taaa\t",
+            ":100644 100644 e69de29... e69de29... M\t",
+            ":100644 e69de29... M bbb/bthing.py",
+            "100644 100644 e69de29... e69de29... M\tbbb/bthing.py",
+            ":1006440 100644 e69de29... e69de29... M\tbbb/bthing.py",
+            ":"
+        ]
+
+        parser = GitParser([])
+
+        for line in lines:
+            m = GitParser.GIT_ACTION_REGEXP.match(line)
+            expected = m.groupdict() if m else None
+            self.assertEqual(parser._match_action_line(line), expected, msg=repr(line))
+
+    def test_match_stats_line(self):
+        """Test if stats lines are matched like the stats pattern does"""
+
+        lines = [
+            "8\t7\tperceval/backends/gerrit.py",
+            "-\t-\tbinary.png",
+            "8 \t 7\t\t perceval/backends/gerrit.py",
+            "8\t7\t  ",
+            "8\t7\t ",
+            "8\t7\t",
+            "8\t\t",
+            "\u0663\t7\tfile",
+            "8a\t7\tfile",
+            "--\t7\tfile",
+            ""
+        ]
+
+        parser = GitParser([])
+
+        for line in lines:
+            m = GitParser.GIT_STATS_REGEXP.match(line)
+            expected = m.groupdict() if m else None
+            self.assertEqual(parser._match_stats_line(line), expected, msg=repr(line))
+
+    def test_parse_trailer(self):
+        """Test if trailers are parsed like the header and trailer pattern does"""
+
+        lines = [
+            "Signed-off-by: John Doe <jdoe@example.com>",
+            "Signed-off-by:\t \tJohn Doe <jdoe@example.com>",
+            "Signed-off-by:John Doe <jdoe@example.com>",
+            "Signed-off-by:  ",
+            "Signed-off-by: ",
+            "Signed-off-by:",
+            "Signed-off-by : John Doe <jdoe@example.com>",
+            "Reviewed-by: John Doe <jdoe@example.com>"
+        ]
+
+        for line in lines:
+            parser = GitParser([])
+            parser.commit = {}
+            parser._parse_trailer(line)
+
+            m = GitParser.GIT_HEADER_TRAILER_REGEXP.match(line)
+            if m and m.group('name') in GitParser.TRAILERS:
+                expected = {m.group('name'): [m.group('value')]}
+            else:
+                expected = {}
+
+            self.assertDictEqual(parser.commit, expected, msg=repr(line))
+
+    def test_parser_unusual_lines(self):
+        """Test if lines not following the usual format are parsed"""
+
+        log = [
+            "commit 456a68ee1407a77f3e804a30dff245bb6c6b872f",
+            "Author:     Eduardo Morais <companheiro.vermelho@example.com>",
+            "AuthorDate: Tue Aug 14 14:30:13 2012 -0300",
+            "Commit:     Eduardo Morais <companheiro.vermelho@example.com>",
+            "CommitDate: Tue Aug 14 14:30:13 2012 -0300",
+            "",
+            "    Unusual lines",
+            "",
+            ":100644 100644 e69de29... e69de29... M\tbbb/bthing.py",
+            "::100644 100644 100644 e69de29... e69de29... e69de29... MM\tccc/cthing.py",
+            "1\t0\t bbb/bthing.py",
+            "2  \t1\tccc/cthing.py"
+        ]
+
+        parser = GitParser(iter([line + '\n' for line in log]))
+        commits = [commit for commit in parser.parse()]
+
+        self.assertEqual(len(commits), 1)
+
+        expected = [
+            {
+                'file': 'bbb/bthing.py',
+                'modes': ['100644', '100644'],
+                'indexes': ['e69de29...', 'e69de29...'],
+                'action': 'M',
+                'added': '1',
+                'removed': '0'
+            },
+            {
+                'file': 'ccc/cthing.py',
+                'modes': ['100644', '100644', '100644'],
+                'indexes': ['e69de29...', 'e69de29...', 'e69de29...'],
+                'action': 'MM',
+                'added': '2',
+                'removed': '1'
+            }
+        ]
+        self.assertListEqual(commits[0]['files'], expected)
+
     def test_commit_pattern(self):
         """Test commit pattern"""
 
@@ -1454,6 +1984,257 @@ class TestGitRepository(TestCaseGit):
 
         shutil.rmtree(new_path)
 
+    def test_tips(self):
+        """Test if the commits at the tips of the references are returned"""
+
+        new_path = os.path.join(self.tmp_path, 'newgit')
+        repo = GitRepository.clone(self.git_path, new_path)
+
+        tips = repo.tips()
+        self.assertListEqual(sorted(tips),
+                             ['456a68ee1407a77f3e804a30dff245bb6c6b872f',
+                              '51a3b654f252210572297f47597b31527c475fb8'])
+
+        tips = repo.tips(branches=['lzp'])
+        self.assertListEqual(tips, ['51a3b654f252210572297f47597b31527c475fb8'])
+
+        tips = repo.tips(branches=[])
+        self.assertListEqual(tips, [])
+
+        shutil.rmtree(new_path)
+
+    def test_tips_from_empty_repository(self):
+        """Test if an exception is raised when the repository is empty"""
+
+        new_path = os.path.join(self.tmp_path, 'newgit')
+        repo = GitRepository.clone(self.git_empty_path, new_path)
+
+        with self.assertRaises(EmptyRepositoryError):
+            repo.tips()
+
+        shutil.rmtree(new_path)
+
+    def test_watermark(self):
+        """Test if the watermark is written and read"""
+
+        new_path = os.path.join(self.tmp_path, 'newgit')
+        repo = GitRepository.clone(self.git_path, new_path)
+
+        self.assertListEqual(repo.read_watermark(), [])
+
+        commits = ['589bb080f059834829a2a5955bebfd7c2baa110a',
+                   '51a3b654f252210572297f47597b31527c475fb8']
+        repo.write_watermark(commits)
+        self.assertListEqual(sorted(repo.read_watermark()), sorted(commits))
+
+        commits = ['456a68ee1407a77f3e804a30dff245bb6c6b872f',
+                   '51a3b654f252210572297f47597b31527c475fb8']
+        repo.write_watermark(commits)
+        self.assertListEqual(sorted(repo.read_watermark()), sorted(commits))
+
+        # Watermark references are not branches nor tags
+        refs = [ref.refname for ref in repo._discover_refs()]
+        self.assertNotIn('refs/perceval/watermark/456a68ee1407a77f3e804a30dff245bb6c6b872f', refs)
+
+        repo.write_watermark([])
+        self.assertListEqual(repo.read_watermark(), [])
+
+        shutil.rmtree(new_path)
+
+    def test_write_watermark_single_command(self):
+        """Test if the watermark is updated running a single command"""
+
+        new_path = os.path.join(self.tmp_path, 'newgit-watermark')
+        repo = GitRepository.clone(self.git_path, new_path)
+
+        commits = ['589bb080f059834829a2a5955bebfd7c2baa110a',
+                   '51a3b654f252210572297f47597b31527c475fb8']
+        repo.write_watermark(commits)
+
+        commits = ['456a68ee1407a77f3e804a30dff245bb6c6b872f',
+                   '51a3b654f252210572297f47597b31527c475fb8']
+
+        with unittest.mock.patch.object(GitRepository, '_exec',
+                                        wraps=GitRepository._exec) as mock_exec:
+            repo.write_watermark(commits)
+
+        cmds = [call.args[0] for call in mock_exec.call_args_list]
+        self.assertEqual(cmds.count(['git', 'update-ref', '--stdin']), 1)
+        self.assertListEqual(sorted(repo.read_watermark()), sorted(commits))
+
+        # Nothing is run when the watermark does not change
+        with unittest.mock.patch.object(GitRepository, '_exec',
+                                        wraps=GitRepository._exec) as mock_exec:
+            repo.write_watermark(commits)
+
+        cmds = [call.args[0] for call in mock_exec.call_args_list]
+        self.assertNotIn(['git', 'update-ref', '--stdin'], cmds)
+
+        shutil.rmtree(new_path)
+
+    def test_write_watermark_error(self):
+        """Test if no reference is updated when the watermark is not valid"""
+
+        new_path = os.path.join(self.tmp_path, 'newgit-watermark')
+        repo = GitRepository.clone(self.git_path, new_path)
+
+        commits = ['589bb080f059834829a2a5955bebfd7c2baa110a']
+        repo.write_watermark(commits)
+
+        with self.assertRaises(RepositoryError):
+            repo.write_watermark(['51a3b654f252210572297f47597b31527c475fb8',
+                                  'ffffffffffffffffffffffffffffffffffffffff'])
+
+        self.assertListEqual(repo.read_watermark(), commits)
+
+        shutil.rmtree(new_path)
+
+    def test_log_revisions(self):
+        """Test if the log of the commits between revisions is returned"""
+
+        new_path = os.path.join(self.tmp_path, 'newgit')
+        repo = GitRepository.clone(self.git_path, new_path)
+
+        gitlog = [line for line in repo.log_revisions(repo.tips())]
+        self.assertListEqual(gitlog, [line for line in repo.log()])
+
+        gitlog = repo.log_revisions(['456a68ee1407a77f3e804a30dff245bb6c6b872f'],
+                                    excluded=['589bb080f059834829a2a5955bebfd7c2baa110a'])
+        commits = [line[:14] for line in gitlog if line.startswith('commit ')]
+        self.assertListEqual(commits, ['commit ce8e0b8', 'commit 51a3b65', 'commit 456a68e'])
+
+        gitlog = [line for line in repo.log_revisions([])]
+        self.assertListEqual(gitlog, [])
+
+        shutil.rmtree(new_path)
+
+    def test_log_refs(self):
+        """Test if the commits and their refs are returned in log order"""
+
+        new_path = os.path.join(self.tmp_path, 'newgit')
+        repo = GitRepository.clone(self.git_path, new_path)
+
+        gitlog = [line for line in repo.log()]
+        expected = [(commit['commit'], commit['refs'])
+                    for commit in Git.parse_git_log_from_iter(gitlog)]
+
+        commits = [entry for entry in repo.log_refs()]
+        self.assertListEqual(commits, expected)
+        self.assertEqual(commits[-1], ('456a68ee1407a77f3e804a30dff245bb6c6b872f',
+                                       ['HEAD -> refs/heads/master']))
+
+        commits = [entry for entry in repo.log_refs(branches=['lzp'])]
+        self.assertEqual(len(commits), 7)
+        self.assertEqual(commits[-1], ('51a3b654f252210572297f47597b31527c475fb8',
+                                       ['refs/heads/lzp']))
+
+        commits = [entry for entry in repo.log_refs(branches=[])]
+        self.assertListEqual(commits, [])
+
+        shutil.rmtree(new_path)
+
+    def test_log_refs_from_empty_repository(self):
+        """Test if an exception is raised when the repository is empty"""
+
+        new_path = os.path.join(self.tmp_path, 'newgit')
+        repo = GitRepository.clone(self.git_empty_path, new_path)
+
+        with self.assertRaises(EmptyRepositoryError):
+            _ = [entry for entry in repo.log_refs()]
+
+        shutil.rmtree(new_path)
+
+    def test_count_commits(self):
+        """Test if the number of commits between revisions is returned"""
+
+        new_path = os.path.join(self.tmp_path, 'newgit')
+        repo = GitRepository.clone(self.git_path, new_path)
+
+        self.assertEqual(repo.count_commits(['456a68ee1407a77f3e804a30dff245bb6c6b872f']), 9)
+        self.assertEqual(repo.count_commits(['456a68ee1407a77f3e804a30dff245bb6c6b872f'],
+                                            excluded=['51a3b654f252210572297f47597b31527c475fb8']), 2)
+        self.assertEqual(repo.count_commits([]), 0)
+
+        shutil.rmtree(new_path)
+
+    def test_maintain(self):
+        """Test if maintenance tasks are run on the repository"""
+
+        new_path = os.path.join(self.tmp_path, 'newgit')
+        repo = GitRepository.clone(self.git_path, new_path)
+
+        timing = repo.maintain()
+
+        self.assertListEqual(list(timing.keys()),
+                             ['loose-objects', 'incremental-repack', 'commit-graph'])
+        for seconds in timing.values():
+            self.assertGreaterEqual(seconds, 0)
+
+        graph_path = os.path.join(new_path, 'objects', 'info', 'commit-graphs')
+        self.assertTrue(os.path.exists(graph_path))
+
+        midx_path = os.path.join(new_path, 'objects', 'pack', 'multi-pack-index')
+        self.assertTrue(os.path.exists(midx_path))
+
+        # The log is the same
+        gitlog = [line for line in repo.log()]
+        self.assertEqual(len(gitlog), 108)
+
+        # Running the tasks again does not fail
+        timing = repo.maintain()
+        self.assertEqual(len(timing), 3)
+
+        shutil.rmtree(new_path)
+
+    def test_maintain_old_git(self):
+        """Test if the tasks supported by older versions of git are run"""
+
+        new_path = os.path.join(self.tmp_path, 'newgit')
+        repo = GitRepository.clone(self.git_path, new_path)
+
+        with unittest.mock.patch.object(GitRepository, '_git_version', (2, 25)):
+            timing = repo.maintain()
+
+        self.assertListEqual(list(timing.keys()), ['gc', 'commit-graph'])
+
+        graph_path = os.path.join(new_path, 'objects', 'info', 'commit-graphs')
+        self.assertTrue(os.path.exists(graph_path))
+
+        with unittest.mock.patch.object(GitRepository, '_git_version', (2, 18)):
+            timing = repo.maintain()
+
+        self.assertListEqual(list(timing.keys()), ['gc'])
+
+        shutil.rmtree(new_path)
+
+    def test_git_version(self):
+        """Test if the version of git is read only once"""
+
+        outputs = [b'git version 2.30.1 (Apple Git-130)\n', b'git version 2.18.0.windows.1\n',
+                   b'unknown\n']
+        expected = [(2, 30), (2, 18), (0, 0)]
+
+        for output, version in zip(outputs, expected):
+            with unittest.mock.patch.object(GitRepository, '_git_version', None), \
+                    unittest.mock.patch.object(GitRepository, '_exec', return_value=output) as mock_exec:
+                self.assertEqual(GitRepository.git_version(), version)
+                self.assertEqual(GitRepository.git_version(), version)
+                self.assertEqual(mock_exec.call_count, 1)
+
+        version = GitRepository.git_version()
+        self.assertGreaterEqual(version, (1, 0))
+
+    def test_maintain_empty_repository(self):
+        """Test if maintenance is skipped when the repository is empty"""
+
+        new_path = os.path.join(self.tmp_path, 'newgit')
+        repo = GitRepository.clone(self.git_empty_path, new_path)
+
+        timing = repo.maintain()
+        self.assertDictEqual(timing, {})
+
+        shutil.rmtree(new_path)
+
     def test_update_empty_repository(self):
         """Test if no exception is raised when the repository is empty"""
 
@@ -1569,6 +2350,38 @@ class TestGitRepository(TestCaseGit):
 
         shutil.rmtree(new_path)
 
+    def test_read_commits_from_pack(self):
+        """Test if the commits of a pack are read from its index and data"""
+
+        new_path = os.path.join(self.tmp_path, 'newgit')
+
+        repo = GitRepository.clone(self.git_path, new_path)
+
+        # Pack all the objects, allowing deltas, into a single pack
+        cmd = ['git', 'repack', '-a', '-d', '-q', '--depth=50']
+        subprocess.check_output(cmd, stderr=subprocess.STDOUT,
+                                cwd=new_path, env={'LANG': 'C'})
+
+        packs = [filename for filename in os.listdir(os.path.join(new_path, 'objects', 'pack'))
+                 if filename.endswith('.pack')]
+        self.assertEqual(len(packs), 1)
+
+        pack_name = packs[0][len('pack-'):-len('.pack')]
+        commits = repo._read_commits_from_pack(pack_name)
+
+        cmd = ['git', 'verify-pack', '-v', 'objects/pack/' + packs[0]]
+        outs = subprocess.check_output(cmd, stderr=subprocess.STDOUT,
+                                       cwd=new_path, env={'LANG': 'C'})
+        lines = [line.split() for line in outs.decode('utf-8').split('\n')]
+        expected = [parts[0] for parts in lines if len(parts) > 1 and parts[1] == 'commit']
+        expected.reverse()
+
+        self.assertEqual(len(commits), 9)
+        self.assertListEqual(commits, expected)
+        self.assertListEqual(sorted(commits), sorted(repo.rev_list()))
+
+        shutil.rmtree(new_path)
+
     def test_rev_list(self):
         """Test rev-list command"""
 
@@ -1595,6 +2408,28 @@ class TestGitRepository(TestCaseGit):
 
         shutil.rmtree(new_path)
 
+    def test_rev_list_reverse_dates(self):
+        """Test rev-list command in reverse order and between dates"""
+
+        new_path = os.path.join(self.tmp_path, 'newgit')
+
+        repo = GitRepository.clone(self.git_path, new_path)
+        gitrev = repo.rev_list(from_date=datetime.datetime(2012, 8, 14, 17, 30, 13),
+                               to_date=datetime.datetime(2014, 2, 11, 22, 7, 49),
+                               reverse=True)
+        gitrev = [line for line in gitrev]
+
+        expected = ['bc57a9209f096a130dcc5ba7089a8663f758a703',
+                    '87783129c3f00d2c81a3a8e585eb86a47e39891a',
+                    '7debcf8a2f57f86663809c58b5c07a398be7674c',
+                    'c0d66f92a95e31c77be08dc9d0f11a16715d1885',
+                    'c6ba8f7a1058db3e6b4bc6f1090e932b107605fb',
+                    '589bb080f059834829a2a5955bebfd7c2baa110a']
+
+        self.assertListEqual(gitrev, expected)
+
+        shutil.rmtree(new_path)
+
     def test_rev_list_from_empty_repository(self):
         """Test if an exception is raised when the repository is empty"""
 
@@ -1621,6 +2456,26 @@ class TestGitRepository(TestCaseGit):
 
         shutil.rmtree(new_path)
 
+    def test_log_commits(self):
+        """Test if the log of a list of commits is returned in the given order"""
+
+        new_path = os.path.join(self.tmp_path, 'newgit')
+
+        repo = GitRepository.clone(self.git_path, new_path)
+        gitlog = repo.log_commits(['c6ba8f7a1058db3e6b4bc6f1090e932b107605fb',
+                                   'bc57a9209f096a130dcc5ba7089a8663f758a703'])
+        gitlog = [line for line in gitlog]
+
+        self.assertEqual(gitlog[0][:14], "commit c6ba8f7")
+        commit_lines = [line for line in gitlog if line.startswith('commit ')]
+        self.assertEqual(len(commit_lines), 2)
+        self.assertEqual(commit_lines[1][:14], "commit bc57a92")
+
+        gitlog = [line for line in repo.log_commits([])]
+        self.assertListEqual(gitlog, [])
+
+        shutil.rmtree(new_path)
+
     def test_log_to_date(self):
         """Test if commits are returned before the given date"""
 
@@ -1683,6 +2538,52 @@ class TestGitRepository(TestCaseGit):
 
         shutil.rmtree(new_path)
 
+    def test_exec_nb(self):
+        """Test if the output of a command is split in lines"""
+
+        output = "first line\nsecond\rline\r\ncañón\n\nno newline"
+        expected = ["first line\n", "second\rline\r\n", "cañón\n", "\n", "no newline"]
+
+        new_path = os.path.join(self.tmp_path, 'newgit')
+        repo = GitRepository.clone(self.git_path, new_path)
+
+        cmd = ['printf', '%s', output]
+        lines = [line for line in repo._exec_nb(cmd, cwd=new_path)]
+        self.assertListEqual(lines, expected)
+
+        # Small buffers split lines and multibyte characters
+        with unittest.mock.patch.object(GitRepository, 'READ_BUFFER_SIZE', 3):
+            lines = [line for line in repo._exec_nb(cmd, cwd=new_path)]
+        self.assertListEqual(lines, expected)
+
+        cmd = ['printf', '%s', "a\nb\n"]
+        lines = [line for line in repo._exec_nb(cmd, cwd=new_path)]
+        self.assertListEqual(lines, ["a\n", "b\n"])
+
+        # Blocks of whole lines are returned when no encoding is set
+        cmd = ['printf', '%s', output]
+        with unittest.mock.patch.object(GitRepository, 'READ_BUFFER_SIZE', 3):
+            blocks = [block for block in repo._exec_nb(cmd, cwd=new_path, encoding=None)]
+
+        self.assertEqual(b''.join(blocks), output.encode('utf-8'))
+        for block in blocks[:-1]:
+            self.assertTrue(block.endswith(b'\n'))
+
+        shutil.rmtree(new_path)
+
+    def test_exec_nb_error(self):
+        """Test if an exception is raised when the command fails"""
+
+        new_path = os.path.join(self.tmp_path, 'newgit')
+        repo = GitRepository.clone(self.git_path, new_path)
+
+        cmd = ['git', 'log', 'notfound']
+
+        with self.assertRaisesRegex(RepositoryError, "return code: 128"):
+            _ = [line for line in repo._exec_nb(cmd, cwd=new_path, env=repo.gitenv)]
+
+        shutil.rmtree(new_path)
+
     def test_git_show(self):
         """Test show command"""
 
@@ -24,6 +24,8 @@
 import datetime
 import dateutil
 import os
+import shutil
+import tempfile
 import time
 import unittest
 import unittest.mock
@@ -35,13 +37,16 @@ import requests
 pkg_resources.declare_namespace('perceval.backends')
 
 from grimoirelab_toolkit.datetime import datetime_utcnow
+from perceval.archive import Archive
 from perceval.backend import BackendCommandArgumentParser
+from perceval.cache import MemoryCache, SQLiteCache
 from perceval.client import RateLimitHandler
 from perceval.errors import RateLimitError
 from perceval.utils import (DEFAULT_DATETIME, DEFAULT_LAST_DATETIME)
 from perceval.backends.core.github import (GitHub,
                                            GitHubCommand,
                                            GitHubClient,
+                                           get_users_cache,
                                            CATEGORY_ISSUE,
                                            CATEGORY_PULL_REQUEST,
                                            CATEGORY_REPO)
@@ -383,6 +388,26 @@ class TestGitHubBackend(unittest.TestCase):
     def test_fetch_more_issues(self):
         """Test when return two issues"""
 
+        self._test_fetch_more_issues(max_workers=1)
+
+    @httpretty.activate
+    def test_fetch_more_issues_workers(self):
+        """Test whether issues are returned in order when they are fetched in parallel"""
+
+        self._test_fetch_more_issues(max_workers=4)
+
+    @httpretty.activate
+    def test_fetch_more_issues_workers_tokens(self):
+        """Test whether tokens are rotated when issues are fetched in parallel"""
+
+        github = self._test_fetch_more_issues(max_workers=4, api_token=['aaa', 'bbb'])
+
+        # Each request is sent with its token; the session is not modified
+        tokens = {request.headers['Authorization'] for request in httpretty.HTTPretty.latest_requests}
+        self.assertSetEqual(tokens, {'token aaa', 'token bbb'})
+        self.assertEqual(github.client.session.headers['Authorization'], 'token aaa')
+
+    def _test_fetch_more_issues(self, max_workers, api_token='aaa'):
         login = read_file('data/github/github_login')
         orgs = read_file('data/github/github_orgs')
         issue_1 = read_file('data/github/github_issue_1')
@@ -471,7 +496,7 @@ class TestGitHubBackend(unittest.TestCase):
                                    'X-RateLimit-Reset': '5'
                                })
 
-        github = GitHub("zhquan_example", "repo", "aaa")
+        github = GitHub("zhquan_example", "repo", api_token, max_workers=max_workers)
         issues = [issues for issues in github.fetch()]
 
         self.assertEqual(len(issues), 2)
@@ -503,10 +528,21 @@ class TestGitHubBackend(unittest.TestCase):
         self.assertEqual(issue['data']['comments_data'][0]['reactions']['total_count'],
                          len(issue['data']['comments_data'][0]['reactions_data']))
 
+        return github
+
     @httpretty.activate
     def test_fetch_more_pulls(self):
         """Test when return two pulls"""
 
+        self._test_fetch_more_pulls(max_workers=1)
+
+    @httpretty.activate
+    def test_fetch_more_pulls_workers(self):
+        """Test whether pulls are returned in order when they are fetched in parallel"""
+
+        self._test_fetch_more_pulls(max_workers=4)
+
+    def _test_fetch_more_pulls(self, max_workers):
         login = read_file('data/github/github_login')
         orgs = read_file('data/github/github_orgs')
         issue_1 = read_file('data/github/github_issue_1')
@@ -636,7 +672,7 @@ class TestGitHubBackend(unittest.TestCase):
                                    'X-RateLimit-Reset': '5'
                                })
 
-        github = GitHub("zhquan_example", "repo", "aaa")
+        github = GitHub("zhquan_example", "repo", "aaa", max_workers=max_workers)
         pulls = [pulls for pulls in github.fetch(category=CATEGORY_PULL_REQUEST, from_date=None)]
 
         self.assertEqual(len(pulls), 2)
@@ -903,6 +939,15 @@ class TestGitHubBackend(unittest.TestCase):
     def test_fetch_pulls_until_date(self):
         """Test when return one pull"""
 
+        self._test_fetch_pulls_until_date(max_workers=1)
+
+    @httpretty.activate
+    def test_fetch_pulls_until_date_workers(self):
+        """Test whether pulls fetched in parallel stop at the given date"""
+
+        self._test_fetch_pulls_until_date(max_workers=4)
+
+    def _test_fetch_pulls_until_date(self, max_workers):
         login = read_file('data/github/github_login')
         orgs = read_file('data/github/github_orgs')
         issue_1 = read_file('data/github/github_issue_1')
@@ -1032,7 +1077,7 @@ class TestGitHubBackend(unittest.TestCase):
                                    'X-RateLimit-Reset': '5'
                                })
 
-        github = GitHub("zhquan_example", "repo", "aaa")
+        github = GitHub("zhquan_example", "repo", "aaa", max_workers=max_workers)
         to_date = datetime.datetime(2016, 3, 1)
         pulls = [pulls for pulls in github.fetch(category=CATEGORY_PULL_REQUEST, to_date=to_date)]
 
@@ -1529,7 +1574,7 @@ class TestGitHubBackend(unittest.TestCase):
                                })
 
         # Check that 404 exception getting user orgs is managed
-        GitHubClient._users_orgs.clear()  # clean cache to get orgs using the API
+        GitHubClient._users_cache.clear()  # clean cache to get orgs using the API
         httpretty.register_uri(httpretty.GET,
                                GITHUB_ORGS_URL,
                                body=orgs, status=404,
@@ -1541,7 +1586,7 @@ class TestGitHubBackend(unittest.TestCase):
         _ = [issues for issues in github.fetch()]
 
         # Check that a no 402 exception getting user orgs is raised
-        GitHubClient._users_orgs.clear()
+        GitHubClient._users_cache.clear()
         httpretty.register_uri(httpretty.GET,
                                GITHUB_ORGS_URL,
                                body=orgs, status=402,
@@ -2542,6 +2587,175 @@ class TestGitHubClient(unittest.TestCase):
         response = client.user("zhquan_example")
         self.assertEqual(response, login)
 
+    @httpretty.activate
+    def test_users_cache(self):
+        """Test whether users and their orgs are fetched only once using a cache"""
+
+        login = read_file('data/github/github_login')
+        orgs = read_file('data/github/github_orgs')
+        rate_limit = read_file('data/github/rate_limit')
+
+        httpretty.register_uri(httpretty.GET,
+                               GITHUB_RATE_LIMIT,
+                               body=rate_limit,
+                               status=200,
+                               forcing_headers={
+                                   'X-RateLimit-Remaining': '20',
+                                   'X-RateLimit-Reset': '15'
+                               })
+        httpretty.register_uri(httpretty.GET,
+                               GITHUB_USER_URL,
+                               body=login, status=200,
+                               forcing_headers={
+                                   'X-RateLimit-Remaining': '20',
+                                   'X-RateLimit-Reset': '15'
+                               })
+        httpretty.register_uri(httpretty.GET,
+                               GITHUB_ORGS_URL,
+                               body=orgs, status=200,
+                               forcing_headers={
+                                   'X-RateLimit-Remaining': '20',
+                                   'X-RateLimit-Reset': '15'
+                               })
+
+        cache = MemoryCache()
+
+        client = GitHubClient("zhquan_example", "repo", "aaa", None, users_cache=cache)
+        self.assertEqual(client.user("zhquan_example"), login)
+        self.assertEqual(client.user_orgs("zhquan_example"), orgs)
+
+        # A new client shares the same cache
+        client = GitHubClient("zhquan_example", "repo", "aaa", None, users_cache=cache)
+        self.assertEqual(client.user("zhquan_example"), login)
+        self.assertEqual(client.user_orgs("zhquan_example"), orgs)
+
+        self.assertEqual(cache.hits, 2)
+        self.assertEqual(cache.misses, 2)
+        self.assertEqual(cache.get(GITHUB_USER_URL), login)
+
+        # Only the rate limit was requested by the second client
+        self.assertEqual(len(httpretty.HTTPretty.latest_requests), 4)
+        self.assertEqual(httpretty.last_request().path, "/rate_limit")
+
+    @httpretty.activate
+    def test_users_cache_archive(self):
+        """Test whether users are stored in the archive even when they are in the users cache"""
+
+        login = read_file('data/github/github_login')
+        rate_limit = read_file('data/github/rate_limit')
+
+        httpretty.register_uri(httpretty.GET,
+                               GITHUB_RATE_LIMIT,
+                               body=rate_limit,
+                               status=200,
+                               forcing_headers={
+                                   'X-RateLimit-Remaining': '20',
+                                   'X-RateLimit-Reset': '15'
+                               })
+        httpretty.register_uri(httpretty.GET,
+                               GITHUB_USER_URL,
+                               body=login, status=200,
+                               forcing_headers={
+                                   'X-RateLimit-Remaining': '20',
+                                   'X-RateLimit-Reset': '15'
+                               })
+
+        test_path = tempfile.mkdtemp(prefix='perceval_')
+        archive_path = os.path.join(test_path, 'myarchive')
+
+        cache = MemoryCache()
+        cache.set(GITHUB_ORGS_URL, '[]')
+
+        archive = Archive.create(archive_path)
+        archive.init_metadata('https://github.com/zhquan_example/repo', 'GitHub', '0.22.0',
+                              CATEGORY_ISSUE, {})
+        client = GitHubClient("zhquan_example", "repo", "aaa", None,
+                              archive=archive, users_cache=cache)
+        self.assertIs(client.users_cache, cache)
+        self.assertEqual(client.user("zhquan_example"), login)
+        self.assertEqual(client.user("zhquan_example"), login)
+        self.assertEqual(client.user_orgs("zhquan_example"), '[]')
+        self.assertEqual(client.user_orgs("zhquan_example"), '[]')
+        archive.close()
+
+        # The user was requested once and the orgs were
+        # found in the cache
+        requests_paths = [req.path for req in httpretty.HTTPretty.latest_requests]
+        self.assertListEqual(requests_paths, ["/rate_limit", "/users/zhquan_example"])
+
+        # The user and the orgs are read from the archive
+        httpretty.reset()
+        cache.clear()
+
+        client = GitHubClient("zhquan_example", "repo", "aaa", None,
+                              archive=Archive(archive_path), from_archive=True,
+                              users_cache=cache)
+        self.assertIsNot(client.users_cache, cache)
+        self.assertEqual(client.user("zhquan_example"), login)
+        self.assertEqual(client.user_orgs("zhquan_example"), '[]')
+        self.assertEqual(len(httpretty.HTTPretty.latest_requests), 0)
+        self.assertEqual(len(cache), 0)
+
+        shutil.rmtree(test_path)
+
+    def test_default_users_cache(self):
+        """Test whether the default users cache is bounded"""
+
+        self.assertEqual(GitHubClient._users_cache.max_size, GitHubClient.USERS_CACHE_SIZE)
+
+    def test_sanitize_for_archive(self):
+        """Test whether the token is removed from the headers of the requests"""
+
+        url = GITHUB_API_URL + '/users/zhquan_example'
+
+        headers = {'Authorization': 'token aaa'}
+        s_url, s_headers, s_payload = GitHubClient.sanitize_for_archive(url, headers, None)
+        self.assertEqual(s_url, url)
+        self.assertIsNone(s_headers)
+        self.assertIsNone(s_payload)
+        self.assertDictEqual(headers, {'Authorization': 'token aaa'})
+
+        headers = {'Authorization': 'token aaa', 'Accept': 'application/json'}
+        _, s_headers, _ = GitHubClient.sanitize_for_archive(url, headers, None)
+        self.assertDictEqual(s_headers, {'Accept': 'application/json'})
+
+        _, s_headers, _ = GitHubClient.sanitize_for_archive(url, None, None)
+        self.assertIsNone(s_headers)
+
+    @unittest.mock.patch('perceval.backends.core.github.GitHubClient._init_rate_limit')
+    def test_user_lock(self, mock_init_rate_limit):
+        """Test whether the number of locks of the users is fixed"""
+
+        client = GitHubClient("zhquan_example", "repo", "aaa", None)
+
+        locks = {id(client._user_lock(GITHUB_API_URL + "/users/user%s" % i)) for i in range(1000)}
+        self.assertLessEqual(len(locks), GitHubClient.USERS_LOCKS)
+        self.assertIs(client._user_lock(GITHUB_USER_URL), client._user_lock(GITHUB_USER_URL))
+        self.assertEqual(len(GitHubClient._users_locks), GitHubClient.USERS_LOCKS)
+
+    def test_get_users_cache(self):
+        """Test whether users caches are shared"""
+
+        self.assertEqual(get_users_cache(), GitHubClient._users_cache)
+
+        cache = get_users_cache(max_size=10, ttl=60)
+        self.assertIsInstance(cache, MemoryCache)
+        self.assertEqual(cache.max_size, 10)
+        self.assertEqual(cache.ttl, 60)
+        self.assertIs(get_users_cache(max_size=10, ttl=60), cache)
+        self.assertIsNot(get_users_cache(max_size=10), cache)
+
+        test_path = tempfile.mkdtemp(prefix='perceval_')
+
+        try:
+            cache_path = os.path.join(test_path, 'users.db')
+            cache = get_users_cache(cache_path)
+            self.assertIsInstance(cache, SQLiteCache)
+            self.assertEqual(cache.cache_path, cache_path)
+            self.assertIs(get_users_cache(cache_path), cache)
+        finally:
+            shutil.rmtree(test_path)
+
     @httpretty.activate
     def test_get_user_orgs(self):
         """Test get_user_orgs API call"""
@@ -2723,6 +2937,88 @@ class TestGitHubClient(unittest.TestCase):
         self.assertDictEqual(httpretty.last_request().querystring, expected)
         self.assertEqual(httpretty.last_request().headers["Authorization"], "token aaa")
 
+    @httpretty.activate
+    def test_tokens_rotation(self):
+        """Test whether the token with the highest rate is used on each request"""
+
+        issue_1 = read_file('data/github/github_empty_request')
+        issue_2 = read_file('data/github/github_empty_request')
+        rate_limit = read_file('data/github/rate_limit')
+
+        httpretty.register_uri(httpretty.GET,
+                               GITHUB_RATE_LIMIT,
+                               body=rate_limit,
+                               status=200,
+                               forcing_headers={
+                                   'X-RateLimit-Remaining': '20',
+                                   'X-RateLimit-Reset': '15'
+                               })
+        httpretty.register_uri(httpretty.GET,
+                               GITHUB_ISSUES_URL,
+                               body=issue_1,
+                               status=200,
+                               forcing_headers={
+                                   'X-RateLimit-Remaining': '15',
+                                   'X-RateLimit-Reset': '15',
+                                   'Link': '<' + GITHUB_ISSUES_URL + '/?&page=2>; rel="next", <' +
+                                           GITHUB_ISSUES_URL + '/?&page=3>; rel="last"'
+                               })
+        httpretty.register_uri(httpretty.GET,
+                               GITHUB_ISSUES_URL + '/?&page=2',
+                               body=issue_2,
+                               status=200,
+                               forcing_headers={
+                                   'X-RateLimit-Remaining': '19',
+                                   'X-RateLimit-Reset': '15'
+                               })
+
+        client = GitHubClient("zhquan_example", "repo", ["aaa", "bbb"], sleep_for_rate=False)
+        self.assertEqual(client.tokens, ["aaa", "bbb"])
+        self.assertEqual(client.token, "aaa")
+
+        issues = [issues for issues in client.issues()]
+        self.assertEqual(len(issues), 2)
+
+        # The rate of 'bbb' was unknown, so it was used first;
+        # then, 'aaa' (20 remaining) was better than 'bbb' (15)
+        tokens = [request.headers["Authorization"] for request in httpretty.HTTPretty.latest_requests]
+        self.assertListEqual(tokens, ["token aaa", "token bbb", "token aaa"])
+        self.assertEqual(client.token, "aaa")
+
+    @httpretty.activate
+    def test_tokens_exhausted(self):
+        """Test whether an exception is raised only when all tokens are exhausted"""
+
+        issue = read_file('data/github/github_empty_request')
+        rate_limit = read_file('data/github/rate_limit')
+
+        httpretty.register_uri(httpretty.GET,
+                               GITHUB_RATE_LIMIT,
+                               body=rate_limit,
+                               status=200,
+                               forcing_headers={
+                                   'X-RateLimit-Remaining': '0',
+                                   'X-RateLimit-Reset': '15'
+                               })
+        httpretty.register_uri(httpretty.GET,
+                               GITHUB_ISSUES_URL,
+                               body=issue,
+                               status=200,
+                               forcing_headers={
+                                   'X-RateLimit-Remaining': '0',
+                                   'X-RateLimit-Reset': '0',
+                                   'Link': '<' + GITHUB_ISSUES_URL + '/?&page=2>; rel="next", <' +
+                                           GITHUB_ISSUES_URL + '/?&page=3>; rel="last"'
+                               })
+
+        client = GitHubClient("zhquan_example", "repo", ["aaa", "bbb"], sleep_for_rate=False)
+
+        with self.assertRaises(RateLimitError):
+            _ = [issues for issues in client.issues()]
+
+        tokens = [request.headers["Authorization"] for request in httpretty.HTTPretty.latest_requests]
+        self.assertListEqual(tokens, ["token aaa", "token bbb"])
+
     @httpretty.activate
     def test_rate_limit_error(self):
         """Test get_page_issue API call"""
@@ -2790,6 +3086,10 @@ class TestGitHubCommand(unittest.TestCase):
                 '--from-date', '1970-01-01',
                 '--to-date', '2100-01-01',
                 '--enterprise-url', 'https://example.com',
+                '--max-workers', '4',
+                '--users-cache-path', '/tmp/users.db',
+                '--users-cache-size', '1000',
+                '--users-cache-ttl', '3600',
                 'zhquan_example', 'repo']
 
         parsed_args = parser.parse(*args)
@@ -2804,6 +3104,47 @@ class TestGitHubCommand(unittest.TestCase):
         self.assertEqual(parsed_args.to_date, DEFAULT_LAST_DATETIME)
         self.assertEqual(parsed_args.no_archive, True)
         self.assertEqual(parsed_args.api_token, 'abcdefgh')
+        self.assertEqual(parsed_args.max_workers, 4)
+        self.assertEqual(parsed_args.users_cache_path, '/tmp/users.db')
+        self.assertEqual(parsed_args.users_cache_size, 1000)
+        self.assertEqual(parsed_args.users_cache_ttl, 3600)
+        self.assertListEqual(parsed_args.extra_api_tokens, [])
+
+    def test_setup_cmd_parser_tokens(self):
+        """Test whether several tokens are given before and after the positional arguments"""
+
+        parser = GitHubCommand.setup_cmd_parser()
+
+        args = ['-t', 'abcdefgh', 'zhquan_example', 'repo']
+        parsed_args = parser.parse(*args)
+
+        self.assertEqual(parsed_args.owner, 'zhquan_example')
+        self.assertEqual(parsed_args.repository, 'repo')
+        self.assertEqual(parsed_args.api_token, 'abcdefgh')
+        self.assertListEqual(parsed_args.extra_api_tokens, [])
+
+        args = ['-t', 'abcdefgh', '--extra-api-token', 'ijklmnop',
+                'zhquan_example', 'repo', '--extra-api-token', 'qrstuvwx']
+        parsed_args = parser.parse(*args)
+
+        self.assertEqual(parsed_args.owner, 'zhquan_example')
+        self.assertEqual(parsed_args.repository, 'repo')
+        self.assertEqual(parsed_args.api_token, 'abcdefgh')
+        self.assertListEqual(parsed_args.extra_api_tokens, ['ijklmnop', 'qrstuvwx'])
+
+    def test_tokens_pool(self):
+        """Test whether the extra tokens are joined to the API token"""
+
+        cmd = GitHubCommand('-t', 'abcdefgh', '--extra-api-token', 'ijklmnop',
+                            '--no-archive', 'zhquan_example', 'repo')
+        self.assertListEqual(cmd.parsed_args.api_token, ['abcdefgh', 'ijklmnop'])
+
+        cmd = GitHubCommand('--extra-api-token', 'ijklmnop', '--no-archive',
+                            'zhquan_example', 'repo')
+        self.assertListEqual(cmd.parsed_args.api_token, ['ijklmnop'])
+
+        cmd = GitHubCommand('-t', 'abcdefgh', '--no-archive', 'zhquan_example', 'repo')
+        self.assertEqual(cmd.parsed_args.api_token, 'abcdefgh')
 
 
 if __name__ == "__main__":
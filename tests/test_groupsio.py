@@ -238,6 +238,8 @@ class TestGroupsioClient(unittest.TestCase):
         self.assertEqual(client.dirpath, self.tmp_path)
         self.assertEqual(client.group_name, 'beta+api')
         self.assertTrue(client.verify)
+        self.assertEqual(client.client.base_url, GROUPSIO_API_URL)
+        self.assertEqual(client.client.session.auth, client.auth)
 
         client = GroupsioClient('beta+api', self.tmp_path, 'aaaaa', verify=False)
 
@@ -246,6 +248,7 @@ class TestGroupsioClient(unittest.TestCase):
         self.assertEqual(client.dirpath, self.tmp_path)
         self.assertEqual(client.group_name, 'beta+api')
         self.assertFalse(client.verify)
+        self.assertFalse(client.client.verify)
 
     @httpretty.activate
     def test_fetch(self):
@@ -70,6 +70,10 @@ class TestHyperKittyList(unittest.TestCase):
         self.assertEqual(hkls.uri, HYPERKITTY_URL)
         self.assertEqual(hkls.dirpath, self.tmp_path)
         self.assertEqual(hkls.client.base_url, HYPERKITTY_URL)
+        self.assertEqual(hkls.client.max_downloads, 1)
+
+        hkls = HyperKittyList(HYPERKITTY_URL, self.tmp_path, max_downloads=4)
+        self.assertEqual(hkls.client.max_downloads, 4)
 
     @httpretty.activate
     @unittest.mock.patch('perceval.backends.core.hyperkitty.datetime_utcnow')
@@ -158,13 +162,16 @@ class TestHyperKittyBackend(unittest.TestCase):
     def test_initialization(self):
         """Test whether attributes are initializated"""
 
-        backend = HyperKitty('http://example.com/', self.tmp_path, tag='test')
+        backend = HyperKitty('http://example.com/', self.tmp_path, tag='test',
+                             index_path='/tmp/perceval/index.db')
 
         self.assertEqual(backend.url, 'http://example.com/')
         self.assertEqual(backend.uri, 'http://example.com/')
         self.assertEqual(backend.dirpath, self.tmp_path)
         self.assertEqual(backend.origin, 'http://example.com/')
         self.assertEqual(backend.tag, 'test')
+        self.assertEqual(backend.index_path, '/tmp/perceval/index.db')
+        self.assertEqual(backend.max_downloads, 1)
 
         # When tag is empty or None it will be set to
         # the value in uri
@@ -176,6 +183,9 @@ class TestHyperKittyBackend(unittest.TestCase):
         self.assertEqual(backend.origin, 'http://example.com/')
         self.assertEqual(backend.tag, 'http://example.com/')
 
+        backend = HyperKitty('http://example.com/', self.tmp_path, max_downloads=4)
+        self.assertEqual(backend.max_downloads, 4)
+
     def test_has_archiving(self):
         """Test if it returns False when has_archiving is called"""
 
@@ -310,13 +320,17 @@ class TestHyperKittyCommand(unittest.TestCase):
         args = ['http://example.com/archives/list/test@example.com/',
                 '--mboxes-path', '/tmp/perceval/',
                 '--tag', 'test',
-                '--from-date', '1970-01-01']
+                '--from-date', '1970-01-01',
+                '--index-path', '/tmp/perceval/index.db',
+                '--max-downloads', '4']
 
         parsed_args = parser.parse(*args)
         self.assertEqual(parsed_args.url, 'http://example.com/archives/list/test@example.com/')
         self.assertEqual(parsed_args.mboxes_path, '/tmp/perceval/')
         self.assertEqual(parsed_args.tag, 'test')
         self.assertEqual(parsed_args.from_date, DEFAULT_DATETIME)
+        self.assertEqual(parsed_args.index_path, '/tmp/perceval/index.db')
+        self.assertEqual(parsed_args.max_downloads, 4)
 
 
 if __name__ == "__main__":
@@ -23,6 +23,7 @@
 
 import bz2
 import datetime
+import email.utils
 import gzip
 import os
 import pkg_resources
@@ -32,15 +33,21 @@ import unittest
 import unittest.mock
 import zipfile
 
+import httpretty
+import requests
+
 pkg_resources.declare_namespace('perceval.backends')
 
 from perceval.backend import BackendCommandArgumentParser
-from perceval.utils import DEFAULT_DATETIME
+from perceval.utils import DEFAULT_DATETIME, DEFAULT_LAST_DATETIME
 from perceval.backends.core.mbox import (logger,
+                                         ArchiveDownloader,
                                          MBox,
                                          MBoxCommand,
                                          MBoxArchive,
-                                         MailingList)
+                                         MailingList,
+                                         _find_mbox_chunks,
+                                         _parse_mbox_chunk)
 
 
 class TestBaseMBox(unittest.TestCase):
@@ -219,6 +226,169 @@ class TestMailingList(TestBaseMBox):
             self.assertEqual(cm.output[-1], 'WARNING:perceval.backends.core.mbox:'
                                             'Ignoring zip mbox due to: ')
 
+    def test_mboxes_downloading(self):
+        """Check whether archives that are being downloaded are ignored"""
+
+        tmp_path = tempfile.mkdtemp(prefix='perceval_')
+        shutil.copy(self.files['single'], os.path.join(tmp_path, 'single.mbox'))
+        shutil.copy(self.files['single'], os.path.join(tmp_path, '.complex.mbox.part'))
+
+        mls = MailingList('test', tmp_path)
+        mboxes = mls.mboxes
+
+        self.assertEqual(len(mboxes), 1)
+        self.assertEqual(mboxes[0].filepath, os.path.join(tmp_path, 'single.mbox'))
+
+        shutil.rmtree(tmp_path)
+
+
+ARCHIVE_URL = 'http://example.com/2016-April.txt'
+
+
+def write_archive(r, filepath):
+    with open(filepath, 'wb') as fd:
+        fd.write(r.raw.read())
+
+
+class TestArchiveDownloader(unittest.TestCase):
+    """Tests for ArchiveDownloader class"""
+
+    def setUp(self):
+        self.tmp_path = tempfile.mkdtemp(prefix='perceval_')
+        self.filepath = os.path.join(self.tmp_path, '2016-April.txt')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_path)
+
+    def test_init(self):
+        """Check attributes initialization"""
+
+        client = ArchiveDownloader('http://example.com/')
+
+        self.assertEqual(client.base_url, 'http://example.com/')
+        self.assertEqual(client.max_downloads, 1)
+        self.assertTrue(client.verify)
+        self.assertIsNone(client.session.auth)
+
+        client = ArchiveDownloader('http://example.com/', max_downloads=16,
+                                   verify=False, auth=('user', 'pass'))
+
+        self.assertEqual(client.max_downloads, 16)
+        self.assertFalse(client.verify)
+        self.assertEqual(client.session.auth, ('user', 'pass'))
+
+        adapter = client.session.get_adapter('http://example.com/')
+        self.assertEqual(adapter._pool_maxsize, 16)
+
+    @httpretty.activate
+    def test_fetch_archive(self):
+        """Test whether archives are only downloaded when they were modified"""
+
+        httpretty.register_uri(httpretty.GET, ARCHIVE_URL,
+                               responses=[
+                                   httpretty.Response(body='aaa',
+                                                      last_modified='Sun, 10 Apr 2016 00:00:00 GMT'),
+                                   httpretty.Response(body='bbb'),
+                                   httpretty.Response(body='', status=304),
+                                   httpretty.Response(body='cccc')
+                               ])
+
+        client = ArchiveDownloader('http://example.com/')
+
+        downloaded = client.fetch_archive(ARCHIVE_URL, self.filepath, write_archive)
+        self.assertTrue(downloaded)
+        self.assertIsNone(httpretty.last_request().headers.get('If-Modified-Since'))
+
+        with open(self.filepath, 'r') as fd:
+            self.assertEqual(fd.read(), 'aaa')
+
+        # The date of the server is kept
+        mtime = os.stat(self.filepath).st_mtime
+        self.assertEqual(mtime, datetime.datetime(2016, 4, 10, tzinfo=datetime.timezone.utc).timestamp())
+
+        # Modified archives with the same size are downloaded
+        downloaded = client.fetch_archive(ARCHIVE_URL, self.filepath, write_archive)
+        self.assertTrue(downloaded)
+        self.assertEqual(httpretty.last_request().headers['If-Modified-Since'],
+                         email.utils.formatdate(mtime, usegmt=True))
+
+        with open(self.filepath, 'r') as fd:
+            self.assertEqual(fd.read(), 'bbb')
+
+        # Not modified
+        downloaded = client.fetch_archive(ARCHIVE_URL, self.filepath, write_archive)
+        self.assertFalse(downloaded)
+
+        with open(self.filepath, 'r') as fd:
+            self.assertEqual(fd.read(), 'bbb')
+
+        downloaded = client.fetch_archive(ARCHIVE_URL, self.filepath, write_archive)
+        self.assertTrue(downloaded)
+
+        with open(self.filepath, 'r') as fd:
+            self.assertEqual(fd.read(), 'cccc')
+
+        self.assertListEqual(os.listdir(self.tmp_path), ['2016-April.txt'])
+
+    @httpretty.activate
+    def test_fetch_archive_write_error(self):
+        """Test whether stored archives are kept when the download fails"""
+
+        def write_error(r, filepath):
+            with open(filepath, 'wb') as fd:
+                fd.write(r.raw.read(2))
+            raise OSError
+
+        httpretty.register_uri(httpretty.GET, ARCHIVE_URL,
+                               body='bbbb')
+
+        with open(self.filepath, 'w') as fd:
+            fd.write('aaa')
+
+        client = ArchiveDownloader('http://example.com/')
+
+        with self.assertRaises(OSError):
+            client.fetch_archive(ARCHIVE_URL, self.filepath, write_error)
+
+        with open(self.filepath, 'r') as fd:
+            self.assertEqual(fd.read(), 'aaa')
+
+        self.assertListEqual(os.listdir(self.tmp_path), ['2016-April.txt'])
+
+    @httpretty.activate
+    def test_fetch_archive_http_error(self):
+        """Test whether HTTP errors are raised"""
+
+        httpretty.register_uri(httpretty.GET, ARCHIVE_URL,
+                               body='', status=404)
+
+        client = ArchiveDownloader('http://example.com/')
+
+        with self.assertRaises(requests.exceptions.HTTPError):
+            client.fetch_archive(ARCHIVE_URL, self.filepath, write_archive)
+
+        self.assertFalse(os.path.exists(self.filepath))
+
+    def test_run(self):
+        """Test whether results are returned following the order of the tasks"""
+
+        def power(x, y):
+            if x < 0:
+                raise ValueError
+            return x ** y
+
+        tasks = [(x, 2) for x in range(10)]
+        expected = [x ** 2 for x in range(10)]
+
+        for max_downloads in [1, 4]:
+            client = ArchiveDownloader('http://example.com/', max_downloads=max_downloads)
+
+            results = client.run(power, tasks)
+            self.assertListEqual(results, expected)
+
+            with self.assertRaises(ValueError):
+                client.run(power, tasks + [(-1, 2)])
+
 
 class TestMBoxBackend(TestBaseMBox):
     """Tests for MBox backend"""
@@ -240,6 +410,9 @@ class TestMBoxBackend(TestBaseMBox):
         self.assertEqual(backend.dirpath, self.tmp_path)
         self.assertEqual(backend.origin, 'http://example.com/')
         self.assertEqual(backend.tag, 'test')
+        self.assertEqual(backend.max_workers, 1)
+        self.assertIsNone(backend.index_path)
+        self.assertIsNone(backend.max_body_size)
 
         # When origin is empty or None it will be set to
         # the value in uri
@@ -247,6 +420,12 @@ class TestMBoxBackend(TestBaseMBox):
         self.assertEqual(backend.origin, 'http://example.com/')
         self.assertEqual(backend.tag, 'http://example.com/')
 
+        backend = MBox('http://example.com/', self.tmp_path, max_workers=4)
+        self.assertEqual(backend.max_workers, 4)
+
+        backend = MBox('http://example.com/', self.tmp_path, max_body_size=0)
+        self.assertEqual(backend.max_body_size, 0)
+
         backend = MBox('http://example.com/', self.tmp_path, tag='')
         self.assertEqual(backend.origin, 'http://example.com/')
         self.assertEqual(backend.tag, 'http://example.com/')
@@ -322,6 +501,244 @@ class TestMBoxBackend(TestBaseMBox):
             self.assertEqual(message['category'], 'message')
             self.assertEqual(message['tag'], 'http://example.com/')
 
+    def test_fetch_workers(self):
+        """Test whether messages are the same when they are parsed in parallel"""
+
+        backend = MBox('http://example.com/', self.tmp_path)
+        expected = [m for m in backend.fetch(from_date=None)]
+
+        # Each message of the plain mboxes is parsed in a chunk
+        with unittest.mock.patch('perceval.backends.core.mbox.MBOX_CHUNK_SIZE', 1):
+            backend = MBox('http://example.com/', self.tmp_path, max_workers=4)
+            messages = [m for m in backend.fetch(from_date=None)]
+
+        self.assertEqual(len(messages), 11)
+
+        for message, exp in zip(messages, expected):
+            self.assertEqual(message['uuid'], exp['uuid'])
+            self.assertDictEqual(message['data'], exp['data'])
+
+        backend = MBox('http://example.com/', self.tmp_error_path, max_workers=2)
+        messages = [m for m in backend.fetch()]
+        self.assertEqual(len(messages), 2)
+
+    def test_fetch_max_body_size(self):
+        """Test whether the bodies of the messages are truncated or skipped"""
+
+        backend = MBox('http://example.com/', self.tmp_path)
+        expected = [m for m in backend.fetch(from_date=None)]
+
+        for max_workers in [1, 2]:
+            backend = MBox('http://example.com/', self.tmp_path,
+                           max_workers=max_workers, max_body_size=10)
+            messages = [m for m in backend.fetch(from_date=None)]
+
+            self.assertEqual(len(messages), 11)
+
+            for message, exp in zip(messages, expected):
+                self.assertEqual(message['uuid'], exp['uuid'])
+
+                body = message['data']['body']
+                exp_body = exp['data']['body']
+                self.assertListEqual(list(body.keys()), list(exp_body.keys()))
+
+                for subtype, text in body.items():
+                    self.assertEqual(text, exp_body[subtype][:10])
+
+        backend = MBox('http://example.com/', self.tmp_path, max_body_size=0)
+        messages = [m for m in backend.fetch(from_date=None)]
+
+        self.assertEqual(len(messages), 11)
+
+        for message, exp in zip(messages, expected):
+            self.assertEqual(message['uuid'], exp['uuid'])
+            self.assertDictEqual(message['data']['body'], {})
+
+    def test_fetch_index(self):
+        """Test whether mboxes read in previous runs are skipped or resumed"""
+
+        for max_workers in [1, 2]:
+            tmp_path = tempfile.mkdtemp(prefix='perceval_')
+            index_path = os.path.join(tmp_path, 'index', 'index.db')
+            mboxes_path = os.path.join(tmp_path, 'mboxes')
+            os.makedirs(mboxes_path)
+
+            mbox_path = os.path.join(mboxes_path, 'mbox_single.mbox')
+            shutil.copy(self.files['single'], mbox_path)
+            shutil.copy(self.cfiles['gz'], mboxes_path)
+
+            def fetch():
+                backend = MBox('http://example.com/', mboxes_path,
+                               max_workers=max_workers, index_path=index_path)
+                return [m['data']['Message-ID'] for m in backend.fetch()]
+
+            # The first time, all the messages are read
+            messages = fetch()
+            self.assertEqual(len(messages), 2)
+            self.assertTrue(os.path.exists(index_path))
+
+            # Nothing changed
+            messages = fetch()
+            self.assertListEqual(messages, [])
+
+            # New messages are appended to the plain mbox; only
+            # these ones are read
+            with open(mbox_path, 'ab') as f_out:
+                with open(self.files['complex'], 'rb') as f_in:
+                    f_out.write(f_in.read())
+
+            messages = fetch()
+            self.assertListEqual(messages, ['<BAY12-DAV6Dhd2stb2e0000c0ce@hotmail.com>',
+                                            '<87iqzlofqu.fsf@avet.kvota.net>'])
+
+            # The plain mbox is replaced by other larger mbox,
+            # so it is read from the beginning
+            shutil.copy(self.files['multipart'], mbox_path)
+            self.assertGreater(os.path.getsize(mbox_path),
+                               os.path.getsize(self.files['single']) + os.path.getsize(self.files['complex']))
+
+            messages = fetch()
+            self.assertListEqual(messages, ['<019801ca633f$f4376140$dca623c0$@yang@example.com>',
+                                            '<FB0C1D9DAED2D411BB990002A52C30EC03838593@example.com>'])
+
+            # Compressed mboxes which changed are read again
+            os.utime(os.path.join(mboxes_path, 'gz'), (0, 0))
+
+            messages = fetch()
+            self.assertListEqual(messages, ['<4CF64D10.9020206@domain.com>'])
+
+            messages = fetch()
+            self.assertListEqual(messages, [])
+
+            shutil.rmtree(tmp_path)
+
+    def test_fetch_index_from_date(self):
+        """Test whether mboxes are read again when the date is earlier than the indexed one"""
+
+        for max_workers in [1, 2]:
+            tmp_path = tempfile.mkdtemp(prefix='perceval_')
+            index_path = os.path.join(tmp_path, 'index.db')
+            mboxes_path = os.path.join(tmp_path, 'mboxes')
+            os.makedirs(mboxes_path)
+
+            mbox_path = os.path.join(mboxes_path, 'mbox_multipart.mbox')
+            shutil.copy(self.files['multipart'], mbox_path)
+
+            def fetch(from_date=DEFAULT_DATETIME):
+                backend = MBox('http://example.com/', mboxes_path,
+                               max_workers=max_workers, index_path=index_path)
+                return [m['data']['Message-ID'] for m in backend.fetch(from_date=from_date)]
+
+            # No messages were sent after this date
+            from_date = DEFAULT_LAST_DATETIME
+
+            messages = fetch(from_date=from_date)
+            self.assertListEqual(messages, [])
+
+            messages = fetch(from_date=from_date)
+            self.assertListEqual(messages, [])
+
+            # The mbox did not change but the date is earlier
+            expected = ['<019801ca633f$f4376140$dca623c0$@yang@example.com>',
+                        '<FB0C1D9DAED2D411BB990002A52C30EC03838593@example.com>']
+
+            messages = fetch()
+            self.assertListEqual(messages, expected)
+
+            messages = fetch()
+            self.assertListEqual(messages, [])
+
+            # Messages appended to the mbox are read since the
+            # given date; the index keeps the latest date
+            with open(mbox_path, 'ab') as f_out:
+                with open(self.files['single'], 'rb') as f_in:
+                    f_out.write(f_in.read())
+
+            messages = fetch(from_date=from_date)
+            self.assertListEqual(messages, [])
+
+            messages = fetch()
+            self.assertListEqual(messages, expected + ['<4CF64D10.9020206@domain.com>'])
+
+            shutil.rmtree(tmp_path)
+
+    def test_fetch_index_not_completed(self):
+        """Test whether the index is not updated when a mbox is not completely read"""
+
+        tmp_path = tempfile.mkdtemp(prefix='perceval_')
+        index_path = os.path.join(tmp_path, 'index.db')
+        mboxes_path = os.path.join(tmp_path, 'mboxes')
+        os.makedirs(mboxes_path)
+
+        shutil.copy(self.files['complex'], mboxes_path)
+
+        backend = MBox('http://example.com/', mboxes_path, index_path=index_path)
+        messages = backend.fetch()
+        next(messages)
+        messages.close()
+
+        messages = [m for m in backend.fetch()]
+        self.assertEqual(len(messages), 2)
+
+        messages = [m for m in backend.fetch()]
+        self.assertEqual(len(messages), 0)
+
+        # Each mailing list has its own entries
+        backend = MBox('http://example.org/', mboxes_path, index_path=index_path)
+        messages = [m for m in backend.fetch()]
+        self.assertEqual(len(messages), 2)
+
+        shutil.rmtree(tmp_path)
+
+    def test_parse_mbox_chunks(self):
+        """Test whether the chunks of a mbox contain all its messages"""
+
+        filepath = self.files['complex']
+        expected = [m for m in MBox.parse_mbox(filepath)]
+
+        chunks = _find_mbox_chunks(filepath, 1)
+        self.assertEqual(len(chunks), 2)
+        self.assertEqual(chunks[0][0], 0)
+        self.assertEqual(chunks[-1][1], os.path.getsize(filepath))
+
+        messages = []
+        for start, end in chunks:
+            msgs, error = _parse_mbox_chunk(MBoxArchive(filepath), start, end)
+            self.assertIsNone(error)
+            self.assertEqual(len(msgs), 1)
+            messages.extend(msgs)
+
+        self.assertListEqual(messages, expected)
+
+        chunks = _find_mbox_chunks(filepath, os.path.getsize(filepath))
+        self.assertListEqual(chunks, [(0, os.path.getsize(filepath))])
+
+        start, end = _find_mbox_chunks(filepath, 1)[1]
+        chunks = _find_mbox_chunks(filepath, 1, start=start, end=end)
+        self.assertListEqual(chunks, [(start, end)])
+
+        msgs, error = _parse_mbox_chunk(MBoxArchive(self.cfiles['gz']), None, None)
+        self.assertIsNone(error)
+        self.assertEqual(len(msgs), 1)
+
+    def test_parse_mbox_chunk_error(self):
+        """Test whether errors reading a chunk are returned"""
+
+        filepath = os.path.join(self.tmp_error_path, 'mbox_empty.mbox')
+        open(filepath, 'w').close()
+
+        self.assertListEqual(_find_mbox_chunks(filepath, 1), [])
+
+        os.remove(filepath)
+
+        filepath = os.path.join(self.tmp_error_path, 'mbox_bz2')
+        with open(filepath, 'wb') as f:
+            f.write(b'\x42\x5a\x68 not a bz2 file')
+
+        msgs, error = _parse_mbox_chunk(MBoxArchive(filepath), None, None)
+        self.assertListEqual(msgs, [])
+        self.assertIsNotNone(error)
+
     @unittest.mock.patch('perceval.backends.core.mbox.str_to_datetime')
     def test_fetch_exception(self, mock_str_to_datetime):
         """Test whether an exception is thrown when the the fetch_items method fails"""
@@ -368,36 +785,26 @@ class TestMBoxBackend(TestBaseMBox):
 
         tmp_path_ign = tempfile.mkdtemp(prefix='perceval_')
 
-        def copy_mbox_side_effect(*args, **kwargs):
-            """Copy a mbox archive or raise IO error for 'mbox_multipart.mbox' archive"""
-
-            error_file = os.path.join(tmp_path_ign, 'mbox_multipart.mbox')
-            mbox = args[0]
-
-            if mbox.filepath == error_file:
-                raise OSError('Mock error')
+        shutil.copy(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data/mbox/mbox_single.mbox'),
+                    tmp_path_ign)
 
-            tmp_path = tempfile.mktemp(prefix='perceval_')
+        # Store a truncated copy of 'data/mbox/mbox_multipart.mbox'
+        # to force an EOFError reading it and to check if the code
+        # ignores this file
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data/mbox/mbox_multipart.mbox'),
+                  'rb') as f_in:
+            data = gzip.compress(f_in.read())
 
-            with mbox.container as f_in:
-                with open(tmp_path, mode='wb') as f_out:
-                    for l in f_in:
-                        f_out.write(l)
-            return tmp_path
+        with open(os.path.join(tmp_path_ign, 'mbox_multipart.mbox.gz'), 'wb') as f_out:
+            f_out.write(data[:len(data) // 2])
 
-        shutil.copy(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data/mbox/mbox_single.mbox'),
-                    tmp_path_ign)
-        shutil.copy(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data/mbox/mbox_multipart.mbox'),
-                    tmp_path_ign)
+        for max_workers in [1, 2]:
+            backend = MBox('http://example.com/', tmp_path_ign, max_workers=max_workers)
 
-        # Mock 'copy_mbox' method for forcing to raise an OSError
-        # with file 'data/mbox/mbox_multipart.mbox' to check if
-        # the code ignores this file
-        with unittest.mock.patch('perceval.backends.core.mbox.MBox._copy_mbox') as mock_copy_mbox:
-            mock_copy_mbox.side_effect = copy_mbox_side_effect
+            with self.assertLogs(logger, level='WARNING') as cm:
+                messages = [m for m in backend.fetch()]
 
-            backend = MBox('http://example.com/', tmp_path_ign)
-            messages = [m for m in backend.fetch()]
+            self.assertRegex(cm.output[-1], "Ignoring .+mbox_multipart.mbox.gz mbox")
 
             # Only one message is read
             self.assertEqual(len(messages), 1)
@@ -566,6 +973,19 @@ class TestMBoxCommand(unittest.TestCase):
         self.assertEqual(parsed_args.dirpath, '/tmp/perceval/')
         self.assertEqual(parsed_args.tag, 'test')
         self.assertEqual(parsed_args.from_date, DEFAULT_DATETIME)
+        self.assertEqual(parsed_args.max_workers, 1)
+        self.assertIsNone(parsed_args.index_path)
+        self.assertIsNone(parsed_args.max_body_size)
+
+        args = ['http://example.com/', '/tmp/perceval/',
+                '--max-workers', '4',
+                '--index-path', '/tmp/perceval/index.db',
+                '--max-body-size', '0']
+
+        parsed_args = parser.parse(*args)
+        self.assertEqual(parsed_args.max_workers, 4)
+        self.assertEqual(parsed_args.index_path, '/tmp/perceval/index.db')
+        self.assertEqual(parsed_args.max_body_size, 0)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2019 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, 51 Franklin Street, Fifth Floor, Boston, MA 02110-1335, USA.
+#
+# Authors:
+#     Santiago Dueñas <sduenas@bitergia.com>
+#
+
+import argparse
+import importlib.machinery
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from perceval.archive import Archive, ArchiveManager
+from perceval.backend import (Backend,
+                              BackendCommand,
+                              BackendCommandArgumentParser)
+from perceval.errors import BackendError
+from perceval.orchestrator import (FetchJob,
+                                   Orchestrator,
+                                   fetch_jobs,
+                                   read_jobs)
+from perceval.utils import DEFAULT_DATETIME
+
+
+class MockedBackend(Backend):
+    """Mocked backend for testing"""
+
+    version = '0.2.0'
+    CATEGORIES = ['mock_item']
+    ITEMS = 5
+
+    def __init__(self, url, tag=None, archive=None):
+        super().__init__(url, tag=tag, archive=archive)
+
+    def fetch_items(self, category, **kwargs):
+        for x in range(self.ITEMS):
+            item = {'item': x, 'origin': self.origin}
+            if self.archive:
+                self.archive.store(self.origin + str(x), None, None, item)
+            yield item
+
+    def fetch(self, category='mock_item'):
+        return super().fetch(category)
+
+    def _init_client(self, from_archive=False):
+        return None
+
+    @staticmethod
+    def metadata_id(item):
+        return str(item['item'])
+
+    @staticmethod
+    def metadata_updated_on(item):
+        return '2016-01-01'
+
+    @staticmethod
+    def metadata_category(item):
+        return 'mock_item'
+
+
+class ErrorBackend(MockedBackend):
+    """Backend which raises an exception while fetching items"""
+
+    def fetch_items(self, category, **kwargs):
+        for item in super().fetch_items(category, **kwargs):
+            yield item
+            raise BackendError(cause="Unhandled exception")
+
+
+class ConcurrencyBackend(MockedBackend):
+    """Backend which tracks the number of concurrent fetches"""
+
+    lock = threading.Lock()
+    running = 0
+    max_running = 0
+
+    def fetch_items(self, category, **kwargs):
+        with ConcurrencyBackend.lock:
+            ConcurrencyBackend.running += 1
+            ConcurrencyBackend.max_running = max(ConcurrencyBackend.max_running,
+                                                 ConcurrencyBackend.running)
+        time.sleep(0.05)
+
+        for item in super().fetch_items(category, **kwargs):
+            yield item
+
+        with ConcurrencyBackend.lock:
+            ConcurrencyBackend.running -= 1
+
+
+class MockedBackendCommand(BackendCommand):
+    """Mocked backend command class used for testing"""
+
+    BACKEND = MockedBackend
+
+    @staticmethod
+    def setup_cmd_parser():
+        parser = BackendCommandArgumentParser(archive=True)
+        parser.parser.add_argument('url')
+        return parser
+
+
+class ErrorBackendCommand(MockedBackendCommand):
+    """Command of the backend which raises an exception"""
+
+    BACKEND = ErrorBackend
+
+
+def job_items(items, origin):
+    return [item['data']['item'] for item in items if item['origin'] == origin]
+
+
+class TestFetchJob(unittest.TestCase):
+    """FetchJob tests"""
+
+    def test_initialization(self):
+        """Test whether attributes are initializated"""
+
+        job = FetchJob(MockedBackend, {'url': 'http://example.com/repo'},
+                       category='mock_item')
+
+        self.assertEqual(job.backend_class, MockedBackend)
+        self.assertDictEqual(job.backend_args, {'url': 'http://example.com/repo'})
+        self.assertEqual(job.category, 'mock_item')
+        self.assertIsNone(job.manager)
+        self.assertEqual(job.host, 'example.com')
+
+    def test_host(self):
+        """Test how the host is set"""
+
+        job = FetchJob(MockedBackend, {'url': 'http://example.com/repo'},
+                       host='myhost')
+        self.assertEqual(job.host, 'myhost')
+
+        job = FetchJob(MockedBackend, {'uri': '/tmp/repo'})
+        self.assertEqual(job.host, '/tmp/repo')
+
+        job = FetchJob(MockedBackend, {'tag': 'test'})
+        self.assertIsNone(job.host)
+
+    def test_from_command(self):
+        """Test if a job is created from the arguments of a command"""
+
+        tmp_path = tempfile.mkdtemp(prefix='perceval_')
+
+        try:
+            job = FetchJob.from_command(MockedBackendCommand,
+                                        'http://example.com/repo',
+                                        '--category', 'mock_item',
+                                        '--tag', 'test',
+                                        '--archive-path', tmp_path)
+
+            self.assertEqual(job.backend_class, MockedBackend)
+            self.assertDictEqual(job.backend_args,
+                                 {'url': 'http://example.com/repo', 'tag': 'test'})
+            self.assertEqual(job.category, 'mock_item')
+            self.assertIsInstance(job.manager, ArchiveManager)
+            self.assertEqual(job.manager.dirpath, tmp_path)
+            self.assertEqual(job.host, 'example.com')
+
+            job = FetchJob.from_command(MockedBackendCommand,
+                                        'http://example.com/repo',
+                                        '--no-archive')
+            self.assertIsNone(job.manager)
+            self.assertIsNone(job.category)
+        finally:
+            shutil.rmtree(tmp_path)
+
+
+class TestOrchestrator(unittest.TestCase):
+    """Orchestrator tests"""
+
+    def setUp(self):
+        self.test_path = tempfile.mkdtemp(prefix='perceval_')
+
+    def tearDown(self):
+        shutil.rmtree(self.test_path)
+
+    def test_initialization(self):
+        """Test whether attributes are initializated"""
+
+        orchestrator = Orchestrator()
+        self.assertEqual(orchestrator.max_workers, Orchestrator.DEFAULT_MAX_WORKERS)
+        self.assertEqual(orchestrator.mode, Orchestrator.THREADS)
+        self.assertIsNone(orchestrator.max_jobs_per_host)
+        self.assertListEqual(orchestrator.failed_jobs, [])
+
+        orchestrator = Orchestrator(max_workers=2, mode=Orchestrator.PROCESSES,
+                                    max_jobs_per_host=1)
+        self.assertEqual(orchestrator.max_workers, 2)
+        self.assertEqual(orchestrator.mode, Orchestrator.PROCESSES)
+        self.assertEqual(orchestrator.max_jobs_per_host, 1)
+
+    def test_invalid_parameters(self):
+        """Test whether an exception is raised with invalid parameters"""
+
+        with self.assertRaises(ValueError):
+            Orchestrator(mode='fibers')
+        with self.assertRaises(ValueError):
+            Orchestrator(max_workers=0)
+        with self.assertRaises(ValueError):
+            Orchestrator(max_jobs_per_host=0)
+
+    def _test_run(self, mode):
+        origins = ['http://example.com/%s' % i for i in range(6)]
+        jobs = [FetchJob(MockedBackend, {'url': origin}) for origin in origins]
+
+        orchestrator = Orchestrator(max_workers=3, mode=mode)
+        items = [item for item in orchestrator.run(jobs)]
+
+        self.assertEqual(len(items), 30)
+        self.assertListEqual(orchestrator.failed_jobs, [])
+
+        for origin in origins:
+            self.assertListEqual(job_items(items, origin), [0, 1, 2, 3, 4])
+
+    def test_run_threads(self):
+        """Test whether the items of all the jobs are fetched using threads"""
+
+        self._test_run(Orchestrator.THREADS)
+
+    def test_run_processes(self):
+        """Test whether the items of all the jobs are fetched using processes"""
+
+        self._test_run(Orchestrator.PROCESSES)
+
+    def test_run_archives(self):
+        """Test whether each job stores its items in its own archive"""
+
+        manager = ArchiveManager(self.test_path)
+
+        jobs = [FetchJob(MockedBackend, {'url': 'http://example.com/a'}, manager=manager),
+                FetchJob(MockedBackend, {'url': 'http://example.com/b'}, manager=manager)]
+
+        items = [item for item in fetch_jobs(jobs, max_workers=2)]
+        self.assertEqual(len(items), 10)
+
+        for origin in ['http://example.com/a', 'http://example.com/b']:
+            filepaths = manager.search(origin, 'MockedBackend', 'mock_item',
+                                       DEFAULT_DATETIME)
+            self.assertEqual(len(filepaths), 1)
+
+            archive = Archive(filepaths[0])
+            self.assertEqual(archive.retrieve(origin + '4', None, None),
+                             {'item': 4, 'origin': origin})
+
+    def test_run_failed_job(self):
+        """Test whether a failed job does not stop the rest of jobs"""
+
+        manager = ArchiveManager(self.test_path)
+
+        failed = FetchJob(ErrorBackend, {'url': 'http://example.com/error'},
+                          manager=manager)
+        jobs = [FetchJob(MockedBackend, {'url': 'http://example.com/a'}),
+                failed,
+                FetchJob(MockedBackend, {'url': 'http://example.com/b'})]
+
+        orchestrator = Orchestrator(max_workers=2)
+        items = [item for item in orchestrator.run(jobs)]
+
+        self.assertListEqual(job_items(items, 'http://example.com/a'), [0, 1, 2, 3, 4])
+        self.assertListEqual(job_items(items, 'http://example.com/b'), [0, 1, 2, 3, 4])
+        self.assertListEqual(job_items(items, 'http://example.com/error'), [0])
+        self.assertListEqual(orchestrator.failed_jobs, [failed])
+
+        # The archive of the failed job was removed
+        filepaths = manager.search('http://example.com/error', 'ErrorBackend',
+                                   'mock_item', DEFAULT_DATETIME)
+        self.assertListEqual(filepaths, [])
+
+    def test_max_jobs_per_host(self):
+        """Test whether the number of jobs per host is limited"""
+
+        ConcurrencyBackend.max_running = 0
+
+        jobs = [FetchJob(ConcurrencyBackend, {'url': 'http://example.com/%s' % i})
+                for i in range(4)]
+        jobs.append(FetchJob(MockedBackend, {'url': 'http://example.org/a'}))
+
+        orchestrator = Orchestrator(max_workers=4, max_jobs_per_host=1)
+        items = [item for item in orchestrator.run(jobs)]
+
+        self.assertEqual(len(items), 25)
+        self.assertEqual(ConcurrencyBackend.max_running, 1)
+
+    def test_stop_consuming(self):
+        """Test whether the workers finish when the consumer stops"""
+
+        jobs = [FetchJob(MockedBackend, {'url': 'http://example.com/%s' % i})
+                for i in range(10)]
+
+        orchestrator = Orchestrator(max_workers=2, queue_size=1)
+        items = orchestrator.run(jobs)
+
+        item = next(items)
+        self.assertEqual(item['data']['item'], 0)
+        items.close()
+
+
+class TestReadJobs(unittest.TestCase):
+    """Tests for read_jobs function"""
+
+    def test_read_jobs(self):
+        """Test whether jobs are read from a file"""
+
+        content = '{"backend": "mock", "args": ["http://example.com/a", "--no-archive"]}\n' \
+                  '\n' \
+                  '{"backend": "mock", "args": ["http://example.org/b", "--no-archive", "--category", "mock_item"]}\n'
+
+        jobs = read_jobs(io.StringIO(content), {'mock': MockedBackendCommand})
+
+        self.assertEqual(len(jobs), 2)
+        self.assertEqual(jobs[0].backend_class, MockedBackend)
+        self.assertEqual(jobs[0].backend_args['url'], 'http://example.com/a')
+        self.assertIsNone(jobs[0].category)
+        self.assertEqual(jobs[1].host, 'example.org')
+        self.assertEqual(jobs[1].category, 'mock_item')
+
+    def test_invalid_jobs(self):
+        """Test whether an exception is raised with invalid lines"""
+
+        commands = {'mock': MockedBackendCommand}
+
+        with self.assertRaisesRegex(BackendError, "invalid job on line 1"):
+            read_jobs(io.StringIO('{"args": []}\n'), commands)
+
+        with self.assertRaisesRegex(BackendError, "invalid job on line 1"):
+            read_jobs(io.StringIO('not a json\n'), commands)
+
+        with self.assertRaisesRegex(BackendError, "unknown backend git on line 2"):
+            read_jobs(io.StringIO('\n{"backend": "git"}\n'), commands)
+
+
+class TestRunJobs(unittest.TestCase):
+    """Tests for the jobs mode of perceval script"""
+
+    def setUp(self):
+        self.test_path = tempfile.mkdtemp(prefix='perceval_')
+
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bin', 'perceval')
+        loader = importlib.machinery.SourceFileLoader('perceval_script', script)
+        self.script = loader.load_module()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_path)
+
+    def _run_jobs(self, content):
+        jobs_path = os.path.join(self.test_path, 'jobs.json')
+
+        with open(jobs_path, 'w') as fd:
+            fd.write(content)
+
+        args = argparse.Namespace(jobs=jobs_path, processes=False, workers=2,
+                                  max_per_host=None, json_line=True,
+                                  outfile=io.StringIO())
+        commands = {'mock': MockedBackendCommand, 'error': ErrorBackendCommand}
+
+        self.script.run_jobs(args, commands)
+
+        return args.outfile.getvalue().splitlines()
+
+    def test_run_jobs(self):
+        """Test whether the items of the jobs are written"""
+
+        content = '{"backend": "mock", "args": ["http://example.com/a", "--no-archive"]}\n' \
+                  '{"backend": "mock", "args": ["http://example.com/b", "--no-archive"]}\n'
+
+        lines = self._run_jobs(content)
+        self.assertEqual(len(lines), 10)
+
+    def test_run_failed_jobs(self):
+        """Test whether the script exits with an error when a job fails"""
+
+        content = '{"backend": "mock", "args": ["http://example.com/a", "--no-archive"]}\n' \
+                  '{"backend": "error", "args": ["http://example.com/error", "--no-archive"]}\n'
+
+        with self.assertRaises(SystemExit) as cm:
+            self._run_jobs(content)
+
+        self.assertEqual(cm.exception.code, 1)
+
+
+if __name__ == "__main__":
+    unittest.main(warnings='ignore')
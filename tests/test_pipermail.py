@@ -75,14 +75,18 @@ class TestPipermailList(unittest.TestCase):
         self.assertEqual(pmls.dirpath, self.tmp_path)
         self.assertEqual(pmls.url, PIPERMAIL_URL)
         self.assertTrue(pmls.verify)
+        self.assertEqual(pmls.client.base_url, PIPERMAIL_URL)
+        self.assertEqual(pmls.client.max_downloads, 1)
 
-        pmls = PipermailList(PIPERMAIL_URL, self.tmp_path, verify=False)
+        pmls = PipermailList(PIPERMAIL_URL, self.tmp_path, verify=False, max_downloads=4)
 
         self.assertIsInstance(pmls, MailingList)
         self.assertEqual(pmls.uri, PIPERMAIL_URL)
         self.assertEqual(pmls.dirpath, self.tmp_path)
         self.assertEqual(pmls.url, PIPERMAIL_URL)
         self.assertFalse(pmls.verify)
+        self.assertFalse(pmls.client.verify)
+        self.assertEqual(pmls.client.max_downloads, 4)
 
     @httpretty.activate
     def test_fetch(self):
@@ -123,6 +127,58 @@ class TestPipermailList(unittest.TestCase):
         self.assertEqual(mboxes[1].filepath, os.path.join(self.tmp_path, '2016-March.txt'))
         self.assertEqual(mboxes[2].filepath, os.path.join(self.tmp_path, '2016-April.txt'))
 
+    @httpretty.activate
+    def test_fetch_max_downloads(self):
+        """Test whether archives are fetched in parallel and only when they change"""
+
+        pipermail_index = read_file('data/pipermail/pipermail_index.html')
+        mbox_nov = read_file('data/pipermail/pipermail_2015_november.mbox')
+        mbox_march = read_file('data/pipermail/pipermail_2016_march.mbox')
+        mbox_april = read_file('data/pipermail/pipermail_2016_april.mbox')
+
+        httpretty.register_uri(httpretty.GET,
+                               PIPERMAIL_URL,
+                               body=pipermail_index)
+        httpretty.register_uri(httpretty.GET,
+                               PIPERMAIL_URL + '2015-November.txt.gz',
+                               body=mbox_nov)
+        httpretty.register_uri(httpretty.GET,
+                               PIPERMAIL_URL + '2016-March.txt',
+                               responses=[
+                                   httpretty.Response(body=mbox_march),
+                                   httpretty.Response(body='', status=304)
+                               ])
+        httpretty.register_uri(httpretty.GET,
+                               PIPERMAIL_URL + '2016-April.txt',
+                               responses=[
+                                   httpretty.Response(body=mbox_april),
+                                   httpretty.Response(body=mbox_april + mbox_march)
+                               ])
+
+        pmls = PipermailList('http://example.com/', self.tmp_path, max_downloads=3)
+        links = pmls.fetch()
+
+        self.assertEqual(len(links), 3)
+        self.assertEqual(links[0][0], PIPERMAIL_URL + '2016-April.txt')
+        self.assertEqual(links[1][0], PIPERMAIL_URL + '2016-March.txt')
+        self.assertEqual(links[2][0], PIPERMAIL_URL + '2015-November.txt.gz')
+
+        with open(os.path.join(self.tmp_path, '2016-April.txt'), 'r') as fd:
+            self.assertEqual(fd.read(), mbox_april)
+
+        # Only the archive that was modified is stored again
+        os.utime(os.path.join(self.tmp_path, '2016-March.txt'), (0, 0))
+
+        links = pmls.fetch()
+        self.assertEqual(len(links), 3)
+
+        self.assertEqual(os.stat(os.path.join(self.tmp_path, '2016-March.txt')).st_mtime, 0)
+
+        with open(os.path.join(self.tmp_path, '2016-April.txt'), 'r') as fd:
+            self.assertEqual(fd.read(), mbox_april + mbox_march)
+
+        self.assertEqual(len(pmls.mboxes), 3)
+
     @httpretty.activate
     def test_fetch_http_403_error(self):
         """Test whether 403 HTTP errors are properly handled"""
@@ -307,6 +363,8 @@ class TestPipermailBackend(unittest.TestCase):
         self.assertEqual(backend.origin, 'http://example.com/')
         self.assertEqual(backend.tag, 'test')
         self.assertTrue(backend.verify)
+        self.assertIsNone(backend.index_path)
+        self.assertEqual(backend.max_downloads, 1)
 
         # When tag is empty or None it will be set to
         # the value in uri
@@ -323,6 +381,9 @@ class TestPipermailBackend(unittest.TestCase):
         self.assertEqual(backend.tag, 'http://example.com/')
         self.assertTrue(backend.verify)
 
+        backend = Pipermail('http://example.com/', self.tmp_path, max_downloads=4)
+        self.assertEqual(backend.max_downloads, 4)
+
     def test_has_archiving(self):
         """Test if it returns False when has_archiving is called"""
 
@@ -570,7 +631,9 @@ class TestPipermailCommand(unittest.TestCase):
                 '--mboxes-path', '/tmp/perceval/',
                 '--tag', 'test',
                 '--from-date', '1970-01-01',
-                '--no-verify']
+                '--no-verify',
+                '--index-path', '/tmp/perceval/index.db',
+                '--max-downloads', '4']
 
         parsed_args = parser.parse(*args)
         self.assertEqual(parsed_args.url, 'http://example.com/')
@@ -578,6 +641,8 @@ class TestPipermailCommand(unittest.TestCase):
         self.assertEqual(parsed_args.tag, 'test')
         self.assertEqual(parsed_args.from_date, DEFAULT_DATETIME)
         self.assertFalse(parsed_args.verify)
+        self.assertEqual(parsed_args.index_path, '/tmp/perceval/index.db')
+        self.assertEqual(parsed_args.max_downloads, 4)
 
 
 if __name__ == "__main__":
@@ -29,6 +29,7 @@ import os
 import shutil
 import tempfile
 import unittest
+import unittest.mock
 import zipfile
 
 from perceval.errors import ParseError
@@ -36,7 +37,9 @@ from perceval.utils import (check_compressed_file_type,
                             message_to_dict,
                             months_range,
                             remove_invalid_xml_chars,
-                            xml_to_dict)
+                            run_in_pool,
+                            xml_to_dict,
+                            xml_to_dict_iter)
 
 
 def read_file(filename, mode='r'):
@@ -45,6 +48,14 @@ def read_file(filename, mode='r'):
     return content
 
 
+def square(n):
+    """Function to run in a pool of processes"""
+
+    if n < 0:
+        raise ValueError("negative number")
+    return n * n
+
+
 class TestCheckCompressedFileType(unittest.TestCase):
     """Unit tests for check_compressed_file_type function"""
 
@@ -216,6 +227,107 @@ class TestMessagetoDict(unittest.TestCase):
                                      'Thanks,\n\nDaniel Nehren\n\n')
         self.assertEqual(len(html_body), 1557)
 
+    def test_max_body_size(self):
+        """Test whether bodies are truncated or not decoded"""
+
+        raw_email = read_file('data/utils/email_multipart_encoding.txt')
+        msg = email.message_from_string(raw_email)
+
+        message = message_to_dict(msg, max_body_size=25)
+
+        self.assertEqual(message['Subject'], msg['Subject'])
+        self.assertEqual(message['body']['plain'], 'technology.esl Committers')
+        self.assertEqual(len(message['body']['html']), 25)
+
+        message = message_to_dict(msg, max_body_size=100000)
+        self.assertEqual(len(message['body']['html']), 3103)
+
+        # Payloads are only read to find the parts, they are not decoded
+        get_payload = email.message.Message.get_payload
+
+        with unittest.mock.patch('email.message.Message.get_payload',
+                                 autospec=True, side_effect=get_payload) as mock_payload:
+            message = message_to_dict(msg, max_body_size=0)
+
+        for call in mock_payload.call_args_list:
+            self.assertFalse(call[1].get('decode', False))
+
+        self.assertEqual(message['Subject'], msg['Subject'])
+        self.assertDictEqual(message['body'], {})
+
+    def test_encoded_headers(self):
+        """Test whether encoded and non-ASCII headers are decoded"""
+
+        raw_email = "From: =?utf-8?q?G=C3=B6ran?= <goran@example.com>\n" \
+                    "Subject: =?iso-8859-1?q?caf=E9?= and more\n" \
+                    "To: Jos\u00e9 <jose@example.com>\n" \
+                    "Cc: \n" \
+                    "Message-ID: <1@example.com>\n\n" \
+                    "Hi!\n"
+        msg = email.message_from_string(raw_email)
+
+        message = message_to_dict(msg)
+
+        self.assertEqual(message['From'], 'Göran  <goran@example.com>')
+        self.assertEqual(message['Subject'], 'café  and more')
+        self.assertEqual(message['To'], 'José <jose@example.com>')
+        self.assertIsNone(message['Cc'])
+        self.assertEqual(message['Message-ID'], '<1@example.com>')
+        self.assertDictEqual(message['body'], {'plain': 'Hi!\n'})
+
+    def test_non_ascii_raw_headers(self):
+        """Test whether raw 8-bit headers are not read as ASCII headers"""
+
+        raw_email = b"From: G\xc3\xb6ran <goran@example.com>\n" \
+                    b"Subject: caf\xc3\xa9\n" \
+                    b"Message-ID: <1@example.com>\n\n" \
+                    b"Hi!\n"
+        msg = email.message_from_bytes(raw_email)
+
+        message = message_to_dict(msg)
+
+        # Undecoded bytes are kept as surrogates
+        self.assertEqual(message['From'], 'G\udcc3\udcb6ran <goran@example.com>')
+        self.assertEqual(message['Subject'], 'caf\udcc3\udca9')
+        self.assertEqual(message['Message-ID'], '<1@example.com>')
+
+
+class TestRunInPool(unittest.TestCase):
+    """Unit tests for run_in_pool"""
+
+    def test_run_in_pool(self):
+        """Test if the tasks and their results are returned in order"""
+
+        tasks = [(n,) for n in range(10)]
+        results = [result for result in run_in_pool(square, tasks, 2)]
+
+        expected = [((n,), n * n) for n in range(10)]
+        self.assertListEqual(results, expected)
+
+    def test_generator_tasks(self):
+        """Test if tasks are taken from a generator"""
+
+        tasks = ((n,) for n in range(5))
+        results = [result for _, result in run_in_pool(square, tasks, 3)]
+
+        self.assertListEqual(results, [0, 1, 4, 9, 16])
+
+    def test_no_tasks(self):
+        """Test if nothing is returned when there are no tasks"""
+
+        results = [result for result in run_in_pool(square, [], 2)]
+        self.assertListEqual(results, [])
+
+    def test_error(self):
+        """Test if the exceptions raised by a task are propagated"""
+
+        tasks = [(1,), (-1,), (2,)]
+        gen = run_in_pool(square, tasks, 2)
+
+        self.assertEqual(next(gen), ((1,), 1))
+        with self.assertRaisesRegex(ValueError, "negative number"):
+            next(gen)
+
 
 class TestRemoveInvalidXMLChars(unittest.TestCase):
     """Unit tests for remove_invalid_xml_characters"""
@@ -227,6 +339,14 @@ class TestRemoveInvalidXMLChars(unittest.TestCase):
         self.assertNotEqual(purged_xml, raw_xml)
         self.assertEqual(len(purged_xml), len(raw_xml))
 
+    def test_replace_chars(self):
+        """Check whether invalid characters are replaced by whitespaces"""
+
+        raw_xml = '<a>\x00b\x08\tc\x0b\x1f\n\x7f\x85\x9f\u00e9</a>'
+        purged_xml = remove_invalid_xml_chars(raw_xml)
+
+        self.assertEqual(purged_xml, '<a> b \tc  \n \x85 \u00e9</a>')
+
 
 class TestXMLtoDict(unittest.TestCase):
     """Unit tests for xml_to_dict"""
@@ -275,5 +395,60 @@ class TestXMLtoDict(unittest.TestCase):
         self.assertRaises(ParseError, xml_to_dict, raw_xml)
 
 
+class TestXMLtoDictIter(unittest.TestCase):
+    """Unit tests for xml_to_dict_iter"""
+
+    def test_xml_to_dict_iter(self):
+        """Check whether it converts the children of a XML file one by one"""
+
+        raw_xml = read_file('data/bugzilla/bugzilla_bugs_details.xml')
+        expected = xml_to_dict(raw_xml)['bug']
+
+        bugs = xml_to_dict_iter(raw_xml, 'bug')
+        self.assertListEqual([bug for bug in bugs], expected)
+        self.assertEqual(len(expected), 5)
+
+        bugs = xml_to_dict_iter(raw_xml, 'version')
+        self.assertListEqual([bug for bug in bugs], [])
+
+    def test_chunks(self):
+        """Check whether the stream is converted when it is parsed in chunks"""
+
+        raw_xml = read_file('data/utils/bugzilla_bugs_invalid_chars.xml')
+        expected = xml_to_dict(raw_xml)['bug']
+
+        with unittest.mock.patch('perceval.utils.XML_CHUNK_SIZE', 7):
+            bugs = [bug for bug in xml_to_dict_iter(raw_xml, 'bug')]
+
+        self.assertListEqual(bugs, expected)
+        self.assertEqual(bugs[0]['bug_id'][0]['__text__'], '25299')
+
+    def test_tag(self):
+        """Check whether only the children with the given tag are converted"""
+
+        raw_xml = '<bugs><bug id="1"><a>1</a></bug><other/><bug id="2"/></bugs>'
+
+        bugs = xml_to_dict_iter(raw_xml, 'bug')
+        bug = next(bugs)
+        self.assertDictEqual(bug, {'id': '1', 'a': [{'__text__': '1'}]})
+
+        bug = next(bugs)
+        self.assertDictEqual(bug, {'id': '2'})
+
+        with self.assertRaises(StopIteration):
+            next(bugs)
+
+    def test_invalid_xml(self):
+        """Check whether it raises an exception when the XML is invalid"""
+
+        raw_xml = read_file('data/utils/xml_invalid.xml')
+
+        with self.assertRaises(ParseError):
+            _ = [bug for bug in xml_to_dict_iter(raw_xml, 'bug')]
+
+        with self.assertRaises(ParseError):
+            _ = [bug for bug in xml_to_dict_iter('', 'bug')]
+
+
 if __name__ == "__main__":
     unittest.main()